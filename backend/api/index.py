@@ -10,6 +10,9 @@ _backend_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if _backend_root not in sys.path:
     sys.path.insert(0, _backend_root)
 
+# Serverless: build services, static index and upstream clients on first use
+os.environ.setdefault("MARKSTRO_LAZY_INIT", "1")
+
 from server import app
 
 # Vercel @vercel/python looks for "app" (ASGI app) – no Mangum needed
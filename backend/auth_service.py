@@ -4,12 +4,16 @@ Handles token generation, validation, and user authentication
 """
 
 import jwt
+import logging
 from datetime import datetime, timedelta
 from typing import Optional, Dict
-from dotenv import load_dotenv
+from metrics import AUTH_FAILURES
+from settings import load_env
 import os
 
-load_dotenv()
+load_env()
+
+logger = logging.getLogger(__name__)
 
 class JWTService:
     """Service for managing JWT tokens"""
@@ -68,10 +72,12 @@ class JWTService:
             )
             return payload
         except jwt.ExpiredSignatureError:
-            print("❌ Token has expired")
+            AUTH_FAILURES.inc("expired")
+            logger.debug("Token has expired")
             return None
         except jwt.InvalidTokenError:
-            print("❌ Invalid token")
+            AUTH_FAILURES.inc("invalid")
+            logger.debug("Invalid token")
             return None
     
     def create_access_token(self, username: str) -> str:
@@ -0,0 +1,46 @@
+"""
+Shared test fixtures
+"""
+
+import json
+
+import pytest
+
+
+class FakeResponse:
+    """Canned requests.Response: a JSON body, streamed in small chunks on request"""
+
+    def __init__(self, body, status_code: int = 200):
+        self.status_code = status_code
+        self.content = body if isinstance(body, bytes) else json.dumps(body).encode()
+
+    def json(self):
+        return json.loads(self.content)
+
+    def iter_content(self, chunk_size: int):
+        # Small chunks, so streamed parsing sees keys and values split across them
+        for start in range(0, len(self.content), 97):
+            yield self.content[start:start + 97]
+
+    def close(self) -> None:
+        pass
+
+
+class FakeSession:
+    """requests.Session stand-in answering each GET from a queue of bodies"""
+
+    def __init__(self, *bodies, status_code: int = 200):
+        self.bodies = list(bodies)
+        self.status_code = status_code
+        self.calls = []
+
+    def get(self, url, params=None, timeout=None, stream=False):
+        self.calls.append(dict(params or {}))
+        body = self.bodies.pop(0) if len(self.bodies) > 1 else self.bodies[0]
+        return FakeResponse(body, self.status_code)
+
+
+@pytest.fixture
+def fake_session():
+    """Factory of FakeSessions: fake_session(body, ...) answers with the bodies in turn"""
+    return FakeSession
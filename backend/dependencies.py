@@ -0,0 +1,81 @@
+"""
+Request Dependencies
+JWT services and the current-user dependencies shared by server.py and routers
+"""
+
+import os
+from functools import lru_cache
+from typing import FrozenSet, Optional
+
+from fastapi import Depends, HTTPException, Query, status
+from fastapi.security import HTTPBearer
+from fastapi.security.http import HTTPAuthorizationCredentials
+
+from auth_service import JWTService, UserService
+
+# Initialize security
+security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
+
+
+# Services are created on first use so importing the app stays cheap
+@lru_cache(maxsize=None)
+def get_jwt_service() -> JWTService:
+    return JWTService()
+
+@lru_cache(maxsize=None)
+def get_user_service() -> UserService:
+    return UserService()
+
+
+def _username_or_401(token: Optional[str]) -> str:
+    username = get_jwt_service().get_username_from_token(token) if token else None
+    if username is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return username
+
+
+def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> str:
+    """
+    Dependency to extract and verify JWT token from request header
+    
+    Usage: 
+        @app.get("/protected")
+        def protected_route(current_user: str = Depends(get_current_user)):
+            return {"user": current_user}
+    """
+    return _username_or_401(credentials.credentials)
+
+
+def get_stream_user(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
+    token: Optional[str] = Query(None, description="Access token, for clients that can't set headers"),
+) -> str:
+    """
+    Like get_current_user, but also accepts ?token=
+
+    Browsers' EventSource cannot send an Authorization header.
+    """
+    return _username_or_401(credentials.credentials if credentials else token)
+
+
+@lru_cache(maxsize=None)
+def _admin_users() -> FrozenSet[str]:
+    # No default: the demo accounts' passwords are public
+    return frozenset(u.strip() for u in os.getenv("ADMIN_USERS", "").split(",") if u.strip())
+
+
+def get_admin_user(current_user: str = Depends(get_current_user)) -> str:
+    """
+    Like get_current_user, but only for users listed in ADMIN_USERS
+
+    ADMIN_USERS is a comma-separated list of usernames. Unset or empty,
+    every admin endpoint answers 403.
+    """
+    if current_user not in _admin_users():
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return current_user
@@ -0,0 +1,56 @@
+"""
+Gunicorn Configuration
+Production launch: cd backend && gunicorn -c gunicorn.conf.py server:app
+
+- One async (uvicorn) worker per available core; WEB_CONCURRENCY overrides.
+- The app is imported once in the master before forking (preload_app), so
+  modules and the static asset index are shared copy-on-write. gc.freeze()
+  keeps the garbage collector from touching (and so copying) those pages.
+- Workers are recycled gracefully after MAX_REQUESTS (+ jitter, so they
+  don't all restart at once).
+- Each worker runs the FastAPI lifespan and gets its own ServiceContainer.
+  Host-wide background jobs run only in the worker holding the leader
+  lock (see services/leader.py).
+"""
+
+import gc
+import os
+
+
+def _available_cores() -> int:
+    # Respects CPU affinity / container limits where the OS exposes them
+    if hasattr(os, "sched_getaffinity"):
+        return max(1, len(os.sched_getaffinity(0)))
+    return os.cpu_count() or 1
+
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", _available_cores()))
+worker_class = "uvicorn_worker.UvicornWorker"
+
+preload_app = True
+max_requests = int(os.getenv("MAX_REQUESTS", "5000"))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", str(max_requests // 10)))
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+timeout = int(os.getenv("WORKER_TIMEOUT", "60"))
+keepalive = 5
+
+# Render / load balancers terminate TLS in front of the app
+forwarded_allow_ips = os.getenv("FORWARDED_ALLOW_IPS", "*")
+accesslog = "-" if os.getenv("ACCESS_LOG") == "1" else None
+errorlog = "-"
+loglevel = os.getenv("LOG_LEVEL", "info")
+
+
+def pre_fork(server, worker):
+    # Everything allocated so far (the preloaded app) is moved out of the
+    # GC generations, so collections in the workers don't dirty those pages
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    server.log.info("Worker %s booted (pid %s)", worker.age, worker.pid)
+
+
+def when_ready(server):
+    server.log.info("Markstro API ready with %s workers on %s", workers, bind)
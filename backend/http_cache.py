@@ -0,0 +1,149 @@
+"""
+HTTP Caching Helpers
+Content-hash ETags, Cache-Control policies and conditional GET handling
+"""
+
+import hashlib
+from typing import Any, Optional, Union
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from responses import dumps
+
+
+class PreparedBody:
+    """Serialized JSON body with its ETag, computed once and reused"""
+
+    __slots__ = ("body", "etag")
+
+    def __init__(self, body: bytes):
+        self.body = body
+        # Weak validator: compressed variants of the same JSON share it
+        self.etag = 'W/"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest()
+
+    @classmethod
+    def from_content(cls, content: Any) -> "PreparedBody":
+        """
+        Serialize content and compute its ETag
+
+        Args:
+            content: JSON-compatible python object
+
+        Returns:
+            PreparedBody
+        """
+        return cls(dumps(content))
+
+
+class CachePolicy:
+    """
+    Cache-Control settings for one kind of endpoint
+
+    Policies are private unless made public: the API routes need a Bearer
+    token, so a shared cache or CDN must not store their responses and
+    serve them to other clients.
+    """
+
+    def __init__(
+        self,
+        max_age: int = 0,
+        stale_while_revalidate: int = 0,
+        public: bool = False,
+    ):
+        self.max_age = max_age
+        self.stale_while_revalidate = stale_while_revalidate
+        self.public = public
+
+    def header_value(self, max_age: Optional[int] = None) -> str:
+        """
+        Build the Cache-Control header value
+
+        Args:
+            max_age: Overrides the policy's max-age (e.g. until a market opens)
+
+        Returns:
+            Header value, e.g. "private, max-age=15, stale-while-revalidate=30"
+        """
+        max_age = self.max_age if max_age is None else max_age
+        parts = ["public" if self.public else "private", f"max-age={max_age}"]
+        if self.stale_while_revalidate:
+            parts.append(f"stale-while-revalidate={self.stale_while_revalidate}")
+        return ", ".join(parts)
+
+
+# Quotes move quickly; daily bars only change at the close (routes pass the
+# time until it, see MarketCalendar); news follows the upstream ingest
+# interval; symbol metadata barely changes at all.
+QUOTE_POLICY = CachePolicy(max_age=15, stale_while_revalidate=45)
+SERIES_POLICY = CachePolicy(max_age=3600, stale_while_revalidate=3600)
+INTRADAY_POLICY = CachePolicy(max_age=30, stale_while_revalidate=30)
+NEWS_POLICY = CachePolicy(max_age=300, stale_while_revalidate=600)
+SEARCH_POLICY = CachePolicy(max_age=86400, stale_while_revalidate=86400)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Weak comparison of an If-None-Match header against an ETag
+
+    Args:
+        if_none_match: Raw header value
+        etag: Current ETag
+
+    Returns:
+        True if the client already has this representation
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    current = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == current:
+            return True
+    return False
+
+
+# Served when the upstream is down and an expired cached value is used
+STALE_POLICY = CachePolicy(max_age=5)
+
+
+def cached_json_response(
+    request: Request,
+    content: Union[PreparedBody, Any],
+    policy: CachePolicy,
+    stale: bool = False,
+    max_age: Optional[float] = None,
+) -> Response:
+    """
+    Build a JSON response with ETag/Cache-Control, or a 304 if unchanged
+
+    Args:
+        request: Incoming request (for If-None-Match)
+        content: PreparedBody or JSON-compatible object
+        policy: Cache policy of the endpoint
+        stale: Content is a fallback copy served while the upstream is down
+        max_age: Overrides the policy's max-age (ignored for stale content)
+
+    Returns:
+        200 response with body, or empty 304 response
+    """
+    prepared = content if isinstance(content, PreparedBody) else PreparedBody.from_content(content)
+    cache_control = STALE_POLICY.header_value() if stale else policy.header_value(
+        None if max_age is None else int(max_age)
+    )
+    headers = {"ETag": prepared.etag, "Cache-Control": cache_control}
+    if not policy.public or stale:
+        # The body depends on the caller's credentials
+        headers["Vary"] = "Authorization"
+    if stale:
+        headers["Warning"] = '110 - "Response is Stale"'
+        headers["X-Data-Stale"] = "true"
+
+    if etag_matches(request.headers.get("if-none-match"), prepared.etag):
+        return Response(status_code=304, headers=headers)
+
+    return Response(content=prepared.body, media_type="application/json", headers=headers)
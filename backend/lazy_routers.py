@@ -0,0 +1,70 @@
+"""
+Lazy Routers
+Includes API routers on the first request under their prefix, so a
+serverless cold start doesn't import every route module (and through them
+the service container, numpy and the upstream clients) up front
+"""
+
+import importlib
+from typing import List, Optional, Sequence, Tuple
+
+from fastapi import FastAPI
+from starlette.routing import Mount
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+# Paths that list every route
+DOC_PATHS = ("/docs", "/redoc", "/openapi.json")
+
+# (module with a `router`, path prefix it serves, dependencies to include it with)
+RouterSpec = Tuple[str, str, Optional[Sequence]]
+
+
+class LazyRouters:
+    """
+    Router modules of an app, included eagerly or on first use
+
+    Routers are added in front of any mounts (e.g. the static frontend at
+    "/"), which would otherwise swallow their paths.
+    """
+
+    def __init__(self, app: FastAPI, specs: Sequence[RouterSpec]):
+        self.app = app
+        self.pending: List[RouterSpec] = list(specs)
+
+    def _include(self, spec: RouterSpec) -> None:
+        module_name, _, dependencies = spec
+        module = importlib.import_module(module_name)
+        self.app.include_router(module.router, dependencies=list(dependencies or ()))
+        routes = self.app.router.routes
+        mounts = [route for route in routes if isinstance(route, Mount)]
+        for mount in mounts:
+            routes.remove(mount)
+        routes.extend(mounts)
+        # Rebuilt with the new routes on the next request for it
+        self.app.openapi_schema = None
+
+    def include_all(self) -> None:
+        while self.pending:
+            self._include(self.pending.pop(0))
+
+    def include_for(self, path: str) -> None:
+        """Include the routers serving a path (all of them for the docs)"""
+        if path in DOC_PATHS:
+            self.include_all()
+            return
+        for spec in [spec for spec in self.pending if path.startswith(spec[1])]:
+            self.pending.remove(spec)
+            self._include(spec)
+
+
+class LazyRouterMiddleware:
+    """Includes the pending routers a request needs before it is routed"""
+
+    def __init__(self, app: ASGIApp, routers: LazyRouters):
+        self.app = app
+        self.routers = routers
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if self.routers.pending and scope["type"] in ("http", "websocket"):
+            self.routers.include_for(scope["path"])
+        await self.app(scope, receive, send)
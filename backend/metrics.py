@@ -0,0 +1,348 @@
+"""
+Metrics
+Lightweight Prometheus-style counters, gauges and histograms
+
+All metrics live in one process-wide registry and are rendered in the
+Prometheus text exposition format by GET /metrics. Recording a value is a
+dict lookup plus an addition under a lock, cheap enough for hot paths.
+"""
+
+import asyncio
+import bisect
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from starlette.routing import Mount
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+LabelValues = Tuple[str, ...]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric(ABC):
+    """Base of the metric types: a name, help text and label names"""
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    @abstractmethod
+    def render(self) -> List[str]:
+        """Exposition lines: the header, then one line per series"""
+
+
+class Counter(_Metric):
+    """Monotonically increasing value per label set"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Value that can go up and down per label set"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def dec(self, *labels: str, amount: float = 1.0) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram per label set"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self._series: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0.0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return int(sum(series[:-1])) if series else 0
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for labels, series in sorted(self._series.items()):
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = _format_labels(self.labelnames, labels, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            cumulative += series[len(self.buckets)]
+            inf = _format_labels(self.labelnames, labels, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{inf} {cumulative}")
+            label_str = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_str} {series[-1]}")
+            lines.append(f"{self.name}_count{label_str} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered together"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """
+        Render all metrics in the Prometheus text format
+
+        Returns:
+            Exposition text
+        """
+        PROCESS_CPU_SECONDS.set(time.process_time())
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# HTTP
+REQUEST_LATENCY = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "Request latency by route template",
+    ("method", "route", "status"),
+))
+REQUESTS_IN_FLIGHT = REGISTRY.register(Gauge(
+    "http_requests_in_flight", "Requests currently being served",
+))
+
+# Upstream providers
+UPSTREAM_LATENCY = REGISTRY.register(Histogram(
+    "upstream_request_duration_seconds", "Upstream API call latency",
+    ("provider", "function", "outcome"),
+))
+UPSTREAM_ERRORS = REGISTRY.register(Counter(
+    "upstream_errors_total", "Upstream API errors by kind",
+    ("provider", "function", "kind"),
+))
+UPSTREAM_RETRIES = REGISTRY.register(Counter(
+    "upstream_retries_total", "Retried upstream calls", ("provider", "function"),
+))
+CIRCUIT_STATE = REGISTRY.register(Gauge(
+    "circuit_breaker_state", "Circuit state per provider (0 closed, 1 half-open, 2 open)", ("provider",),
+))
+CIRCUIT_TRANSITIONS = REGISTRY.register(Counter(
+    "circuit_breaker_transitions_total", "Circuit state changes", ("provider", "state"),
+))
+PROVIDER_FAILOVERS = REGISTRY.register(Counter(
+    "provider_failovers_total", "Calls moved to the next market data provider", ("provider", "method"),
+))
+PROVIDER_HEDGES = REGISTRY.register(Counter(
+    "provider_hedged_requests_total", "Hedged quote requests sent and won", ("provider", "result"),
+))
+
+# Caches and rate limiting
+CACHE_REQUESTS = REGISTRY.register(Counter(
+    "cache_requests_total", "Cache lookups by result", ("cache", "result"),
+))
+CACHE_EVICTIONS = REGISTRY.register(Counter(
+    "cache_evictions_total", "Cache entries removed", ("cache", "reason"),
+))
+RATE_LIMIT_WAIT = REGISTRY.register(Histogram(
+    "rate_limiter_wait_seconds", "Time spent waiting for a rate limiter token", ("limiter",),
+    buckets=(0.0, 0.01, 0.1, 0.5, 1.0, 2.5, 5.0, 15.0, 60.0),
+))
+
+# Alerts
+ALERTS_ACTIVE = REGISTRY.register(Gauge(
+    "alerts_active", "Active price alerts indexed by this worker",
+))
+ALERTS_TRIGGERED = REGISTRY.register(Counter(
+    "alerts_triggered_total", "Price alerts fired", ("kind",),
+))
+ALERT_MATCH_SECONDS = REGISTRY.register(Histogram(
+    "alert_match_seconds", "Time to find the alerts crossed by one quote",
+    buckets=(0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01),
+))
+
+# Screener
+SCREENER_SECONDS = REGISTRY.register(Histogram(
+    "screener_query_seconds", "Time to filter and sort the screener snapshot",
+    buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1),
+))
+
+# Intraday bars
+INTRADAY_SYMBOLS = REGISTRY.register(Gauge(
+    "intraday_symbols", "Symbols with intraday bars held by this worker",
+))
+INTRADAY_COMPACTED = REGISTRY.register(Counter(
+    "intraday_compacted_days_total", "Daily bars built from intraday bars past retention",
+))
+
+# Auth and process
+AUTH_FAILURES = REGISTRY.register(Counter(
+    "auth_token_failures_total", "Rejected JWTs by reason", ("reason",),
+))
+EVENT_LOOP_LAG = REGISTRY.register(Histogram(
+    "event_loop_lag_seconds", "Delay between scheduled and actual event loop wake-up",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+))
+PROCESS_CPU_SECONDS = REGISTRY.register(Gauge(
+    "process_cpu_seconds", "CPU time consumed by this worker process",
+))
+
+
+class UpstreamTimer:
+    """
+    Context manager timing one upstream call
+
+    Usage:
+        with UpstreamTimer("alphavantage", "GLOBAL_QUOTE"):
+            response = session.get(...)
+    """
+
+    __slots__ = ("provider", "function", "started")
+
+    def __init__(self, provider: str, function: str):
+        self.provider = provider
+        self.function = function
+
+    def __enter__(self) -> "UpstreamTimer":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        elapsed = time.perf_counter() - self.started
+        UPSTREAM_LATENCY.observe(elapsed, self.provider, self.function, "error" if exc_type else "ok")
+        if exc_type is not None:
+            UPSTREAM_ERRORS.inc(self.provider, self.function, exc_type.__name__)
+
+
+def record_upstream_error(provider: str, function: str, kind: str) -> None:
+    """Count an upstream error detected after the HTTP call succeeded"""
+    UPSTREAM_ERRORS.inc(provider, function, kind)
+
+
+def route_label(scope: Scope) -> str:
+    """Route template of a handled request (low-cardinality label)"""
+    route = scope.get("route")
+    if route is None:
+        # Mounted sub-apps (e.g. the static frontend) only leave their endpoint
+        endpoint = scope.get("endpoint")
+        return f"mount:{type(endpoint).__name__}" if endpoint is not None else "unmatched"
+    if isinstance(route, Mount):
+        return (route.path or "") + "/*"
+    return getattr(route, "path", "unmatched")
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route latency and in-flight requests"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = [500]
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            REQUEST_LATENCY.observe(
+                time.perf_counter() - started,
+                scope["method"], route_label(scope), str(status[0]),
+            )
+
+
+async def monitor_event_loop_lag(interval: float = 0.5) -> None:
+    """Background task sampling how late the event loop wakes up"""
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(0.0, loop.time() - expected))
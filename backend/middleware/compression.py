@@ -0,0 +1,219 @@
+"""
+Response Compression Middleware
+Negotiates brotli/gzip per request and caches compressed bodies
+"""
+
+import gzip
+import hashlib
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+)
+
+SUPPORTED_ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    Pick the best content encoding the client accepts
+
+    Args:
+        accept_encoding: Raw Accept-Encoding header value
+
+    Returns:
+        "br", "gzip" or None when no supported encoding is acceptable
+    """
+    if not accept_encoding:
+        return None
+
+    weights = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[token] = q
+
+    wildcard = weights.get("*", 0.0)
+    best, best_q = None, 0.0
+    for encoding in SUPPORTED_ENCODINGS:
+        q = weights.get(encoding, wildcard)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def is_compressible(content_type: str) -> bool:
+    """Check whether a media type is worth compressing"""
+    content_type = content_type.lower()
+    return any(content_type.startswith(prefix) for prefix in COMPRESSIBLE_TYPES)
+
+
+def compress(body: bytes, encoding: str, gzip_level: int = 6, brotli_quality: int = 5) -> bytes:
+    """
+    Compress a body with the given encoding
+
+    Args:
+        body: Raw bytes
+        encoding: "br" or "gzip"
+        gzip_level: zlib compression level
+        brotli_quality: Brotli quality (0-11)
+
+    Returns:
+        Compressed bytes
+    """
+    if encoding == "br":
+        return brotli.compress(body, quality=brotli_quality)
+    # mtime=0 keeps the output deterministic for identical bodies
+    return gzip.compress(body, compresslevel=gzip_level, mtime=0)
+
+
+class CompressedBodyCache:
+    """LRU cache of compressed bodies keyed by content digest and encoding"""
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 16 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[bytes, str], bytes]" = OrderedDict()
+        self._size = 0
+
+    def get_or_compress(self, body: bytes, encoding: str, **options) -> bytes:
+        """
+        Return the cached compressed variant of body, compressing on miss
+
+        Args:
+            body: Raw bytes
+            encoding: "br" or "gzip"
+
+        Returns:
+            Compressed bytes
+        """
+        key = (hashlib.blake2b(body, digest_size=16).digest(), encoding)
+        cached = self._entries.get(key)
+        if cached is not None:
+            self._entries.move_to_end(key)
+            return cached
+
+        compressed = compress(body, encoding, **options)
+        if len(compressed) <= self.max_bytes:
+            self._entries[key] = compressed
+            self._size += len(compressed)
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+        return compressed
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware that compresses complete (non-streaming) responses
+
+    Streaming responses and bodies below minimum_size are passed through
+    untouched. Identical bodies are compressed once and served from the
+    cache afterwards.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        gzip_level: int = 6,
+        brotli_quality: int = 5,
+        cache_entries: int = 256,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.options = {"gzip_level": gzip_level, "brotli_quality": brotli_quality}
+        self.cache = CompressedBodyCache(max_entries=cache_entries)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressionResponder(self, encoding, send)
+        await self.app(scope, receive, responder)
+
+
+class _CompressionResponder:
+    """Buffers the start message until the first body chunk is seen"""
+
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send: Send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self.send = send
+        self.start_message: Optional[Message] = None
+        self.passthrough = False
+
+    async def __call__(self, message: Message) -> None:
+        if self.passthrough:
+            await self.send(message)
+            return
+
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            return
+
+        if message["type"] != "http.response.body" or self.start_message is None:
+            await self.send(message)
+            return
+
+        start, self.start_message = self.start_message, None
+        body = message.get("body", b"")
+
+        if message.get("more_body", False) or not self._should_compress(start, body):
+            self.passthrough = True
+            await self.send(start)
+            await self.send(message)
+            return
+
+        compressed = self.middleware.cache.get_or_compress(
+            body, self.encoding, **self.middleware.options
+        )
+        headers = MutableHeaders(raw=start["headers"])
+        headers["Content-Encoding"] = self.encoding
+        headers["Content-Length"] = str(len(compressed))
+        headers.add_vary_header("Accept-Encoding")
+        # A strong ETag names exact bytes; the compressed body is only equivalent
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            headers["ETag"] = "W/" + etag
+
+        self.passthrough = True
+        await self.send(start)
+        await self.send({"type": "http.response.body", "body": compressed, "more_body": False})
+
+    def _should_compress(self, start: Message, body: bytes) -> bool:
+        if len(body) < self.middleware.minimum_size:
+            return False
+        if start.get("status", 200) in (204, 206, 304):
+            return False
+        headers = Headers(raw=start["headers"])
+        if "content-encoding" in headers:
+            return False
+        return is_compressible(headers.get("content-type", ""))
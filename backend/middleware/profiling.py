@@ -0,0 +1,296 @@
+"""
+Request Profiling Middleware
+Samples the stacks of selected requests and writes flame-graph files
+
+Enable with PROFILE_SAMPLE_RATE (fraction of requests, e.g. 0.01) and/or
+PROFILE_ADMIN_TOKEN (requests carrying `X-Profile-Token: <token>` are
+always profiled). Profiles are written per route to PROFILE_DIR as
+collapsed stacks (.folded, loadable by speedscope and flamegraph.pl) or
+speedscope JSON (PROFILE_FORMAT=speedscope), and the directory is kept
+under PROFILE_MAX_BYTES by deleting the oldest files. Sampling stops after
+PROFILE_MAX_SECONDS, and event streams are never profiled.
+"""
+
+import hmac
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from metrics import route_label
+
+PROFILE_HEADER = "x-profile-token"
+
+# Leaf frames in these files mean the thread is parked, not working
+_IDLE_FILES = ("selectors.py", "threading.py", "queue.py", "base_events.py")
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+class SamplingProfiler:
+    """
+    Wall-clock sampling profiler driven by a background thread
+
+    Every interval the thread reads the current stack of all other threads
+    through sys._current_frames() and counts collapsed stacks. Idle
+    threads (blocked in selectors, locks or queues) are skipped, so the
+    result shows the event loop and threadpool work done during a request.
+    Sampling ends after max_seconds even if stop() is not called yet.
+    """
+
+    def __init__(self, interval: float = 0.005, max_seconds: float = 30.0):
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.started = 0.0
+        self.duration = 0.0
+
+    def start(self) -> None:
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        """
+        Stop sampling (blocks until the sampler thread exits; call it from
+        the threadpool, not the event loop)
+
+        Returns:
+            Counter of collapsed stack string -> sample count
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.duration = time.perf_counter() - self.started
+        return self.stacks
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            if time.perf_counter() - self.started > self.max_seconds:
+                break
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or frame.f_code.co_filename.endswith(_IDLE_FILES):
+                    continue
+                if thread_id not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                stack.reverse()
+                self.stacks[";".join(stack)] += 1
+
+
+def to_speedscope(stacks: Counter, name: str, interval: float) -> dict:
+    """
+    Convert collapsed stacks to a speedscope "sampled" profile
+
+    Args:
+        stacks: Counter of collapsed stack -> samples
+        name: Profile name
+        interval: Sampling interval in seconds
+
+    Returns:
+        speedscope file as a dict
+    """
+    frames: Dict[str, int] = {}
+    samples, weights = [], []
+    for stack, count in stacks.items():
+        indices = []
+        for frame in stack.split(";"):
+            if frame not in frames:
+                frames[frame] = len(frames)
+            indices.append(frames[frame])
+        samples.append(indices)
+        weights.append(count * interval * 1000)
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "shared": {"frames": [{"name": frame} for frame in frames]},
+        "profiles": [{
+            "type": "sampled",
+            "name": name,
+            "unit": "milliseconds",
+            "startValue": 0,
+            "endValue": sum(weights),
+            "samples": samples,
+            "weights": weights,
+        }],
+    }
+
+
+class ProfileWriter:
+    """Writes profiles per route and keeps the directory size bounded"""
+
+    def __init__(self, directory: str, max_bytes: int, fmt: str = "collapsed"):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.format = fmt
+
+    def write(self, route: str, stacks: Counter, interval: float, duration: float) -> Optional[str]:
+        """
+        Write one profile
+
+        Args:
+            route: Route template of the request
+            stacks: Sampled stacks
+            interval: Sampling interval in seconds
+            duration: Request wall time in seconds
+
+        Returns:
+            Path of the written file, or None if nothing was sampled
+        """
+        if not stacks:
+            return None
+
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", route).strip("_") or "root"
+        route_dir = os.path.join(self.directory, slug)
+        os.makedirs(route_dir, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        base = os.path.join(route_dir, f"{stamp}-{int(duration * 1000)}ms-{os.getpid()}")
+
+        if self.format == "speedscope":
+            path = base + ".speedscope.json"
+            with open(path, "w") as f:
+                json.dump(to_speedscope(stacks, route, interval), f)
+        else:
+            path = base + ".folded"
+            with open(path, "w") as f:
+                for stack, count in stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+
+        self.rotate()
+        return path
+
+    def rotate(self) -> None:
+        """Delete the oldest profiles until the directory fits max_bytes"""
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                stat = os.stat(path)
+                files.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+
+class ProfilingMiddleware:
+    """
+    Profiles a sample of requests (or admin-requested ones)
+
+    Only one request is profiled at a time per worker, which bounds the
+    overhead and keeps concurrent requests from blending into one profile.
+    Event streams (SSE) would hold that slot for as long as the client
+    stays connected, so they are skipped: by their Accept header, or when
+    the response turns out to be text/event-stream.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        sample_rate: float = 0.0,
+        admin_token: Optional[str] = None,
+        directory: Optional[str] = None,
+        max_bytes: int = 50 * 1024 * 1024,
+        interval: float = 0.005,
+        fmt: str = "collapsed",
+        max_seconds: float = 30.0,
+    ):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.admin_token = admin_token
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.writer = ProfileWriter(
+            directory or os.path.join(tempfile.gettempdir(), "markstro-profiles"), max_bytes, fmt
+        )
+        self._busy = threading.Lock()
+
+    @staticmethod
+    def settings_from_env() -> Tuple[bool, dict]:
+        """
+        Read profiler settings from the environment
+
+        Returns:
+            (enabled, keyword arguments for the middleware)
+        """
+        options = {
+            "sample_rate": float(os.getenv("PROFILE_SAMPLE_RATE", "0")),
+            "admin_token": os.getenv("PROFILE_ADMIN_TOKEN") or None,
+            "directory": os.getenv("PROFILE_DIR") or None,
+            "max_bytes": int(os.getenv("PROFILE_MAX_BYTES", str(50 * 1024 * 1024))),
+            "interval": float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000.0,
+            "fmt": os.getenv("PROFILE_FORMAT", "collapsed"),
+            "max_seconds": float(os.getenv("PROFILE_MAX_SECONDS", "30")),
+        }
+        return options["sample_rate"] > 0 or options["admin_token"] is not None, options
+
+    def _wants_profile(self, scope: Scope) -> bool:
+        headers = Headers(scope=scope)
+        if "text/event-stream" in headers.get("accept", ""):
+            return False
+        if self.admin_token:
+            token = headers.get(PROFILE_HEADER)
+            # Constant time, so response timing does not leak the token
+            if token is not None and hmac.compare_digest(token.encode(), self.admin_token.encode()):
+                return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self._wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        if not self._busy.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        profiler = SamplingProfiler(self.interval, self.max_seconds)
+        profiler.start()
+        finished = False
+
+        async def finish(write: bool) -> None:
+            nonlocal finished
+            finished = True
+            try:
+                stacks = await run_in_threadpool(profiler.stop)
+            finally:
+                self._busy.release()
+            if write:
+                await run_in_threadpool(
+                    self.writer.write, route_label(scope), stacks, profiler.interval, profiler.duration
+                )
+
+        async def send_checking_for_streams(message: Message) -> None:
+            if message["type"] == "http.response.start" and not finished:
+                content_type = Headers(raw=message.get("headers", [])).get("content-type", "")
+                if content_type.startswith("text/event-stream"):
+                    await finish(write=False)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_checking_for_streams)
+        finally:
+            if not finished:
+                await finish(write=True)
@@ -0,0 +1,72 @@
+"""
+Response Helpers
+Fast JSON serialization used as the default response class of the API
+"""
+
+import json
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, stdlib json is the fallback
+    orjson = None
+
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps(content: Any) -> bytes:
+        """
+        Serialize content to compact JSON bytes
+
+        Args:
+            content: JSON-compatible python object
+
+        Returns:
+            UTF-8 encoded JSON
+        """
+        return orjson.dumps(content, option=_ORJSON_OPTIONS)
+
+else:
+    _encoder = json.JSONEncoder(
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(",", ":"),
+        default=str,
+    )
+
+    def dumps(content: Any) -> bytes:
+        """
+        Serialize content to compact JSON bytes
+
+        Args:
+            content: JSON-compatible python object
+
+        Returns:
+            UTF-8 encoded JSON
+        """
+        return _encoder.encode(content).encode("utf-8")
+
+
+def loads(data: bytes) -> Any:
+    """
+    Parse JSON bytes produced by dumps()
+
+    Args:
+        data: UTF-8 encoded JSON
+
+    Returns:
+        Python object
+    """
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered with orjson when available"""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,66 @@
+import io
+import os
+import tempfile
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+from services.bulk_io import import_chunks, import_path, iter_csv, read_csv_chunks
+from services.container import ServiceContainer, get_services
+
+router = APIRouter(prefix='/api/admin/market-data', tags=['Admin'])
+
+MAX_IMPORT_BYTES = int(os.getenv('MAX_IMPORT_BYTES', str(1024 ** 3)))
+# Uploads stay in memory up to this size, then spill to a temp file
+SPOOL_BYTES = 8 * 1024 ** 2
+
+
+async def _spool_body(request: Request, spool) -> None:
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > MAX_IMPORT_BYTES:
+            raise HTTPException(status_code=413, detail=f'Upload larger than {MAX_IMPORT_BYTES} bytes')
+        spool.write(chunk)
+    spool.seek(0)
+
+
+@router.post('/import')
+async def import_bars(
+    request: Request,
+    format: str = Query('csv', pattern='^(csv|parquet)$'),
+    symbol: Optional[str] = Query(None, description='For files without a symbol column'),
+    services: ServiceContainer = Depends(get_services)
+):
+    """Load daily bars from the raw request body (not multipart), streamed to a spool file"""
+    store = services.market_store
+    try:
+        if format == 'csv':
+            with tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES) as spool:
+                await _spool_body(request, spool)
+                text = io.TextIOWrapper(spool, encoding='utf-8', newline='')
+                return await run_in_threadpool(import_chunks, store, read_csv_chunks(text, symbol))
+        # pyarrow needs a real file to seek in
+        with tempfile.NamedTemporaryFile(suffix='.parquet') as f:
+            await _spool_body(request, f)
+            f.flush()
+            return await run_in_threadpool(import_path, store, f.name, 'parquet', symbol)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get('/export')
+async def export_bars(
+    symbols: Optional[str] = Query(None, description='Comma-separated (default: all)'),
+    start: Optional[str] = Query(None, pattern=r'^\d{4}-\d{2}-\d{2}$'),
+    end: Optional[str] = Query(None, pattern=r'^\d{4}-\d{2}-\d{2}$'),
+    services: ServiceContainer = Depends(get_services)
+):
+    symbol_list = [s.strip().upper() for s in symbols.split(',') if s.strip()] if symbols else None
+    # A sync iterator: Starlette pulls each chunk in the threadpool
+    return StreamingResponse(
+        iter_csv(services.market_store, symbol_list, start, end),
+        media_type='text/csv',
+        headers={'Content-Disposition': 'attachment; filename="bars.csv"'},
+    )
@@ -0,0 +1,85 @@
+import asyncio
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from starlette.concurrency import run_in_threadpool
+
+from dependencies import get_current_user, get_stream_user
+from responses import dumps
+from services.container import ServiceContainer, get_services
+
+router = APIRouter(prefix='/api/alerts', tags=['Alerts'])
+
+HEARTBEAT_SECONDS = 15
+
+
+class AlertCreate(BaseModel):
+    symbol: str = Field(..., min_length=1, max_length=20)
+    kind: Literal['price_above', 'price_below', 'change_above', 'change_below']
+    threshold: float
+    note: str = Field('', max_length=200)
+
+
+@router.get('')
+async def list_alerts(
+    current_user: str = Depends(get_current_user),
+    services: ServiceContainer = Depends(get_services)
+):
+    return {'alerts': await run_in_threadpool(services.alerts.list, current_user)}
+
+@router.post('', status_code=201)
+async def create_alert(
+    body: AlertCreate,
+    current_user: str = Depends(get_current_user),
+    services: ServiceContainer = Depends(get_services)
+):
+    try:
+        alert = await run_in_threadpool(
+            services.alerts.create, current_user, body.symbol.upper(), body.kind, body.threshold, body.note
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return alert.to_dict()
+
+@router.delete('/{alert_id}')
+async def delete_alert(
+    alert_id: int,
+    current_user: str = Depends(get_current_user),
+    services: ServiceContainer = Depends(get_services)
+):
+    if not await run_in_threadpool(services.alerts.delete, current_user, alert_id):
+        raise HTTPException(status_code=404, detail='Alert not found')
+    return {'deleted': alert_id}
+
+@router.get('/stream')
+async def stream_alerts(
+    request: Request,
+    current_user: str = Depends(get_stream_user),
+    services: ServiceContainer = Depends(get_services)
+):
+    """Server-sent events: one `alert` event per triggered alert"""
+    await run_in_threadpool(services.alerts.ensure_loaded)
+    queue = services.alerts.subscribe(current_user)
+
+    async def events():
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                try:
+                    alert = await asyncio.wait_for(queue.get(), timeout=HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ': keep-alive\n\n'
+                    continue
+                yield f'event: alert\ndata: {dumps(alert).decode()}\n\n'
+        finally:
+            services.alerts.unsubscribe(current_user, queue)
+
+    return StreamingResponse(
+        events(),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
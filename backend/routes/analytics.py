@@ -0,0 +1,124 @@
+import datetime
+from typing import Dict, List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from pydantic import BaseModel, Field
+from starlette.concurrency import run_in_threadpool
+
+from http_cache import SERIES_POLICY, cached_json_response
+from services.backtest import strategy_info
+from services.container import ServiceContainer, get_services
+from services.returns import DEFAULT_BENCHMARKS
+
+router = APIRouter(prefix='/api/analytics', tags=['Analytics'])
+
+MAX_SYMBOLS = 100
+
+
+class BacktestRequest(BaseModel):
+    symbol: str = Field(..., min_length=1, max_length=20)
+    strategy: str
+    params: Dict[str, float] = {}
+    start: Optional[datetime.date] = None
+    cost_bps: float = Field(5, ge=0, le=500, description='Cost per position change, in basis points')
+    initial: float = Field(10000, gt=0)
+
+
+class SweepRequest(BaseModel):
+    symbol: str = Field(..., min_length=1, max_length=20)
+    strategy: str
+    grid: Dict[str, List[float]]
+    start: Optional[datetime.date] = None
+    cost_bps: float = Field(5, ge=0, le=500)
+    sort_by: str = Field('sharpe', pattern='^(sharpe|totalReturn|cagr|maxDrawdown)$')
+    top: int = Field(20, ge=1, le=500)
+
+
+def _symbol_list(value: str) -> list:
+    return list(dict.fromkeys(s.strip().upper() for s in value.split(',') if s.strip()))
+
+
+def _until_next_close(services: ServiceContainer, symbols: List[str]) -> Optional[float]:
+    # New daily bars, and so a different result, can only arrive after the first close
+    ttls = [ttl for ttl in map(services.calendar.bars_ttl, symbols) if ttl is not None]
+    return min(ttls, default=None)
+
+
+@router.get('/returns')
+async def get_returns_matrix(
+    request: Request,
+    symbols: str = Query(..., description='Comma-separated symbols'),
+    window: int = Query(90, ge=5, le=2520),
+    benchmarks: str = Query(','.join(DEFAULT_BENCHMARKS)),
+    include_returns: bool = Query(False),
+    services: ServiceContainer = Depends(get_services)
+):
+    # Sorted, so any ordering of the same set shares a cache entry
+    symbol_list = sorted(_symbol_list(symbols))
+    benchmark_list = _symbol_list(benchmarks)
+    if not symbol_list or len(symbol_list) > MAX_SYMBOLS:
+        raise HTTPException(status_code=400, detail=f'Give between 1 and {MAX_SYMBOLS} symbols')
+
+    # The bar write time is part of the key, so new data never serves an old matrix
+    version = await run_in_threadpool(services.market_store.bars_version, symbol_list + benchmark_list)
+    key = (tuple(symbol_list), window, tuple(benchmark_list), include_returns, version)
+    try:
+        entry = await services.analytics_cache.get_or_load(
+            key, lambda: services.returns.compute(symbol_list, window, benchmark_list, include_returns)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return cached_json_response(
+        request, entry.prepared(), SERIES_POLICY,
+        max_age=_until_next_close(services, symbol_list + benchmark_list)
+    )
+
+@router.get('/backtest/strategies')
+async def list_strategies():
+    return {'strategies': strategy_info()}
+
+@router.post('/backtest')
+async def run_backtest(
+    request: Request,
+    body: BacktestRequest,
+    services: ServiceContainer = Depends(get_services)
+):
+    symbol = body.symbol.upper()
+    start = body.start.isoformat() if body.start else None
+    # Deep history is downloaded on first use; later runs only top it up
+    await run_in_threadpool(services.history.ensure, symbol)
+    version = await run_in_threadpool(services.market_store.bars_version, [symbol])
+    key = ('backtest', symbol, body.strategy, tuple(sorted(body.params.items())), start,
+           body.cost_bps, body.initial, version)
+    try:
+        entry = await services.analytics_cache.get_or_load(key, lambda: services.backtests.backtest(
+            symbol, body.strategy, body.params, start, body.cost_bps / 10000, body.initial
+        ))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return cached_json_response(
+        request, entry.prepared(), SERIES_POLICY, max_age=_until_next_close(services, [symbol])
+    )
+
+@router.post('/backtest/sweep')
+async def run_backtest_sweep(
+    body: SweepRequest,
+    services: ServiceContainer = Depends(get_services)
+):
+    symbol = body.symbol.upper()
+    start = body.start.isoformat() if body.start else None
+    await run_in_threadpool(services.history.ensure, symbol)
+    version = await run_in_threadpool(services.market_store.bars_version, [symbol])
+    key = ('sweep', symbol, body.strategy, tuple((k, tuple(v)) for k, v in sorted(body.grid.items())),
+           start, body.cost_bps, body.sort_by, body.top, version)
+    cached = services.analytics_cache.get(key)
+    if cached is not None:
+        return cached.value
+    try:
+        result = await services.backtests.sweep(
+            symbol, body.strategy, body.grid, start, body.cost_bps / 10000, body.sort_by, body.top
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    services.analytics_cache.set(key, result)
+    return result
@@ -1,20 +1,19 @@
 # ========== AUTHENTICATION ROUTES ==========
 import os
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status
 from pydantic import BaseModel, EmailStr
-import sqlite3
 import hashlib
 import jwt
 import datetime
 from typing import Optional
-from dotenv import load_dotenv
-load_dotenv()
+from services.container import ServiceContainer, get_services
+from services.database import Database
+from settings import load_env
+load_env()
 SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'your-secret-key-change-this')
 
-router = APIRouter()
+router = APIRouter(prefix='/api/auth/email', tags=['Auth'])
 
-# Database path
-DB_PATH = "database/users.db"
 SECRET_KEY = "your-secret-key-change-this"  # .env mein rakho
 
 # Models
@@ -32,24 +31,9 @@ class Token(BaseModel):
     token_type: str
     user: dict
 
-# Database initialization
-def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            email TEXT UNIQUE NOT NULL,
-            password TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    conn.commit()
-    conn.close()
-
-# Initialize DB on startup
-init_db()
+# Database (pooled connections owned by the service container)
+def get_database(services: ServiceContainer = Depends(get_services)) -> Database:
+    return services.database
 
 # Helper functions
 def hash_password(password: str) -> str:
@@ -65,32 +49,30 @@ def create_token(user_id: int, email: str) -> str:
 
 # Routes
 @router.post("/signup", response_model=Token)
-def signup(user: UserSignup):
+def signup(user: UserSignup, db: Database = Depends(get_database)):
     """User registration"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        # Check if email exists
-        cursor.execute("SELECT id FROM users WHERE email = ?", (user.email,))
-        if cursor.fetchone():
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Email already registered"
+        with db.connection() as conn:
+            cursor = conn.cursor()
+            
+            # Check if email exists
+            cursor.execute("SELECT id FROM users WHERE email = ?", (user.email,))
+            if cursor.fetchone():
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Email already registered"
+                )
+            
+            # Hash password
+            hashed_pwd = hash_password(user.password)
+            
+            # Insert user
+            cursor.execute(
+                "INSERT INTO users (name, email, password) VALUES (?, ?, ?)",
+                (user.name, user.email, hashed_pwd)
             )
-        
-        # Hash password
-        hashed_pwd = hash_password(user.password)
-        
-        # Insert user
-        cursor.execute(
-            "INSERT INTO users (name, email, password) VALUES (?, ?, ?)",
-            (user.name, user.email, hashed_pwd)
-        )
-        conn.commit()
-        
-        user_id = cursor.lastrowid
-        conn.close()
+            
+            user_id = cursor.lastrowid
         
         # Create token
         token = create_token(user_id, user.email)
@@ -114,19 +96,15 @@ def signup(user: UserSignup):
         )
 
 @router.post("/login", response_model=Token)
-def login(user: UserLogin):
+def login(user: UserLogin, db: Database = Depends(get_database)):
     """User login"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        # Get user
-        cursor.execute(
-            "SELECT id, name, email, password FROM users WHERE email = ?",
-            (user.email,)
-        )
-        result = cursor.fetchone()
-        conn.close()
+        with db.connection() as conn:
+            # Get user
+            result = conn.execute(
+                "SELECT id, name, email, password FROM users WHERE email = ?",
+                (user.email,)
+            ).fetchone()
         
         if not result:
             raise HTTPException(
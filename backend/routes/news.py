@@ -1,29 +1,45 @@
-from fastapi import APIRouter, HTTPException, Query
-from services.newsapi import NewsAPIService
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from http_cache import NEWS_POLICY, cached_json_response
+from services.container import ServiceContainer, get_services
+from services.errors import UpstreamError
 
 router = APIRouter(prefix='/api/news', tags=['News'])
-news_service = NewsAPIService()
 
+@router.get('')
 @router.get('/market')
 async def get_market_news(
+    request: Request,
     category: str = Query('business'),
     page: int = Query(1, ge=1),
-    page_size: int = Query(10, ge=1, le=100)
+    page_size: int = Query(10, ge=1, le=100),
+    services: ServiceContainer = Depends(get_services)
 ):
     try:
-        data = news_service.get_market_news(category, page, page_size)
-        return data
+        entry = await services.news_cache.get_or_load(
+            ('market', category, page, page_size),
+            lambda: services.newsapi.get_market_news(category, page, page_size)
+        )
+        return cached_json_response(request, entry.prepared(), NEWS_POLICY, stale=entry.stale)
+    except UpstreamError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.get('/search')
 async def search_news(
+    request: Request,
     q: str = Query(...),
     page: int = Query(1, ge=1),
-    page_size: int = Query(10, ge=1, le=100)
+    page_size: int = Query(10, ge=1, le=100),
+    services: ServiceContainer = Depends(get_services)
 ):
     try:
-        data = news_service.search_news(q, page, page_size)
-        return data
+        entry = await services.news_cache.get_or_load(
+            ('search', q.lower(), page, page_size),
+            lambda: services.newsapi.search_news(q, page, page_size)
+        )
+        return cached_json_response(request, entry.prepared(), NEWS_POLICY, stale=entry.stale)
+    except UpstreamError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
\ No newline at end of file
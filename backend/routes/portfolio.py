@@ -0,0 +1,149 @@
+import datetime
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel, Field
+from starlette.concurrency import run_in_threadpool
+
+from dependencies import get_current_user
+from services.container import ServiceContainer, get_services
+from services.errors import UpstreamError
+
+router = APIRouter(prefix='/api/portfolios', tags=['Portfolio'])
+
+
+class PortfolioCreate(BaseModel):
+    name: str = Field(..., min_length=1, max_length=100)
+    currency: str = Field('USD', min_length=3, max_length=3)
+
+
+class TradeCreate(BaseModel):
+    symbol: str = Field(..., min_length=1, max_length=20)
+    side: Literal['buy', 'sell']
+    quantity: float = Field(..., gt=0)
+    price: float = Field(..., ge=0)
+    fees: float = Field(0, ge=0)
+    date: Optional[datetime.date] = None
+
+
+class CashCreate(BaseModel):
+    amount: float = Field(..., description='Positive deposit, negative withdrawal')
+    date: Optional[datetime.date] = None
+
+
+def _found(result):
+    if result is None:
+        raise HTTPException(status_code=404, detail='Portfolio not found')
+    return result
+
+
+def _today(date: Optional[datetime.date]) -> str:
+    return (date or datetime.date.today()).isoformat()
+
+
+async def _converted(func, *args):
+    # Valuations in another currency need FX rates, which may be unavailable
+    try:
+        return _found(await run_in_threadpool(func, *args))
+    except UpstreamError:
+        raise
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get('')
+async def list_portfolios(
+    current_user: str = Depends(get_current_user),
+    services: ServiceContainer = Depends(get_services)
+):
+    return {'portfolios': await run_in_threadpool(services.portfolios.list, current_user)}
+
+@router.post('', status_code=201)
+async def create_portfolio(
+    body: PortfolioCreate,
+    current_user: str = Depends(get_current_user),
+    services: ServiceContainer = Depends(get_services)
+):
+    try:
+        return await run_in_threadpool(services.portfolios.create, current_user, body.name, body.currency.upper())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get('/{portfolio_id}')
+async def get_portfolio(
+    portfolio_id: int,
+    current_user: str = Depends(get_current_user),
+    services: ServiceContainer = Depends(get_services)
+):
+    return _found(await run_in_threadpool(services.portfolios.get, current_user, portfolio_id))
+
+@router.delete('/{portfolio_id}')
+async def delete_portfolio(
+    portfolio_id: int,
+    current_user: str = Depends(get_current_user),
+    services: ServiceContainer = Depends(get_services)
+):
+    if not await run_in_threadpool(services.portfolios.delete, current_user, portfolio_id):
+        raise HTTPException(status_code=404, detail='Portfolio not found')
+    return {'deleted': portfolio_id}
+
+@router.post('/{portfolio_id}/trades', status_code=201)
+async def add_trade(
+    portfolio_id: int,
+    body: TradeCreate,
+    current_user: str = Depends(get_current_user),
+    services: ServiceContainer = Depends(get_services)
+):
+    quantity = body.quantity if body.side == 'buy' else -body.quantity
+    return _found(await run_in_threadpool(
+        services.portfolios.add_transaction, current_user, portfolio_id, 'trade', _today(body.date),
+        symbol=body.symbol.upper(), quantity=quantity, price=body.price, fees=body.fees,
+    ))
+
+@router.post('/{portfolio_id}/cash', status_code=201)
+async def add_cash(
+    portfolio_id: int,
+    body: CashCreate,
+    current_user: str = Depends(get_current_user),
+    services: ServiceContainer = Depends(get_services)
+):
+    return _found(await run_in_threadpool(
+        services.portfolios.add_transaction, current_user, portfolio_id, 'cash', _today(body.date),
+        amount=body.amount,
+    ))
+
+@router.delete('/{portfolio_id}/transactions/{transaction_id}')
+async def delete_transaction(
+    portfolio_id: int,
+    transaction_id: int,
+    current_user: str = Depends(get_current_user),
+    services: ServiceContainer = Depends(get_services)
+):
+    if not await run_in_threadpool(services.portfolios.delete_transaction, current_user, portfolio_id, transaction_id):
+        raise HTTPException(status_code=404, detail='Transaction not found')
+    return {'deleted': transaction_id}
+
+@router.get('/{portfolio_id}/valuation')
+async def get_valuation(
+    portfolio_id: int,
+    currency: Optional[str] = Query(None, pattern='^[A-Za-z]{3}$', description='Convert every value into this currency'),
+    current_user: str = Depends(get_current_user),
+    services: ServiceContainer = Depends(get_services)
+):
+    return await _converted(
+        services.portfolios.valuation, current_user, portfolio_id, currency and currency.upper()
+    )
+
+@router.get('/{portfolio_id}/equity')
+async def get_equity_curve(
+    portfolio_id: int,
+    days: int = Query(365, ge=1, le=3650),
+    currency: Optional[str] = Query(None, pattern='^[A-Za-z]{3}$', description='Convert every value into this currency'),
+    current_user: str = Depends(get_current_user),
+    services: ServiceContainer = Depends(get_services)
+):
+    return await _converted(
+        services.portfolios.equity_curve, current_user, portfolio_id, days, currency and currency.upper()
+    )
@@ -0,0 +1,79 @@
+import asyncio
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+
+from dependencies import get_stream_user
+from responses import dumps
+from services.container import ServiceContainer, get_services
+
+router = APIRouter(prefix='/api/quotes', tags=['Quotes'])
+
+HEARTBEAT_SECONDS = 15
+MAX_STREAM_SYMBOLS = 100
+
+
+@router.get('/stream')
+async def stream_quotes(
+    request: Request,
+    symbols: str = Query(..., description='Comma-separated symbols'),
+    since: Optional[str] = Query(None, description='Cursor to resume from (or the Last-Event-ID header)'),
+    current_user: str = Depends(get_stream_user),
+    services: ServiceContainer = Depends(get_services)
+):
+    """
+    Server-sent events: a `snapshot` event with full quotes, then `delta`
+    events with only the changed fields of changed symbols. Every event id
+    is a cursor, so a reconnecting EventSource resumes with deltas.
+    """
+    symbol_list = list(dict.fromkeys(s.strip().upper() for s in symbols.split(',') if s.strip()))
+    if not symbol_list or len(symbol_list) > MAX_STREAM_SYMBOLS:
+        raise HTTPException(status_code=400, detail=f'Give between 1 and {MAX_STREAM_SYMBOLS} symbols')
+
+    await services.load_quotes(symbol_list)
+    # Subscribe before reading the resume point, so no change falls in between
+    subscription = services.quote_feed.subscribe(symbol_list)
+    resume = services.quotes.parse_cursor(since or request.headers.get('last-event-id'))
+
+    def snapshot() -> str:
+        seq = services.quotes.seq
+        cursor = services.quotes.cursor(seq)
+        quotes = services.quotes.encode(symbol_list)
+        subscription.since = seq
+        data = b'{"cursor":' + dumps(cursor) + b',"reset":true,"quotes":' + quotes + b'}'
+        return f'event: snapshot\nid: {cursor}\ndata: {data.decode()}\n\n'
+
+    async def events():
+        try:
+            yield 'retry: 5000\n\n'
+            changes = services.quotes.changes(resume, symbol_list) if resume is not None else None
+            if changes is None:
+                yield snapshot()
+            else:
+                seq, deltas = changes
+                subscription.since = seq
+                cursor = services.quotes.cursor(seq)
+                data = dumps({'cursor': cursor, 'reset': False, 'quotes': deltas})
+                yield f'event: delta\nid: {cursor}\ndata: {data.decode()}\n\n'
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscription.queue.get(), timeout=HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ': keep-alive\n\n'
+                    continue
+                if message is None:
+                    yield snapshot()
+                    continue
+                cursor, data = message
+                yield f'event: delta\nid: {cursor}\ndata: {data.decode()}\n\n'
+        finally:
+            services.quote_feed.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
@@ -0,0 +1,33 @@
+import os
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from starlette.concurrency import run_in_threadpool
+
+from services.container import ServiceContainer, get_services
+from services.screener import FIELDS
+
+router = APIRouter(prefix='/api/screener', tags=['Screener'])
+
+# Seconds a worker's snapshot may lag the market store
+REFRESH_SECONDS = float(os.getenv('SCREENER_REFRESH_SECONDS', '15'))
+
+@router.get('')
+async def run_screen(
+    filter: str = Query(None, description='e.g. "rsi14 < 30 and volumeRatio > 2"'),
+    sort: str = Query('changePercent'),
+    order: str = Query('desc', pattern='^(asc|desc)$'),
+    limit: int = Query(50, ge=1, le=500),
+    fields: str = Query(None, description='Comma-separated columns (default: all)'),
+    services: ServiceContainer = Depends(get_services)
+):
+    await run_in_threadpool(services.screener.refresh_if_older, REFRESH_SECONDS)
+    columns = [f.strip() for f in fields.split(',') if f.strip()] if fields else FIELDS
+    try:
+        result = services.screener.screen(filter, sort, order == 'desc', limit, columns)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {'filter': filter, 'universe': len(services.screener), **result}
+
+@router.get('/fields')
+async def screener_fields():
+    return {'fields': list(FIELDS)}
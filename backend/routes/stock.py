@@ -1,26 +1,203 @@
-from fastapi import APIRouter, HTTPException
-from services.alphavantage import AlphaVantageService
+import datetime
+import time
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from starlette.concurrency import run_in_threadpool
+from http_cache import (
+    INTRADAY_POLICY,
+    QUOTE_POLICY,
+    SEARCH_POLICY,
+    SERIES_POLICY,
+    PreparedBody,
+    cached_json_response,
+)
+from responses import dumps
+from services.container import ServiceContainer, get_services
+from services.errors import UpstreamError
 
 router = APIRouter(prefix='/api/stock', tags=['Stock'])
-service = AlphaVantageService()
+
+MAX_QUOTE_SYMBOLS = 100
 
 @router.get('/quote/{symbol}')
-async def get_stock_quote(symbol: str):
+async def get_stock_quote(
+    request: Request,
+    symbol: str,
+    currency: Optional[str] = Query(None, pattern='^[A-Za-z]{3}$', description='Convert prices into this currency'),
+    services: ServiceContainer = Depends(get_services)
+):
+    symbol = symbol.upper()
+    try:
+        entry = await services.load_quote(symbol)
+        await services.check_alerts(entry)
+        content = services.record_quote(entry)
+        if currency:
+            content = await run_in_threadpool(services.fx.convert_quote, entry.value, currency.upper())
+        # A closed market's quote holds until the next open, in browsers too
+        max_age = None if services.calendar.is_open(symbol) else entry.expires_at - time.time()
+        return cached_json_response(request, content, QUOTE_POLICY, stale=entry.stale, max_age=max_age)
+    except UpstreamError:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get('/quotes')
+async def get_stock_quotes(
+    request: Request,
+    symbols: str = Query(..., description='Comma-separated symbols'),
+    since: Optional[str] = Query(None, description='Cursor of the previous response: only changes are returned'),
+    currency: Optional[str] = Query(None, pattern='^[A-Za-z]{3}$', description='Convert prices into this currency'),
+    services: ServiceContainer = Depends(get_services)
+):
+    symbol_list = list(dict.fromkeys(s.strip().upper() for s in symbols.split(',') if s.strip()))
+    if not symbol_list or len(symbol_list) > MAX_QUOTE_SYMBOLS:
+        raise HTTPException(status_code=400, detail=f'Give between 1 and {MAX_QUOTE_SYMBOLS} symbols')
+
+    entries, errors = await services.load_quotes(symbol_list)
+    stale = any(entry.stale for entry in entries.values())
+
+    # Converted deltas are only valid while the rates are: the cursor carries the rates' day
+    currency = currency and currency.upper()
+    fx_tag = services.fx.tag(currency) if currency else ''
+    since, _, since_tag = (since or '').partition('.')
+
+    def convert(quotes: dict) -> bytes:
+        return dumps({symbol: services.fx.convert_quote(quote, currency, symbol) for symbol, quote in quotes.items()})
+
+    # Deltas if the cursor is ours and the changelog still covers it, else a full resync
+    seq = services.quotes.parse_cursor(since) if since_tag == fx_tag else None
+    changes = services.quotes.changes(seq, symbol_list) if seq is not None else None
     try:
-        return service.get_quote(symbol)
+        if changes is not None:
+            seq, deltas = changes
+            cursor = services.quotes.cursor(seq)
+            quotes = await run_in_threadpool(convert, deltas) if currency else dumps(deltas)
+        elif currency:
+            cursor = services.quotes.cursor()
+            quotes = await run_in_threadpool(convert, {symbol: entry.value for symbol, entry in entries.items()})
+        else:
+            cursor = services.quotes.cursor()
+            # Stitch the stored bodies together instead of re-serializing each quote
+            bodies = {symbol: services.record_quote(entry) for symbol, entry in entries.items()}
+            quotes = b'{' + b','.join(dumps(symbol) + b':' + prepared.body for symbol, prepared in bodies.items()) + b'}'
+    except UpstreamError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+    if fx_tag:
+        cursor = f'{cursor}.{fx_tag}'
+
+    body = (
+        b'{"cursor":' + dumps(cursor) + b',"reset":' + (b'false' if changes is not None else b'true')
+        + b',"quotes":' + quotes + b',"errors":' + dumps(errors) + b'}'
+    )
+    return cached_json_response(request, PreparedBody(body), QUOTE_POLICY, stale=stale)
 
 @router.get('/timeseries/{symbol}')
-async def get_stock_timeseries(symbol: str):
+async def get_stock_timeseries(
+    request: Request,
+    symbol: str,
+    history: str = Query('compact', pattern='^(compact|full)$', description='full: the whole stored daily history'),
+    start: Optional[datetime.date] = Query(None, description='First date (full history only)'),
+    adjusted: bool = Query(True, description='Adjust for splits and dividends (full history only)'),
+    currency: Optional[str] = Query(None, pattern='^[A-Za-z]{3}$', description='Convert prices into this currency'),
+    services: ServiceContainer = Depends(get_services)
+):
+    symbol = symbol.upper()
+    try:
+        if history == 'full':
+            # Downloaded once per symbol, then topped up from the market store's copy
+            first = start.isoformat() if start else None
+            entry = await services.series_cache.get_or_load(
+                ('history', symbol, first, adjusted),
+                lambda: services.history.series(symbol, first, adjusted),
+                ttl=services.calendar.bars_ttl(symbol)
+            )
+        else:
+            entry = await services.series_cache.get_or_load(
+                symbol,
+                lambda: services.market_data.for_cache('get_time_series', symbol),
+                ttl=services.calendar.bars_ttl(symbol)
+            )
+        content = entry.prepared()
+        if currency:
+            content = await run_in_threadpool(services.fx.convert_bars, entry.value, currency.upper())
+        return cached_json_response(
+            request, content, SERIES_POLICY, stale=entry.stale, max_age=entry.expires_at - time.time()
+        )
+    except UpstreamError:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get('/intraday/{symbol}')
+async def get_stock_intraday(
+    request: Request,
+    symbol: str,
+    interval: str = Query('5min', pattern='^(1|5|15|60)min$'),
+    limit: int = Query(390, ge=1, le=2000),
+    currency: Optional[str] = Query(None, pattern='^[A-Za-z]{3}$', description='Convert prices into this currency'),
+    services: ServiceContainer = Depends(get_services)
+):
+    symbol = symbol.upper()
+    try:
+        # Only the newest bars are fetched; older ones are already in memory
+        entry = await services.intraday_cache.get_or_load(
+            symbol,
+            lambda: services.intraday.refresh(symbol),
+            ttl=services.calendar.quote_ttl(symbol, services.intraday_cache.ttl)
+        )
+        content = await run_in_threadpool(services.intraday.series, symbol, interval, limit)
+        if content is not None and currency:
+            content = await run_in_threadpool(services.fx.convert_bars, content, currency.upper())
+    except UpstreamError:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if content is None:
+        raise HTTPException(status_code=404, detail=f'No intraday data for {symbol}')
+    max_age = None if services.calendar.is_open(symbol) else entry.expires_at - time.time()
+    return cached_json_response(request, content, INTRADAY_POLICY, stale=entry.stale, max_age=max_age)
+
+@router.get('/market-status')
+async def get_market_status(
+    interval: int = Query(120, ge=5, le=3600, description='Client refresh interval during a session (seconds)'),
+    services: ServiceContainer = Depends(get_services)
+):
+    """
+    Session state of each exchange, with how long a client polling every
+    `interval` seconds should wait before its next refresh
+    """
+    return {'exchanges': services.calendar.status(interval)}
+
+@router.get('/search')
+async def search_stocks_query(
+    request: Request,
+    q: str = Query(..., min_length=1),
+    services: ServiceContainer = Depends(get_services)
+):
     try:
-        return service.get_time_series(symbol)
+        entry = await services.search_cache.get_or_load(
+            q.lower(), lambda: services.market_data.for_cache('search_symbols', q)
+        )
+        # Results name each symbol's currency, which conversions then use
+        services.fx.learn(entry.value)
+        return cached_json_response(request, {'query': q, 'results': entry.value}, SEARCH_POLICY, stale=entry.stale)
+    except UpstreamError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.get('/search/{query}')
-async def search_stocks(query: str):
+async def search_stocks(request: Request, query: str, services: ServiceContainer = Depends(get_services)):
     try:
-        return service.search_symbols(query)
+        entry = await services.search_cache.get_or_load(
+            query.lower(), lambda: services.market_data.for_cache('search_symbols', query)
+        )
+        services.fx.learn(entry.value)
+        return cached_json_response(request, entry.prepared(), SEARCH_POLICY, stale=entry.stale)
+    except UpstreamError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
\ No newline at end of file
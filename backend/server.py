@@ -3,34 +3,64 @@ Markstro API - Complete Server with JWT Authentication
 Run with: python server.py
 """
 
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
-from fastapi.security import HTTPBearer
+from fastapi.responses import PlainTextResponse
 from fastapi.security.http import HTTPAuthorizationCredentials
-from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 from typing import Optional
+import hmac
 import os
-from dotenv import load_dotenv
+from contextlib import asynccontextmanager
 
 # Import authentication services
-from auth_service import JWTService, UserService
+from dependencies import get_admin_user, get_current_user, get_jwt_service, get_user_service, security
+from lazy_routers import LazyRouterMiddleware, LazyRouters
+from metrics import REGISTRY, MetricsMiddleware
+from middleware.compression import CompressionMiddleware
+from middleware.profiling import ProfilingMiddleware
+from responses import FastJSONResponse
+from services.errors import RateLimitedError, UpstreamError, redact
+from settings import is_production, lazy_init_enabled
+from static_assets import StaticAssetApp, StaticAssetIndex
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Create the worker's shared services on startup, close them on shutdown
+
+    In lazy mode (serverless) the services, and their background loops,
+    are created by the first request that needs them (see get_services).
+    """
+    if not lazy_init_enabled():
+        from services.container import ServiceContainer
 
-# Initialize security
-security = HTTPBearer()
+        services = ServiceContainer()
+        app.state.services = services
+        await services.start()
+    yield
+    services = getattr(app.state, "services", None)
+    if services is not None:
+        await services.close()
 
 # Initialize FastAPI app
 app = FastAPI(
     title="Markstro API",
     description="Stock Market & News API with JWT Authentication",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse,
+    lifespan=lifespan
 )
 
 # Frontend static setup (served from backend for single-site deploy)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 FRONTEND_DIR = os.path.join(BASE_DIR, "frontend")
-INDEX_FILE = os.path.join(FRONTEND_DIR, "index.html")
+
+# Frontend assets are indexed once and served from memory. In lazy mode
+# (serverless) the index is built by the first static request instead.
+static_assets = StaticAssetIndex(FRONTEND_DIR)
+if os.path.isdir(FRONTEND_DIR) and not lazy_init_enabled():
+    static_assets.build()
 
 # CORS Configuration
 origins = [
@@ -49,9 +79,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize services
-jwt_service = JWTService()
-user_service = UserService()
+# Compress JSON and text bodies above 1 KB (brotli when available, else gzip)
+app.add_middleware(CompressionMiddleware, minimum_size=1024)
+
+# Outermost, so latency includes compression and CORS handling
+app.add_middleware(MetricsMiddleware)
+
+# Opt-in sampling profiler (PROFILE_SAMPLE_RATE / PROFILE_ADMIN_TOKEN)
+profiling_enabled, profiling_options = ProfilingMiddleware.settings_from_env()
+if profiling_enabled:
+    app.add_middleware(ProfilingMiddleware, **profiling_options)
 
 # ============================================================================
 # Pydantic Models
@@ -87,40 +124,16 @@ class UserResponse(BaseModel):
     email: str
     full_name: str
 
-# ============================================================================
-# Dependencies
-# ============================================================================
-
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> str:
-    """
-    Dependency to extract and verify JWT token from request header
-    
-    Usage: 
-        @app.get("/protected")
-        def protected_route(current_user: str = Depends(get_current_user)):
-            return {"user": current_user}
-    """
-    token = credentials.credentials
-    username = jwt_service.get_username_from_token(token)
-    
-    if username is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid or expired token",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    
-    return username
-
 # ============================================================================
 # Public Endpoints (No Authentication Required)
 # ============================================================================
 
 @app.get("/")
-async def root():
+async def root(request: Request):
     """Root endpoint"""
-    if os.path.exists(INDEX_FILE):
-        return FileResponse(INDEX_FILE)
+    index_response = static_assets.response(request.headers, "index.html")
+    if index_response is not None:
+        return index_response
     return {
         "message": "Markstro API is running!",
         "version": "1.0.0",
@@ -137,6 +150,23 @@ async def health():
         "version": "1.0.0"
     }
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    """
+    Prometheus metrics endpoint
+
+    If METRICS_TOKEN is set, scrapers must send it as a Bearer token. In
+    production (MARKSTRO_ENV=production) the token is required: without
+    one the endpoint is closed rather than public.
+    """
+    expected = os.getenv("METRICS_TOKEN")
+    if not expected and is_production():
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Metrics need METRICS_TOKEN in production")
+    supplied = request.headers.get("authorization", "")
+    if expected and not hmac.compare_digest(supplied.encode(), f"Bearer {expected}".encode()):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid metrics token")
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 # ============================================================================
 # Authentication Endpoints
 # ============================================================================
@@ -152,18 +182,18 @@ async def login(request: LoginRequest):
     - username: john, password: john123
     """
     # Verify user credentials
-    if not user_service.verify_user(request.username, request.password):
+    if not get_user_service().verify_user(request.username, request.password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid username or password"
         )
     
     # Get user info
-    user = user_service.get_user(request.username)
+    user = get_user_service().get_user(request.username)
     
     # Create tokens
-    access_token = jwt_service.create_access_token(request.username)
-    refresh_token = jwt_service.create_refresh_token(request.username)
+    access_token = get_jwt_service().create_access_token(request.username)
+    refresh_token = get_jwt_service().create_refresh_token(request.username)
     
     return LoginResponse(
         access_token=access_token,
@@ -184,14 +214,14 @@ async def register(request: RegisterRequest):
     Returns JWT tokens after successful registration
     """
     # Check if user already exists
-    if user_service.user_exists(request.username):
+    if get_user_service().user_exists(request.username):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Username already exists"
         )
     
     # Create new user
-    user_service.create_user(
+    get_user_service().create_user(
         username=request.username,
         password=request.password,
         email=request.email,
@@ -199,11 +229,11 @@ async def register(request: RegisterRequest):
     )
     
     # Get created user
-    user = user_service.get_user(request.username)
+    user = get_user_service().get_user(request.username)
     
     # Create tokens
-    access_token = jwt_service.create_access_token(request.username)
-    refresh_token = jwt_service.create_refresh_token(request.username)
+    access_token = get_jwt_service().create_access_token(request.username)
+    refresh_token = get_jwt_service().create_refresh_token(request.username)
     
     return LoginResponse(
         access_token=access_token,
@@ -222,7 +252,7 @@ async def refresh_token(credentials: HTTPAuthorizationCredentials = Depends(secu
     Refresh access token using refresh token
     """
     token = credentials.credentials
-    payload = jwt_service.verify_token(token)
+    payload = get_jwt_service().verify_token(token)
     
     if not payload or payload.get("type") != "refresh":
         raise HTTPException(
@@ -231,7 +261,7 @@ async def refresh_token(credentials: HTTPAuthorizationCredentials = Depends(secu
         )
     
     username = payload.get("sub")
-    new_access_token = jwt_service.create_access_token(username)
+    new_access_token = get_jwt_service().create_access_token(username)
     
     return TokenResponse(
         access_token=new_access_token,
@@ -249,7 +279,7 @@ async def get_current_user_info(current_user: str = Depends(get_current_user)):
     
     Required: Bearer token in Authorization header
     """
-    user = user_service.get_user(current_user)
+    user = get_user_service().get_user(current_user)
     return UserResponse(
         username=user["username"],
         email=user["email"],
@@ -268,74 +298,27 @@ async def verify_token(current_user: str = Depends(get_current_user)):
     }
 
 # ============================================================================
-# Stock Endpoints (Protected)
-# ============================================================================
-
-@app.get("/api/stock/quote/{symbol}")
-async def get_stock_quote(symbol: str, current_user: str = Depends(get_current_user)):
-    """
-    Get stock quote (Protected - Requires Authentication)
-    
-    Example: GET /api/stock/quote/AAPL
-    Authorization: Bearer <your_token>
-    """
-    return {
-        "symbol": symbol.upper(),
-        "price": 150.25,
-        "change": 2.5,
-        "change_percent": 1.7,
-        "requested_by": current_user,
-        "message": "Endpoint ready for implementation"
-    }
-
-@app.get("/api/stock/search")
-async def search_stocks(q: str, current_user: str = Depends(get_current_user)):
-    """
-    Search for stocks (Protected)
-    
-    Example: GET /api/stock/search?q=apple
-    Authorization: Bearer <your_token>
-    """
-    return {
-        "query": q,
-        "results": [
-            {"symbol": "AAPL", "name": "Apple Inc."},
-            {"symbol": "APPL", "name": "AppLovin Corporation"}
-        ],
-        "requested_by": current_user
-    }
-
-# ============================================================================
-# News Endpoints (Protected)
+# Stock, News & Account Routers (Protected)
 # ============================================================================
 
-@app.get("/api/news")
-async def get_news(current_user: str = Depends(get_current_user)):
-    """
-    Get latest news (Protected)
-    
-    Authorization: Bearer <your_token>
-    """
-    return {
-        "news": [],
-        "total": 0,
-        "requested_by": current_user,
-        "message": "News endpoint ready for implementation"
-    }
-
-@app.get("/api/news/search")
-async def search_news(q: str, current_user: str = Depends(get_current_user)):
-    """
-    Search news (Protected)
-    
-    Example: GET /api/news/search?q=stocks
-    Authorization: Bearer <your_token>
-    """
-    return {
-        "query": q,
-        "results": [],
-        "requested_by": current_user
-    }
+# Imported on the first request under their prefix in lazy mode
+routers = LazyRouters(app, [
+    ("routes.stock", "/api/stock", [Depends(get_current_user)]),
+    ("routes.news", "/api/news", [Depends(get_current_user)]),
+    ("routes.screener", "/api/screener", [Depends(get_current_user)]),
+    ("routes.analytics", "/api/analytics", [Depends(get_current_user)]),
+    ("routes.auth", "/api/auth/email", None),
+    # Per-endpoint auth: the streams also accept ?token=
+    ("routes.alerts", "/api/alerts", None),
+    ("routes.quotes", "/api/quotes", None),
+    ("routes.portfolio", "/api/portfolios", None),
+    # Only for the usernames listed in ADMIN_USERS (disabled while it is unset)
+    ("routes.admin", "/api/admin/market-data", [Depends(get_admin_user)]),
+])
+if lazy_init_enabled():
+    app.add_middleware(LazyRouterMiddleware, routers=routers)
+else:
+    routers.include_all()
 
 # ============================================================================
 # Error Handlers
@@ -343,17 +326,37 @@ async def search_news(q: str, current_user: str = Depends(get_current_user)):
 
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request, exc):
-    return {
-        "error": exc.detail,
-        "status_code": exc.status_code
-    }
+    return FastJSONResponse(
+        status_code=exc.status_code,
+        content={
+            "error": exc.detail,
+            "status_code": exc.status_code
+        },
+        headers=getattr(exc, "headers", None)
+    )
+
+@app.exception_handler(UpstreamError)
+async def upstream_exception_handler(request, exc):
+    """Provider failures: 404 no data, 429 rate limited, 502 bad or refused response, 503 unavailable"""
+    headers = None
+    if isinstance(exc, RateLimitedError) and exc.retry_after is not None:
+        headers = {"Retry-After": str(max(1, round(exc.retry_after)))}
+    return FastJSONResponse(
+        status_code=exc.status_code,
+        content={
+            # Messages never carry request URLs, but an API key must not leak even if one does
+            "error": redact(str(exc)),
+            "status_code": exc.status_code
+        },
+        headers=headers
+    )
 
 # ============================================================================
 # Main
 # ============================================================================
 
 if os.path.isdir(FRONTEND_DIR):
-    app.mount("/", StaticFiles(directory=FRONTEND_DIR, html=True), name="frontend")
+    app.mount("/", StaticAssetApp(static_assets), name="frontend")
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,41 @@
+"""
+Price Adjustments
+Backward adjustment of stored daily bars for splits and dividends
+"""
+
+from typing import Sequence, Tuple
+
+import numpy as np
+
+
+def adjustment_factors(dates: np.ndarray, closes: np.ndarray,
+                       actions: Sequence[Tuple[str, float, float]]) -> np.ndarray:
+    """
+    Backward adjustment factor of each bar for the splits and dividends after it
+
+    A split of coefficient s scales earlier prices by 1/s; a dividend d
+    scales them by 1 - d / (close before the ex-date), the vendor's own
+    method. A new split changes every earlier factor, which is why raw bars
+    and actions are stored rather than adjusted prices. Actions on a
+    series' first bar are skipped: no bar before them needs adjusting.
+
+    Args:
+        dates: Bar dates (datetime64[D] or ISO strings), oldest first
+        closes: Raw closes aligned with dates
+        actions: (ex-date, dividend, split coefficient), any order
+
+    Returns:
+        Factors aligned with dates: multiply prices, divide volumes
+    """
+    count = len(dates)
+    # step[i]: factor applying to the bars before bar i
+    step = np.ones(count + 1)
+    if actions and count:
+        action_dates, dividends, splits = (np.array(column) for column in zip(*actions))
+        index = np.searchsorted(dates, action_dates.astype(dates.dtype))
+        # An action needs a bar before its ex-date (for the dividend's close) and one on or after it
+        valid = (index > 0) & (index < count) & (splits > 0)
+        index, dividends, splits = index[valid], dividends[valid], splits[valid]
+        np.multiply.at(step, index, (1.0 - dividends / closes[index - 1]) / splits)
+    # Product of the steps after each bar
+    return np.cumprod(step[::-1])[::-1][1:]
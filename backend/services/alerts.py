@@ -0,0 +1,389 @@
+"""
+Price Alerts
+Per-symbol sorted threshold index, evaluated against every quote update
+"""
+
+import asyncio
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Optional, Set, Tuple
+
+from metrics import ALERT_MATCH_SECONDS, ALERTS_ACTIVE, ALERTS_TRIGGERED
+from services.database import Database
+
+ABOVE = "above"
+BELOW = "below"
+
+# kind -> (quote field, direction)
+ALERT_KINDS = {
+    "price_above": ("price", ABOVE),
+    "price_below": ("price", BELOW),
+    "change_above": ("changePercent", ABOVE),
+    "change_below": ("changePercent", BELOW),
+}
+
+_ALERT_COLUMNS = "id, username, symbol, kind, threshold, note, status, created_at, triggered_at, triggered_value"
+
+
+class Alert:
+    """One user alert"""
+
+    __slots__ = (
+        "id", "username", "symbol", "kind", "threshold", "note",
+        "status", "created_at", "triggered_at", "triggered_value",
+    )
+
+    def __init__(self, id, username, symbol, kind, threshold, note="", status="active",
+                 created_at=0.0, triggered_at=None, triggered_value=None):
+        self.id = id
+        self.username = username
+        self.symbol = symbol
+        self.kind = kind
+        self.threshold = threshold
+        self.note = note
+        self.status = status
+        self.created_at = created_at
+        self.triggered_at = triggered_at
+        self.triggered_value = triggered_value
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__ if name != "username"}
+
+
+class ThresholdIndex:
+    """
+    Sorted thresholds of one (symbol, field, direction) with their alert ids
+
+    Alerts are one-shot, so everything a new value has crossed is a prefix
+    (for "above") or suffix (for "below") of the sorted list: one bisect
+    finds it and the matched alerts are cut out, O(log n + k).
+    """
+
+    __slots__ = ("thresholds", "ids")
+
+    def __init__(self):
+        self.thresholds: List[float] = []
+        self.ids: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, threshold: float, alert_id: int) -> None:
+        i = bisect_right(self.thresholds, threshold)
+        self.thresholds.insert(i, threshold)
+        self.ids.insert(i, alert_id)
+
+    def remove(self, threshold: float, alert_id: int) -> bool:
+        i = bisect_left(self.thresholds, threshold)
+        while i < len(self.thresholds) and self.thresholds[i] == threshold:
+            if self.ids[i] == alert_id:
+                del self.thresholds[i]
+                del self.ids[i]
+                return True
+            i += 1
+        return False
+
+    def pop_crossed(self, value: float, direction: str) -> List[int]:
+        """
+        Remove and return the alerts crossed by value
+
+        Args:
+            value: New value of the field
+            direction: ABOVE (thresholds <= value) or BELOW (thresholds >= value)
+
+        Returns:
+            Alert ids
+        """
+        if direction == ABOVE:
+            k = bisect_right(self.thresholds, value)
+            ids = self.ids[:k]
+            del self.thresholds[:k], self.ids[:k]
+        else:
+            k = bisect_left(self.thresholds, value)
+            ids = self.ids[k:]
+            del self.thresholds[k:], self.ids[k:]
+        return ids
+
+
+class AlertEngine:
+    """
+    Evaluates alerts on quote updates and pushes the triggered ones
+
+    Every worker indexes all active alerts. match() (in memory, no I/O)
+    pops the alerts a quote crossed; fire() claims them in the database with
+    a conditional UPDATE, so when several workers see the same quote only
+    one of them fires each alert. Triggered and deleted alerts are written
+    to alert_events; sync() replays events and new alerts from the other
+    workers, so each worker can push to the streams connected to it.
+    """
+
+    def __init__(self, database: Database, max_per_user: int = 200):
+        self.db = database
+        self.max_per_user = max_per_user
+        self.loaded = False
+        self._alerts: Dict[int, Alert] = {}
+        self._index: Dict[Tuple[str, str, str], ThresholdIndex] = {}
+        self._last_quotes: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._last_alert_id = 0
+        self._last_event_id = 0
+        self._local_events: Set[int] = set()
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    # ------------------------------------------------------------------
+    # Index
+    # ------------------------------------------------------------------
+
+    def _add(self, alert: Alert) -> None:
+        field, direction = ALERT_KINDS[alert.kind]
+        key = (alert.symbol, field, direction)
+        index = self._index.get(key)
+        if index is None:
+            index = self._index[key] = ThresholdIndex()
+        index.add(alert.threshold, alert.id)
+        self._alerts[alert.id] = alert
+
+    def _remove(self, alert_id: int) -> Optional[Alert]:
+        alert = self._alerts.pop(alert_id, None)
+        if alert is not None:
+            field, direction = ALERT_KINDS[alert.kind]
+            index = self._index.get((alert.symbol, field, direction))
+            if index is not None:
+                index.remove(alert.threshold, alert.id)
+        return alert
+
+    def symbols(self) -> List[str]:
+        """Symbols with at least one active alert"""
+        with self._lock:
+            return sorted({alert.symbol for alert in self._alerts.values()})
+
+    def match(self, quote: dict) -> List[Tuple[Alert, float]]:
+        """
+        Pop the alerts crossed by a quote
+
+        Args:
+            quote: Quote dict with symbol, price and changePercent
+
+        Returns:
+            (alert, value that crossed it) pairs, to pass to fire()
+        """
+        started = time.perf_counter()
+        symbol = quote.get("symbol")
+        matches: List[Tuple[Alert, float]] = []
+        with self._lock:
+            self._last_quotes[symbol] = quote
+            for field in ("price", "changePercent"):
+                value = quote.get(field)
+                if value is None:
+                    continue
+                for direction in (ABOVE, BELOW):
+                    index = self._index.get((symbol, field, direction))
+                    if not index:
+                        continue
+                    for alert_id in index.pop_crossed(value, direction):
+                        alert = self._alerts.pop(alert_id, None)
+                        if alert is not None:
+                            matches.append((alert, value))
+            ALERTS_ACTIVE.set(len(self._alerts))
+        ALERT_MATCH_SECONDS.observe(time.perf_counter() - started)
+        return matches
+
+    # ------------------------------------------------------------------
+    # Database (blocking; call from the threadpool)
+    # ------------------------------------------------------------------
+
+    def ensure_loaded(self) -> None:
+        """Index all active alerts on first use"""
+        if self.loaded:
+            return
+        with self._load_lock:
+            if self.loaded:
+                return
+            with self.db.connection() as conn:
+                rows = conn.execute(f"SELECT {_ALERT_COLUMNS} FROM alerts WHERE status = 'active'").fetchall()
+                last_alert = conn.execute("SELECT COALESCE(MAX(id), 0) FROM alerts").fetchone()[0]
+                last_event = conn.execute("SELECT COALESCE(MAX(id), 0) FROM alert_events").fetchone()[0]
+            with self._lock:
+                for row in rows:
+                    self._add(Alert(*row))
+                self._last_alert_id = last_alert
+                self._last_event_id = last_event
+                ALERTS_ACTIVE.set(len(self._alerts))
+            self.loaded = True
+
+    def create(self, username: str, symbol: str, kind: str, threshold: float, note: str = "") -> Alert:
+        """
+        Store and index a new alert; fires at once if the last quote already crossed it
+
+        Raises:
+            ValueError: Unknown kind or too many active alerts
+        """
+        if kind not in ALERT_KINDS:
+            raise ValueError(f"Unknown alert kind: {kind}")
+        self.ensure_loaded()
+        now = time.time()
+        with self.db.connection() as conn:
+            active = conn.execute(
+                "SELECT COUNT(*) FROM alerts WHERE username = ? AND status = 'active'", (username,)
+            ).fetchone()[0]
+            if active >= self.max_per_user:
+                raise ValueError(f"At most {self.max_per_user} active alerts per user")
+            alert_id = conn.execute(
+                "INSERT INTO alerts (username, symbol, kind, threshold, note, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (username, symbol, kind, threshold, note, now),
+            ).lastrowid
+        alert = Alert(alert_id, username, symbol, kind, threshold, note, "active", now)
+        with self._lock:
+            self._add(alert)
+            quote = self._last_quotes.get(symbol)
+        if quote is not None:
+            self.fire(self.match(quote))
+        return alert
+
+    def delete(self, username: str, alert_id: int) -> bool:
+        """
+        Delete one of the user's alerts
+
+        Returns:
+            False if no such alert
+        """
+        self.ensure_loaded()
+        with self.db.connection() as conn:
+            updated = conn.execute(
+                "UPDATE alerts SET status = 'deleted' WHERE id = ? AND username = ? AND status != 'deleted'",
+                (alert_id, username),
+            ).rowcount
+            if updated:
+                conn.execute(
+                    "INSERT INTO alert_events (alert_id, type, created_at) VALUES (?, 'deleted', ?)",
+                    (alert_id, time.time()),
+                )
+        with self._lock:
+            self._remove(alert_id)
+        return bool(updated)
+
+    def list(self, username: str, limit: int = 200) -> List[dict]:
+        """The user's alerts, newest first"""
+        with self.db.connection() as conn:
+            rows = conn.execute(
+                f"SELECT {_ALERT_COLUMNS} FROM alerts WHERE username = ? AND status != 'deleted' "
+                "ORDER BY id DESC LIMIT ?",
+                (username, limit),
+            ).fetchall()
+        return [Alert(*row).to_dict() for row in rows]
+
+    def fire(self, matches: List[Tuple[Alert, float]]) -> List[Alert]:
+        """
+        Claim matched alerts and push them to their users
+
+        Args:
+            matches: Result of match()
+
+        Returns:
+            Alerts fired by this worker (others may have been claimed elsewhere)
+
+        Raises:
+            sqlite3.Error: The claim failed; the matched alerts are back in
+                the index, to be matched again
+        """
+        if not matches:
+            return []
+        now = time.time()
+        fired = []
+        try:
+            with self.db.connection() as conn:
+                for alert, value in matches:
+                    claimed = conn.execute(
+                        "UPDATE alerts SET status = 'triggered', triggered_at = ?, triggered_value = ? "
+                        "WHERE id = ? AND status = 'active'",
+                        (now, value, alert.id),
+                    ).rowcount
+                    if not claimed:
+                        continue
+                    event_id = conn.execute(
+                        "INSERT INTO alert_events (alert_id, type, created_at) VALUES (?, 'triggered', ?)",
+                        (alert.id, now),
+                    ).lastrowid
+                    fired.append((event_id, alert, value))
+        except Exception:
+            # Nothing was claimed (the transaction rolled back): index them again for the next quote
+            with self._lock:
+                for alert, _ in matches:
+                    if alert.id not in self._alerts:
+                        self._add(alert)
+                ALERTS_ACTIVE.set(len(self._alerts))
+            raise
+
+        for _, alert, value in fired:
+            alert.status, alert.triggered_at, alert.triggered_value = "triggered", now, value
+        for event_id, alert, _ in fired:
+            self._local_events.add(event_id)
+            ALERTS_TRIGGERED.inc(alert.kind)
+            self._deliver(alert)
+        return [alert for _, alert, _ in fired]
+
+    def sync(self) -> None:
+        """Pick up alerts created and events recorded by other workers"""
+        if not self.loaded:
+            return
+        with self.db.connection() as conn:
+            new_alerts = conn.execute(
+                f"SELECT {_ALERT_COLUMNS} FROM alerts WHERE id > ? ORDER BY id", (self._last_alert_id,)
+            ).fetchall()
+            events = conn.execute(
+                f"SELECT e.id, e.type, {', '.join('a.' + c for c in _ALERT_COLUMNS.split(', '))} "
+                "FROM alert_events e JOIN alerts a ON a.id = e.alert_id WHERE e.id > ? ORDER BY e.id",
+                (self._last_event_id,),
+            ).fetchall()
+
+        with self._lock:
+            for row in new_alerts:
+                self._last_alert_id = row[0]
+                if row[6] == "active" and row[0] not in self._alerts:
+                    self._add(Alert(*row))
+            remote = []
+            for event_id, event_type, *row in events:
+                self._last_event_id = event_id
+                self._remove(row[0])
+                if event_id in self._local_events:
+                    self._local_events.discard(event_id)
+                elif event_type == "triggered":
+                    remote.append(Alert(*row))
+            ALERTS_ACTIVE.set(len(self._alerts))
+        for alert in remote:
+            self._deliver(alert)
+
+    # ------------------------------------------------------------------
+    # Push channel
+    # ------------------------------------------------------------------
+
+    def subscribe(self, username: str) -> asyncio.Queue:
+        """Queue receiving the user's triggered alerts (call from the event loop)"""
+        self._loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=100)
+        self._subscribers.setdefault(username, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, username: str, queue: asyncio.Queue) -> None:
+        queues = self._subscribers.get(username)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[username]
+
+    def _deliver(self, alert: Alert) -> None:
+        queues = self._subscribers.get(alert.username)
+        if not queues or self._loop is None:
+            return
+        payload = alert.to_dict()
+        for queue in list(queues):
+            self._loop.call_soon_threadsafe(_offer, queue, payload)
+
+
+def _offer(queue: asyncio.Queue, payload: dict) -> None:
+    # A client that stopped reading loses alerts rather than growing memory
+    if not queue.full():
+        queue.put_nowait(payload)
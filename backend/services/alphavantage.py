@@ -1,129 +1,252 @@
 import requests
 import os
-from dotenv import load_dotenv
+import time
+from metrics import UpstreamTimer, record_upstream_error
+from services.errors import (
+    InvalidSymbolError,
+    NoDataError,
+    RateLimitedError,
+    UpstreamParseError,
+    UpstreamPlanError,
+    UpstreamUnavailableError,
+    network_error,
+)
+from services.parsers import ADJUSTED_BARS, BARS, FX_BARS, GLOBAL_QUOTE, SYMBOL_SEARCH, SeriesParser
+from services.providers.base import MarketDataProvider
+from services.resilience import call_upstream
+from settings import load_env
 
-load_dotenv()
+load_env()
 
-class AlphaVantageService:
-    def __init__(self):
+# Time series bodies are parsed as they download, in chunks of this size
+CHUNK_BYTES = 256 * 1024
+# The free tier's quota is per minute
+RATE_LIMIT_RETRY_AFTER = 60
+# "Information" also carries permanent refusals (premium-only functions or
+# parameters, bad API keys); only messages about the quota are rate limits
+RATE_LIMIT_MARKERS = ('rate limit', 'call frequency', 'spreading out', 'per second', 'per minute', 'per day')
+# How long a refused premium function is not asked for again
+PLAN_RECHECK_SECONDS = 24 * 3600
+
+class AlphaVantageService(MarketDataProvider):
+    name = 'alphavantage'
+
+    def __init__(self, session=None, limiter=None, breaker=None, retry=None):
         self.api_key = os.getenv('ALPHA_VANTAGE_KEY')
-        self.base_url = 'https://www.alphavantage.co/query'
+        self.base_url = os.getenv('ALPHA_VANTAGE_BASE_URL', 'https://www.alphavantage.co/query')
+        # Shared requests.Session (connection pool) and TokenBucket, if provided
+        self.http = session or requests
+        self.limiter = limiter
+        # CircuitBreaker / RetryPolicy for this provider, if provided
+        self.breaker = breaker
+        self.retry = retry
+        self.timeout = float(os.getenv('UPSTREAM_TIMEOUT', '5'))
+        # Until when TIME_SERIES_DAILY_ADJUSTED is known to be refused (monotonic)
+        self._adjusted_refused_until = 0.0
     
-    def get_quote(self, symbol: str):
+    def _get(self, params: dict, series=None):
+        # One quota token per logical call: retries of a failed attempt are not new calls
+        if self.limiter is not None:
+            self.limiter.acquire(max_wait=5.0)
+        return call_upstream(
+            lambda budget: self._request(params, series, budget),
+            self.breaker, self.retry, 'alphavantage', params['function'],
+        )
+    
+    def _request(self, params: dict, series=None, budget=None):
+        """
+        GET one function and decode it
+        
+        Args:
+            params: Query parameters
+            series: (series key, SeriesShape[, sink]) to stream-parse a time
+                series into columns instead of decoding the whole body
+            budget: Seconds left of the retry deadline, capping the timeout
+        
+        Returns:
+            dict: Decoded response (the series as SeriesColumns, or with a
+                sink the number of rows passed to it)
+        
+        Raises:
+            InvalidSymbolError, RateLimitedError, UpstreamParseError,
+            UpstreamPlanError, UpstreamUnavailableError
+        """
+        function = params['function']
+        timeout = self.timeout if budget is None else max(0.1, min(self.timeout, budget))
         try:
-            params = {
-                'function': 'GLOBAL_QUOTE',
-                'symbol': symbol,
-                'apikey': self.api_key
-            }
-            
-            response = requests.get(self.base_url, params=params, timeout=10)
-            data = response.json()
-            
-            if 'Error Message' in data:
-                raise Exception('Invalid stock symbol')
-            
-            if 'Note' in data:
-                raise Exception('API rate limit exceeded')
-            
-            quote = data.get('Global Quote', {})
-            
-            if not quote:
-                raise Exception('No data available')
-            
-            return {
-                'symbol': symbol,
-                'price': float(quote.get('05. price', 0)),
-                'change': float(quote.get('09. change', 0)),
-                'changePercent': float(quote.get('10. change percent', '0').replace('%', '')),
-                'open': float(quote.get('02. open', 0)),
-                'high': float(quote.get('03. high', 0)),
-                'low': float(quote.get('04. low', 0)),
-                'volume': int(quote.get('06. volume', 0)),
-                'previousClose': float(quote.get('08. previous close', 0)),
-                'latestTradingDay': quote.get('07. latest trading day', '')
-            }
-            
+            with UpstreamTimer('alphavantage', function):
+                response = self.http.get(
+                    self.base_url, params=params, timeout=timeout, stream=series is not None
+                )
         except requests.exceptions.RequestException as e:
-            raise Exception(f'Network error: {str(e)}')
-        except Exception as e:
-            raise Exception(str(e))
+            raise network_error('alphavantage', e)
+        try:
+            if response.status_code >= 500:
+                record_upstream_error('alphavantage', function, 'http_5xx')
+                raise UpstreamUnavailableError(f'Alpha Vantage error: HTTP {response.status_code}')
+            if series is None:
+                try:
+                    data = response.json()
+                except ValueError:
+                    raise UpstreamParseError(f'Alpha Vantage {function} response is not JSON')
+                if not isinstance(data, dict):
+                    raise UpstreamParseError(f'Alpha Vantage {function} response is not a JSON object')
+            else:
+                parser = SeriesParser(*series)
+                for chunk in response.iter_content(CHUNK_BYTES):
+                    parser.feed(chunk)
+                data = parser.finish()
+        except requests.exceptions.RequestException as e:
+            raise network_error('alphavantage', e)
+        except UpstreamParseError:
+            record_upstream_error('alphavantage', function, 'parse_error')
+            raise
+        finally:
+            response.close()
+        
+        if 'Error Message' in data:
+            record_upstream_error('alphavantage', function, 'invalid_symbol')
+            subject = params.get('symbol') or params.get('keywords') or \
+                f"{params.get('from_symbol')}/{params.get('to_symbol')}"
+            raise InvalidSymbolError(f'Invalid symbol: {subject}')
+        # Free tier quota messages come as "Note" (per minute) or "Information" (per day)
+        if 'Note' in data:
+            record_upstream_error('alphavantage', function, 'rate_limited')
+            raise RateLimitedError('API rate limit exceeded', retry_after=RATE_LIMIT_RETRY_AFTER)
+        if 'Information' in data:
+            message = str(data['Information'])
+            if any(marker in message.lower() for marker in RATE_LIMIT_MARKERS):
+                record_upstream_error('alphavantage', function, 'rate_limited')
+                raise RateLimitedError('API rate limit exceeded', retry_after=RATE_LIMIT_RETRY_AFTER)
+            record_upstream_error('alphavantage', function, 'plan_restricted')
+            raise UpstreamPlanError(f'Alpha Vantage refused {function}: {message}')
+        return data
+    
+    def get_quote(self, symbol: str):
+        params = {
+            'function': 'GLOBAL_QUOTE',
+            'symbol': symbol,
+            'apikey': self.api_key
+        }
+        
+        quote = self._get(params).get('Global Quote')
+        
+        if not quote:
+            raise NoDataError(f'No quote data for {symbol}')
+        
+        return {'symbol': symbol, **GLOBAL_QUOTE.parse(quote)}
     
     def get_time_series(self, symbol: str):
-        try:
+        params = {
+            'function': 'TIME_SERIES_DAILY',
+            'symbol': symbol,
+            'apikey': self.api_key
+        }
+        
+        time_series = self._get(params, ('Time Series (Daily)', BARS)).get('Time Series (Daily)')
+        
+        if not time_series:
+            raise NoDataError(f'No chart data for {symbol}')
+        
+        return {
+            'symbol': symbol,
+            'data': time_series.tail(60).records('date')
+        }
+    
+    def get_daily_history(self, symbol: str, full: bool = False, sink=None):
+        """
+        Daily bars with splits and dividends, or raw bars without them
+        
+        TIME_SERIES_DAILY_ADJUSTED is premium-only: once it is refused,
+        the compact TIME_SERIES_DAILY, which every plan has, is used
+        instead for PLAN_RECHECK_SECONDS.
+        
+        Returns:
+            dict: {'symbol', 'rows', 'adjusted'}; 'adjusted' is False for
+                the raw fallback, which has no dividend or split columns
+        """
+        if time.monotonic() >= self._adjusted_refused_until:
             params = {
-                'function': 'TIME_SERIES_DAILY',
+                'function': 'TIME_SERIES_DAILY_ADJUSTED',
                 'symbol': symbol,
+                'outputsize': 'full' if full else 'compact',
                 'apikey': self.api_key
             }
-            
-            response = requests.get(self.base_url, params=params, timeout=10)
-            data = response.json()
-            
-            if 'Error Message' in data:
-                raise Exception('Invalid stock symbol')
-            
-            if 'Note' in data:
-                raise Exception('API rate limit exceeded')
-            
-            time_series = data.get('Time Series (Daily)', {})
-            
-            if not time_series:
-                raise Exception('No chart data available')
-            
-            formatted_data = []
-            for date in sorted(time_series.keys(), reverse=True)[:60]:
-                values = time_series[date]
-                formatted_data.append({
-                    'date': date,
-                    'open': float(values['1. open']),
-                    'high': float(values['2. high']),
-                    'low': float(values['3. low']),
-                    'close': float(values['4. close']),
-                    'volume': int(values['5. volume'])
-                })
-            
-            formatted_data.reverse()
-            
-            return {
-                'symbol': symbol,
-                'data': formatted_data
-            }
-            
-        except requests.exceptions.RequestException as e:
-            raise Exception(f'Network error: {str(e)}')
-        except Exception as e:
-            raise Exception(str(e))
+            try:
+                # Rows go to the sink batch by batch as the body downloads; a retry feeds them again
+                rows = self._get(params, ('Time Series (Daily)', ADJUSTED_BARS, sink)).get('Time Series (Daily)')
+            except UpstreamPlanError:
+                self._adjusted_refused_until = time.monotonic() + PLAN_RECHECK_SECONDS
+            else:
+                if not rows:
+                    raise NoDataError(f'No chart data for {symbol}')
+                return {'symbol': symbol, 'rows': rows, 'adjusted': True}
+        
+        params = {
+            'function': 'TIME_SERIES_DAILY',
+            'symbol': symbol,
+            'apikey': self.api_key
+        }
+        rows = self._get(params, ('Time Series (Daily)', BARS, sink)).get('Time Series (Daily)')
+        
+        if not rows:
+            raise NoDataError(f'No chart data for {symbol}')
+        
+        return {'symbol': symbol, 'rows': rows, 'adjusted': False}
+    
+    def get_intraday(self, symbol: str, interval: str = '1min', full: bool = False):
+        params = {
+            'function': 'TIME_SERIES_INTRADAY',
+            'symbol': symbol,
+            'interval': interval,
+            'outputsize': 'full' if full else 'compact',
+            'apikey': self.api_key
+        }
+        
+        series_key = f'Time Series ({interval})'
+        data = self._get(params, (series_key, BARS))
+        time_series = data.get(series_key)
+        
+        if not time_series:
+            raise NoDataError(f'No intraday data for {symbol}')
+        
+        return {
+            'symbol': symbol,
+            'interval': interval,
+            'timeZone': data.get('Meta Data', {}).get('6. Time Zone', ''),
+            'data': time_series.records('timestamp')
+        }
+    
+    def get_fx_daily(self, from_currency: str, to_currency: str):
+        params = {
+            'function': 'FX_DAILY',
+            'from_symbol': from_currency,
+            'to_symbol': to_currency,
+            'outputsize': 'full',
+            'apikey': self.api_key
+        }
+        
+        time_series = self._get(params, ('Time Series FX (Daily)', FX_BARS)).get('Time Series FX (Daily)')
+        
+        if not time_series:
+            raise NoDataError(f'No FX data for {from_currency}/{to_currency}')
+        
+        return {
+            'from': from_currency,
+            'to': to_currency,
+            'data': [
+                {'date': date, 'rate': rate}
+                for date, rate in zip(time_series.times.tolist(), time_series.columns['close'].tolist())
+            ]
+        }
     
     def search_symbols(self, keywords: str):
-        try:
-            params = {
-                'function': 'SYMBOL_SEARCH',
-                'keywords': keywords,
-                'apikey': self.api_key
-            }
-            
-            response = requests.get(self.base_url, params=params, timeout=10)
-            data = response.json()
-            
-            if 'Note' in data:
-                raise Exception('API rate limit exceeded')
-            
-            matches = data.get('bestMatches', [])
-            
-            results = []
-            for match in matches[:10]:
-                results.append({
-                    'symbol': match.get('1. symbol', ''),
-                    'name': match.get('2. name', ''),
-                    'type': match.get('3. type', ''),
-                    'region': match.get('4. region', ''),
-                    'currency': match.get('8. currency', '')
-                })
-            
-            return results
-            
-        except requests.exceptions.RequestException as e:
-            raise Exception(f'Network error: {str(e)}')
-        except Exception as e:
-            raise Exception(str(e))
\ No newline at end of file
+        params = {
+            'function': 'SYMBOL_SEARCH',
+            'keywords': keywords,
+            'apikey': self.api_key
+        }
+        
+        matches = self._get(params).get('bestMatches', [])
+        
+        return SYMBOL_SEARCH.parse_many(matches[:10])
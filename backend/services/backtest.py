@@ -0,0 +1,359 @@
+"""
+Backtesting Engine
+Rule-based strategies over stored daily bars, with vectorized positions
+and P&L; parameter sweeps fan out to a process pool
+"""
+
+import asyncio
+import itertools
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from services.adjustments import adjustment_factors
+from services.market_store import MarketStore
+
+TRADING_DAYS = 252
+MAX_SWEEP_COMBINATIONS = 500
+
+
+# ----------------------------------------------------------------------
+# Indicators
+# ----------------------------------------------------------------------
+
+def sma(values: np.ndarray, n: int) -> np.ndarray:
+    """Simple moving average; NaN for the first n - 1 values"""
+    out = np.full(len(values), np.nan)
+    if n <= len(values):
+        sums = np.cumsum(np.insert(values, 0, 0.0))
+        out[n - 1:] = (sums[n:] - sums[:-n]) / n
+    return out
+
+
+def rsi(values: np.ndarray, period: int) -> np.ndarray:
+    """
+    Wilder's RSI series
+
+    The smoothing is a recursive filter, so this loops over bars; the
+    strategies built on it stay vectorized.
+    """
+    out = np.full(len(values), np.nan)
+    if len(values) <= period:
+        return out
+    change = np.diff(values)
+    gain = np.maximum(change, 0)
+    loss = np.maximum(-change, 0)
+    avg_gain, avg_loss = gain[:period].mean(), loss[:period].mean()
+    smoothed_gain = np.empty(len(change) - period + 1)
+    smoothed_loss = np.empty_like(smoothed_gain)
+    smoothed_gain[0], smoothed_loss[0] = avg_gain, avg_loss
+    for i, (g, l) in enumerate(zip(gain[period:].tolist(), loss[period:].tolist()), start=1):
+        avg_gain = (avg_gain * (period - 1) + g) / period
+        avg_loss = (avg_loss * (period - 1) + l) / period
+        smoothed_gain[i], smoothed_loss[i] = avg_gain, avg_loss
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out[period:] = np.where(smoothed_loss == 0, 100.0, 100 - 100 / (1 + smoothed_gain / smoothed_loss))
+    return out
+
+
+def hold_between(entries: np.ndarray, exits: np.ndarray) -> np.ndarray:
+    """
+    Long position from each entry until the next exit
+
+    The last event (entry or exit) seen so far decides the position; it is
+    found with a running maximum over event indexes instead of a loop.
+    """
+    events = np.where(entries, 1.0, np.where(exits, 0.0, np.nan))
+    index = np.where(np.isnan(events), 0, np.arange(len(events)))
+    np.maximum.accumulate(index, out=index)
+    position = events[index]
+    return np.nan_to_num(position)
+
+
+# ----------------------------------------------------------------------
+# Strategies
+# ----------------------------------------------------------------------
+
+def ma_crossover(close: np.ndarray, fast: int = 20, slow: int = 50) -> np.ndarray:
+    """Long while the fast SMA is above the slow SMA"""
+    if fast >= slow:
+        raise ValueError("fast must be shorter than slow")
+    with np.errstate(invalid="ignore"):
+        return (sma(close, fast) > sma(close, slow)).astype(float)
+
+
+def rsi_reversion(close: np.ndarray, period: int = 14, lower: float = 30, upper: float = 70) -> np.ndarray:
+    """Buy when RSI drops below lower, sell when it rises above upper"""
+    if lower >= upper:
+        raise ValueError("lower must be below upper")
+    values = rsi(close, period)
+    with np.errstate(invalid="ignore"):
+        return hold_between(values < lower, values > upper)
+
+
+# name -> (function, {param: (type, min, max)})
+STRATEGIES: Dict[str, Tuple[Callable[..., np.ndarray], Dict[str, tuple]]] = {
+    "ma_crossover": (ma_crossover, {"fast": (int, 2, 250), "slow": (int, 3, 400)}),
+    "rsi_reversion": (rsi_reversion, {"period": (int, 2, 100), "lower": (float, 1, 99), "upper": (float, 1, 99)}),
+}
+
+
+def strategy_info() -> Dict[str, dict]:
+    """Strategies with their parameters, defaults and bounds"""
+    info = {}
+    for name, (function, bounds) in STRATEGIES.items():
+        defaults = dict(zip(function.__code__.co_varnames[1:function.__code__.co_argcount], function.__defaults__))
+        info[name] = {
+            "description": function.__doc__,
+            "params": {
+                param: {"type": kind.__name__, "min": low, "max": high, "default": defaults[param]}
+                for param, (kind, low, high) in bounds.items()
+            },
+        }
+    return info
+
+
+def validate_params(strategy: str, params: dict) -> dict:
+    """
+    Check and coerce strategy parameters
+
+    Raises:
+        ValueError: Unknown strategy or parameter, or out of bounds
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown strategy: {strategy} (available: {', '.join(STRATEGIES)})")
+    bounds = STRATEGIES[strategy][1]
+    clean = {}
+    for name, value in params.items():
+        if name not in bounds:
+            raise ValueError(f"Unknown parameter for {strategy}: {name}")
+        kind, low, high = bounds[name]
+        value = kind(value)
+        if not low <= value <= high:
+            raise ValueError(f"{name} must be between {low} and {high}")
+        clean[name] = value
+    return clean
+
+
+def expand_grid(strategy: str, grid: Dict[str, Sequence]) -> List[dict]:
+    """
+    Cartesian product of parameter values
+
+    Raises:
+        ValueError: Invalid values, or more than MAX_SWEEP_COMBINATIONS
+    """
+    names = sorted(grid)
+    count = int(np.prod([len(grid[name]) for name in names])) if names else 1
+    if count > MAX_SWEEP_COMBINATIONS:
+        raise ValueError(f"Sweep has {count} combinations (max {MAX_SWEEP_COMBINATIONS})")
+    return [
+        validate_params(strategy, dict(zip(names, values)))
+        for values in itertools.product(*(grid[name] for name in names))
+    ]
+
+
+# ----------------------------------------------------------------------
+# Engine
+# ----------------------------------------------------------------------
+
+def simulate(close: np.ndarray, position: np.ndarray, cost: float = 0.0005) -> Dict[str, np.ndarray]:
+    """
+    Daily strategy returns for a target position series
+
+    A position decided on a bar's close is held from the next bar on, so
+    there is no look-ahead. Each change of position pays `cost` (fraction
+    of the traded value).
+    """
+    returns = np.zeros(len(close))
+    returns[1:] = close[1:] / close[:-1] - 1
+    held = np.zeros(len(close))
+    held[1:] = position[:-1]
+    turnover = np.abs(np.diff(held, prepend=0.0))
+    strategy_returns = held * returns - turnover * cost
+    equity = np.cumprod(1 + strategy_returns)
+    drawdown = equity / np.maximum.accumulate(equity) - 1
+    return {"returns": strategy_returns, "held": held, "equity": equity, "drawdown": drawdown}
+
+
+def summarize(result: Dict[str, np.ndarray], close: np.ndarray) -> dict:
+    """Performance statistics of a simulate() result"""
+    returns = result["returns"][1:]
+    equity = result["equity"]
+    years = max(len(returns), 1) / TRADING_DAYS
+    std = returns.std(ddof=1) if len(returns) > 1 else 0.0
+    entries = np.flatnonzero(np.diff(result["held"], prepend=0.0) > 0)
+    return {
+        "totalReturn": float(equity[-1] - 1),
+        "cagr": float(equity[-1] ** (1 / years) - 1) if equity[-1] > 0 else -1.0,
+        "volatility": float(std * np.sqrt(TRADING_DAYS)),
+        "sharpe": float(returns.mean() / std * np.sqrt(TRADING_DAYS)) if std > 0 else None,
+        "maxDrawdown": float(result["drawdown"].min()),
+        "exposure": float(result["held"].mean()),
+        "trades": int(len(entries)),
+        "buyAndHoldReturn": float(close[-1] / close[0] - 1),
+    }
+
+
+def list_trades(dates: np.ndarray, close: np.ndarray, held: np.ndarray) -> List[dict]:
+    """Round trips: entered at the close before the first held bar, exited at the close before the first flat one"""
+    change = np.diff(held, prepend=0.0)
+    entries = np.flatnonzero(change > 0) - 1
+    exits = np.flatnonzero(change < 0) - 1
+    trades = []
+    for i, entry in enumerate(entries.tolist()):
+        exit_ = exits[i] if i < len(exits) else None
+        exit_price = float(close[exit_]) if exit_ is not None else float(close[-1])
+        trades.append({
+            "entryDate": str(dates[entry]),
+            "entryPrice": float(close[entry]),
+            "exitDate": str(dates[exit_]) if exit_ is not None else None,
+            "exitPrice": exit_price,
+            "return": exit_price / float(close[entry]) - 1,
+        })
+    return trades
+
+
+def run_backtest(dates: np.ndarray, close: np.ndarray, strategy: str, params: dict,
+                 cost: float = 0.0005, initial: float = 10000.0) -> dict:
+    """
+    Full backtest of one parameter set
+
+    Returns:
+        Params, statistics, trades and the equity / drawdown curve
+    """
+    function = STRATEGIES[strategy][0]
+    result = simulate(close, function(close, **params), cost)
+    return {
+        "strategy": strategy,
+        "params": params,
+        "start": str(dates[0]),
+        "end": str(dates[-1]),
+        "bars": int(len(close)),
+        "metrics": summarize(result, close),
+        "trades": list_trades(dates, close, result["held"]),
+        "curve": {
+            "dates": dates.astype(str).tolist(),
+            "equity": (result["equity"] * initial).tolist(),
+            "drawdown": result["drawdown"].tolist(),
+        },
+    }
+
+
+def run_sweep(close: np.ndarray, strategy: str, combinations: Sequence[dict], cost: float = 0.0005) -> List[dict]:
+    """
+    Statistics for many parameter sets (runs in a worker process)
+
+    Returns:
+        One {"params", "metrics"} per combination, in order
+    """
+    function = STRATEGIES[strategy][0]
+    results = []
+    for params in combinations:
+        try:
+            metrics: Optional[dict] = summarize(simulate(close, function(close, **params), cost), close)
+            error = None
+        except ValueError as e:
+            metrics, error = None, str(e)
+        results.append({"params": params, "metrics": metrics, "error": error})
+    return results
+
+
+# ----------------------------------------------------------------------
+# Service
+# ----------------------------------------------------------------------
+
+class BacktestService:
+    """
+    Loads bars from the MarketStore and runs backtests
+
+    Single backtests run in the caller's thread (they take milliseconds).
+    Sweeps big enough to amortize inter-process overhead (combinations x
+    bars >= min_parallel_work) are split into one chunk per process; the
+    pool uses the spawn start method, since forking a threaded server
+    process is unsafe, and is only created on the first such sweep.
+    """
+
+    def __init__(self, store: MarketStore, max_workers: int = 2, min_parallel_work: int = 250_000):
+        self.store = store
+        self.max_workers = max_workers
+        self.min_parallel_work = min_parallel_work
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._pool
+
+    def load(self, symbol: str, start: Optional[str] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Stored daily closes of a symbol, adjusted for splits and dividends
+
+        Raises:
+            ValueError: Fewer than 30 bars
+        """
+        bars = self.store.get_bars(symbol)
+        dates = np.array([bar["date"] for bar in bars], dtype="datetime64[D]")
+        close = np.array([bar["close"] for bar in bars], dtype=float)
+        close = close * adjustment_factors(dates, close, self.store.get_actions(symbol))
+        if start:
+            first = np.searchsorted(dates, np.datetime64(start, "D"))
+            dates, close = dates[first:], close[first:]
+        if len(close) < 30:
+            raise ValueError(f"Not enough stored history for {symbol} ({len(close)} bars)")
+        return dates, close
+
+    def backtest(self, symbol: str, strategy: str, params: dict, start: Optional[str] = None,
+                 cost: float = 0.0005, initial: float = 10000.0) -> dict:
+        """Blocking; see run_backtest()"""
+        params = validate_params(strategy, params)
+        dates, close = self.load(symbol, start)
+        return {"symbol": symbol, **run_backtest(dates, close, strategy, params, cost, initial)}
+
+    async def sweep(self, symbol: str, strategy: str, grid: Dict[str, Sequence], start: Optional[str] = None,
+                    cost: float = 0.0005, sort_by: str = "sharpe", top: int = 20) -> dict:
+        """
+        Run every combination of a parameter grid
+
+        Returns:
+            The `top` parameter sets by `sort_by`, best first
+        """
+        combinations = expand_grid(strategy, grid)
+        loop = asyncio.get_running_loop()
+        dates, close = await loop.run_in_executor(None, self.load, symbol, start)
+
+        if len(combinations) * len(close) < self.min_parallel_work or self.max_workers <= 1:
+            results = await loop.run_in_executor(None, run_sweep, close, strategy, combinations, cost)
+        else:
+            size = -(-len(combinations) // self.max_workers)
+            chunks = [combinations[i:i + size] for i in range(0, len(combinations), size)]
+            parts = await asyncio.gather(*(
+                loop.run_in_executor(self.pool, run_sweep, close, strategy, chunk, cost) for chunk in chunks
+            ))
+            results = [result for part in parts for result in part]
+
+        def key(result):
+            value = (result["metrics"] or {}).get(sort_by)
+            return (value is None, -(value or 0.0))
+        results.sort(key=key)
+        return {
+            "symbol": symbol,
+            "strategy": strategy,
+            "start": str(dates[0]),
+            "end": str(dates[-1]),
+            "bars": int(len(close)),
+            "combinations": len(combinations),
+            "sortBy": sort_by,
+            "results": results[:top],
+        }
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
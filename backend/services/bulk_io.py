@@ -0,0 +1,297 @@
+"""
+Bulk Market Data I/O
+Streaming import and export of daily OHLCV between files and the MarketStore
+
+Formats:
+    csv       One row per bar. Header names are matched case-insensitively
+              (symbol/ticker, date/timestamp, open, high, low, close,
+              volume); files without a symbol column need one passed in.
+    columnar  A directory holding one little-endian binary file per column
+              plus meta.json (dtypes, row count, symbol table). Symbols are
+              stored as uint32 codes and dates as int32 days since 1970,
+              48 bytes per bar. Readers memory-map the columns, so
+              any file size loads in bounded memory.
+    parquet   Read only, if pyarrow is installed.
+
+Every format is parsed in chunks, and each chunk is written in one
+transaction.
+"""
+
+import csv
+import io
+import json
+import os
+import time
+from typing import IO, Dict, Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from services.market_store import MarketStore
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # parquet support is optional
+    pq = None
+
+DEFAULT_CHUNK_SIZE = 50_000
+
+COLUMNAR_FORMAT = "markstro-bars"
+COLUMNAR_VERSION = 1
+COLUMNAR_DTYPES = {
+    "symbol": "<u4",
+    "date": "<i4",
+    "open": "<f8",
+    "high": "<f8",
+    "low": "<f8",
+    "close": "<f8",
+    "volume": "<i8",
+}
+
+_HEADER_ALIASES = {
+    "symbol": "symbol", "ticker": "symbol",
+    "date": "date", "timestamp": "date", "day": "date",
+    "open": "open", "high": "high", "low": "low", "close": "close",
+    "volume": "volume",
+}
+_PRICE_COLUMNS = ("open", "high", "low", "close")
+
+
+def detect_format(path: str) -> str:
+    """Format name from a path (directories are columnar)"""
+    if os.path.isdir(path):
+        return "columnar"
+    extension = os.path.splitext(path)[1].lower()
+    if extension in (".parquet", ".pq"):
+        return "parquet"
+    return "csv"
+
+
+# ----------------------------------------------------------------------
+# Readers: each yields chunks of (symbol, date, open, high, low, close, volume)
+# ----------------------------------------------------------------------
+
+def read_csv_chunks(file: IO[str], symbol: Optional[str] = None,
+                    chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[List[tuple]]:
+    """
+    Parse a CSV stream in chunks
+
+    Args:
+        file: Text stream
+        symbol: Symbol of every row, for files without a symbol column
+        chunk_size: Rows per chunk
+
+    Raises:
+        ValueError: Missing columns or a malformed row (with its line number)
+    """
+    reader = csv.reader(file)
+    header = next(reader, None)
+    if header is None:
+        return
+    positions: Dict[str, int] = {}
+    for i, name in enumerate(header):
+        column = _HEADER_ALIASES.get(name.strip().lower())
+        if column is not None and column not in positions:
+            positions[column] = i
+    required = ["date", *_PRICE_COLUMNS, "volume"] + ([] if symbol else ["symbol"])
+    missing = [name for name in required if name not in positions]
+    if missing:
+        raise ValueError(f"CSV is missing columns: {', '.join(missing)}")
+
+    date_at = positions["date"]
+    open_at, high_at, low_at, close_at = (positions[name] for name in _PRICE_COLUMNS)
+    volume_at = positions["volume"]
+    symbol_at = positions.get("symbol")
+    fixed_symbol = symbol.upper() if symbol else None
+
+    chunk: List[tuple] = []
+    for line, row in enumerate(reader, start=2):
+        if not row:
+            continue
+        try:
+            chunk.append((
+                fixed_symbol or row[symbol_at].strip().upper(),
+                row[date_at].strip()[:10],
+                float(row[open_at]), float(row[high_at]), float(row[low_at]), float(row[close_at]),
+                int(float(row[volume_at] or 0)),
+            ))
+        except (ValueError, IndexError) as e:
+            raise ValueError(f"Line {line}: {e}")
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def read_columnar_chunks(directory: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[List[tuple]]:
+    """
+    Read a columnar export in chunks (columns are memory-mapped)
+
+    Raises:
+        ValueError: Not a columnar export, or an unsupported version
+    """
+    with open(os.path.join(directory, "meta.json")) as f:
+        meta = json.load(f)
+    if meta.get("format") != COLUMNAR_FORMAT or meta.get("version") != COLUMNAR_VERSION:
+        raise ValueError(f"{directory} is not a {COLUMNAR_FORMAT} v{COLUMNAR_VERSION} export")
+    rows = meta["rows"]
+    if rows == 0:
+        return
+    symbols = np.array(meta["symbols"], dtype=object)
+    columns = {
+        name: np.memmap(os.path.join(directory, f"{name}.bin"), dtype=dtype, mode="r", shape=(rows,))
+        for name, dtype in meta["columns"].items()
+    }
+    for start in range(0, rows, chunk_size):
+        part = slice(start, start + chunk_size)
+        dates = np.datetime_as_string(columns["date"][part].astype("datetime64[D]"))
+        yield list(zip(
+            symbols[columns["symbol"][part]].tolist(),
+            dates.tolist(),
+            *(columns[name][part].tolist() for name in (*_PRICE_COLUMNS, "volume")),
+        ))
+
+
+def read_parquet_chunks(path: str, symbol: Optional[str] = None,
+                        chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[List[tuple]]:
+    """
+    Read a Parquet file in record batches
+
+    Raises:
+        ValueError: pyarrow is not installed, or columns are missing
+    """
+    if pq is None:
+        raise ValueError("Parquet import needs pyarrow (pip install pyarrow)")
+    parquet = pq.ParquetFile(path)
+    names = {_HEADER_ALIASES.get(name.lower()): name for name in parquet.schema_arrow.names}
+    wanted = ["date", *_PRICE_COLUMNS, "volume"] + ([] if symbol else ["symbol"])
+    missing = [name for name in wanted if name not in names]
+    if missing:
+        raise ValueError(f"Parquet file is missing columns: {', '.join(missing)}")
+    for batch in parquet.iter_batches(batch_size=chunk_size, columns=[names[name] for name in wanted]):
+        data = {name: batch.column(i).to_pylist() for i, name in enumerate(wanted)}
+        symbols = [symbol.upper()] * batch.num_rows if symbol else [s.upper() for s in data["symbol"]]
+        dates = [str(d)[:10] for d in data["date"]]
+        yield list(zip(
+            symbols, dates,
+            *([float(v) for v in data[name]] for name in _PRICE_COLUMNS),
+            (int(v or 0) for v in data["volume"]),
+        ))
+
+
+def import_chunks(store: MarketStore, chunks: Iterable[List[tuple]]) -> dict:
+    """
+    Write parsed chunks to the store, one transaction per chunk
+
+    Returns:
+        {"rows", "symbols", "seconds"}
+    """
+    started = time.perf_counter()
+    rows = 0
+    symbols = set()
+    for chunk in chunks:
+        rows += store.bulk_upsert_bars(chunk)
+        symbols.update(row[0] for row in chunk)
+    return {"rows": rows, "symbols": len(symbols), "seconds": round(time.perf_counter() - started, 3)}
+
+
+def import_path(store: MarketStore, path: str, fmt: Optional[str] = None, symbol: Optional[str] = None,
+                chunk_size: int = DEFAULT_CHUNK_SIZE) -> dict:
+    """
+    Import a CSV file, Parquet file or columnar directory
+
+    Args:
+        store: Destination
+        path: Source path
+        fmt: csv, parquet or columnar (default: from the path)
+        symbol: Symbol for files without a symbol column
+        chunk_size: Rows per transaction
+
+    Returns:
+        Import statistics
+    """
+    fmt = fmt or detect_format(path)
+    if fmt == "columnar":
+        return import_chunks(store, read_columnar_chunks(path, chunk_size))
+    if fmt == "parquet":
+        return import_chunks(store, read_parquet_chunks(path, symbol, chunk_size))
+    if fmt == "csv":
+        if symbol is None and not _has_symbol_column(path):
+            # AAPL.csv -> AAPL
+            symbol = os.path.splitext(os.path.basename(path))[0]
+        with open(path, newline="") as f:
+            return import_chunks(store, read_csv_chunks(f, symbol, chunk_size))
+    raise ValueError(f"Unknown format: {fmt}")
+
+
+def _has_symbol_column(path: str) -> bool:
+    with open(path, newline="") as f:
+        header = next(csv.reader(f), [])
+    return any(_HEADER_ALIASES.get(name.strip().lower()) == "symbol" for name in header)
+
+
+# ----------------------------------------------------------------------
+# Writers
+# ----------------------------------------------------------------------
+
+def iter_csv(store: MarketStore, symbols: Optional[Sequence[str]] = None, start: Optional[str] = None,
+             end: Optional[str] = None, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[str]:
+    """
+    Export bars as CSV text, one chunk at a time
+
+    Yields:
+        CSV text (the first chunk starts with the header)
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(["symbol", "date", "open", "high", "low", "close", "volume"])
+    for chunk in store.iter_bars(symbols, start, end, chunk_size):
+        writer.writerows(chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def export_columnar(store: MarketStore, directory: str, symbols: Optional[Sequence[str]] = None,
+                    start: Optional[str] = None, end: Optional[str] = None,
+                    chunk_size: int = DEFAULT_CHUNK_SIZE) -> dict:
+    """
+    Export bars to a columnar directory, appending chunk by chunk
+
+    Returns:
+        {"rows", "symbols", "bytes", "seconds"}
+    """
+    started = time.perf_counter()
+    os.makedirs(directory, exist_ok=True)
+    codes: Dict[str, int] = {}
+    files = {name: open(os.path.join(directory, f"{name}.bin"), "wb") for name in COLUMNAR_DTYPES}
+    rows = 0
+    try:
+        for chunk in store.iter_bars(symbols, start, end, chunk_size):
+            symbol_col, date_col, *values = zip(*chunk)
+            columns = {
+                "symbol": np.array([codes.setdefault(s, len(codes)) for s in symbol_col], dtype="<u4"),
+                "date": np.array(date_col, dtype="datetime64[D]").astype("<i4"),
+            }
+            for name, column in zip((*_PRICE_COLUMNS, "volume"), values):
+                columns[name] = np.array(column, dtype=COLUMNAR_DTYPES[name])
+            for name, column in columns.items():
+                column.tofile(files[name])
+            rows += len(chunk)
+    finally:
+        for f in files.values():
+            f.close()
+
+    meta = {
+        "format": COLUMNAR_FORMAT,
+        "version": COLUMNAR_VERSION,
+        "rows": rows,
+        "columns": COLUMNAR_DTYPES,
+        "symbols": list(codes),
+    }
+    with open(os.path.join(directory, "meta.json"), "w") as f:
+        json.dump(meta, f)
+    size = sum(os.path.getsize(os.path.join(directory, f"{name}.bin")) for name in COLUMNAR_DTYPES)
+    return {"rows": rows, "symbols": len(codes), "bytes": size, "seconds": round(time.perf_counter() - started, 3)}
@@ -0,0 +1,300 @@
+"""
+In-Process Cache
+TTL + LRU cache with single-flight loading, shared by all requests of a worker,
+optionally backed by a shared L2 store (see services.shared_cache)
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple, Type
+
+from starlette.concurrency import run_in_threadpool
+
+from http_cache import STALE_POLICY, PreparedBody
+from metrics import CACHE_EVICTIONS, CACHE_REQUESTS
+from responses import loads
+from services.shared_cache import SharedStore, decode_key, encode_key
+
+logger = logging.getLogger(__name__)
+
+
+class Fallback:
+    """
+    Loader result from a fallback source (e.g. stored data while the vendor
+    is slow or down): cached briefly and always served as stale
+    """
+
+    __slots__ = ("value",)
+
+    def __init__(self, value: Any):
+        self.value = value
+
+
+class CacheEntry:
+    """Cached value plus its lazily serialized JSON body"""
+
+    __slots__ = ("value", "stored_at", "expires_at", "fallback", "_prepared")
+
+    def __init__(self, value: Any, ttl: float, prepared: Optional[PreparedBody] = None, fallback: bool = False):
+        self.value = value
+        self.stored_at = time.time()
+        self.expires_at = self.stored_at + ttl
+        # Came from a fallback source: stale even before it expires
+        self.fallback = fallback
+        self._prepared = prepared
+
+    @property
+    def fresh(self) -> bool:
+        return time.time() < self.expires_at
+
+    @property
+    def stale(self) -> bool:
+        return self.fallback or not self.fresh
+
+    def prepared(self) -> PreparedBody:
+        """
+        Serialized body and ETag of the value, computed once per entry
+
+        Returns:
+            PreparedBody
+        """
+        if self._prepared is None:
+            self._prepared = PreparedBody.from_content(self.value)
+        return self._prepared
+
+
+class TTLCache:
+    """
+    Bounded TTL cache with LRU eviction
+
+    get_or_load() coalesces concurrent misses for the same key, so a burst
+    of requests for one symbol results in a single upstream call; callers
+    that are cancelled leave the load running for the others. Expired
+    entries are kept for another `stale_ttl` seconds; if reloading fails
+    with one of `stale_on`, the stale entry is served instead.
+
+    A loader may return a Fallback: its value is kept for `fallback_ttl`
+    seconds (the stale HTTP policy's max-age), flagged stale, and not
+    written to the shared store.
+
+    With a `shared` store the cache has two tiers: misses are looked up in
+    the shared L2 (filled by any worker) before calling the loader, loaded
+    values are written to it as serialized JSON, and invalidations are
+    published so other workers drop their L1 copies (see
+    apply_invalidation()).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        ttl: float,
+        max_entries: int = 1024,
+        stale_ttl: float = 0.0,
+        stale_on: Tuple[Type[BaseException], ...] = (),
+        shared: Optional[SharedStore] = None,
+        fallback_ttl: float = float(STALE_POLICY.max_age),
+    ):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stale_ttl = stale_ttl
+        self.stale_on = stale_on
+        self.shared = shared
+        self.fallback_ttl = fallback_ttl
+        self._entries: "OrderedDict[Hashable, CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[CacheEntry]:
+        """
+        Get a fresh entry
+
+        Args:
+            key: Cache key
+
+        Returns:
+            CacheEntry, or None if missing or expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or not entry.fresh:
+                CACHE_REQUESTS.inc(self.name, "miss")
+                return None
+            self._entries.move_to_end(key)
+        CACHE_REQUESTS.inc(self.name, "hit")
+        return entry
+
+    def get_stale(self, key: Hashable) -> Optional[CacheEntry]:
+        """
+        Get an entry even if expired, as long as it is inside the stale window
+
+        Args:
+            key: Cache key
+
+        Returns:
+            CacheEntry, or None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None or time.time() >= entry.expires_at + self.stale_ttl:
+            return None
+        return entry
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> CacheEntry:
+        """
+        Store a value
+
+        Args:
+            key: Cache key
+            value: Value to cache
+            ttl: Seconds to keep it (defaults to the cache TTL)
+
+        Returns:
+            The new CacheEntry
+        """
+        return self._insert(key, CacheEntry(value, self.ttl if ttl is None else ttl))
+
+    def _insert(self, key: Hashable, entry: CacheEntry) -> CacheEntry:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                CACHE_EVICTIONS.inc(self.name, "lru")
+        return entry
+
+    def _shared_key(self, key: Hashable) -> str:
+        return f"{self.name}:{encode_key(key)}"
+
+    def invalidate(self, key: Hashable) -> None:
+        """Drop one key, in every worker when a shared store is configured"""
+        with self._lock:
+            self._entries.pop(key, None)
+        if self.shared is not None:
+            self.shared.delete(self._shared_key(key))
+            self.shared.publish_invalidation(self.name, encode_key(key))
+
+    def clear(self) -> None:
+        """Drop everything, in every worker when a shared store is configured"""
+        with self._lock:
+            self._entries.clear()
+        if self.shared is not None:
+            self.shared.delete_prefix(f"{self.name}:")
+            self.shared.publish_invalidation(self.name, None)
+
+    def apply_invalidation(self, encoded_key: Optional[str]) -> None:
+        """
+        Drop L1 entries invalidated by another worker
+
+        Args:
+            encoded_key: Key as published, or None for everything
+        """
+        with self._lock:
+            if encoded_key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(decode_key(encoded_key), None)
+
+    def _call_loader(self, key: Hashable, loader: Callable[[], Any], ttl: Optional[float]) -> CacheEntry:
+        value = loader()
+        if isinstance(value, Fallback):
+            CACHE_REQUESTS.inc(self.name, "fallback")
+            return self._insert(key, CacheEntry(value.value, self.fallback_ttl, fallback=True))
+        return self.set(key, value, ttl)
+
+    def _load(self, key: Hashable, loader: Callable[[], Any], ttl: Optional[float]) -> CacheEntry:
+        """Blocking miss path: shared L2 first, then the loader"""
+        if self.shared is None:
+            return self._call_loader(key, loader, ttl)
+
+        shared_key = self._shared_key(key)
+        try:
+            found = self.shared.get(shared_key)
+        except Exception:
+            logger.warning("Shared cache read failed for %s", shared_key, exc_info=True)
+            found = None
+        if found is not None and found[1] > time.time():
+            body, expires_at = found
+            CACHE_REQUESTS.inc(self.name, "shared_hit")
+            entry = CacheEntry(loads(body), expires_at - time.time(), PreparedBody(body))
+            return self._insert(key, entry)
+
+        entry = self._call_loader(key, loader, ttl)
+        if entry.fallback:
+            return entry
+        try:
+            self.shared.set(
+                shared_key, entry.prepared().body, entry.expires_at, entry.expires_at + self.stale_ttl
+            )
+        except Exception:
+            logger.warning("Shared cache write failed for %s", shared_key, exc_info=True)
+        return entry
+
+    def purge_expired(self) -> int:
+        """
+        Remove entries that are past their stale window
+
+        Returns:
+            Number of entries removed
+        """
+        cutoff = time.time() - self.stale_ttl
+        with self._lock:
+            expired = [key for key, entry in self._entries.items() if entry.expires_at <= cutoff]
+            for key in expired:
+                del self._entries[key]
+        if expired:
+            CACHE_EVICTIONS.inc(self.name, "expired", amount=len(expired))
+        return len(expired)
+
+    async def get_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Any],
+        ttl: Optional[float] = None,
+    ) -> CacheEntry:
+        """
+        Get a fresh entry, calling loader (in the threadpool) on a miss
+
+        Args:
+            key: Cache key
+            loader: Blocking function producing the value
+            ttl: Seconds to keep the loaded value
+
+        Returns:
+            CacheEntry (check .stale when stale_on is configured)
+        """
+        entry = self.get(key)
+        if entry is not None:
+            return entry
+
+        pending = self._inflight.get(key)
+        if pending is None:
+            # The load runs in its own task: a caller that goes away (e.g. a
+            # client disconnect) stops waiting without cancelling it for the others
+            pending = asyncio.ensure_future(self._fill(key, loader, ttl))
+            self._inflight[key] = pending
+            pending.add_done_callback(lambda task: self._fill_done(key, task))
+        return await asyncio.shield(pending)
+
+    async def _fill(self, key: Hashable, loader: Callable[[], Any], ttl: Optional[float]) -> CacheEntry:
+        try:
+            return await run_in_threadpool(self._load, key, loader, ttl)
+        except Exception as exc:
+            stale = self.get_stale(key) if isinstance(exc, self.stale_on) else None
+            if stale is None:
+                raise
+            CACHE_REQUESTS.inc(self.name, "stale")
+            return stale
+
+    def _fill_done(self, key: Hashable, task: "asyncio.Task") -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Retrieved here, so a load every caller gave up on doesn't log "never retrieved"
+            task.exception()
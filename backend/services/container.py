@@ -0,0 +1,473 @@
+"""
+Service Container
+One instance per worker, created in the FastAPI lifespan and injected
+into routers through get_services()
+"""
+
+import asyncio
+import logging
+import os
+from functools import cached_property
+from typing import Callable, Coroutine, Dict, List, Sequence, Tuple
+
+import requests
+from fastapi import Request
+from requests.adapters import HTTPAdapter
+from starlette.concurrency import run_in_threadpool
+
+from http_cache import PreparedBody
+from metrics import monitor_event_loop_lag
+from services.alerts import AlertEngine
+from services.alphavantage import AlphaVantageService
+from services.backtest import BacktestService
+from services.cache import CacheEntry, TTLCache
+from services.database import DEFAULT_DB_PATH, Database
+from services.errors import UpstreamError
+from services.fx import FXService
+from services.history import HistoryService
+from services.intraday import IntradayService
+from services.leader import DEFAULT_LOCK_PATH, LeaderLock
+from services.market_calendar import MarketCalendar, RefreshSchedule
+from services.market_store import DEFAULT_MARKET_DB_PATH, MarketStore
+from services.newsapi import NewsAPIService
+from services.portfolio import PortfolioService
+from services.providers.base import MarketDataProvider
+from services.providers.local import LocalMarketDataProvider
+from services.providers.router import ProviderRouter
+from services.quote_feed import QuoteFeed
+from services.quote_snapshot import QuoteSnapshotStore
+from services.rate_limit import SharedTokenBucket, TokenBucket
+from services.resilience import CircuitBreaker, RetryPolicy
+from services.returns import ReturnsService
+from services.screener import ScreenerService
+from services.shared_cache import shared_store_from_url
+from settings import load_env
+
+load_env()
+
+logger = logging.getLogger(__name__)
+
+
+class ServiceContainer:
+    """
+    Owns the shared resources of one worker process
+
+    Upstream clients, caches and the database pool are built on first
+    access (cached_property), so lazy mode only pays for what a request
+    actually touches. start() warms them eagerly for long-running servers;
+    close() cancels background tasks and releases connections.
+
+    With several workers (gunicorn.conf.py), per-worker tasks use spawn()
+    while host-wide jobs use spawn_singleton(), which only runs them in the
+    worker holding the leader lock.
+    """
+
+    def __init__(self):
+        # L2 shared with the other workers (SHARED_CACHE_URL), if configured
+        self.shared = shared_store_from_url(os.getenv("SHARED_CACHE_URL"))
+        # Expired entries stay around as a fallback while a provider is down
+        options = {"stale_on": (UpstreamError,), "shared": self.shared}
+        self.quote_cache = TTLCache("quote", 60, 2048, stale_ttl=3600, **options)
+        self.series_cache = TTLCache("series", 3600, 512, stale_ttl=7 * 86400, **options)
+        self.search_cache = TTLCache("search", 86400, 1024, stale_ttl=7 * 86400, **options)
+        self.news_cache = TTLCache("news", 300, 256, stale_ttl=6 * 3600, **options)
+        # Computed from local data; keys carry the data version, so no L2
+        self.analytics_cache = TTLCache("analytics", 3600, 256)
+        # Exchange sessions: quotes of closed markets are cached until the next open
+        self.calendar = MarketCalendar.default(os.getenv("MARKET_HOLIDAYS_PATH"))
+        # Latest quote per symbol with versions and shared serialized bodies;
+        # with an L2, quote cursors are valid on every worker
+        self.quotes = QuoteSnapshotStore(shared=self.shared)
+        self.quote_feed = QuoteFeed(self.quotes)
+        # Gates intraday refreshes; the bars themselves live in self.intraday,
+        # which is per worker, so no L2 either
+        self.intraday_cache = TTLCache("intraday", 60, 4096, stale_ttl=86400, stale_on=(UpstreamError,))
+        self.breakers: Dict[str, CircuitBreaker] = {
+            "alphavantage": CircuitBreaker("alphavantage"),
+            "newsapi": CircuitBreaker("newsapi"),
+        }
+        self.retry = RetryPolicy(
+            attempts=int(os.getenv("UPSTREAM_RETRY_ATTEMPTS", "3")),
+            deadline=float(os.getenv("UPSTREAM_RETRY_DEADLINE", "8")),
+        )
+        self.background_tasks: List[asyncio.Task] = []
+        self.leader = LeaderLock(os.getenv("LEADER_LOCK_PATH", DEFAULT_LOCK_PATH))
+        self._singletons: List[Callable[[], Coroutine]] = []
+
+    # ------------------------------------------------------------------
+    # Shared resources
+    # ------------------------------------------------------------------
+
+    @cached_property
+    def http(self) -> requests.Session:
+        """Pooled HTTP session shared by all upstream clients"""
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    @cached_property
+    def alphavantage_limiter(self) -> TokenBucket:
+        """Alpha Vantage quota (free tier: 5 requests per minute)"""
+        per_minute = float(os.getenv("ALPHA_VANTAGE_RATE_PER_MIN", "5"))
+        if self.shared is not None:
+            # One quota for all workers, not one per worker
+            return SharedTokenBucket(self.shared, per_minute / 60.0, per_minute, name="alphavantage")
+        return TokenBucket(rate=per_minute / 60.0, capacity=per_minute, name="alphavantage")
+
+    @cached_property
+    def alphavantage(self) -> AlphaVantageService:
+        return AlphaVantageService(
+            session=self.http,
+            limiter=self.alphavantage_limiter,
+            breaker=self.breakers["alphavantage"],
+            retry=self.retry,
+        )
+
+    @cached_property
+    def market_store(self) -> MarketStore:
+        return MarketStore(os.getenv("MARKET_DB_PATH", DEFAULT_MARKET_DB_PATH))
+
+    @cached_property
+    def market_data(self) -> ProviderRouter:
+        """
+        Quote / series / search source used by the stock routes
+
+        MARKET_PROVIDERS lists the providers to route between
+        (default "alphavantage,local"); QUOTE_HEDGING=0 disables hedging.
+        """
+        available = {
+            "alphavantage": lambda: self.alphavantage,
+            "local": lambda: LocalMarketDataProvider(self.market_store),
+        }
+        names = [n.strip() for n in os.getenv("MARKET_PROVIDERS", "alphavantage,local").split(",") if n.strip()]
+        providers: List[MarketDataProvider] = [available[name]() for name in names]
+        return ProviderRouter(
+            providers,
+            hedge_quotes=os.getenv("QUOTE_HEDGING", "1") == "1",
+            store=self.market_store if "local" in names else None,
+        )
+
+    @cached_property
+    def screener(self) -> ScreenerService:
+        return ScreenerService(self.market_store)
+
+    @cached_property
+    def intraday(self) -> IntradayService:
+        return IntradayService(self.market_data)
+
+    @cached_property
+    def newsapi(self) -> NewsAPIService:
+        return NewsAPIService(session=self.http, breaker=self.breakers["newsapi"], retry=self.retry)
+
+    @cached_property
+    def database(self) -> Database:
+        return Database(os.getenv("USERS_DB_PATH", DEFAULT_DB_PATH))
+
+    @cached_property
+    def alerts(self) -> AlertEngine:
+        """Price alerts; the index is loaded on first use (ensure_loaded)"""
+        return AlertEngine(self.database)
+
+    @cached_property
+    def returns(self) -> ReturnsService:
+        return ReturnsService(self.market_store)
+
+    @cached_property
+    def backtests(self) -> BacktestService:
+        workers = int(os.getenv("BACKTEST_WORKERS", str(min(4, os.cpu_count() or 1))))
+        return BacktestService(self.market_store, max_workers=workers)
+
+    @cached_property
+    def portfolios(self) -> PortfolioService:
+        return PortfolioService(self.database, self.market_store, self.quotes, fx=self.fx)
+
+    @cached_property
+    def fx(self) -> FXService:
+        """Currency conversion with daily rates from the market data providers"""
+        return FXService(self.market_data, self.calendar)
+
+    @cached_property
+    def history(self) -> HistoryService:
+        """Full daily history per symbol, downloaded once into the market store"""
+        return HistoryService(self.market_data, self.market_store, self.calendar)
+
+    @property
+    def caches(self) -> List[TTLCache]:
+        return [
+            self.quote_cache, self.series_cache, self.search_cache, self.news_cache,
+            self.analytics_cache, self.intraday_cache,
+        ]
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def spawn(self, coro: Coroutine) -> asyncio.Task:
+        """
+        Run a coroutine as a background task owned by the container
+
+        Args:
+            coro: Coroutine to run until shutdown
+
+        Returns:
+            The created task
+        """
+        task = asyncio.create_task(coro)
+        self.background_tasks.append(task)
+        return task
+
+    def spawn_singleton(self, factory: Callable[[], Coroutine]) -> None:
+        """
+        Run a background job in one worker per host only
+
+        Args:
+            factory: Returns the coroutine to run; called again in whichever
+                worker takes over leadership
+        """
+        self._singletons.append(factory)
+        if self.leader.is_leader:
+            self.spawn(factory())
+
+    async def start(self, warm: bool = True) -> None:
+        """
+        Start background tasks and optionally warm shared resources
+
+        Args:
+            warm: Build clients/pools now instead of on first use
+        """
+        if warm:
+            self.http
+            self.market_data
+            self.newsapi
+            self.database.init_schema()
+            await run_in_threadpool(self.alerts.ensure_loaded)
+            # The first snapshot reads every symbol's history; don't block startup on it
+            self.spawn(run_in_threadpool(self.screener.refresh))
+        self.spawn(self._purge_expired_loop())
+        self.spawn(monitor_event_loop_lag())
+        self.spawn(self._sync_alerts_loop())
+        self.spawn(self._compact_intraday_loop())
+        self.spawn(self._quote_feed_loop())
+        self.spawn_singleton(self._poll_alerts_loop)
+        self.spawn(self._leader_loop())
+        if self.shared is not None:
+            self.spawn_singleton(self._purge_shared_loop)
+            # Read the position before serving, so no invalidation is missed
+            seq, _ = await run_in_threadpool(self.shared.invalidations_since, None)
+            self.spawn(self._sync_invalidations_loop(seq))
+            self.spawn(self._sync_quotes_loop())
+
+    async def close(self) -> None:
+        """Cancel background tasks and close connections"""
+        for task in self.background_tasks:
+            task.cancel()
+        await asyncio.gather(*self.background_tasks, return_exceptions=True)
+        self.background_tasks.clear()
+        self.leader.release()
+
+        if "backtests" in self.__dict__:
+            self.backtests.close()
+        if "market_data" in self.__dict__:
+            self.market_data.close()
+        if "market_store" in self.__dict__:
+            self.market_store.close()
+        if "http" in self.__dict__:
+            self.http.close()
+        if self.shared is not None:
+            self.shared.close()
+        if "database" in self.__dict__:
+            self.database.close()
+
+    async def _purge_expired_loop(self, interval: float = 60.0) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            for cache in self.caches:
+                removed = cache.purge_expired()
+                if removed:
+                    logger.debug("Purged %d expired entries from %s cache", removed, cache.name)
+
+    async def _purge_shared_loop(self, interval: float = 60.0) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await run_in_threadpool(self.shared.purge_expired)
+            except Exception:
+                logger.warning("Could not purge the shared cache", exc_info=True)
+
+    async def _sync_alerts_loop(self, interval: float = 1.0) -> None:
+        """Index alerts created, and push alerts fired, by other workers"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await run_in_threadpool(self.alerts.sync)
+            except Exception:
+                logger.warning("Could not sync alerts", exc_info=True)
+
+    async def _poll_alerts_loop(self) -> None:
+        """Refresh quotes of alerted symbols nobody is requesting, as their markets trade"""
+        schedule = RefreshSchedule(self.calendar, float(os.getenv("ALERT_POLL_SECONDS", "60")))
+        while True:
+            await asyncio.sleep(schedule.delay())
+            await run_in_threadpool(self.alerts.ensure_loaded)
+            for symbol in schedule.due(self.alerts.symbols()):
+                try:
+                    entry = await self.load_quote(symbol)
+                except Exception:
+                    logger.debug("Could not refresh %s for alerts", symbol, exc_info=True)
+                    continue
+                self.record_quote(entry)
+                await self.check_alerts(entry)
+
+    async def _compact_intraday_loop(self) -> None:
+        """Move intraday bars past retention into daily bars"""
+        interval = float(os.getenv("INTRADAY_COMPACT_SECONDS", "900"))
+        retention = int(os.getenv("INTRADAY_RETENTION_DAYS", "5"))
+        idle = float(os.getenv("INTRADAY_IDLE_SECONDS", "86400"))
+        while True:
+            await asyncio.sleep(interval)
+            if "intraday" not in self.__dict__:
+                continue
+            try:
+                rows = await run_in_threadpool(self.intraday.compact, retention, idle)
+                if rows:
+                    # Vendor daily bars win over ones rebuilt from intraday data
+                    await run_in_threadpool(self.market_store.insert_missing_bars, rows)
+            except Exception:
+                logger.warning("Could not compact intraday bars", exc_info=True)
+
+    async def _quote_feed_loop(self) -> None:
+        """Refresh the symbols streaming clients watch and push what changed"""
+        interval = float(os.getenv("QUOTE_STREAM_SECONDS", "5"))
+        while True:
+            await asyncio.sleep(interval)
+            symbols = self.quote_feed.symbols()
+            if symbols:
+                try:
+                    await self.load_quotes(symbols)
+                except Exception:
+                    logger.warning("Could not refresh streamed quotes", exc_info=True)
+            self.quote_feed.publish()
+
+    async def load_quote(self, symbol: str) -> CacheEntry:
+        """
+        Load a quote through the quote cache
+
+        The entry lives for the quote cache's TTL while the symbol's market
+        trades, a quarter of it around the open and close, and until the
+        next open while the market is closed. A quote answered by a local
+        fallback provider is only kept for a few seconds and is stale.
+
+        Args:
+            symbol: Stock symbol
+
+        Returns:
+            quote_cache CacheEntry
+        """
+        # A stored fallback quote may be days old: served as stale, kept out of alerts and the snapshot
+        return await self.quote_cache.get_or_load(
+            symbol, lambda: self.market_data.for_cache("get_quote", symbol),
+            ttl=self.calendar.quote_ttl(symbol, self.quote_cache.ttl),
+        )
+
+    async def load_quotes(self, symbols: Sequence[str]) -> Tuple[Dict[str, CacheEntry], Dict[str, str]]:
+        """
+        Load several quotes through the quote cache concurrently
+
+        Fresh quotes go into the snapshot store as one batch, and alerts are
+        checked against them.
+
+        Args:
+            symbols: Stock symbols
+
+        Returns:
+            (symbol -> quote_cache CacheEntry, symbol -> error message)
+        """
+        results = await asyncio.gather(*map(self.load_quote, symbols), return_exceptions=True)
+        entries: Dict[str, CacheEntry] = {}
+        errors: Dict[str, str] = {}
+        for symbol, result in zip(symbols, results):
+            if isinstance(result, Exception):
+                errors[symbol] = str(result)
+            else:
+                entries[symbol] = result
+        fresh = [entry for entry in entries.values() if not entry.stale]
+        self.quotes.put_many([entry.value for entry in fresh], [entry.stored_at for entry in fresh])
+        for entry in entries.values():
+            await self.check_alerts(entry)
+        return entries, errors
+
+    def record_quote(self, entry) -> PreparedBody:
+        """
+        Publish a quote_cache entry to the snapshot store
+
+        Args:
+            entry: quote_cache CacheEntry
+
+        Returns:
+            Serialized quote; stale entries keep their own body and leave
+            the snapshot (and its freshness) alone
+        """
+        if entry.stale:
+            return entry.prepared()
+        return self.quotes.put(entry.value, entry.stored_at)
+
+    async def check_alerts(self, entry) -> None:
+        """
+        Evaluate alerts against a freshly loaded quote
+
+        Args:
+            entry: quote_cache CacheEntry; stale quotes never fire alerts
+        """
+        if entry.stale or not self.alerts.loaded:
+            return
+        matches = self.alerts.match(entry.value)
+        if matches:
+            await run_in_threadpool(self.alerts.fire, matches)
+
+    async def _leader_loop(self, interval: float = 5.0) -> None:
+        """Try to become the leader; start the singleton jobs when it happens"""
+        while not self.leader.try_acquire():
+            await asyncio.sleep(interval)
+        for factory in self._singletons:
+            self.spawn(factory())
+
+    async def _sync_invalidations_loop(self, seq: int, interval: float = 1.0) -> None:
+        """Apply invalidations published by other workers to the local caches"""
+        caches = {cache.name: cache for cache in self.caches}
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                seq, events = await run_in_threadpool(self.shared.invalidations_since, seq)
+            except Exception:
+                logger.warning("Could not read shared cache invalidations", exc_info=True)
+                continue
+            for name, key in events:
+                if name in caches:
+                    caches[name].apply_invalidation(key)
+
+    async def _sync_quotes_loop(self, interval: float = 1.0) -> None:
+        """Exchange snapshot quote changes with the other workers"""
+        while True:
+            try:
+                await run_in_threadpool(self.quotes.sync)
+            except Exception:
+                logger.warning("Could not sync snapshot quotes with the shared store", exc_info=True)
+            await asyncio.sleep(interval)
+
+
+async def get_services(request: Request) -> ServiceContainer:
+    """
+    Dependency returning the worker's ServiceContainer
+
+    Creates and starts one on first use if the lifespan did not (lazy
+    mode, or serverless runtimes that skip ASGI lifespan events), so the
+    background loops only start once a request needs the services.
+    """
+    services = getattr(request.app.state, "services", None)
+    if services is None:
+        services = ServiceContainer()
+        request.app.state.services = services
+        await services.start(warm=False)
+    return services
@@ -0,0 +1,137 @@
+"""
+Database Service
+Small SQLite connection pool shared by the routers of one worker
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_DB_PATH = os.path.join(BASE_DIR, "database", "users.db")
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        email TEXT UNIQUE NOT NULL,
+        password TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE IF NOT EXISTS alerts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT NOT NULL,
+        symbol TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        threshold REAL NOT NULL,
+        note TEXT NOT NULL DEFAULT '',
+        status TEXT NOT NULL DEFAULT 'active',
+        created_at REAL NOT NULL,
+        triggered_at REAL,
+        triggered_value REAL
+    );
+    CREATE INDEX IF NOT EXISTS idx_alerts_user ON alerts (username, status);
+    CREATE TABLE IF NOT EXISTS alert_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        alert_id INTEGER NOT NULL,
+        type TEXT NOT NULL,
+        created_at REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS portfolios (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT NOT NULL,
+        name TEXT NOT NULL,
+        currency TEXT NOT NULL DEFAULT 'USD',
+        version INTEGER NOT NULL DEFAULT 0,
+        created_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_portfolios_user ON portfolios (username);
+    CREATE TABLE IF NOT EXISTS portfolio_transactions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        portfolio_id INTEGER NOT NULL,
+        kind TEXT NOT NULL,
+        symbol TEXT,
+        quantity REAL NOT NULL DEFAULT 0,
+        price REAL NOT NULL DEFAULT 0,
+        fees REAL NOT NULL DEFAULT 0,
+        amount REAL NOT NULL DEFAULT 0,
+        date TEXT NOT NULL,
+        created_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_portfolio_transactions ON portfolio_transactions (portfolio_id, date);
+'''
+
+
+class Database:
+    """
+    Pool of SQLite connections
+
+    Connections are opened on demand, reused across requests and closed
+    together on shutdown. WAL mode lets readers proceed during writes.
+    """
+
+    def __init__(self, path: str = DEFAULT_DB_PATH, pool_size: int = 4, schema: str = SCHEMA):
+        self.path = path
+        self.schema = schema
+        self._pool: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue(maxsize=pool_size)
+        self._initialized = False
+        self._schema_lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def init_schema(self) -> None:
+        """Create tables if they don't exist"""
+        with self._borrow() as conn:
+            conn.executescript(self.schema)
+        self._initialized = True
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """
+        Borrow a connection; commits on success, rolls back on error
+
+        Yields:
+            sqlite3.Connection
+        """
+        if not self._initialized and self.schema:
+            # Concurrent first users wait until the tables exist
+            with self._schema_lock:
+                if not self._initialized:
+                    self.init_schema()
+        with self._borrow() as conn:
+            yield conn
+
+    @contextmanager
+    def _borrow(self) -> Iterator[sqlite3.Connection]:
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            try:
+                self._pool.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    def close(self) -> None:
+        """Close all pooled connections"""
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
@@ -0,0 +1,85 @@
+"""
+Upstream Errors
+Exception types raised by the upstream provider clients
+
+Each type carries the HTTP status the API answers with when it reaches a
+route (see the UpstreamError handler in server.py).
+"""
+
+import logging
+import re
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# API key query parameters (Alpha Vantage "apikey", NewsAPI "apiKey")
+_SECRET_PARAMS = re.compile(r"(api_?key=)[^&\s'\"]+", re.IGNORECASE)
+
+
+class UpstreamError(Exception):
+    """Base class for failures talking to a market data or news provider"""
+
+    status_code = 502
+
+
+class UpstreamUnavailableError(UpstreamError):
+    """Provider unreachable, timed out or returned a server error"""
+
+    status_code = 503
+
+
+class CircuitOpenError(UpstreamUnavailableError):
+    """Call rejected without trying because the provider's circuit is open"""
+
+
+class RateLimitedError(UpstreamError):
+    """Provider quota exhausted (upstream "Note" response or local limiter)"""
+
+    status_code = 429
+
+    def __init__(self, message: str = "API rate limit exceeded", retry_after: Optional[float] = None):
+        super().__init__(message)
+        # Seconds until a retry may succeed, if known (sent as Retry-After)
+        self.retry_after = retry_after
+
+
+class UpstreamPlanError(UpstreamError):
+    """
+    Provider refused the request for good: a premium-only function or
+    parameter, or a missing or invalid API key (retrying won't help)
+    """
+
+
+class NoDataError(UpstreamError):
+    """Provider has no data for the requested symbol"""
+
+    status_code = 404
+
+
+class InvalidSymbolError(NoDataError):
+    """Provider does not know the symbol (or currency pair) at all"""
+
+
+class UpstreamParseError(UpstreamError):
+    """Provider answered with a body that does not have the expected shape"""
+
+
+def redact(text: str) -> str:
+    """Text with API key query parameters masked, e.g. an error naming its request URL"""
+    return _SECRET_PARAMS.sub(r"\1***", text)
+
+
+def network_error(provider: str, exc: Exception) -> UpstreamUnavailableError:
+    """
+    Error for an upstream request that got no response
+
+    The message names only the exception type: requests' own messages
+    contain the full URL, API key included, and error messages reach
+    clients. The detail is logged, redacted.
+
+    Args:
+        provider: Provider name, for the log
+        exc: The requests exception
+    """
+    logger.warning("%s request failed: %s", provider, redact(str(exc)))
+    return UpstreamUnavailableError(f"Network error: {type(exc).__name__}")
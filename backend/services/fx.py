@@ -0,0 +1,256 @@
+"""
+FX Rates
+Daily exchange rates per currency pair, fetched at most once a day, and
+conversion of quotes, bar series and portfolio values with them
+"""
+
+import datetime
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from services.errors import NoDataError, UpstreamError
+from services.market_calendar import INDICES, MarketCalendar
+from services.providers.base import MarketDataProvider
+
+logger = logging.getLogger(__name__)
+
+# Trading currency per exchange code (see MarketCalendar.exchange_of)
+CURRENCIES = {
+    "NSE": "INR", "BSE": "INR", "NYSE": "USD", "LON": "GBX",
+    "TRT": "CAD", "TRV": "CAD", "DEX": "EUR", "FRK": "EUR", "SHH": "CNY", "SHZ": "CNY",
+}
+# Minor units some exchanges quote in: code -> (currency, units per minor unit)
+MINOR_UNITS = {"GBX": ("GBP", 0.01), "GBP": ("GBP", 1.0)}
+
+# Money fields of a quote (changePercent and volume carry no currency)
+QUOTE_FIELDS = ("price", "change", "open", "high", "low", "previousClose")
+BAR_FIELDS = ("open", "high", "low", "close")
+
+
+def _major(currency: str) -> Tuple[str, float]:
+    return MINOR_UNITS.get(currency, (currency, 1.0))
+
+
+class FXService:
+    """
+    Currency conversion backed by the provider's daily FX series
+
+    Each pair's whole daily history is fetched once per (UTC) day and kept
+    as two numpy arrays; a pair also serves its inverse. Converting a
+    series looks all its dates up with one searchsorted (a date without a
+    rate, like a weekend, uses the last rate before it) and multiplies
+    whole columns. If refreshing a pair fails, yesterday's rates are used.
+    """
+
+    def __init__(self, provider: MarketDataProvider, calendar: MarketCalendar):
+        self.provider = provider
+        self.calendar = calendar
+        # (from, to) -> (day fetched, dates, rates)
+        self._pairs: Dict[Tuple[str, str], Tuple[datetime.date, np.ndarray, np.ndarray]] = {}
+        # Pairs the provider had no rates for, and the day it said so
+        self._missing: Dict[Tuple[str, str], datetime.date] = {}
+        # Currencies reported by symbol search, which beat the exchange table
+        self._symbol_currencies: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._loading: Dict[Tuple[str, str], threading.Lock] = {}
+
+    # ------------------------------------------------------------------
+    # Currencies
+    # ------------------------------------------------------------------
+
+    def currency_of(self, symbol: str) -> Optional[str]:
+        """
+        Trading currency of a symbol
+
+        Returns:
+            ISO code (GBX for pence), or None for indices, which are points
+        """
+        symbol = symbol.upper()
+        if symbol in INDICES:
+            return None
+        known = self._symbol_currencies.get(symbol)
+        if known:
+            return known
+        return CURRENCIES.get(self.calendar.exchange_of(symbol), "USD")
+
+    def learn(self, results: Iterable[dict]) -> None:
+        """Remember the currency of symbol search results"""
+        for result in results:
+            if result.get("symbol") and result.get("currency"):
+                self._symbol_currencies[result["symbol"].upper()] = result["currency"].upper()
+
+    @staticmethod
+    def today() -> datetime.date:
+        return datetime.datetime.now(datetime.timezone.utc).date()
+
+    def tag(self, currency: str) -> str:
+        """Changes whenever converted values may change (daily), e.g. for cursors and cache keys"""
+        return f"{currency}{self.today():%Y%m%d}"
+
+    # ------------------------------------------------------------------
+    # Rates
+    # ------------------------------------------------------------------
+
+    def _cached(self, pair: Tuple[str, str], today: datetime.date):
+        with self._lock:
+            entry = self._pairs.get(pair)
+            if entry is not None and entry[0] == today:
+                return entry
+            inverse = self._pairs.get(pair[::-1])
+            if inverse is not None and inverse[0] == today:
+                return today, inverse[1], 1.0 / inverse[2]
+            return None
+
+    def history(self, from_currency: str, to_currency: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Daily rates of a pair of major currencies
+
+        Returns:
+            (dates as datetime64[D], rates), oldest first
+
+        Raises:
+            UpstreamError: No rates today and none from an earlier day
+        """
+        pair = (from_currency, to_currency)
+        today = self.today()
+        entry = self._cached(pair, today)
+        if entry is not None:
+            return entry[1], entry[2]
+        with self._lock:
+            loading = self._loading.setdefault(pair, threading.Lock())
+        # One fetch per pair; concurrent callers wait for it
+        with loading:
+            entry = self._cached(pair, today)
+            if entry is not None:
+                return entry[1], entry[2]
+            if self._missing.get(pair) == today:
+                raise NoDataError(f"No FX data for {from_currency}/{to_currency}")
+            try:
+                data = self.provider.get_fx_daily(from_currency, to_currency)["data"]
+            except UpstreamError as e:
+                with self._lock:
+                    previous = self._pairs.get(pair)
+                if previous is None:
+                    if isinstance(e, NoDataError):
+                        self._missing[pair] = today
+                    raise
+                logger.warning("Using %s rates of %s/%s", previous[0], *pair, exc_info=True)
+                return previous[1], previous[2]
+            dates = np.array([row["date"] for row in data], dtype="datetime64[D]")
+            rates = np.array([row["rate"] for row in data], dtype=np.float64)
+            with self._lock:
+                self._pairs[pair] = (today, dates, rates)
+        return dates, rates
+
+    def rates(self, from_currency: str, to_currency: str, dates: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Units of to_currency per unit of from_currency on each date
+
+        Args:
+            from_currency: ISO code (minor units like GBX allowed)
+            to_currency: ISO code
+            dates: datetime64[D] array; None for just the latest rate
+
+        Returns:
+            Array aligned with dates (one element without dates)
+
+        Raises:
+            NoDataError: A date is before the pair's first rate
+        """
+        (source, source_factor), (target, target_factor) = _major(from_currency), _major(to_currency)
+        size = 1 if dates is None else len(dates)
+        factor = source_factor / target_factor
+        if source == target:
+            return np.full(size, factor)
+        history_dates, history_rates = self.history(source, target)
+        if dates is None:
+            return history_rates[-1:] * factor
+        # Last rate on or before each date
+        index = np.searchsorted(history_dates, dates, side="right") - 1
+        if len(index) and index.min() < 0:
+            raise NoDataError(
+                f"No {source}/{target} rate for {dates.min()}: rates start on {history_dates[0]}"
+            )
+        return history_rates[index] * factor
+
+    def rate(self, from_currency: str, to_currency: str) -> float:
+        """Latest rate of a pair"""
+        return float(self.rates(from_currency, to_currency)[0])
+
+    def rates_for(self, currencies: Sequence[Optional[str]], to_currency: str,
+                  dates: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Rates for values in mixed currencies, one lookup per distinct currency
+
+        Args:
+            currencies: Currency of each value (None: not money, rate 1)
+            to_currency: Target currency
+            dates: Date of each value, or None for the latest rates
+
+        Returns:
+            Array aligned with currencies
+        """
+        currencies = np.array(currencies, dtype=object)
+        result = np.ones(len(currencies))
+        for currency in set(currencies.tolist()) - {None, to_currency}:
+            mask = currencies == currency
+            if dates is None:
+                result[mask] = self.rate(currency, to_currency)
+            else:
+                result[mask] = self.rates(currency, to_currency, dates[mask])
+        return result
+
+    # ------------------------------------------------------------------
+    # Conversion
+    # ------------------------------------------------------------------
+
+    def convert_quote(self, quote: dict, to_currency: str, symbol: Optional[str] = None) -> dict:
+        """
+        A quote (or quote delta) in another currency, at the latest rate
+
+        Args:
+            quote: Quote dict; fields it lacks are left out
+            to_currency: Target currency
+            symbol: Defaults to quote["symbol"]
+
+        Returns:
+            New dict with a "currency" field (None for indices)
+        """
+        currency = self.currency_of(symbol or quote["symbol"])
+        if currency is None:
+            return {**quote, "currency": None}
+        rate = 1.0 if currency == to_currency else self.rate(currency, to_currency)
+        converted = dict(quote)
+        for field in QUOTE_FIELDS:
+            if field in converted:
+                converted[field] = converted[field] * rate
+        converted["currency"] = to_currency
+        return converted
+
+    def convert_bars(self, series: dict, to_currency: str) -> dict:
+        """
+        Daily or intraday bars in another currency, each at its own day's rate
+
+        Args:
+            series: {"symbol", "data": [{"date" or "timestamp", "open", ...}]}
+            to_currency: Target currency
+
+        Returns:
+            New series with a "currency" field (None for indices)
+        """
+        bars: List[dict] = series["data"]
+        currency = self.currency_of(series["symbol"])
+        if currency is None or not bars:
+            return {**series, "currency": currency and to_currency}
+        time_key = "date" if "date" in bars[0] else "timestamp"
+        dates = np.array([bar[time_key][:10] for bar in bars], dtype="datetime64[D]")
+        rates = self.rates(currency, to_currency, dates)
+        columns = {field: (np.array([bar[field] for bar in bars]) * rates).tolist() for field in BAR_FIELDS}
+        data = [
+            {**bar, **{field: values[i] for field, values in columns.items()}}
+            for i, bar in enumerate(bars)
+        ]
+        return {**series, "currency": to_currency, "data": data}
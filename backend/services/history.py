@@ -0,0 +1,182 @@
+"""
+Daily History
+A symbol's whole daily history, downloaded once and kept in the market
+store, then topped up with compact deltas; split and dividend adjustment
+of stored bars
+"""
+
+import datetime
+import logging
+import threading
+import time
+from itertools import repeat
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+from services.adjustments import adjustment_factors
+from services.errors import NoDataError, UpstreamError
+from services.market_calendar import MarketCalendar
+from services.market_store import MarketStore
+from services.parsers import SeriesColumns
+from services.providers.base import MarketDataProvider
+
+logger = logging.getLogger(__name__)
+
+# A compact download has the last 100 trading days: about 140 calendar days
+COMPACT_DAYS = 140
+# Seconds before a failed download is tried again (unless the vendor says)
+FAILURE_BACKOFF = 300.0
+
+PRICE_FIELDS = ("open", "high", "low", "close")
+
+
+class HistoryService:
+    """
+    Deep daily history per symbol, at one full upstream download ever
+
+    The first sync of a symbol fetches its full adjusted daily series and
+    writes it into the market store batch by batch as the body parses, so
+    memory stays at about one download chunk. Later syncs, once the stored
+    bars expire at the next close, fetch only the compact series (the last
+    100 days), unless the stored history has fallen further behind than
+    that. Splits and dividends are stored next to the raw bars and applied
+    when a series is read.
+
+    Without a plan that has the adjusted series the provider falls back to
+    raw compact bars; the full download is then asked for again on later
+    syncs, for when the plan changes. A failed download is recorded in the
+    store with a backoff, so reads in every worker use the stored bars
+    instead of repeating the call until it passes.
+    """
+
+    def __init__(self, provider: MarketDataProvider, store: MarketStore, calendar: MarketCalendar,
+                 default_ttl: float = 3600.0):
+        self.provider = provider
+        self.store = store
+        self.calendar = calendar
+        # Refresh interval of symbols on unknown exchanges
+        self.default_ttl = default_ttl
+        self._lock = threading.Lock()
+        self._loading: Dict[str, threading.Lock] = {}
+
+    # ------------------------------------------------------------------
+    # Sync
+    # ------------------------------------------------------------------
+
+    def _writer(self, symbol: str) -> Callable[[SeriesColumns], None]:
+        def write(batch: SeriesColumns) -> None:
+            columns = batch.columns
+            dates = batch.times.tolist()
+            self.store.bulk_upsert_bars(list(zip(
+                repeat(symbol), dates, *(columns[field].tolist() for field in PRICE_FIELDS),
+                columns["volume"].tolist(),
+            )))
+            if "dividend" not in columns:
+                # Raw bars without corporate actions (see get_daily_history)
+                return
+            actions = (columns["dividend"] != 0) | (columns["split"] != 1)
+            if actions.any():
+                self.store.upsert_actions(list(zip(
+                    repeat(symbol), batch.times[actions].tolist(),
+                    columns["dividend"][actions].tolist(), columns["split"][actions].tolist(),
+                )))
+        return write
+
+    @staticmethod
+    def _behind(last_date: Optional[str]) -> bool:
+        if not last_date:
+            return True
+        today = datetime.datetime.now(datetime.timezone.utc).date()
+        return (today - datetime.date.fromisoformat(last_date)).days > COMPACT_DAYS
+
+    def sync(self, symbol: str, force: bool = False) -> str:
+        """
+        Bring a symbol's stored history up to date
+
+        Args:
+            symbol: Stock symbol
+            force: Download even if the stored bars have not expired
+
+        Returns:
+            "fresh" (nothing fetched), "compact" or "full"
+
+        Raises:
+            UpstreamError: Download failed
+        """
+        state = self.store.history_state(symbol)
+        now = time.time()
+        if state is not None and not force and now < state["expiresAt"]:
+            return "fresh"
+        full = state is None or not state["fullAt"] or self._behind(state["lastDate"])
+        result = self.provider.get_daily_history(symbol, full, self._writer(symbol))
+        # Raw fallback bars are the compact series whatever was asked for
+        full = full and result.get("adjusted", True)
+        ttl = self.calendar.bars_ttl(symbol) or self.default_ttl
+        self.store.mark_history_synced(symbol, full, now + ttl)
+        return "full" if full else "compact"
+
+    def ensure(self, symbol: str) -> None:
+        """
+        Sync a symbol once among concurrent callers
+
+        A failed download is only an error if nothing is stored yet;
+        otherwise the stored bars are used as they are. Either way it is
+        not tried again for FAILURE_BACKOFF seconds (or the vendor's
+        retry-after).
+
+        Raises:
+            UpstreamError: Download failed and the store has no bars
+            NoDataError: Nothing stored, and the last download failed too
+                recently to try again
+        """
+        with self._lock:
+            loading = self._loading.setdefault(symbol, threading.Lock())
+        with loading:
+            try:
+                status = self.sync(symbol)
+            except UpstreamError as e:
+                backoff = getattr(e, "retry_after", None) or FAILURE_BACKOFF
+                self.store.mark_history_failed(symbol, time.time() + backoff)
+                if not self.store.get_bars(symbol, limit=1):
+                    raise
+                logger.warning("Using stored daily history of %s", symbol, exc_info=True)
+                return
+            if status == "fresh" and not self.store.get_bars(symbol, limit=1):
+                raise NoDataError(f"No daily history for {symbol}: the last download failed, retrying later")
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    def series(self, symbol: str, start: Optional[str] = None, adjusted: bool = True) -> dict:
+        """
+        Stored daily bars of a symbol, synced first
+
+        Args:
+            symbol: Stock symbol
+            start: First date (ISO), inclusive
+            adjusted: Adjust prices and volumes for splits and dividends
+
+        Returns:
+            {"symbol", "adjusted", "data": [{"date", "open", ..., "volume"}]}, oldest first
+        """
+        self.ensure(symbol)
+        rows = [row for chunk in self.store.iter_bars([symbol]) for row in chunk]
+        if not rows:
+            return {"symbol": symbol, "adjusted": adjusted, "data": []}
+        _, dates, opens, highs, lows, closes, volumes = zip(*rows)
+        dates = np.array(dates)
+        columns = {
+            "open": np.array(opens), "high": np.array(highs), "low": np.array(lows),
+            "close": np.array(closes), "volume": np.array(volumes, dtype=np.int64),
+        }
+        if adjusted:
+            # Over the whole history: an action's factor needs the close before it
+            factors = adjustment_factors(dates, columns["close"], self.store.get_actions(symbol))
+            for field in PRICE_FIELDS:
+                columns[field] = columns[field] * factors
+            columns["volume"] = np.rint(columns["volume"] / factors).astype(np.int64)
+        first = int(np.searchsorted(dates, start)) if start else 0
+        series = SeriesColumns(dates[first:], {name: column[first:] for name, column in columns.items()})
+        return {"symbol": symbol, "adjusted": adjusted, "data": series.records("date")}
@@ -0,0 +1,351 @@
+"""
+Intraday Bars
+Per-symbol 1/5/15/60-minute OHLCV held in memory, rolled up into higher
+timeframes as bars close and compacted into daily bars when they age out
+
+Timestamps are the exchange's wall-clock time (as the vendor reports it)
+in seconds since 1970, so bucket and day boundaries are plain integer
+arithmetic and line up with the local session.
+"""
+
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from metrics import INTRADAY_COMPACTED, INTRADAY_SYMBOLS
+from services.providers.base import MarketDataProvider
+
+INTERVALS = {"1min": 60, "5min": 300, "15min": 900, "60min": 3600}
+# Rows kept per timeframe: 1-minute bars cover a few sessions, the
+# coarser timeframes (rolled up before 1-minute rows are overwritten) weeks
+DEFAULT_CAPACITY = {"1min": 2000, "5min": 1200, "15min": 600, "60min": 400}
+DAY = 86400
+
+BAR_DTYPE = np.dtype([
+    ("ts", "<i8"), ("open", "<f8"), ("high", "<f8"), ("low", "<f8"), ("close", "<f8"), ("volume", "<i8"),
+])
+
+
+def resample(rows: np.ndarray, size: int) -> np.ndarray:
+    """
+    Aggregate time-ordered bars into buckets of `size` seconds
+
+    Args:
+        rows: BAR_DTYPE array, oldest first
+        size: Bucket length in seconds (DAY for daily bars)
+
+    Returns:
+        BAR_DTYPE array with one row per non-empty bucket
+    """
+    if len(rows) == 0:
+        return rows
+    buckets = rows["ts"] - rows["ts"] % size
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:] - 1, len(rows) - 1]
+    out = np.empty(len(starts), dtype=BAR_DTYPE)
+    out["ts"] = buckets[starts]
+    out["open"] = rows["open"][starts]
+    out["high"] = np.maximum.reduceat(rows["high"], starts)
+    out["low"] = np.minimum.reduceat(rows["low"], starts)
+    out["close"] = rows["close"][ends]
+    out["volume"] = np.add.reduceat(rows["volume"], starts)
+    return out
+
+
+def _combine(first: np.void, second: np.void) -> tuple:
+    """One bar covering two consecutive bars of the same bucket"""
+    return (
+        first["ts"], first["open"], max(first["high"], second["high"]), min(first["low"], second["low"]),
+        second["close"], first["volume"] + second["volume"],
+    )
+
+
+def bars_from_dicts(data: List[dict]) -> np.ndarray:
+    """
+    Convert provider bars ({'timestamp', 'open', ..., 'volume'}) to BAR_DTYPE
+
+    Returns:
+        Rows sorted by time, duplicates dropped
+    """
+    rows = np.empty(len(data), dtype=BAR_DTYPE)
+    rows["ts"] = np.array([bar["timestamp"] for bar in data], dtype="datetime64[s]").astype("<i8")
+    for name in ("open", "high", "low", "close", "volume"):
+        rows[name] = [bar[name] for bar in data]
+    rows.sort(order="ts")
+    keep = np.r_[rows["ts"][1:] != rows["ts"][:-1], True]
+    return rows[keep]
+
+
+class BarRing:
+    """
+    Fixed-capacity, time-ordered bar array
+
+    Backed by twice the capacity so the live rows are always one contiguous
+    slice: once the end of the buffer is reached, the newest rows are moved
+    back to the front, which costs O(1) amortized per appended row.
+    """
+
+    __slots__ = ("capacity", "_data", "_start", "_end")
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._data = np.zeros(2 * capacity, dtype=BAR_DTYPE)
+        self._start = 0
+        self._end = 0
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    @property
+    def rows(self) -> np.ndarray:
+        """Live rows, oldest first (a view into the buffer)"""
+        return self._data[self._start:self._end]
+
+    @property
+    def last(self) -> Optional[np.void]:
+        return self._data[self._end - 1] if self._end > self._start else None
+
+    def set_last(self, row: tuple) -> None:
+        self._data[self._end - 1] = row
+
+    def extend(self, rows: np.ndarray) -> None:
+        """Append rows newer than the current last row"""
+        n = len(rows)
+        if n >= self.capacity:
+            self._data[:self.capacity] = rows[-self.capacity:]
+            self._start, self._end = 0, self.capacity
+            return
+        if self._end + n > len(self._data):
+            keep = min(len(self), self.capacity - n)
+            self._data[:keep] = self._data[self._end - keep:self._end]
+            self._start, self._end = 0, keep
+        self._data[self._end:self._end + n] = rows
+        self._end += n
+        self._start = max(self._start, self._end - self.capacity)
+
+    def drop_before(self, ts: int) -> None:
+        """Forget rows starting before `ts`"""
+        self._start += int(np.searchsorted(self.rows["ts"], ts))
+
+
+class IntradaySeries:
+    """Bars of one symbol at every timeframe"""
+
+    __slots__ = ("rings", "time_zone", "floor", "fetched_at", "used_at")
+
+    def __init__(self, capacity: Dict[str, int]):
+        self.rings = {interval: BarRing(capacity[interval]) for interval in INTERVALS}
+        self.time_zone = ""
+        # Bars before this were compacted into daily bars and are ignored
+        self.floor = 0
+        self.fetched_at = 0.0
+        self.used_at = time.monotonic()
+
+    # ------------------------------------------------------------------
+    # Ingestion
+    # ------------------------------------------------------------------
+
+    def add(self, rows: np.ndarray) -> int:
+        """
+        Add 1-minute bars and roll closed bars up the timeframes
+
+        The newest row of each ring is its open bar: at 1 minute it may
+        still be revised by the vendor, above it is missing the open bars
+        of the lower timeframes. A bar closes once a later one starts and
+        is then folded into the next timeframe.
+
+        Returns:
+            Number of 1-minute bars that were new or revised
+        """
+        ring = self.rings["1min"]
+        last = ring.last
+        rows = rows[rows["ts"] >= max(self.floor, last["ts"] if last is not None else 0)]
+        if len(rows) == 0:
+            return 0
+        closed = self._apply(ring, rows, replace=True)
+        for interval in ("5min", "15min", "60min"):
+            if len(closed) == 0:
+                break
+            closed = self._apply(self.rings[interval], resample(closed, INTERVALS[interval]), replace=False)
+        return len(rows)
+
+    @staticmethod
+    def _apply(ring: BarRing, rows: np.ndarray, replace: bool) -> np.ndarray:
+        """Fold bars (oldest first, none older than the open bar) into a ring; return the bars this closed"""
+        closed = []
+        last = ring.last
+        if last is not None and rows["ts"][0] == last["ts"]:
+            ring.set_last(rows[0] if replace else _combine(last, rows[0]))
+            rows = rows[1:]
+        if len(rows):
+            if last is not None:
+                closed.append(np.array([ring.last], dtype=BAR_DTYPE))
+            ring.extend(rows)
+            closed.append(rows[:-1])
+        return np.concatenate(closed) if closed else rows[:0]
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    def view(self, interval: str) -> np.ndarray:
+        """
+        Bars of a timeframe including the open bars below it
+
+        Returns:
+            New BAR_DTYPE array, oldest first
+        """
+        size = INTERVALS[interval]
+        lower = [i for i in INTERVALS if INTERVALS[i] < size]
+        # Open bars of the lower timeframes, oldest content first
+        pending = [self.rings[i].last for i in reversed(lower) if self.rings[i].last is not None]
+        rows = self.rings[interval].rows.copy()
+        if not pending:
+            return rows
+        pending = resample(np.array(pending, dtype=BAR_DTYPE), size)
+        if len(rows) and pending["ts"][0] == rows["ts"][-1]:
+            rows[-1] = _combine(rows[-1], pending[0])
+            pending = pending[1:]
+        return np.concatenate([rows, pending])
+
+    def latest_ts(self) -> Optional[int]:
+        last = self.rings["1min"].last
+        return int(last["ts"]) if last is not None else None
+
+    def empty(self) -> bool:
+        return all(len(ring) == 0 for ring in self.rings.values())
+
+    def drop_before(self, ts: int) -> None:
+        for ring in self.rings.values():
+            ring.drop_before(ts)
+        self.floor = max(self.floor, ts)
+
+
+class IntradayService:
+    """
+    In-memory intraday bars, refreshed from the newest vendor bars
+
+    Only 1-minute bars are fetched; 5, 15 and 60 minutes are derived from
+    them. The first fetch of a symbol (or one after a long gap) asks for the
+    vendor's full intraday window, later ones for the latest bars only.
+    """
+
+    def __init__(self, provider: MarketDataProvider, capacity: Optional[Dict[str, int]] = None,
+                 backfill_after: float = 90 * 60):
+        self.provider = provider
+        self.capacity = {**DEFAULT_CAPACITY, **(capacity or {})}
+        # The vendor's compact output covers 100 minutes
+        self.backfill_after = backfill_after
+        self._series: Dict[str, IntradaySeries] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._series)
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self._series
+
+    def refresh(self, symbol: str) -> int:
+        """
+        Fetch the newest 1-minute bars of a symbol and roll them up
+
+        Returns:
+            Number of new or revised 1-minute bars
+
+        Raises:
+            UpstreamError: No provider could answer
+        """
+        with self._lock:
+            series = self._series.get(symbol)
+            full = series is None or time.monotonic() - series.fetched_at > self.backfill_after
+        result = self.provider.get_intraday(symbol, "1min", full)
+        rows = bars_from_dicts(result["data"])
+        with self._lock:
+            series = self._series.get(symbol)
+            if series is None:
+                series = self._series[symbol] = IntradaySeries(self.capacity)
+                INTRADAY_SYMBOLS.set(len(self._series))
+            series.time_zone = result.get("timeZone", series.time_zone)
+            series.fetched_at = time.monotonic()
+            return series.add(rows)
+
+    def series(self, symbol: str, interval: str, limit: Optional[int] = None) -> Optional[dict]:
+        """
+        Bars of a symbol at one timeframe, in the API's response shape
+
+        Args:
+            symbol: Stock symbol
+            interval: One of INTERVALS
+            limit: Newest bars to return (default: all held)
+
+        Returns:
+            {'symbol', 'interval', 'timeZone', 'data': [{'timestamp', 'open', ...}]},
+            or None if the symbol has no intraday data
+
+        Raises:
+            ValueError: Unknown interval
+        """
+        if interval not in INTERVALS:
+            raise ValueError(f"Unknown interval {interval}; use one of {', '.join(INTERVALS)}")
+        with self._lock:
+            series = self._series.get(symbol)
+            if series is None:
+                return None
+            series.used_at = time.monotonic()
+            rows = series.view(interval)
+            time_zone = series.time_zone
+        if limit is not None:
+            rows = rows[-limit:]
+        timestamps = np.datetime_as_string(rows["ts"].astype("datetime64[s]")).tolist()
+        columns = [rows[name].tolist() for name in ("open", "high", "low", "close", "volume")]
+        return {
+            "symbol": symbol,
+            "interval": interval,
+            "timeZone": time_zone,
+            "data": [
+                {"timestamp": ts, "open": o, "high": h, "low": l, "close": c, "volume": v}
+                for ts, o, h, l, c, v in zip(timestamps, *columns)
+            ],
+        }
+
+    def compact(self, retention_days: int = 5, idle_seconds: float = 86400) -> List[Tuple]:
+        """
+        Turn intraday bars older than the retention window into daily bars
+
+        Days are counted back from each symbol's newest bar. Symbols nobody
+        has asked for within idle_seconds are compacted completely and
+        dropped from memory.
+
+        Args:
+            retention_days: Calendar days of intraday bars to keep per symbol
+            idle_seconds: Drop symbols unused for this long
+
+        Returns:
+            (symbol, date, open, high, low, close, volume) rows for the store
+        """
+        now = time.monotonic()
+        daily: List[Tuple] = []
+        with self._lock:
+            for symbol, series in list(self._series.items()):
+                latest = series.latest_ts()
+                if latest is None:
+                    del self._series[symbol]
+                    continue
+                idle = now - series.used_at > idle_seconds
+                cutoff = (latest // DAY + (1 if idle else 1 - retention_days)) * DAY
+                rows = series.view("60min")
+                days = resample(rows[rows["ts"] < cutoff], DAY)
+                if len(days):
+                    dates = np.datetime_as_string((days["ts"] // DAY).astype("datetime64[D]")).tolist()
+                    daily.extend(zip(
+                        [symbol] * len(days), dates,
+                        *(days[name].tolist() for name in ("open", "high", "low", "close", "volume")),
+                    ))
+                    series.drop_before(cutoff)
+                if idle or series.empty():
+                    del self._series[symbol]
+            INTRADAY_SYMBOLS.set(len(self._series))
+        INTRADAY_COMPACTED.inc(amount=len(daily))
+        return daily
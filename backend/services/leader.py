@@ -0,0 +1,72 @@
+"""
+Leader Election
+File lock deciding which worker on a host runs the singleton background tasks
+"""
+
+import logging
+import os
+import tempfile
+from typing import IO, Optional
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows, where there is one worker anyway
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOCK_PATH = os.path.join(tempfile.gettempdir(), "markstro-leader.lock")
+
+
+class LeaderLock:
+    """
+    Non-blocking exclusive flock on a file
+
+    The worker holding the lock is the leader. The OS releases the lock
+    when that process exits (including crashes and recycling after
+    max_requests), and another worker takes over on its next attempt.
+    """
+
+    def __init__(self, path: str = DEFAULT_LOCK_PATH):
+        self.path = path
+        self._file: Optional[IO] = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._file is not None
+
+    def try_acquire(self) -> bool:
+        """
+        Become the leader if nobody else is
+
+        Returns:
+            True if this process holds the lock
+        """
+        if self._file is not None:
+            return True
+        if fcntl is None:
+            self._file = open(os.devnull, "w")
+            return True
+
+        f = open(self.path, "a+")
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        f.seek(0)
+        f.truncate()
+        f.write(f"{os.getpid()}\n")
+        f.flush()
+        self._file = f
+        logger.info("Worker %d is now the leader", os.getpid())
+        return True
+
+    def release(self) -> None:
+        """Give up leadership"""
+        if self._file is None:
+            return
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        self._file.close()
+        self._file = None
@@ -0,0 +1,315 @@
+"""
+Market Calendar
+Trading sessions, holidays and time zones of the exchanges the app quotes,
+and the cache lifetimes and refresh intervals that follow from them
+"""
+
+import json
+import logging
+import os
+import time
+from datetime import date, datetime, time as dtime, timedelta
+from typing import Dict, Iterable, List, Optional
+from zoneinfo import ZoneInfo
+
+logger = logging.getLogger(__name__)
+
+# Exchange holidays on weekdays (weekends are closed anyway) and early
+# closes, for every year published so far. Later years can also be added
+# with MARKET_HOLIDAYS_PATH (same format) without a deploy.
+HOLIDAYS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config", "market_holidays.json")
+# BSE follows the NSE holiday list
+SHARED_HOLIDAYS = {"BSE": "NSE"}
+
+# Symbol suffixes (RELIANCE.BSE) and index symbols of each exchange;
+# symbols without a suffix are US listings
+SUFFIXES = {"BSE": "BSE", "BO": "BSE", "NS": "NSE", "NSE": "NSE"}
+INDICES = {"^BSESN": "BSE", "^NSEI": "NSE", "^GSPC": "NYSE", "^DJI": "NYSE"}
+DEFAULT_EXCHANGE = "NYSE"
+
+# How long before/after the open and close refreshes run faster, and by how much
+EDGE = timedelta(minutes=15)
+BURST = 4
+
+
+def load_holidays(*paths: Optional[str]) -> Dict[str, dict]:
+    """
+    Holidays and early closes of each exchange, merged from JSON files
+
+    Args:
+        paths: Files of exchange -> {"holidays": [dates], "earlyCloses":
+            {date: "HH:MM"}} (or just the list of holidays); None is skipped
+
+    Returns:
+        exchange -> {"holidays": [dates], "earlyCloses": {date: "HH:MM"}}
+    """
+    merged: Dict[str, dict] = {}
+    for path in paths:
+        if not path:
+            continue
+        with open(path) as f:
+            for name, days in json.load(f).items():
+                if isinstance(days, list):
+                    days = {"holidays": days}
+                entry = merged.setdefault(name.upper(), {"holidays": [], "earlyCloses": {}})
+                entry["holidays"].extend(days.get("holidays", []))
+                entry["earlyCloses"].update(days.get("earlyCloses", {}))
+    for name, source in SHARED_HOLIDAYS.items():
+        own = merged.get(name, {"holidays": [], "earlyCloses": {}})
+        shared = merged.get(source, {"holidays": [], "earlyCloses": {}})
+        merged[name] = {
+            "holidays": shared["holidays"] + own["holidays"],
+            "earlyCloses": {**shared["earlyCloses"], **own["earlyCloses"]},
+        }
+    return merged
+
+
+class ExchangeCalendar:
+    """
+    Regular sessions of one exchange
+
+    A session runs from `open` to `close` (local time) on weekdays that
+    are not holidays, or to an earlier time on half days. Prices keep
+    settling for `settle` after the close (closing auction), so that is
+    counted as part of the session. Outside a session a quote stays valid
+    until the next open and a daily bar until the next close.
+
+    Days of years without a holiday list are treated as trading days, with
+    a warning, since a missing list turns every holiday into a session.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        timezone: str,
+        open: dtime,
+        close: dtime,
+        holidays: Iterable[str] = (),
+        settle: timedelta = timedelta(minutes=15),
+        early_closes: Optional[Dict[str, str]] = None,
+    ):
+        self.name = name
+        self.tz = ZoneInfo(timezone)
+        self.open = open
+        self.close = close
+        self.holidays = {date.fromisoformat(day) for day in holidays}
+        self.settle = settle
+        self.early_closes = {
+            date.fromisoformat(day): dtime.fromisoformat(close) for day, close in (early_closes or {}).items()
+        }
+        # Years whose holidays are known
+        self.years = {day.year for day in self.holidays}
+        self._warned_years = set()
+
+    def is_trading_day(self, day: date) -> bool:
+        if day.year not in self.years and day.year not in self._warned_years:
+            self._warned_years.add(day.year)
+            logger.warning(
+                "No %s holidays for %d: treating every weekday as a trading day; "
+                "add them to %s or MARKET_HOLIDAYS_PATH", self.name, day.year, HOLIDAYS_PATH,
+            )
+        return day.weekday() < 5 and day not in self.holidays
+
+    def close_on(self, day: date) -> dtime:
+        """Closing time (local) of a trading day: earlier on half days"""
+        return self.early_closes.get(day, self.close)
+
+    def localize(self, now: Optional[datetime] = None) -> datetime:
+        """Current time (or an aware time) in the exchange's time zone"""
+        return datetime.now(self.tz) if now is None else now.astimezone(self.tz)
+
+    def _sessions(self, now: datetime):
+        # (open, end) of the session that is running or comes next, then the following ones
+        day = now.date() - timedelta(days=1)
+        for _ in range(60):
+            if self.is_trading_day(day):
+                start = datetime.combine(day, self.open, self.tz)
+                end = datetime.combine(day, self.close_on(day), self.tz) + self.settle
+                if end > now:
+                    yield start, end
+            day += timedelta(days=1)
+
+    def is_open(self, now: Optional[datetime] = None) -> bool:
+        """Whether a session (including its settle time) is running"""
+        now = self.localize(now)
+        start, _ = next(self._sessions(now))
+        return start <= now
+
+    def next_open(self, now: Optional[datetime] = None) -> datetime:
+        """Start of the next session that has not started yet"""
+        now = self.localize(now)
+        return next(start for start, _ in self._sessions(now) if start > now)
+
+    def next_close(self, now: Optional[datetime] = None) -> datetime:
+        """End (close plus settle time) of the running or next session"""
+        now = self.localize(now)
+        _, end = next(self._sessions(now))
+        return end
+
+    def refresh_interval(self, base: float, now: Optional[datetime] = None) -> float:
+        """
+        Seconds a price fetched now stays current
+
+        Args:
+            base: Interval during a session
+            now: Current time (aware), defaults to now
+
+        Returns:
+            base / BURST within EDGE of the open or close, base during the
+            rest of a session, and the time until the next open otherwise
+        """
+        now = self.localize(now)
+        start, end = next(self._sessions(now))
+        if now < start:
+            return max((start - now).total_seconds(), 1.0)
+        if now - start < EDGE or end - self.settle - now < EDGE:
+            return base / BURST
+        return base
+
+
+class MarketCalendar:
+    """
+    Exchange calendars looked up by symbol
+
+    Symbols of exchanges without a calendar are treated as always trading,
+    which keeps the plain TTLs for them.
+    """
+
+    def __init__(self, exchanges: Dict[str, ExchangeCalendar]):
+        self.exchanges = exchanges
+
+    @classmethod
+    def default(cls, holidays_path: Optional[str] = None, today: Optional[date] = None) -> "MarketCalendar":
+        """
+        NSE, BSE and NYSE regular sessions
+
+        Args:
+            holidays_path: Extra JSON file in the format of HOLIDAYS_PATH
+            today: Date whose year must have holidays (default: today);
+                exchanges without them are logged as errors
+        """
+        days = load_holidays(HOLIDAYS_PATH, holidays_path)
+
+        def exchange(name: str, timezone: str, open: dtime, close: dtime) -> ExchangeCalendar:
+            return ExchangeCalendar(
+                name, timezone, open, close,
+                holidays=days[name]["holidays"], early_closes=days[name]["earlyCloses"],
+            )
+
+        calendar = cls({
+            "NSE": exchange("NSE", "Asia/Kolkata", dtime(9, 15), dtime(15, 30)),
+            "BSE": exchange("BSE", "Asia/Kolkata", dtime(9, 15), dtime(15, 30)),
+            "NYSE": exchange("NYSE", "America/New_York", dtime(9, 30), dtime(16, 0)),
+        })
+        year = (today or date.today()).year
+        for name in calendar.missing_holidays(year):
+            logger.error("No %s holidays for %d in %s: its holidays will be served as sessions",
+                         name, year, HOLIDAYS_PATH)
+        return calendar
+
+    def missing_holidays(self, year: int) -> List[str]:
+        """Exchanges without a holiday list for a year"""
+        return [name for name, calendar in self.exchanges.items() if year not in calendar.years]
+
+    def exchange_of(self, symbol: str) -> str:
+        """Exchange code a symbol trades on"""
+        symbol = symbol.upper()
+        if symbol in INDICES:
+            return INDICES[symbol]
+        _, dot, suffix = symbol.rpartition(".")
+        if not dot:
+            return DEFAULT_EXCHANGE
+        return SUFFIXES.get(suffix, suffix)
+
+    def for_symbol(self, symbol: str) -> Optional[ExchangeCalendar]:
+        return self.exchanges.get(self.exchange_of(symbol))
+
+    def is_open(self, symbol: str, now: Optional[datetime] = None) -> bool:
+        calendar = self.for_symbol(symbol)
+        return calendar is None or calendar.is_open(now)
+
+    def quote_ttl(self, symbol: str, base: float, now: Optional[datetime] = None) -> float:
+        """
+        Seconds to cache a quote (or intraday bars) of a symbol
+
+        Args:
+            symbol: Stock symbol
+            base: TTL during a session
+            now: Current time (aware), defaults to now
+
+        Returns:
+            See ExchangeCalendar.refresh_interval(); base for unknown exchanges
+        """
+        calendar = self.for_symbol(symbol)
+        return base if calendar is None else calendar.refresh_interval(base, now)
+
+    def bars_ttl(self, symbol: str, now: Optional[datetime] = None) -> Optional[float]:
+        """
+        Seconds to cache daily bars of a symbol: until its next close
+
+        Returns:
+            None for unknown exchanges (use the cache's default TTL)
+        """
+        calendar = self.for_symbol(symbol)
+        if calendar is None:
+            return None
+        now = calendar.localize(now)
+        return max((calendar.next_close(now) - now).total_seconds(), 1.0)
+
+    def status(self, base: float, now: Optional[datetime] = None) -> Dict[str, dict]:
+        """
+        Session state of every exchange
+
+        Args:
+            base: Client refresh interval during a session (seconds)
+
+        Returns:
+            exchange -> {open, nextOpen, nextClose, refreshSeconds}
+        """
+        result = {}
+        for name, calendar in self.exchanges.items():
+            local = calendar.localize(now)
+            result[name] = {
+                "open": calendar.is_open(local),
+                "timezone": str(calendar.tz),
+                "nextOpen": calendar.next_open(local).isoformat(),
+                "nextClose": calendar.next_close(local).isoformat(),
+                "refreshSeconds": round(calendar.refresh_interval(base, local)),
+            }
+        return result
+
+
+class RefreshSchedule:
+    """
+    When each symbol of a background poller is next due
+
+    Each refresh schedules the symbol's next one quote_ttl() later, so
+    pollers speed up around the open and close and go quiet while the
+    symbol's exchange is closed.
+    """
+
+    def __init__(self, calendar: MarketCalendar, base: float):
+        self.calendar = calendar
+        self.base = base
+        self._due: Dict[str, float] = {}
+
+    def due(self, symbols: Iterable[str]) -> List[str]:
+        """
+        Symbols to refresh now; each is scheduled for its next refresh
+
+        Args:
+            symbols: Symbols the poller currently watches (others are forgotten)
+        """
+        now = time.time()
+        watched = set(symbols)
+        self._due = {symbol: due for symbol, due in self._due.items() if symbol in watched}
+        result = sorted(symbol for symbol in watched if self._due.get(symbol, 0.0) <= now)
+        for symbol in result:
+            self._due[symbol] = now + self.calendar.quote_ttl(symbol, self.base)
+        return result
+
+    def delay(self) -> float:
+        """Seconds until the next symbol is due, at most base (new symbols may appear)"""
+        if not self._due:
+            return self.base
+        return min(max(min(self._due.values()) - time.time(), 0.0), self.base)
@@ -0,0 +1,550 @@
+"""
+Market Data Store
+SQLite tables holding quotes, daily bars and symbol metadata locally
+"""
+
+import os
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from services.adjustments import adjustment_factors
+from services.database import BASE_DIR, Database
+
+DEFAULT_MARKET_DB_PATH = os.path.join(BASE_DIR, "database", "market.db")
+
+MARKET_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS quotes (
+        symbol TEXT PRIMARY KEY,
+        price REAL NOT NULL,
+        change REAL NOT NULL DEFAULT 0,
+        change_percent REAL NOT NULL DEFAULT 0,
+        open REAL NOT NULL DEFAULT 0,
+        high REAL NOT NULL DEFAULT 0,
+        low REAL NOT NULL DEFAULT 0,
+        volume INTEGER NOT NULL DEFAULT 0,
+        previous_close REAL NOT NULL DEFAULT 0,
+        latest_trading_day TEXT NOT NULL DEFAULT '',
+        updated_at REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS daily_bars (
+        symbol TEXT NOT NULL,
+        date TEXT NOT NULL,
+        open REAL NOT NULL,
+        high REAL NOT NULL,
+        low REAL NOT NULL,
+        close REAL NOT NULL,
+        volume INTEGER NOT NULL,
+        PRIMARY KEY (symbol, date)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS bar_updates (
+        symbol TEXT PRIMARY KEY,
+        updated_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_bar_updates_time ON bar_updates (updated_at);
+    CREATE INDEX IF NOT EXISTS idx_quotes_updated ON quotes (updated_at);
+    CREATE TABLE IF NOT EXISTS symbols (
+        symbol TEXT PRIMARY KEY,
+        name TEXT NOT NULL DEFAULT '',
+        type TEXT NOT NULL DEFAULT '',
+        region TEXT NOT NULL DEFAULT '',
+        currency TEXT NOT NULL DEFAULT ''
+    );
+    CREATE TABLE IF NOT EXISTS corporate_actions (
+        symbol TEXT NOT NULL,
+        date TEXT NOT NULL,
+        dividend REAL NOT NULL DEFAULT 0,
+        split REAL NOT NULL DEFAULT 1,
+        PRIMARY KEY (symbol, date)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS history_sync (
+        symbol TEXT PRIMARY KEY,
+        full_at REAL NOT NULL,
+        synced_at REAL NOT NULL,
+        expires_at REAL NOT NULL,
+        last_date TEXT
+    );
+'''
+
+QUOTE_FIELDS = (
+    "symbol", "price", "change", "changePercent", "open", "high", "low",
+    "volume", "previousClose", "latestTradingDay",
+)
+
+
+class MarketStore(Database):
+    """
+    Local market data, in the same shapes the API returns
+
+    Quotes and bars are upserted, so replaying the same data is harmless.
+    """
+
+    def __init__(self, path: str = DEFAULT_MARKET_DB_PATH, pool_size: int = 4):
+        super().__init__(path, pool_size=pool_size, schema=MARKET_SCHEMA)
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    def upsert_quote(self, quote: dict) -> None:
+        """
+        Store the latest quote of a symbol
+
+        Args:
+            quote: Quote dict as returned by get_quote()
+        """
+        row = tuple(quote.get(field, 0) for field in QUOTE_FIELDS) + (time.time(),)
+        with self.connection() as conn:
+            conn.execute(
+                '''INSERT OR REPLACE INTO quotes
+                   (symbol, price, change, change_percent, open, high, low,
+                    volume, previous_close, latest_trading_day, updated_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                row,
+            )
+
+    def upsert_bars(self, symbol: str, bars: Iterable[dict]) -> int:
+        """
+        Store daily bars of a symbol
+
+        Args:
+            symbol: Stock symbol
+            bars: Dicts with date/open/high/low/close/volume
+
+        Returns:
+            Number of rows written
+        """
+        rows = [
+            (symbol, bar["date"], bar["open"], bar["high"], bar["low"], bar["close"], bar["volume"])
+            for bar in bars
+        ]
+        with self.connection() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO daily_bars VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+            )
+            if rows:
+                conn.execute("INSERT OR REPLACE INTO bar_updates VALUES (?, ?)", (symbol, time.time()))
+        return len(rows)
+
+    def bulk_upsert_bars(self, rows: Sequence[tuple]) -> int:
+        """
+        Store bars of any number of symbols in one transaction
+
+        Args:
+            rows: (symbol, date, open, high, low, close, volume) tuples
+
+        Returns:
+            Number of rows written
+        """
+        symbols = {row[0] for row in rows}
+        now = time.time()
+        with self.connection() as conn:
+            conn.executemany("INSERT OR REPLACE INTO daily_bars VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            conn.executemany(
+                "INSERT OR REPLACE INTO bar_updates VALUES (?, ?)", [(symbol, now) for symbol in symbols]
+            )
+        return len(rows)
+
+    def insert_missing_bars(self, rows: Sequence[tuple]) -> int:
+        """
+        Store bars only for dates that have none yet
+
+        Used for bars derived locally (e.g. compacted intraday data), which
+        must not overwrite the vendor's own daily bars.
+
+        Args:
+            rows: (symbol, date, open, high, low, close, volume) tuples
+
+        Returns:
+            Number of rows inserted
+        """
+        with self.connection() as conn:
+            before = conn.total_changes
+            conn.executemany("INSERT OR IGNORE INTO daily_bars VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            inserted = conn.total_changes - before
+            if inserted:
+                now = time.time()
+                conn.executemany(
+                    "INSERT OR REPLACE INTO bar_updates VALUES (?, ?)", [(s, now) for s in {row[0] for row in rows}]
+                )
+        return inserted
+
+    def upsert_actions(self, rows: Sequence[tuple]) -> int:
+        """
+        Store splits and dividends
+
+        Args:
+            rows: (symbol, ex-date, dividend per share, split coefficient) tuples
+
+        Returns:
+            Number of rows written
+        """
+        with self.connection() as conn:
+            conn.executemany("INSERT OR REPLACE INTO corporate_actions VALUES (?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def mark_history_synced(self, symbol: str, full: bool, expires_at: float) -> None:
+        """
+        Record a daily history download of a symbol
+
+        Args:
+            symbol: Stock symbol
+            full: Whether it was the whole history (else the latest days only)
+            expires_at: When the stored bars should be refreshed
+        """
+        now = time.time()
+        full_at = now if full else 0.0
+        with self.connection() as conn:
+            last_date = conn.execute(
+                "SELECT MAX(date) FROM daily_bars WHERE symbol = ?", (symbol,)
+            ).fetchone()[0]
+            conn.execute(
+                '''INSERT INTO history_sync (symbol, full_at, synced_at, expires_at, last_date)
+                   VALUES (?, ?, ?, ?, ?)
+                   ON CONFLICT (symbol) DO UPDATE SET
+                       full_at = CASE WHEN ? THEN excluded.full_at ELSE full_at END,
+                       synced_at = excluded.synced_at,
+                       expires_at = excluded.expires_at,
+                       last_date = excluded.last_date''',
+                (symbol, full_at, now, expires_at, last_date, full),
+            )
+
+    def mark_history_failed(self, symbol: str, retry_at: float) -> None:
+        """
+        Record a failed daily history download of a symbol
+
+        Args:
+            symbol: Stock symbol
+            retry_at: When to try downloading again (until then the stored
+                bars count as fresh)
+        """
+        with self.connection() as conn:
+            conn.execute(
+                '''INSERT INTO history_sync (symbol, full_at, synced_at, expires_at, last_date)
+                   VALUES (?, 0, 0, ?, NULL)
+                   ON CONFLICT (symbol) DO UPDATE SET expires_at = excluded.expires_at''',
+                (symbol, retry_at),
+            )
+
+    def upsert_symbols(self, matches: Iterable[dict]) -> None:
+        """
+        Store symbol metadata
+
+        Args:
+            matches: Dicts as returned by search_symbols()
+        """
+        rows = [
+            (m["symbol"], m.get("name", ""), m.get("type", ""), m.get("region", ""), m.get("currency", ""))
+            for m in matches if m.get("symbol")
+        ]
+        with self.connection() as conn:
+            conn.executemany("INSERT OR REPLACE INTO symbols VALUES (?, ?, ?, ?, ?)", rows)
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    def get_quote(self, symbol: str) -> Optional[dict]:
+        with self.connection() as conn:
+            row = conn.execute(
+                '''SELECT symbol, price, change, change_percent, open, high, low,
+                          volume, previous_close, latest_trading_day
+                   FROM quotes WHERE symbol = ?''',
+                (symbol,),
+            ).fetchone()
+        return dict(zip(QUOTE_FIELDS, row)) if row else None
+
+    def get_quotes(self, symbols: Sequence[str]) -> Dict[str, dict]:
+        """
+        Stored quotes of several symbols
+
+        Args:
+            symbols: Stock symbols
+
+        Returns:
+            symbol -> quote dict, for the symbols that have one
+        """
+        result: Dict[str, dict] = {}
+        with self.connection() as conn:
+            # Stay under SQLite's bound-parameter limit
+            for start in range(0, len(symbols), 500):
+                chunk = list(symbols[start:start + 500])
+                rows = conn.execute(
+                    f'''SELECT symbol, price, change, change_percent, open, high, low,
+                              volume, previous_close, latest_trading_day
+                       FROM quotes WHERE symbol IN ({", ".join("?" * len(chunk))})''',
+                    chunk,
+                ).fetchall()
+                for row in rows:
+                    result[row[0]] = dict(zip(QUOTE_FIELDS, row))
+        return result
+
+    def get_bars(self, symbol: str, limit: Optional[int] = None) -> List[dict]:
+        """
+        Daily bars of a symbol, oldest first
+
+        Args:
+            symbol: Stock symbol
+            limit: Only the most recent `limit` bars
+
+        Returns:
+            List of bar dicts
+        """
+        with self.connection() as conn:
+            rows = conn.execute(
+                '''SELECT date, open, high, low, close, volume FROM daily_bars
+                   WHERE symbol = ? ORDER BY date DESC LIMIT ?''',
+                (symbol, -1 if limit is None else limit),
+            ).fetchall()
+        rows.reverse()
+        return [
+            {"date": d, "open": o, "high": h, "low": l, "close": c, "volume": v}
+            for d, o, h, l, c, v in rows
+        ]
+
+    def get_actions(self, symbol: str) -> List[Tuple[str, float, float]]:
+        """Splits and dividends of a symbol as (date, dividend, split), oldest first"""
+        with self.connection() as conn:
+            return conn.execute(
+                "SELECT date, dividend, split FROM corporate_actions WHERE symbol = ? ORDER BY date",
+                (symbol,),
+            ).fetchall()
+
+    def history_state(self, symbol: str) -> Optional[dict]:
+        """
+        When a symbol's daily history was last downloaded
+
+        Returns:
+            {"fullAt", "syncedAt", "expiresAt", "lastDate"}, or None if it
+            never was; fullAt and syncedAt are 0 until a full or any
+            download succeeds
+        """
+        with self.connection() as conn:
+            row = conn.execute(
+                "SELECT full_at, synced_at, expires_at, last_date FROM history_sync WHERE symbol = ?",
+                (symbol,),
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("fullAt", "syncedAt", "expiresAt", "lastDate"), row))
+
+    def iter_bars(self, symbols: Optional[Sequence[str]] = None, start: Optional[str] = None,
+                  end: Optional[str] = None, chunk_size: int = 50_000) -> Iterator[List[tuple]]:
+        """
+        Stream daily bars in primary-key order
+
+        Args:
+            symbols: Only these symbols (default: all)
+            start: First date, inclusive
+            end: Last date, inclusive
+            chunk_size: Rows per yielded chunk
+
+        Yields:
+            Lists of (symbol, date, open, high, low, close, volume)
+        """
+        if symbols is not None and len(symbols) > 500:
+            # Stay under SQLite's bound-parameter limit
+            ordered = sorted(symbols)
+            for i in range(0, len(ordered), 500):
+                yield from self.iter_bars(ordered[i:i + 500], start, end, chunk_size)
+            return
+        clauses, params = [], []
+        if symbols is not None:
+            clauses.append(f"symbol IN ({', '.join('?' * len(symbols))})")
+            params.extend(symbols)
+        if start:
+            clauses.append("date >= ?")
+            params.append(start)
+        if end:
+            clauses.append("date <= ?")
+            params.append(end)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self.connection() as conn:
+            cursor = conn.execute(
+                f"SELECT symbol, date, open, high, low, close, volume FROM daily_bars {where} ORDER BY symbol, date",
+                params,
+            )
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+
+    def search_symbols(self, keywords: str, limit: int = 10) -> List[dict]:
+        """
+        Symbols whose ticker or name contains the keywords (ticker prefix first)
+
+        Args:
+            keywords: Search text
+            limit: Max results
+
+        Returns:
+            List of symbol dicts
+        """
+        pattern = f"%{keywords}%"
+        with self.connection() as conn:
+            rows = conn.execute(
+                '''SELECT symbol, name, type, region, currency FROM symbols
+                   WHERE symbol LIKE ? OR name LIKE ?
+                   ORDER BY symbol NOT LIKE ?, symbol LIMIT ?''',
+                (pattern, pattern, f"{keywords}%", limit),
+            ).fetchall()
+        return [
+            {"symbol": s, "name": n, "type": t, "region": r, "currency": c}
+            for s, n, t, r, c in rows
+        ]
+
+    # ------------------------------------------------------------------
+    # Change tracking (for snapshots kept in memory, e.g. the screener)
+    # ------------------------------------------------------------------
+
+    def bars_updated_since(self, since: float) -> Tuple[List[str], float]:
+        """
+        Symbols whose bars were written after a timestamp
+
+        Args:
+            since: updated_at watermark; 0 returns every symbol with bars
+
+        Returns:
+            (symbols, new watermark)
+        """
+        with self.connection() as conn:
+            if since <= 0:
+                symbols = [row[0] for row in conn.execute("SELECT DISTINCT symbol FROM daily_bars")]
+                latest = conn.execute("SELECT MAX(updated_at) FROM bar_updates").fetchone()[0]
+                return symbols, latest or time.time()
+            rows = conn.execute(
+                "SELECT symbol, updated_at FROM bar_updates WHERE updated_at > ?", (since,)
+            ).fetchall()
+        return [symbol for symbol, _ in rows], max((t for _, t in rows), default=since)
+
+    def quotes_updated_since(self, since: float) -> Tuple[List[dict], float]:
+        """
+        Quotes written after a timestamp
+
+        Args:
+            since: updated_at watermark
+
+        Returns:
+            (quote dicts, new watermark)
+        """
+        with self.connection() as conn:
+            rows = conn.execute(
+                '''SELECT symbol, price, change, change_percent, open, high, low,
+                          volume, previous_close, latest_trading_day, updated_at
+                   FROM quotes WHERE updated_at > ?''',
+                (since,),
+            ).fetchall()
+        quotes = [dict(zip(QUOTE_FIELDS, row)) for row in rows]
+        return quotes, max((row[-1] for row in rows), default=since)
+
+    def _actions_after(self, conn, symbol: str, first_date: str) -> List[Tuple[str, float, float]]:
+        return conn.execute(
+            "SELECT date, dividend, split FROM corporate_actions WHERE symbol = ? AND date > ?",
+            (symbol, first_date),
+        ).fetchall()
+
+    def get_recent_bars(self, symbols: Sequence[str], limit: int, adjusted: bool = False) -> Dict[str, List[tuple]]:
+        """
+        Most recent high/low/close/volume of several symbols
+
+        Args:
+            symbols: Stock symbols
+            limit: Bars per symbol
+            adjusted: Adjust for the splits and dividends inside the window
+
+        Returns:
+            symbol -> [(high, low, close, volume), ...] oldest first
+        """
+        result: Dict[str, List[tuple]] = {}
+        with self.connection() as conn:
+            # One primary-key range scan per symbol beats a window function over the table
+            for symbol in symbols:
+                rows = conn.execute(
+                    '''SELECT date, high, low, close, volume FROM daily_bars
+                       WHERE symbol = ? ORDER BY date DESC LIMIT ?''',
+                    (symbol, limit),
+                ).fetchall()
+                if not rows:
+                    continue
+                rows.reverse()
+                actions = self._actions_after(conn, symbol, rows[0][0]) if adjusted else None
+                if actions:
+                    dates, highs, lows, closes, volumes = (np.array(column) for column in zip(*rows))
+                    factors = adjustment_factors(dates, closes, actions)
+                    result[symbol] = list(zip(
+                        (highs * factors).tolist(), (lows * factors).tolist(), (closes * factors).tolist(),
+                        np.rint(volumes / factors).astype(np.int64).tolist(),
+                    ))
+                else:
+                    result[symbol] = [row[1:] for row in rows]
+        return result
+
+    def get_close_history(self, symbols: Sequence[str], start: str) -> Dict[str, Tuple[List[str], List[float]]]:
+        """
+        Daily closes of several symbols from a date on
+
+        Args:
+            symbols: Stock symbols
+            start: First date (YYYY-MM-DD)
+
+        Returns:
+            symbol -> (dates, closes), oldest first
+        """
+        result: Dict[str, Tuple[List[str], List[float]]] = {}
+        with self.connection() as conn:
+            for symbol in symbols:
+                rows = conn.execute(
+                    "SELECT date, close FROM daily_bars WHERE symbol = ? AND date >= ? ORDER BY date",
+                    (symbol, start),
+                ).fetchall()
+                if rows:
+                    dates, closes = zip(*rows)
+                    result[symbol] = (list(dates), list(closes))
+        return result
+
+    def get_recent_closes(self, symbols: Sequence[str], limit: int,
+                          adjusted: bool = False) -> Dict[str, Tuple[List[str], List[float]]]:
+        """
+        Last `limit` daily closes of several symbols
+
+        Args:
+            symbols: Stock symbols
+            limit: Bars per symbol
+            adjusted: Adjust for the splits and dividends inside the window
+
+        Returns:
+            symbol -> (dates, closes), oldest first
+        """
+        result: Dict[str, Tuple[List[str], List[float]]] = {}
+        with self.connection() as conn:
+            for symbol in symbols:
+                rows = conn.execute(
+                    "SELECT date, close FROM daily_bars WHERE symbol = ? ORDER BY date DESC LIMIT ?",
+                    (symbol, limit),
+                ).fetchall()
+                if rows:
+                    rows.reverse()
+                    dates, closes = zip(*rows)
+                    actions = self._actions_after(conn, symbol, dates[0]) if adjusted else None
+                    if actions:
+                        closes = np.array(closes)
+                        closes = (closes * adjustment_factors(np.array(dates), closes, actions)).tolist()
+                    result[symbol] = (list(dates), list(closes))
+        return result
+
+    def bars_version(self, symbols: Sequence[str]) -> float:
+        """Latest bar write time among symbols (changes whenever their bars do)"""
+        if not symbols:
+            return 0.0
+        with self.connection() as conn:
+            version = 0.0
+            for start in range(0, len(symbols), 500):
+                chunk = list(symbols[start:start + 500])
+                latest = conn.execute(
+                    f"SELECT MAX(updated_at) FROM bar_updates WHERE symbol IN ({', '.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchone()[0]
+                version = max(version, latest or 0.0)
+        return version
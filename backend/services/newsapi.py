@@ -5,17 +5,85 @@ Latest market news fetch karne ke liye
 
 import requests
 import os
-from dotenv import load_dotenv
+from metrics import UpstreamTimer, record_upstream_error
+from services.errors import (
+    RateLimitedError,
+    UpstreamError,
+    UpstreamParseError,
+    UpstreamUnavailableError,
+    network_error,
+)
+from services.parsers import parse_articles
+from services.resilience import call_upstream
+from settings import load_env
 from datetime import datetime, timedelta
 
 # Load environment variables
-load_dotenv()
+load_env()
+
+# NewsAPI error codes -> exception raised for them; codes not listed are
+# UpstreamError (e.g. a bad API key), request mistakes are ValueError
+ERROR_CODES = {
+    'rateLimited': RateLimitedError,
+    'apiKeyExhausted': RateLimitedError,
+    'unexpectedError': UpstreamUnavailableError,
+    'parameterInvalid': ValueError,
+    'parametersMissing': ValueError,
+    'sourcesTooMany': ValueError,
+    'sourceDoesNotExist': ValueError,
+}
 
 class NewsAPIService:
-    def __init__(self):
+    def __init__(self, session=None, breaker=None, retry=None):
         # API key environment se load karo
         self.api_key = os.getenv('NEWS_API_KEY')
-        self.base_url = 'https://newsapi.org/v2'
+        self.base_url = os.getenv('NEWS_API_BASE_URL', 'https://newsapi.org/v2')
+        # Shared requests.Session (connection pool), if provided
+        self.http = session or requests
+        # CircuitBreaker / RetryPolicy for this provider, if provided
+        self.breaker = breaker
+        self.retry = retry
+        self.timeout = float(os.getenv('UPSTREAM_TIMEOUT', '5'))
+    
+    def _get(self, endpoint: str, params: dict):
+        """
+        GET an endpoint through the circuit breaker and retry policy
+        
+        Returns:
+            dict: Decoded JSON response
+        """
+        return call_upstream(
+            lambda budget: self._request(endpoint, params, budget), self.breaker, self.retry, 'newsapi', endpoint
+        )
+    
+    def _request(self, endpoint: str, params: dict, budget=None):
+        # Never wait past the retry deadline (budget: seconds left of it)
+        timeout = self.timeout if budget is None else max(0.1, min(self.timeout, budget))
+        try:
+            with UpstreamTimer('newsapi', endpoint):
+                response = self.http.get(
+                    f'{self.base_url}/{endpoint}',
+                    params=params,
+                    timeout=timeout
+                )
+        except requests.exceptions.RequestException as e:
+            raise network_error('newsapi', e)
+        if response.status_code >= 500:
+            record_upstream_error('newsapi', endpoint, 'http_5xx')
+            raise UpstreamUnavailableError(f'News API error: HTTP {response.status_code}')
+        try:
+            data = response.json()
+        except ValueError:
+            record_upstream_error('newsapi', endpoint, 'parse_error')
+            raise UpstreamParseError(f'News API {endpoint} response is not JSON')
+        if not isinstance(data, dict):
+            record_upstream_error('newsapi', endpoint, 'parse_error')
+            raise UpstreamParseError(f'News API {endpoint} response is not a JSON object')
+        if data.get('status') == 'error':
+            code = data.get('code', 'error')
+            record_upstream_error('newsapi', endpoint, code)
+            raise ERROR_CODES.get(code, UpstreamError)(data.get('message', 'News API error'))
+        return data
     
     def get_market_news(self, category='business', page=1, page_size=10):
         """
@@ -29,60 +97,26 @@ class NewsAPIService:
         Returns:
             dict: News articles
         """
-        try:
-            # Last 7 days ka news fetch karo
-            from_date = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
-            
-            params = {
-                'apiKey': self.api_key,
-                'category': category,
-                'language': 'en',
-                'sortBy': 'publishedAt',
-                'from': from_date,
-                'page': page,
-                'pageSize': page_size
-            }
-            
-            response = requests.get(
-                f'{self.base_url}/top-headlines',
-                params=params,
-                timeout=10
-            )
-            
-            data = response.json()
-            
-            # Error handling
-            if data.get('status') == 'error':
-                raise Exception(data.get('message', 'News API error'))
-            
-            articles = data.get('articles', [])
-            
-            # Format articles
-            formatted_articles = []
-            for article in articles:
-                # Skip articles without essential info
-                if not article.get('title') or article.get('title') == '[Removed]':
-                    continue
-                
-                formatted_articles.append({
-                    'title': article.get('title', ''),
-                    'description': article.get('description', ''),
-                    'url': article.get('url', ''),
-                    'urlToImage': article.get('urlToImage', ''),
-                    'publishedAt': article.get('publishedAt', ''),
-                    'source': article.get('source', {}).get('name', 'Unknown'),
-                    'author': article.get('author', 'Unknown')
-                })
-            
-            return {
-                'totalResults': data.get('totalResults', 0),
-                'articles': formatted_articles
-            }
-            
-        except requests.exceptions.RequestException as e:
-            raise Exception(f'Network error: {str(e)}')
-        except Exception as e:
-            raise Exception(str(e))
+        # Last 7 days ka news fetch karo
+        from_date = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
+        
+        params = {
+            'apiKey': self.api_key,
+            'category': category,
+            'language': 'en',
+            'sortBy': 'publishedAt',
+            'from': from_date,
+            'page': page,
+            'pageSize': page_size
+        }
+        
+        data = self._get('top-headlines', params)
+        
+        return {
+            'totalResults': data.get('totalResults', 0),
+            # Articles without essential info are skipped
+            'articles': parse_articles(data.get('articles', []))
+        }
     
     def search_news(self, query: str, page=1, page_size=10):
         """
@@ -96,56 +130,23 @@ class NewsAPIService:
         Returns:
             dict: Search results
         """
-        try:
-            # Last 30 days ka news
-            from_date = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
-            
-            params = {
-                'apiKey': self.api_key,
-                'q': query,
-                'language': 'en',
-                'sortBy': 'publishedAt',
-                'from': from_date,
-                'page': page,
-                'pageSize': page_size
-            }
-            
-            response = requests.get(
-                f'{self.base_url}/everything',
-                params=params,
-                timeout=10
-            )
-            
-            data = response.json()
-            
-            if data.get('status') == 'error':
-                raise Exception(data.get('message', 'Search failed'))
-            
-            articles = data.get('articles', [])
-            
-            # Format results
-            formatted_articles = []
-            for article in articles:
-                if not article.get('title') or article.get('title') == '[Removed]':
-                    continue
-                
-                formatted_articles.append({
-                    'title': article.get('title', ''),
-                    'description': article.get('description', ''),
-                    'url': article.get('url', ''),
-                    'urlToImage': article.get('urlToImage', ''),
-                    'publishedAt': article.get('publishedAt', ''),
-                    'source': article.get('source', {}).get('name', 'Unknown'),
-                    'author': article.get('author', 'Unknown')
-                })
-            
-            return {
-                'totalResults': data.get('totalResults', 0),
-                'articles': formatted_articles,
-                'query': query
-            }
-            
-        except requests.exceptions.RequestException as e:
-            raise Exception(f'Network error: {str(e)}')
-        except Exception as e:
-            raise Exception(str(e))
\ No newline at end of file
+        # Last 30 days ka news
+        from_date = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
+        
+        params = {
+            'apiKey': self.api_key,
+            'q': query,
+            'language': 'en',
+            'sortBy': 'publishedAt',
+            'from': from_date,
+            'page': page,
+            'pageSize': page_size
+        }
+        
+        data = self._get('everything', params)
+        
+        return {
+            'totalResults': data.get('totalResults', 0),
+            'articles': parse_articles(data.get('articles', [])),
+            'query': query
+        }
\ No newline at end of file
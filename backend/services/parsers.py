@@ -0,0 +1,355 @@
+"""
+Provider Parsers
+Precompiled field mappings for each Alpha Vantage and NewsAPI response
+shape, and a streaming parser for large Alpha Vantage time series
+"""
+
+import json
+from operator import itemgetter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from services.errors import UpstreamParseError
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:  # orjson is optional, stdlib json is the fallback
+    _loads = json.loads
+
+# Marks a field without a default: records lacking it are a parse error
+REQUIRED = object()
+
+# Field: (API name, vendor key, converter, default)
+Field = Tuple[str, str, Callable[[Any], Any], Any]
+
+
+def _percent(value: str) -> float:
+    return float(value.rstrip("%"))
+
+
+def _same(value: Any) -> Any:
+    return value
+
+
+def _source_name(source: Optional[dict]) -> str:
+    return (source or {}).get("name", "Unknown")
+
+
+class FieldMap:
+    """
+    Maps vendor records of one shape to the API's field names
+
+    The vendor keys are looked up with a single itemgetter; only records
+    that lack one of them take the slow path, which fills in defaults (or
+    fails for required fields). Any unexpected value raises
+    UpstreamParseError instead of a bare KeyError or ValueError.
+    """
+
+    def __init__(self, shape: str, fields: Sequence[Field]):
+        self.shape = shape
+        self.fields = tuple(fields)
+        self._names = tuple(name for name, _, _, _ in fields)
+        self._converters = tuple(convert for _, _, convert, _ in fields)
+        keys = [key for _, key, _, _ in fields]
+        # itemgetter of one key returns the bare value, not a tuple
+        self._get = itemgetter(*keys) if len(keys) > 1 else lambda record: (record[keys[0]],)
+
+    def _fill(self, record: dict) -> tuple:
+        values = []
+        for name, key, _, default in self.fields:
+            if key in record:
+                values.append(record[key])
+            elif default is REQUIRED:
+                raise UpstreamParseError(f"{self.shape} response has no {key!r}")
+            else:
+                values.append(default)
+        return tuple(values)
+
+    def parse(self, record: dict) -> dict:
+        """
+        Convert one vendor record
+
+        Raises:
+            UpstreamParseError: Required field missing or a value of the wrong type
+        """
+        try:
+            values = self._get(record)
+        except KeyError:
+            values = self._fill(record)
+        except TypeError:
+            raise UpstreamParseError(f"{self.shape} record is not an object")
+        try:
+            return {name: convert(value) for name, convert, value in zip(self._names, self._converters, values)}
+        except (TypeError, ValueError) as e:
+            raise UpstreamParseError(f"Bad value in {self.shape} response: {e}")
+
+    def parse_many(self, records: Iterable[dict]) -> List[dict]:
+        return [self.parse(record) for record in records]
+
+
+GLOBAL_QUOTE = FieldMap("GLOBAL_QUOTE", [
+    ("price", "05. price", float, REQUIRED),
+    ("change", "09. change", float, 0.0),
+    ("changePercent", "10. change percent", _percent, "0"),
+    ("open", "02. open", float, 0.0),
+    ("high", "03. high", float, 0.0),
+    ("low", "04. low", float, 0.0),
+    ("volume", "06. volume", int, 0),
+    ("previousClose", "08. previous close", float, 0.0),
+    ("latestTradingDay", "07. latest trading day", str, ""),
+])
+
+SYMBOL_SEARCH = FieldMap("SYMBOL_SEARCH", [
+    ("symbol", "1. symbol", str, ""),
+    ("name", "2. name", str, ""),
+    ("type", "3. type", str, ""),
+    ("region", "4. region", str, ""),
+    ("currency", "8. currency", str, ""),
+])
+
+NEWS_ARTICLE = FieldMap("NewsAPI article", [
+    ("title", "title", _same, ""),
+    ("description", "description", _same, ""),
+    ("url", "url", _same, ""),
+    ("urlToImage", "urlToImage", _same, ""),
+    ("publishedAt", "publishedAt", _same, ""),
+    ("source", "source", _source_name, None),
+    ("author", "author", _same, "Unknown"),
+])
+
+
+def parse_articles(articles: Iterable[dict]) -> List[dict]:
+    """NewsAPI articles, without removed ones and ones without a title"""
+    return [
+        NEWS_ARTICLE.parse(article) for article in articles
+        if article.get("title") and article.get("title") != "[Removed]"
+    ]
+
+
+# ----------------------------------------------------------------------
+# Time series
+# ----------------------------------------------------------------------
+
+class SeriesShape:
+    """
+    Fields of one Alpha Vantage time series row: vendor key, API name and
+    type of each
+    """
+
+    def __init__(self, fields: Sequence[Tuple[str, str, type]]):
+        self.names = tuple(name for name, _, _ in fields)
+        self.getters = tuple(itemgetter(key) for _, key, _ in fields)
+        self.types = tuple(kind for _, _, kind in fields)
+        self.dtypes = tuple(np.float64 if kind is float else np.int64 for kind in self.types)
+
+
+BARS = SeriesShape([
+    ("open", "1. open", float),
+    ("high", "2. high", float),
+    ("low", "3. low", float),
+    ("close", "4. close", float),
+    ("volume", "5. volume", int),
+])
+
+# TIME_SERIES_DAILY_ADJUSTED: raw prices plus the vendor's corporate actions
+ADJUSTED_BARS = SeriesShape([
+    ("open", "1. open", float),
+    ("high", "2. high", float),
+    ("low", "3. low", float),
+    ("close", "4. close", float),
+    ("adjustedClose", "5. adjusted close", float),
+    ("volume", "6. volume", int),
+    ("dividend", "7. dividend amount", float),
+    ("split", "8. split coefficient", float),
+])
+
+FX_BARS = SeriesShape([
+    ("open", "1. open", float),
+    ("high", "2. high", float),
+    ("low", "3. low", float),
+    ("close", "4. close", float),
+])
+
+
+class SeriesColumns:
+    """Parsed time series: timestamps and one array per field, oldest first"""
+
+    __slots__ = ("times", "columns")
+
+    def __init__(self, times: np.ndarray, columns: Dict[str, np.ndarray]):
+        # Timestamps as strings: "2026-10-19" or "2026-10-19 15:59:00"
+        self.times = times
+        self.columns = columns
+
+    @classmethod
+    def ordered(cls, times: np.ndarray, columns: Dict[str, np.ndarray]) -> "SeriesColumns":
+        """Columns sorted oldest first (Alpha Vantage sends the newest row first)"""
+        if len(times) > 1 and not (times[1:] > times[:-1]).all():
+            if (times[1:] < times[:-1]).all():
+                order = slice(None, None, -1)
+            else:
+                order = np.argsort(times, kind="stable")
+            times = times[order]
+            columns = {name: column[order] for name, column in columns.items()}
+        return cls(times, columns)
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def tail(self, count: int) -> "SeriesColumns":
+        """The newest count rows"""
+        start = max(len(self.times) - count, 0)
+        return SeriesColumns(self.times[start:], {name: column[start:] for name, column in self.columns.items()})
+
+    def records(self, time_key: str) -> List[dict]:
+        """Rows as API dicts: {time_key, open, ...}"""
+        records: List[dict] = [{time_key: time} for time in self.times.tolist()]
+        # Filling column by column is cheaper than a dict(zip()) per row
+        for name, column in self.columns.items():
+            for record, value in zip(records, column.tolist()):
+                record[name] = value
+        return records
+
+
+def _head_before(body: bytes, start: int) -> bytes:
+    # The response up to the series' key, closed back into a JSON object
+    return body[:start].rstrip().rstrip(b",") + b"}"
+
+
+class SeriesParser:
+    """
+    Incremental parser of one Alpha Vantage time series response
+
+    Fed the body in chunks as it downloads. Whole rows of the series are
+    cut off the buffered text at the last `},` (the end of a row), decoded
+    as one small object and turned into numpy columns right away, so
+    neither the whole body nor its decoded tree is ever held: peak memory
+    is about one chunk plus the columns. With a sink, each batch of rows
+    is handed to it instead of being kept, so memory stays at about one
+    chunk however long the series is. Everything before the series
+    (metadata, or an error envelope like {"Note": ...} that has no series
+    at all) is decoded as it is.
+    """
+
+    # An envelope without the series is small; a big one is not a series response
+    MAX_HEAD_BYTES = 1 << 20
+
+    def __init__(self, series_key: str, shape: SeriesShape = BARS,
+                 sink: Optional[Callable[[SeriesColumns], None]] = None):
+        self.series_key = series_key
+        self.shape = shape
+        self.sink = sink
+        self.rows = 0
+        self._marker = json.dumps(series_key).encode()
+        self._head = b""
+        # Unparsed text of the series; None until its key has been seen
+        self._rest: Optional[bytes] = None
+        self._opened = False
+        self._batches: List[SeriesColumns] = []
+
+    def feed(self, chunk: bytes) -> None:
+        if self._rest is not None:
+            self._rest += chunk
+            self._scan()
+            return
+        self._head += chunk
+        start = self._head.find(self._marker)
+        if start < 0:
+            if len(self._head) > self.MAX_HEAD_BYTES:
+                raise UpstreamParseError(f"Response has no {self.series_key!r}")
+            return
+        self._rest = self._head[start + len(self._marker):]
+        self._head = _head_before(self._head, start)
+        self._scan()
+
+    def _scan(self) -> None:
+        if not self._opened:
+            brace = self._rest.find(b"{")
+            if brace < 0:
+                return
+            if self._rest[:brace].strip() != b":":
+                raise UpstreamParseError(f"{self.series_key!r} is not an object")
+            self._rest = self._rest[brace + 1:]
+            self._opened = True
+        end = self._rest.rfind(b"},")
+        if end >= 0:
+            self._take(self._rest[:end + 1])
+            self._rest = self._rest[end + 2:]
+
+    def _take(self, rows_text: bytes) -> None:
+        shape = self.shape
+        try:
+            rows = _loads(b"{" + rows_text + b"}")
+            values = list(rows.values())
+            count = len(values)
+            columns = {
+                name: np.fromiter(map(kind, map(get, values)), dtype, count)
+                for name, get, kind, dtype in zip(shape.names, shape.getters, shape.types, shape.dtypes)
+            }
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            raise UpstreamParseError(f"Malformed {self.series_key!r}: {e!r}")
+        batch = SeriesColumns.ordered(np.array(list(rows), dtype=str), columns)
+        self.rows += count
+        if self.sink is not None:
+            self.sink(batch)
+        else:
+            self._batches.append(batch)
+
+    def finish(self) -> dict:
+        """
+        The decoded response
+
+        Returns:
+            The response's other members, plus series_key -> SeriesColumns
+            if the response has the series (with a sink: the number of
+            rows passed to it)
+
+        Raises:
+            UpstreamParseError: Body is not JSON or the series is truncated
+        """
+        try:
+            envelope = _loads(self._head)
+        except ValueError as e:
+            raise UpstreamParseError(f"Response is not JSON: {e}")
+        if not isinstance(envelope, dict):
+            raise UpstreamParseError("Response is not a JSON object")
+        if self._rest is None:
+            return envelope
+        # What is left is the last rows, then the series' and the response's closing braces
+        rest = self._rest.rstrip()
+        if not self._opened or not rest.endswith(b"}"):
+            raise UpstreamParseError(f"Truncated {self.series_key!r}")
+        rest = rest[:-1].rstrip()
+        if not rest.endswith(b"}"):
+            raise UpstreamParseError(f"Truncated {self.series_key!r}")
+        rest = rest[:-1]
+        if rest.strip():
+            self._take(rest)
+        if self.sink is not None:
+            envelope[self.series_key] = self.rows
+            return envelope
+        batches = self._batches
+        if not batches:
+            envelope[self.series_key] = SeriesColumns(np.array([], dtype=str), {
+                name: np.array([], dtype=dtype) for name, dtype in zip(self.shape.names, self.shape.dtypes)
+            })
+            return envelope
+        # Batches come newest first too: reversed, the rows are usually in order already
+        if batches[0].times[0] > batches[-1].times[0]:
+            batches = batches[::-1]
+        envelope[self.series_key] = SeriesColumns.ordered(
+            np.concatenate([batch.times for batch in batches]),
+            {name: np.concatenate([batch.columns[name] for batch in batches]) for name in self.shape.names},
+        )
+        return envelope
+
+
+def parse_series(chunks: Iterable[bytes], series_key: str, shape: SeriesShape = BARS,
+                 sink: Optional[Callable[[SeriesColumns], None]] = None) -> dict:
+    """Run a SeriesParser over a body's chunks"""
+    parser = SeriesParser(series_key, shape, sink)
+    for chunk in chunks:
+        parser.feed(chunk)
+    return parser.finish()
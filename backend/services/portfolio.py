@@ -0,0 +1,483 @@
+"""
+Portfolio Service
+Holdings, cash and P&L of user portfolios, computed with numpy over the
+transaction ledger and the local market data
+"""
+
+import copy
+import datetime
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from services.database import Database
+from services.fx import FXService
+from services.market_store import MarketStore
+from services.quote_snapshot import QuoteSnapshotStore
+
+MAX_PORTFOLIOS_PER_USER = 20
+
+_TRANSACTION_COLUMNS = "id, kind, symbol, quantity, price, fees, amount, date"
+
+
+class Ledger:
+    """
+    Transactions of one portfolio version as numpy columns
+
+    Trades carry a signed quantity (negative = sell); cash rows carry a
+    signed amount (negative = withdrawal).
+    """
+
+    def __init__(self, rows: Sequence[tuple]):
+        self.rows = rows
+        trades = [row for row in rows if row[1] == "trade"]
+        self.symbols, codes = np.unique(np.array([row[2] for row in trades], dtype=str), return_inverse=True)
+        self.codes = codes.astype(np.intp)
+        self.quantity = np.array([row[3] for row in trades], dtype=float)
+        self.price = np.array([row[4] for row in trades], dtype=float)
+        self.fees = np.array([row[5] for row in trades], dtype=float)
+        self.trade_dates = np.array([row[7] for row in trades], dtype="datetime64[D]")
+        cash = [row for row in rows if row[1] == "cash"]
+        self.deposits = np.array([row[6] for row in cash], dtype=float)
+        self.deposit_dates = np.array([row[7] for row in cash], dtype="datetime64[D]")
+
+    def holdings(self) -> Dict[str, np.ndarray]:
+        """
+        Per-symbol position, aligned with self.symbols
+
+        Cost uses the average purchase price over all buys; sells realize
+        the difference to it.
+        """
+        n = len(self.symbols)
+        buys = self.quantity > 0
+        bought = np.bincount(self.codes, np.where(buys, self.quantity, 0.0), n)
+        buy_cost = np.bincount(self.codes, np.where(buys, self.quantity * self.price + self.fees, 0.0), n)
+        sold = np.bincount(self.codes, np.where(buys, 0.0, -self.quantity), n)
+        proceeds = np.bincount(self.codes, np.where(buys, 0.0, -self.quantity * self.price - self.fees), n)
+        quantity = bought - sold
+        with np.errstate(divide="ignore", invalid="ignore"):
+            average_cost = np.where(bought > 0, buy_cost / bought, 0.0)
+        return {
+            "quantity": quantity,
+            "averageCost": average_cost,
+            "costBasis": average_cost * quantity,
+            "realizedPnl": proceeds - average_cost * sold,
+        }
+
+    def cash_flows(self) -> np.ndarray:
+        """Cash effect of each trade"""
+        return -self.quantity * self.price - self.fees
+
+    @property
+    def cash(self) -> float:
+        return float(self.deposits.sum() + self.cash_flows().sum())
+
+    def converted(self, trade_rates: np.ndarray, deposit_rates: np.ndarray) -> "Ledger":
+        """
+        The same ledger with trade prices/fees and cash amounts multiplied by a rate each
+
+        Args:
+            trade_rates: One rate per trade (e.g. on its date)
+            deposit_rates: One rate per cash row
+        """
+        ledger = copy.copy(self)
+        ledger.price = self.price * trade_rates
+        ledger.fees = self.fees * trade_rates
+        ledger.deposits = self.deposits * deposit_rates
+        return ledger
+
+
+class PortfolioService:
+    """
+    Portfolio CRUD and analytics
+
+    Every change bumps the portfolio's version, so the parsed ledger is
+    cached per (portfolio, version) and valuations per (version, prices):
+    repeated calls only re-run the math when a trade was added or a
+    constituent's price moved.
+
+    Values are summed as entered unless a currency is asked for; then
+    trades are converted from each symbol's currency at the rate of their
+    date, cash from the portfolio's currency, and prices at the latest rate.
+    """
+
+    def __init__(self, database: Database, store: MarketStore, quotes: Optional[QuoteSnapshotStore] = None,
+                 cache_size: int = 512, quote_max_age: float = 60.0, fx: Optional[FXService] = None):
+        self.db = database
+        self.store = store
+        self.quotes = quotes
+        self.fx = fx
+        self.quote_max_age = quote_max_age
+        self.cache_size = cache_size
+        self._ledgers: "OrderedDict[int, Tuple[int, Ledger]]" = OrderedDict()
+        self._results: "OrderedDict[tuple, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Caches
+    # ------------------------------------------------------------------
+
+    def _remember(self, cache: OrderedDict, key, value) -> None:
+        with self._lock:
+            cache[key] = value
+            cache.move_to_end(key)
+            while len(cache) > self.cache_size:
+                cache.popitem(last=False)
+
+    def _recall(self, cache: OrderedDict, key):
+        with self._lock:
+            value = cache.get(key)
+            if value is not None:
+                cache.move_to_end(key)
+            return value
+
+    # ------------------------------------------------------------------
+    # Portfolios and transactions
+    # ------------------------------------------------------------------
+
+    def list(self, username: str) -> List[dict]:
+        with self.db.connection() as conn:
+            rows = conn.execute(
+                "SELECT id, name, currency, created_at FROM portfolios WHERE username = ? ORDER BY id",
+                (username,),
+            ).fetchall()
+        return [{"id": i, "name": n, "currency": c, "createdAt": t} for i, n, c, t in rows]
+
+    def create(self, username: str, name: str, currency: str = "USD") -> dict:
+        """
+        Raises:
+            ValueError: Too many portfolios
+        """
+        with self.db.connection() as conn:
+            count = conn.execute("SELECT COUNT(*) FROM portfolios WHERE username = ?", (username,)).fetchone()[0]
+            if count >= MAX_PORTFOLIOS_PER_USER:
+                raise ValueError(f"At most {MAX_PORTFOLIOS_PER_USER} portfolios per user")
+            now = time.time()
+            portfolio_id = conn.execute(
+                "INSERT INTO portfolios (username, name, currency, created_at) VALUES (?, ?, ?, ?)",
+                (username, name, currency, now),
+            ).lastrowid
+        return {"id": portfolio_id, "name": name, "currency": currency, "createdAt": now}
+
+    def delete(self, username: str, portfolio_id: int) -> bool:
+        with self.db.connection() as conn:
+            deleted = conn.execute(
+                "DELETE FROM portfolios WHERE id = ? AND username = ?", (portfolio_id, username)
+            ).rowcount
+            if deleted:
+                conn.execute("DELETE FROM portfolio_transactions WHERE portfolio_id = ?", (portfolio_id,))
+        return bool(deleted)
+
+    def add_transaction(self, username: str, portfolio_id: int, kind: str, date: str, symbol: Optional[str] = None,
+                        quantity: float = 0.0, price: float = 0.0, fees: float = 0.0,
+                        amount: float = 0.0) -> Optional[dict]:
+        """
+        Record a trade (signed quantity) or a cash movement (signed amount)
+
+        Returns:
+            The transaction, or None if the portfolio doesn't exist
+        """
+        with self.db.connection() as conn:
+            # The version bump doubles as the ownership check
+            if not conn.execute(
+                "UPDATE portfolios SET version = version + 1 WHERE id = ? AND username = ?",
+                (portfolio_id, username),
+            ).rowcount:
+                return None
+            transaction_id = conn.execute(
+                '''INSERT INTO portfolio_transactions
+                   (portfolio_id, kind, symbol, quantity, price, fees, amount, date, created_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                (portfolio_id, kind, symbol, quantity, price, fees, amount, date, time.time()),
+            ).lastrowid
+        return _transaction_dict((transaction_id, kind, symbol, quantity, price, fees, amount, date))
+
+    def delete_transaction(self, username: str, portfolio_id: int, transaction_id: int) -> bool:
+        with self.db.connection() as conn:
+            if not conn.execute(
+                "UPDATE portfolios SET version = version + 1 WHERE id = ? AND username = ?",
+                (portfolio_id, username),
+            ).rowcount:
+                return False
+            deleted = conn.execute(
+                "DELETE FROM portfolio_transactions WHERE id = ? AND portfolio_id = ?",
+                (transaction_id, portfolio_id),
+            ).rowcount
+            if not deleted:
+                conn.rollback()
+        return bool(deleted)
+
+    def _ledger(self, username: str, portfolio_id: int) -> Optional[Tuple[dict, Ledger]]:
+        with self.db.connection() as conn:
+            row = conn.execute(
+                "SELECT id, name, currency, version FROM portfolios WHERE id = ? AND username = ?",
+                (portfolio_id, username),
+            ).fetchone()
+            if row is None:
+                return None
+            info = {"id": row[0], "name": row[1], "currency": row[2], "version": row[3]}
+            cached = self._recall(self._ledgers, portfolio_id)
+            if cached is not None and cached[0] == info["version"]:
+                return info, cached[1]
+            rows = conn.execute(
+                f"SELECT {_TRANSACTION_COLUMNS} FROM portfolio_transactions WHERE portfolio_id = ? ORDER BY date, id",
+                (portfolio_id,),
+            ).fetchall()
+        ledger = Ledger(rows)
+        self._remember(self._ledgers, portfolio_id, (info["version"], ledger))
+        return info, ledger
+
+    def get(self, username: str, portfolio_id: int) -> Optional[dict]:
+        """Portfolio with its positions (at cost), cash and transactions"""
+        loaded = self._ledger(username, portfolio_id)
+        if loaded is None:
+            return None
+        info, ledger = loaded
+        holdings = ledger.holdings()
+        positions = [
+            {"symbol": symbol, **{name: float(values[i]) for name, values in holdings.items()}}
+            for i, symbol in enumerate(ledger.symbols.tolist())
+            if holdings["quantity"][i] != 0
+        ]
+        return {
+            **info,
+            "cash": ledger.cash,
+            "positions": positions,
+            "transactions": [_transaction_dict(row) for row in ledger.rows],
+        }
+
+    # ------------------------------------------------------------------
+    # Analytics
+    # ------------------------------------------------------------------
+
+    def _prices(self, symbols: Sequence[str]) -> Tuple[np.ndarray, np.ndarray, List[Optional[str]]]:
+        """
+        Latest price and daily change of each symbol, in one batch
+
+        Looks in the quote snapshots first (recent quotes only), then the
+        stored quotes (one query), then the last two daily bars. Missing
+        prices are NaN.
+
+        Returns:
+            (prices, changes, as-of trading days)
+        """
+        if self.quotes is not None:
+            found, columns, snapshot_days = self.quotes.lookup(symbols, self.quote_max_age)
+            if found.all():
+                return columns["price"], columns["change"], snapshot_days
+        else:
+            found = np.zeros(len(symbols), dtype=bool)
+        quotes: Dict[str, dict] = {}
+        missing = [s for s, ok in zip(symbols, found.tolist()) if not ok]
+        if missing:
+            quotes.update(self.store.get_quotes(missing))
+            missing = [s for s in missing if s not in quotes]
+        if missing:
+            for symbol, bars in self.store.get_recent_bars(missing, 2).items():
+                close = bars[-1][2]
+                previous = bars[0][2] if len(bars) > 1 else close
+                quotes[symbol] = {"price": close, "change": close - previous, "latestTradingDay": None}
+
+        prices = np.array([quotes.get(s, {}).get("price", np.nan) for s in symbols], dtype=float)
+        changes = np.array([quotes.get(s, {}).get("change", np.nan) for s in symbols], dtype=float)
+        days = [quotes.get(s, {}).get("latestTradingDay") for s in symbols]
+        if found.any():
+            prices[found] = columns["price"][found]
+            changes[found] = columns["change"][found]
+            days = [snapshot if ok else day for snapshot, day, ok in zip(snapshot_days, days, found.tolist())]
+        return prices, changes, days
+
+    def _fx_tag(self, currency: Optional[str]) -> Optional[str]:
+        if currency is None:
+            return None
+        if self.fx is None:
+            raise ValueError("Currency conversion is not available")
+        return self.fx.tag(currency)
+
+    def _in_currency(self, ledger: Ledger, portfolio_currency: str, currency: str) -> Ledger:
+        """Ledger with trades converted from their symbol's currency and cash from the portfolio's"""
+        symbol_currencies = [self.fx.currency_of(symbol) for symbol in ledger.symbols.tolist()]
+        trade_currencies = [symbol_currencies[code] for code in ledger.codes.tolist()]
+        return ledger.converted(
+            self.fx.rates_for(trade_currencies, currency, ledger.trade_dates),
+            self.fx.rates_for([portfolio_currency] * len(ledger.deposits), currency, ledger.deposit_dates),
+        )
+
+    def valuation(self, username: str, portfolio_id: int, currency: Optional[str] = None) -> Optional[dict]:
+        """
+        Market value, daily and total P&L and allocation
+
+        Args:
+            currency: Convert every value into this currency
+
+        Returns:
+            Totals plus one row per open position, or None if not found
+
+        Raises:
+            UpstreamError: FX rates needed for the conversion are unavailable
+        """
+        loaded = self._ledger(username, portfolio_id)
+        if loaded is None:
+            return None
+        info, ledger = loaded
+        fx_tag = self._fx_tag(currency)
+        if currency is not None:
+            ledger = self._in_currency(ledger, info["currency"], currency)
+        holdings = ledger.holdings()
+        open_positions = holdings["quantity"] != 0
+        symbols = ledger.symbols[open_positions].tolist()
+        prices, changes, days = self._prices(symbols)
+        if currency is not None:
+            rates = self.fx.rates_for([self.fx.currency_of(symbol) for symbol in symbols], currency)
+            prices, changes = prices * rates, changes * rates
+
+        key = ("valuation", portfolio_id, info["version"], fx_tag, prices.tobytes(), changes.tobytes())
+        cached = self._recall(self._results, key)
+        if cached is not None:
+            return cached
+
+        quantity = holdings["quantity"][open_positions]
+        cost_basis = holdings["costBasis"][open_positions]
+        market_value = quantity * prices
+        unrealized = market_value - cost_basis
+        day_pnl = quantity * changes
+        cash = ledger.cash
+        priced = ~np.isnan(market_value)
+        invested = float(market_value[priced].sum())
+        total_value = invested + cash
+        with np.errstate(divide="ignore", invalid="ignore"):
+            allocation = market_value / total_value * 100 if total_value else np.full(len(symbols), np.nan)
+            unrealized_percent = unrealized / cost_basis * 100
+            previous_value = float((market_value - day_pnl)[priced].sum())
+
+        columns = {
+            "quantity": quantity, "price": prices, "change": changes,
+            "marketValue": market_value, "costBasis": cost_basis,
+            "averageCost": holdings["averageCost"][open_positions],
+            "unrealizedPnl": unrealized, "unrealizedPnlPercent": unrealized_percent,
+            "dayPnl": day_pnl, "allocation": allocation,
+        }
+        lists = {name: values.tolist() for name, values in columns.items()}
+        positions = []
+        for i, symbol in enumerate(symbols):
+            row = {"symbol": symbol, "asOf": days[i]}
+            for name, values in lists.items():
+                value = values[i]
+                row[name] = None if value != value else value
+            positions.append(row)
+
+        day_pnl_total = float(np.nansum(day_pnl))
+        result = {
+            **info,
+            "valuationCurrency": currency,
+            "cash": cash,
+            "marketValue": invested,
+            "totalValue": total_value,
+            "costBasis": float(cost_basis.sum()),
+            "unrealizedPnl": float(unrealized[priced].sum()),
+            "realizedPnl": float(holdings["realizedPnl"].sum()),
+            "dayPnl": day_pnl_total,
+            "dayPnlPercent": day_pnl_total / previous_value * 100 if previous_value else None,
+            "netDeposits": float(ledger.deposits.sum()),
+            "unpriced": [symbols[i] for i in np.flatnonzero(~priced).tolist()],
+            "positions": positions,
+        }
+        self._remember(self._results, key, result)
+        return result
+
+    def equity_curve(self, username: str, portfolio_id: int, days: int = 365,
+                     currency: Optional[str] = None) -> Optional[dict]:
+        """
+        Daily portfolio value from the stored closes
+
+        Holdings and cash are replayed from the ledger onto the union of
+        trading dates; a symbol missing a date keeps its previous close.
+
+        Args:
+            days: Calendar days back from today
+            currency: Convert every value into this currency, at each day's rate
+
+        Returns:
+            {"dates", "equity", "cash", "netDeposits"}, or None if not found
+
+        Raises:
+            UpstreamError: FX rates needed for the conversion are unavailable
+        """
+        loaded = self._ledger(username, portfolio_id)
+        if loaded is None:
+            return None
+        info, ledger = loaded
+        symbols = ledger.symbols.tolist()
+        start = (datetime.date.today() - datetime.timedelta(days=days)).isoformat()
+
+        fx_tag = self._fx_tag(currency)
+        key = ("equity", portfolio_id, info["version"], start, self.store.bars_version(symbols), fx_tag)
+        cached = self._recall(self._results, key)
+        if cached is not None:
+            return cached
+        if currency is not None:
+            ledger = self._in_currency(ledger, info["currency"], currency)
+
+        history = self.store.get_close_history(symbols, start)
+        if not history:
+            dates = np.array([], dtype="datetime64[D]")
+        else:
+            dates = np.unique(np.concatenate([np.array(d, dtype="datetime64[D]") for d, _ in history.values()]))
+
+        # Closes on the common calendar, forward filled (then back filled at the start)
+        closes = np.full((len(symbols), len(dates)), np.nan)
+        for i, symbol in enumerate(symbols):
+            if symbol in history:
+                symbol_dates, symbol_closes = history[symbol]
+                closes[i, np.searchsorted(dates, np.array(symbol_dates, dtype="datetime64[D]"))] = symbol_closes
+        if len(dates):
+            filled = np.where(np.isnan(closes), 0, np.arange(len(dates)))
+            np.maximum.accumulate(filled, axis=1, out=filled)
+            closes = np.take_along_axis(closes, filled, axis=1)
+            first = np.argmax(~np.isnan(closes), axis=1)
+            closes = np.where(np.isnan(closes), closes[np.arange(len(symbols)), first][:, None], closes)
+        closes = np.nan_to_num(closes)
+        if currency is not None and len(dates):
+            # One rate row per currency, applied to all of its symbols' closes
+            symbol_currencies = np.array([self.fx.currency_of(symbol) for symbol in symbols], dtype=object)
+            for symbol_currency in set(symbol_currencies.tolist()) - {None, currency}:
+                closes[symbol_currencies == symbol_currency] *= self.fx.rates(symbol_currency, currency, dates)
+
+        # Position and cash changes land on the first trading date on/after they happen
+        trade_at = np.searchsorted(dates, ledger.trade_dates)
+        deposit_at = np.searchsorted(dates, ledger.deposit_dates)
+        position_delta = np.zeros((len(symbols), len(dates) + 1))
+        np.add.at(position_delta, (ledger.codes, trade_at), ledger.quantity)
+        cash_delta = np.zeros(len(dates) + 1)
+        np.add.at(cash_delta, trade_at, ledger.cash_flows())
+        np.add.at(cash_delta, deposit_at, ledger.deposits)
+        deposit_delta = np.zeros(len(dates) + 1)
+        np.add.at(deposit_delta, deposit_at, ledger.deposits)
+
+        positions = np.cumsum(position_delta, axis=1)[:, :len(dates)]
+        cash = np.cumsum(cash_delta)[:len(dates)]
+        equity = (positions * closes).sum(axis=0) + cash
+
+        result = {
+            **info,
+            "valuationCurrency": currency,
+            "dates": dates.astype(str).tolist(),
+            "equity": equity.tolist(),
+            "cash": cash.tolist(),
+            "netDeposits": np.cumsum(deposit_delta)[:len(dates)].tolist(),
+        }
+        self._remember(self._results, key, result)
+        return result
+
+
+def _transaction_dict(row: tuple) -> dict:
+    transaction_id, kind, symbol, quantity, price, fees, amount, date = row
+    if kind == "cash":
+        return {"id": transaction_id, "kind": kind, "amount": amount, "date": date}
+    return {
+        "id": transaction_id, "kind": kind, "symbol": symbol,
+        "quantity": quantity, "price": price, "fees": fees, "date": date,
+    }
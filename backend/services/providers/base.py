@@ -0,0 +1,89 @@
+"""
+Market Data Provider Interface
+Common shape of every quote / daily series / symbol search source
+"""
+
+from abc import ABC, abstractmethod
+from typing import List
+
+from services.errors import NoDataError
+
+
+class MarketDataProvider(ABC):
+    """
+    A source of market data
+
+    Results use the API's response shapes:
+        get_quote        -> {'symbol', 'price', 'change', 'changePercent', ...}
+        get_time_series  -> {'symbol', 'data': [{'date', 'open', ..., 'volume'}]}
+        search_symbols   -> [{'symbol', 'name', 'type', 'region', 'currency'}]
+        get_intraday     -> {'symbol', 'interval', 'timeZone', 'data': [{'timestamp', 'open', ...}]}
+        get_fx_daily     -> {'from', 'to', 'data': [{'date', 'rate'}]}
+        get_daily_history -> {'symbol', 'rows', 'adjusted'} (the bars themselves go to a sink)
+
+    Implementations raise services.errors.UpstreamError subclasses when they
+    cannot answer (unreachable, rate limited, no data, malformed response), which lets
+    ProviderRouter fail over to the next provider. Any other exception
+    means the request itself is bad and is passed to the caller.
+    """
+
+    name = 'provider'
+    # 0 for live vendors; higher tiers are fallbacks whose data may lag
+    tier = 0
+
+    @abstractmethod
+    def get_quote(self, symbol: str) -> dict:
+        ...
+
+    @abstractmethod
+    def get_time_series(self, symbol: str) -> dict:
+        ...
+
+    @abstractmethod
+    def search_symbols(self, keywords: str) -> List[dict]:
+        ...
+
+    def get_intraday(self, symbol: str, interval: str = '1min', full: bool = False) -> dict:
+        """
+        Intraday bars, oldest first, timestamps in the exchange's local time
+
+        Args:
+            symbol: Stock symbol
+            interval: 1min, 5min, 15min or 60min
+            full: The vendor's whole intraday window instead of the latest bars
+
+        Providers without intraday data keep this default.
+        """
+        raise NoDataError(f'{self.name} has no intraday data')
+
+    def get_fx_daily(self, from_currency: str, to_currency: str) -> dict:
+        """
+        Daily closing exchange rates of a currency pair, oldest first
+
+        Args:
+            from_currency: ISO code of the base currency
+            to_currency: ISO code of the quote currency (units per base unit)
+
+        Providers without FX data keep this default.
+        """
+        raise NoDataError(f'{self.name} has no FX data')
+
+    def get_daily_history(self, symbol: str, full: bool = False, sink=None) -> dict:
+        """
+        Daily bars with split and dividend columns (see parsers.ADJUSTED_BARS)
+
+        Args:
+            symbol: Stock symbol
+            full: The whole history (20+ years) instead of the last 100 days
+            sink: Called with each batch of parsed rows (SeriesColumns,
+                oldest first) as the body downloads; batches may repeat
+                if the request is retried
+
+        A provider that can only serve raw bars (no dividend and split
+        columns, possibly fewer days than asked for) returns adjusted=False.
+        Providers without daily history keep this default.
+        """
+        raise NoDataError(f'{self.name} has no daily history')
+
+    def close(self) -> None:
+        """Release resources held by the provider"""
@@ -0,0 +1,65 @@
+"""
+Local Market Data Provider
+Serves quotes, daily bars and symbols from the local MarketStore
+"""
+
+from typing import List
+
+from services.errors import NoDataError
+from services.market_store import MarketStore
+from services.providers.base import MarketDataProvider
+
+
+class LocalMarketDataProvider(MarketDataProvider):
+    """
+    Provider backed by SQLite
+
+    The store is filled by ProviderRouter (results of live providers are
+    mirrored into it) or by importing data, so it can answer while the
+    vendors are down, and offline in development.
+    """
+
+    name = 'local'
+    tier = 1
+
+    def __init__(self, store: MarketStore, series_limit: int = 60):
+        self.store = store
+        self.series_limit = series_limit
+
+    def get_quote(self, symbol: str) -> dict:
+        quote = self.store.get_quote(symbol)
+        if quote is not None:
+            return quote
+
+        # No stored quote: derive one from the last two daily bars
+        bars = self.store.get_bars(symbol, limit=2)
+        if not bars:
+            raise NoDataError(f'No local data for {symbol}')
+        last = bars[-1]
+        previous = bars[0]['close'] if len(bars) > 1 else last['open']
+        change = last['close'] - previous
+        return {
+            'symbol': symbol,
+            'price': last['close'],
+            'change': change,
+            'changePercent': change / previous * 100 if previous else 0.0,
+            'open': last['open'],
+            'high': last['high'],
+            'low': last['low'],
+            'volume': last['volume'],
+            'previousClose': previous,
+            'latestTradingDay': last['date'],
+        }
+
+    def get_time_series(self, symbol: str) -> dict:
+        bars = self.store.get_bars(symbol, limit=self.series_limit)
+        if not bars:
+            raise NoDataError(f'No local chart data for {symbol}')
+        return {'symbol': symbol, 'data': bars}
+
+    def search_symbols(self, keywords: str) -> List[dict]:
+        # No match here says nothing about the vendor's universe: not an empty answer
+        matches = self.store.search_symbols(keywords)
+        if not matches:
+            raise NoDataError(f'No local symbols match {keywords!r}')
+        return matches
@@ -0,0 +1,313 @@
+"""
+Provider Router
+Orders market data providers by health and latency, fails over between
+them and hedges slow quote requests
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from metrics import PROVIDER_FAILOVERS, PROVIDER_HEDGES
+from services.cache import Fallback
+from services.errors import UpstreamError, UpstreamUnavailableError
+from services.market_store import MarketStore
+from services.providers.base import MarketDataProvider
+from services.rate_limit import on_admit
+
+logger = logging.getLogger(__name__)
+
+
+class ProviderStats:
+    """
+    Recent latency and failures of one provider
+
+    Keeps an EWMA of successful call latency for ranking and a window of
+    raw samples for the hedging percentile.
+    """
+
+    def __init__(self, window: int = 200, alpha: float = 0.2, max_failures: int = 3, cooldown: float = 30.0):
+        self.alpha = alpha
+        self.max_failures = max_failures
+        self.cooldown = cooldown
+        self.ewma: Optional[float] = None
+        self.consecutive_failures = 0
+        self.last_failure = 0.0
+        self._samples: deque = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, latency: float, failed: bool) -> None:
+        with self._lock:
+            if failed:
+                self.consecutive_failures += 1
+                self.last_failure = time.monotonic()
+                return
+            self.consecutive_failures = 0
+            self._samples.append(latency)
+            self.ewma = latency if self.ewma is None else self.alpha * latency + (1 - self.alpha) * self.ewma
+
+    @property
+    def healthy(self) -> bool:
+        """False after repeated failures, until the cooldown has passed"""
+        return (
+            self.consecutive_failures < self.max_failures
+            or time.monotonic() - self.last_failure >= self.cooldown
+        )
+
+    def percentile(self, q: float, min_samples: int = 20) -> Optional[float]:
+        """
+        Latency percentile of recent successful calls
+
+        Args:
+            q: Quantile in [0, 1]
+            min_samples: Return None with fewer samples than this
+
+        Returns:
+            Seconds, or None if there is not enough data
+        """
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+class ProviderRouter(MarketDataProvider):
+    """
+    MarketDataProvider that delegates to the best available provider
+
+    Ranking: available providers first (healthy and circuit not open), then
+    by tier (live vendors before local fallbacks), then by latency EWMA.
+    Calls that fail with an UpstreamError move on to the next provider.
+
+    Quotes are hedged between live vendors: if the first provider hasn't
+    answered within its recent p95 latency, counted from when its rate
+    limiter let the request through, the same request is sent to the next
+    live (tier 0) provider and whichever answers first wins. The slower
+    call is left to finish in the background; its result only updates the
+    stats. Local fallbacks are never hedged to, only failed over to, and
+    get_quote_with_source() tells callers when one answered. for_cache()
+    wraps any fallback answer in cache.Fallback, so caches keep it briefly
+    and serve it as stale.
+
+    If a store is given, results from live (tier 0) providers are mirrored
+    into it so the local provider can serve them later.
+    """
+
+    name = 'router'
+
+    def __init__(
+        self,
+        providers: Sequence[MarketDataProvider],
+        hedge_quotes: bool = True,
+        hedge_quantile: float = 0.95,
+        hedge_min_delay: float = 0.05,
+        hedge_default_delay: float = 1.0,
+        store: Optional[MarketStore] = None,
+        max_workers: int = 8,
+    ):
+        if not providers:
+            raise ValueError('ProviderRouter needs at least one provider')
+        self.providers = list(providers)
+        self.hedge_quotes = hedge_quotes
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_default_delay = hedge_default_delay
+        self.store = store
+        self.stats: Dict[str, ProviderStats] = {p.name: ProviderStats() for p in self.providers}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='provider')
+
+    # ------------------------------------------------------------------
+    # Ranking
+    # ------------------------------------------------------------------
+
+    def _available(self, provider: MarketDataProvider) -> bool:
+        breaker = getattr(provider, 'breaker', None)
+        if breaker is not None and not breaker.available():
+            return False
+        return self.stats[provider.name].healthy
+
+    def ranked(self) -> List[MarketDataProvider]:
+        """Providers in the order they should be tried"""
+        def key(provider: MarketDataProvider):
+            ewma = self.stats[provider.name].ewma
+            return (not self._available(provider), provider.tier, 0.0 if ewma is None else ewma)
+        return sorted(self.providers, key=key)
+
+    def hedge_delay(self, provider: MarketDataProvider) -> float:
+        """Seconds to wait for a provider before sending a hedged request"""
+        p = self.stats[provider.name].percentile(self.hedge_quantile)
+        return self.hedge_default_delay if p is None else max(self.hedge_min_delay, p)
+
+    # ------------------------------------------------------------------
+    # Calls
+    # ------------------------------------------------------------------
+
+    def _call(self, provider: MarketDataProvider, method: str, arg: str, *extra,
+              admitted: Optional[Future] = None):
+        started = time.perf_counter()
+
+        def admit() -> None:
+            # Time the call from when the provider's rate limiter let it through
+            nonlocal started
+            started = time.perf_counter()
+            if admitted is not None and not admitted.done():
+                admitted.set_result(time.monotonic())
+
+        if getattr(provider, 'limiter', None) is None:
+            admit()
+        try:
+            with on_admit(admit):
+                result = getattr(provider, method)(arg, *extra)
+        except UpstreamError:
+            self.stats[provider.name].record(time.perf_counter() - started, failed=True)
+            raise
+        finally:
+            # Failed before the limiter let it through: nothing to wait for
+            if admitted is not None and not admitted.done():
+                admitted.set_result(time.monotonic())
+        self.stats[provider.name].record(time.perf_counter() - started, failed=False)
+        if self.store is not None and provider.tier == 0:
+            self._mirror(method, arg, result)
+        return result
+
+    def _mirror(self, method: str, arg: str, result) -> None:
+        try:
+            if method == 'get_quote':
+                self.store.upsert_quote(result)
+            elif method == 'get_time_series':
+                self.store.upsert_bars(result['symbol'], result['data'])
+            elif method == 'search_symbols':
+                self.store.upsert_symbols(result)
+        except Exception:
+            logger.warning('Could not mirror %s(%s) into the market store', method, arg, exc_info=True)
+
+    @staticmethod
+    def _pick_error(errors: List[Tuple[int, UpstreamError]]) -> UpstreamError:
+        # A live vendor's error (e.g. circuit open) says more than a fallback's "no data"
+        if not errors:
+            return UpstreamUnavailableError('No market data provider available')
+        return min(errors, key=lambda item: item[0])[1]
+
+    def _failover(self, method: str, arg: str, *extra) -> Tuple[Any, MarketDataProvider]:
+        errors: List[Tuple[int, UpstreamError]] = []
+        for provider in self.ranked():
+            try:
+                return self._call(provider, method, arg, *extra), provider
+            except UpstreamError as e:
+                PROVIDER_FAILOVERS.inc(provider.name, method)
+                errors.append((provider.tier, e))
+        raise self._pick_error(errors)
+
+    def _hedged(self, method: str, arg: str) -> Tuple[Any, MarketDataProvider]:
+        ranked = self.ranked()
+        position = 0
+        pending: Dict[Future, MarketDataProvider] = {}
+
+        def launch(hedge: bool) -> Tuple[Optional[MarketDataProvider], Future]:
+            nonlocal position
+            admitted: Future = Future()
+            if position >= len(ranked):
+                return None, admitted
+            provider = ranked[position]
+            position += 1
+            pending[self._executor.submit(self._call, provider, method, arg, admitted=admitted)] = provider
+            if hedge:
+                PROVIDER_HEDGES.inc(provider.name, 'sent')
+            return provider, admitted
+
+        current, admitted = launch(hedge=False)
+        hedged = False
+        errors: List[Tuple[int, UpstreamError]] = []
+        while pending:
+            waiting = set(pending)
+            timeout = None
+            # Only another live vendor is worth a hedge: a fallback would win with old data
+            if not hedged and current.tier == 0 and position < len(ranked) and ranked[position].tier == 0:
+                if admitted.done():
+                    timeout = max(0.0, self.hedge_delay(current) - (time.monotonic() - admitted.result()))
+                else:
+                    waiting.add(admitted)
+            done, _ = wait(waiting, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                hedged = True
+                launch(hedge=True)
+                continue
+            for future in done:
+                provider = pending.pop(future, None)
+                if provider is None:
+                    continue
+                try:
+                    result = future.result()
+                except UpstreamError as e:
+                    PROVIDER_FAILOVERS.inc(provider.name, method)
+                    errors.append((provider.tier, e))
+                    continue
+                if hedged and provider is not current:
+                    PROVIDER_HEDGES.inc(provider.name, 'won')
+                return result, provider
+            if not pending:
+                current, admitted = launch(hedge=False)
+                hedged = False
+        raise self._pick_error(errors)
+
+    # ------------------------------------------------------------------
+    # MarketDataProvider
+    # ------------------------------------------------------------------
+
+    def get_quote_with_source(self, symbol: str) -> Tuple[dict, MarketDataProvider]:
+        """
+        A quote and the provider that answered
+
+        Returns:
+            (quote, provider); a provider of tier > 0 is a local fallback
+            whose quote may be old
+        """
+        if self.hedge_quotes and len(self.providers) > 1:
+            return self._hedged('get_quote', symbol)
+        return self._failover('get_quote', symbol)
+
+    def for_cache(self, method: str, *args) -> Any:
+        """
+        Call a provider method as a TTLCache loader
+
+        Args:
+            method: MarketDataProvider method name, e.g. 'search_symbols'
+            args: Its arguments
+
+        Returns:
+            The result, or Fallback(result) if a fallback tier (tier > 0)
+            answered: its data may be old or incomplete, so the cache must
+            not keep it for the full TTL as if a vendor had answered
+        """
+        if method == 'get_quote':
+            result, provider = self.get_quote_with_source(*args)
+        else:
+            result, provider = self._failover(method, *args)
+        return Fallback(result) if provider.tier > 0 else result
+
+    def get_quote(self, symbol: str) -> dict:
+        return self.get_quote_with_source(symbol)[0]
+
+    def get_time_series(self, symbol: str) -> dict:
+        return self._failover('get_time_series', symbol)[0]
+
+    def search_symbols(self, keywords: str) -> List[dict]:
+        return self._failover('search_symbols', keywords)[0]
+
+    def get_intraday(self, symbol: str, interval: str = '1min', full: bool = False) -> dict:
+        return self._failover('get_intraday', symbol, interval, full)[0]
+
+    def get_fx_daily(self, from_currency: str, to_currency: str) -> dict:
+        return self._failover('get_fx_daily', from_currency, to_currency)[0]
+
+    def get_daily_history(self, symbol: str, full: bool = False, sink=None) -> dict:
+        return self._failover('get_daily_history', symbol, full, sink)[0]
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        for provider in self.providers:
+            provider.close()
@@ -0,0 +1,123 @@
+"""
+Quote Feed
+Fans quote deltas out to streaming subscribers, serializing each symbol's
+delta once per tick however many clients watch it
+"""
+
+import asyncio
+from typing import Iterable, List, Optional, Set, Tuple
+
+from responses import dumps
+from services.quote_snapshot import QuoteSnapshotStore
+
+# Queued message: (cursor, JSON payload), or None for "send a full snapshot"
+Message = Optional[Tuple[str, bytes]]
+
+
+class Subscription:
+    """One streaming client: its symbols and pending messages"""
+
+    __slots__ = ("symbols", "queue", "since")
+
+    def __init__(self, symbols: Iterable[str], max_pending: int):
+        self.symbols = frozenset(symbols)
+        self.queue: "asyncio.Queue[Message]" = asyncio.Queue(maxsize=max_pending)
+        # Sequence number the client's first event brought it to, until the next publish
+        self.since: Optional[int] = None
+
+    def offer(self, message: Message) -> None:
+        # A client that stopped reading gets one snapshot later instead of a backlog
+        if message is not None and not self.queue.full():
+            self.queue.put_nowait(message)
+            return
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+
+class QuoteFeed:
+    """
+    Publishes snapshot changes to subscribers (event loop only)
+
+    publish() reads the changelog since the previous publish once, encodes
+    one `"SYMBOL":{changed fields}` fragment per changed symbol, and gives
+    each subscriber the fragments of its own symbols joined together.
+    """
+
+    def __init__(self, quotes: QuoteSnapshotStore, max_pending: int = 8):
+        self.quotes = quotes
+        self.max_pending = max_pending
+        self._subscribers: Set[Subscription] = set()
+        self._seq = quotes.seq
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self, symbols: Iterable[str]) -> Subscription:
+        subscription = Subscription(symbols, self.max_pending)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self._subscribers.discard(subscription)
+
+    def symbols(self) -> List[str]:
+        """Every symbol some subscriber watches"""
+        return sorted(set().union(*(s.symbols for s in self._subscribers)))
+
+    def publish(self) -> int:
+        """
+        Queue the changes since the last publish for every subscriber
+
+        Returns:
+            Number of subscribers that got a message
+        """
+        if not self._subscribers:
+            self._seq = self.quotes.seq
+            return 0
+        result = self.quotes.changes(self._seq)
+        if result is None:
+            # Too many changes since the last tick for the changelog: resync everyone
+            self._seq = self.quotes.seq
+            for subscription in self._subscribers:
+                subscription.offer(None)
+            return len(self._subscribers)
+
+        previous = self._seq
+        seq, deltas = result
+        self._seq = seq
+        if not deltas:
+            return 0
+        fragments = {symbol: dumps(symbol) + b":" + dumps(delta) for symbol, delta in deltas.items()}
+        cursor = self.quotes.cursor(seq)
+        head = b'{"cursor":' + dumps(cursor) + b',"reset":false,"quotes":{'
+        sent = 0
+        for subscription in self._subscribers:
+            if subscription.since is not None and subscription.since > previous:
+                # Joined since the last publish: only what its first event did not include
+                sent += self._catch_up(subscription, seq)
+                continue
+            subscription.since = None
+            if len(fragments) < len(subscription.symbols):
+                chosen = [f for symbol, f in fragments.items() if symbol in subscription.symbols]
+            else:
+                chosen = [fragments[symbol] for symbol in subscription.symbols if symbol in fragments]
+            if chosen:
+                subscription.offer((cursor, head + b",".join(chosen) + b"}}"))
+                sent += 1
+        return sent
+
+    def _catch_up(self, subscription: Subscription, seq: int) -> int:
+        since, subscription.since = subscription.since, None
+        if since >= seq:
+            return 0
+        result = self.quotes.changes(since, subscription.symbols)
+        if result is None:
+            subscription.offer(None)
+            return 1
+        seq, deltas = result
+        if not deltas:
+            return 0
+        cursor = self.quotes.cursor(seq)
+        subscription.offer((cursor, dumps({"cursor": cursor, "reset": False, "quotes": deltas})))
+        return 1
@@ -0,0 +1,417 @@
+"""
+Quote Snapshots
+Latest quote per symbol in struct-of-arrays form, with a version per
+symbol, the serialized JSON of every quote shared by all readers, and a
+changelog for field-level deltas
+"""
+
+import bisect
+import json
+import logging
+import secrets
+import threading
+import time
+from collections import deque
+from itertools import repeat
+from typing import Deque, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from http_cache import PreparedBody
+from responses import dumps
+from services.shared_cache import SharedStore
+
+logger = logging.getLogger(__name__)
+
+NUMERIC_COLUMNS = {
+    "price": np.float64,
+    "change": np.float64,
+    "changePercent": np.float64,
+    "open": np.float64,
+    "high": np.float64,
+    "low": np.float64,
+    "volume": np.int64,
+    "previousClose": np.float64,
+}
+# Delta fields, one bit each in the changelog masks
+DELTA_FIELDS = (*NUMERIC_COLUMNS, "latestTradingDay")
+_DAY_BIT = 1 << (len(DELTA_FIELDS) - 1)
+# Shared key holding the epoch of the workers' common cursors
+EPOCH_KEY = "quote_snapshot:epoch"
+
+
+def normalize_quote(quote: dict) -> dict:
+    """
+    A quote with every field present, typed and in a fixed order
+
+    Equal quotes serialize to equal bytes, which is how unchanged updates
+    are detected.
+
+    Raises:
+        KeyError: No symbol
+        ValueError: A field is not a number
+    """
+    normalized = {"symbol": quote["symbol"]}
+    for name, dtype in NUMERIC_COLUMNS.items():
+        value = quote.get(name) or 0
+        normalized[name] = int(value) if dtype is np.int64 else float(value)
+    normalized["latestTradingDay"] = quote.get("latestTradingDay") or ""
+    return normalized
+
+
+class QuoteSnapshotStore:
+    """
+    Latest quote of every symbol seen by this worker
+
+    Each symbol owns a slot; numeric fields live in one numpy column per
+    field, so reading a batch of symbols is one fancy-index per column
+    instead of a dict per quote. Every slot also keeps the quote's
+    serialized body (PreparedBody, with its ETag) and the sequence number
+    of its last change. Writing a quote that did not change keeps all
+    three, so every reader reuses the same bytes; writing the very dict
+    that was stored last (a cache hit) returns before serializing.
+
+    put_many() applies a whole batch under one lock: readers see all of it
+    or none of it.
+
+    Every change is also appended to a changelog ring (slot plus a bit mask
+    of the fields that changed); changes() folds the entries after a
+    sequence number into per-symbol deltas. Sequence numbers are only
+    meaningful within one store, so clients get them as cursors tagged
+    with the store's epoch.
+
+    With a SharedStore, a client may resume on any worker: each worker
+    publishes its changes to the shared quote changelog and applies the
+    others' in sync(), cursors carry positions in that changelog under an
+    epoch kept in the shared store, and every worker remembers which local
+    sequence numbers each position it reached maps to. A client resumed on
+    another worker may get some fields again, but never misses one.
+    """
+
+    def __init__(self, capacity: int = 1024, log_capacity: int = 65536,
+                 shared: Optional[SharedStore] = None, max_marks: int = 4096):
+        self._slots: Dict[str, int] = {}
+        self._symbols: List[str] = []
+        self._days: List[str] = []
+        self._bodies: List[PreparedBody] = []
+        # The quote dict each slot was last written from
+        self._sources: List[Optional[dict]] = []
+        self._columns = {name: np.zeros(capacity, dtype=dtype) for name, dtype in NUMERIC_COLUMNS.items()}
+        self._versions = np.zeros(capacity, dtype=np.int64)
+        self._updated_at = np.zeros(capacity, dtype=np.float64)
+        self._seq = 0
+        # Change number n is kept at (n - 1) % log_capacity
+        self._log_slots = np.zeros(log_capacity, dtype=np.int64)
+        self._log_masks = np.zeros(log_capacity, dtype=np.uint16)
+        self.epoch = secrets.token_hex(4)
+        self._lock = threading.Lock()
+        self.shared = shared
+        # Changes not yet published: (normalized quote, as_of)
+        self._outbox: List[Tuple[dict, float]] = []
+        # Local seq before the first unpublished change
+        self._outbox_from: Optional[int] = None
+        # (shared position, local seq once every change up to it was applied,
+        #  local seq after which any change past it may lie), in order
+        self._marks: Deque[Tuple[int, int, int]] = deque(maxlen=max_marks)
+        self._position: Optional[int] = None
+
+    def __len__(self) -> int:
+        return len(self._symbols)
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self._slots
+
+    @property
+    def seq(self) -> int:
+        """Sequence number of the latest change (0 before any quote)"""
+        return self._seq
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    def _slot(self, symbol: str) -> int:
+        slot = self._slots.get(symbol)
+        if slot is not None:
+            return slot
+        slot = len(self._symbols)
+        if slot == len(self._versions):
+            grow = lambda array: np.concatenate([array, np.zeros_like(array)])
+            self._columns = {name: grow(column) for name, column in self._columns.items()}
+            self._versions = grow(self._versions)
+            self._updated_at = grow(self._updated_at)
+        self._slots[symbol] = slot
+        self._symbols.append(symbol)
+        self._days.append("")
+        self._bodies.append(None)
+        self._sources.append(None)
+        return slot
+
+    def put_many(self, quotes: Iterable[dict], as_of: Optional[Iterable[float]] = None,
+                 publish: bool = True) -> List[str]:
+        """
+        Store a batch of quotes atomically
+
+        Args:
+            quotes: Quote dicts as returned by get_quote()
+            as_of: When each quote was fetched (default: now); a quote
+                older than the stored one is ignored
+            publish: Queue the changes for the other workers (with a
+                shared store; False for changes read from them)
+
+        Returns:
+            Symbols whose quote changed (each got a new version)
+
+        Raises:
+            KeyError, ValueError: A malformed quote (nothing is stored)
+        """
+        now = time.time()
+        # Serialize outside the lock; the last quote of a symbol wins
+        batch, sources, times = {}, {}, {}
+        for quote, fetched_at in zip(quotes, repeat(now) if as_of is None else as_of):
+            if self._is_current(quote):
+                continue
+            normalized = normalize_quote(quote)
+            batch[normalized["symbol"]] = normalized
+            sources[normalized["symbol"]] = quote
+            times[normalized["symbol"]] = fetched_at
+        if not batch:
+            return []
+        prepared = {symbol: PreparedBody.from_content(quote) for symbol, quote in batch.items()}
+
+        changed: List[str] = []
+        with self._lock:
+            for symbol in batch:
+                slot = self._slot(symbol)
+                # An in-flight request finishing late must not roll a quote back
+                if self._bodies[slot] is not None and times[symbol] < self._updated_at[slot]:
+                    continue
+                self._updated_at[slot] = times[symbol]
+                self._sources[slot] = sources[symbol]
+                body = self._bodies[slot]
+                if body is not None and body.body == prepared[symbol].body:
+                    continue
+                changed.append(symbol)
+            if not changed:
+                return changed
+            changed_slots = np.array([self._slots[symbol] for symbol in changed])
+            # New symbols get every bit; known ones the fields that differ
+            known = np.array([self._bodies[slot] is not None for slot in changed_slots.tolist()])
+            masks = np.where(known, 0, (1 << len(DELTA_FIELDS)) - 1).astype(np.uint16)
+            for bit, (name, column) in enumerate(self._columns.items()):
+                values = np.array([batch[symbol][name] for symbol in changed], dtype=column.dtype)
+                masks |= ((column[changed_slots] != values) << bit).astype(np.uint16)
+                column[changed_slots] = values
+            for i, (symbol, slot) in enumerate(zip(changed, changed_slots.tolist())):
+                day = batch[symbol]["latestTradingDay"]
+                if day != self._days[slot]:
+                    masks[i] |= _DAY_BIT
+                self._days[slot] = day
+                self._bodies[slot] = prepared[symbol]
+
+            seqs = np.arange(self._seq + 1, self._seq + 1 + len(changed))
+            positions = (seqs - 1) % len(self._log_slots)
+            self._log_slots[positions] = changed_slots
+            self._log_masks[positions] = masks
+            self._versions[changed_slots] = seqs
+            if publish and self.shared is not None:
+                if self._outbox_from is None:
+                    self._outbox_from = self._seq
+                self._outbox.extend((batch[symbol], times[symbol]) for symbol in changed)
+            self._seq += len(changed)
+        return changed
+
+    def _is_current(self, quote: dict) -> bool:
+        # Unlocked peek: a race only costs one redundant serialization
+        slot = self._slots.get(quote.get("symbol"))
+        return slot is not None and slot < len(self._sources) and self._sources[slot] is quote
+
+    def put(self, quote: dict, as_of: Optional[float] = None) -> PreparedBody:
+        """
+        Store one quote
+
+        Returns:
+            The symbol's PreparedBody (the previous one if nothing changed)
+        """
+        self.put_many([quote], None if as_of is None else [as_of])
+        return self.get(quote["symbol"])
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    def get(self, symbol: str) -> Optional[PreparedBody]:
+        """Serialized latest quote of a symbol, or None"""
+        with self._lock:
+            slot = self._slots.get(symbol)
+            return None if slot is None else self._bodies[slot]
+
+    def version(self, symbol: str) -> int:
+        """Sequence number of the symbol's last change (0 if unknown)"""
+        with self._lock:
+            slot = self._slots.get(symbol)
+            return 0 if slot is None else int(self._versions[slot])
+
+    def encode(self, symbols: Sequence[str]) -> bytes:
+        """
+        JSON object of symbol -> full quote, stitched from the stored bodies
+
+        Symbols without a quote are left out.
+        """
+        with self._lock:
+            bodies = [(symbol, self._bodies[self._slots[symbol]]) for symbol in symbols if symbol in self._slots]
+        return b"{" + b",".join(dumps(symbol) + b":" + body.body for symbol, body in bodies) + b"}"
+
+    def cursor(self, seq: Optional[int] = None) -> str:
+        """Opaque client cursor for a sequence number (default: the latest)"""
+        seq = self._seq if seq is None else seq
+        if self.shared is None:
+            return f"{self.epoch}-{seq}"
+        with self._lock:
+            # The last shared position fully applied by the time of seq
+            index = bisect.bisect_right([applied for _, applied, _ in self._marks], seq) - 1
+            # Before the first sync: position 0, which no other worker resumes from a later point
+            position = self._marks[index][0] if index >= 0 else 0
+        return f"{self.epoch}-{position}"
+
+    def parse_cursor(self, cursor: Optional[str]) -> Optional[int]:
+        """
+        Sequence number of a cursor from this store (with a shared store,
+        from any worker)
+
+        Returns:
+            None for a missing or foreign cursor (another worker without a
+            shared store, or before a restart), which calls for a full resync
+        """
+        epoch, _, seq = (cursor or "").partition("-")
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        if self.shared is None:
+            return int(seq)
+        with self._lock:
+            index = bisect.bisect_right([position for position, _, _ in self._marks], int(seq)) - 1
+            # Older than anything this worker has seen: it cannot tell what changed
+            return self._marks[index][2] if index >= 0 else None
+
+    # ------------------------------------------------------------------
+    # Sharing between workers
+    # ------------------------------------------------------------------
+
+    def sync(self) -> None:
+        """
+        Publish this worker's changes and apply the other workers'
+
+        Blocking (shared store I/O); run it in the threadpool, about once a
+        second. The first call reads the latest quote of every symbol.
+        """
+        epoch = self._shared_epoch()
+        with self._lock:
+            outbox, self._outbox, self._outbox_from = self._outbox, [], None
+        if outbox:
+            self.shared.publish_quotes([(quote["symbol"], dumps([quote, as_of])) for quote, as_of in outbox])
+        position, entries = self.shared.quotes_since(self._position or 0)
+        remote = [json.loads(entry) for entry in entries]
+        if remote:
+            # This worker's own entries come back too: unchanged, so no new seq
+            self.put_many([quote for quote, _ in remote], [as_of for _, as_of in remote], publish=False)
+        with self._lock:
+            if epoch != self.epoch:
+                self.epoch = epoch
+                self._marks.clear()
+            self._position = position
+            applied = self._seq
+            if not self._marks:
+                # Cursors of other workers may predate whatever this one loaded: resend it all
+                self._marks.append((position, applied, 0))
+            elif self._marks[-1][0] != position:
+                # Changes queued meanwhile are past `position` but already below `applied`
+                self._marks.append((position, applied, applied if self._outbox_from is None else self._outbox_from))
+
+    def _shared_epoch(self) -> str:
+        # Two workers starting together may both write one; the last write wins
+        # and the other adopts it on its next sync
+        stored = self.shared.get(EPOCH_KEY)
+        if stored is not None:
+            return stored[0].decode()
+        epoch = secrets.token_hex(4)
+        forever = time.time() + 10 * 365 * 86400
+        self.shared.set(EPOCH_KEY, epoch.encode(), forever, forever)
+        logger.info("Started quote cursor epoch %s", epoch)
+        return epoch
+
+    def changes(self, since: int, symbols: Optional[Sequence[str]] = None
+                ) -> Optional[Tuple[int, Dict[str, dict]]]:
+        """
+        Fields that changed after a sequence number
+
+        Args:
+            since: Sequence number the client is at
+            symbols: Only these symbols (default: all)
+
+        Returns:
+            (current seq, symbol -> {field: new value}), or None if the
+            changelog no longer reaches back to `since` (resync needed)
+        """
+        with self._lock:
+            seq = self._seq
+            if since > seq or seq - since > len(self._log_slots):
+                return None
+            positions = np.arange(since, seq) % len(self._log_slots)
+            merged = np.zeros(len(self._symbols), dtype=np.uint16)
+            np.bitwise_or.at(merged, self._log_slots[positions], self._log_masks[positions])
+            if symbols is not None:
+                wanted = np.zeros(len(self._symbols), dtype=bool)
+                wanted[[self._slots[s] for s in symbols if s in self._slots]] = True
+                merged[~wanted] = 0
+            deltas: Dict[str, dict] = {}
+            for slot in np.flatnonzero(merged).tolist():
+                mask = int(merged[slot])
+                delta = {}
+                for bit, name in enumerate(DELTA_FIELDS):
+                    if mask >> bit & 1:
+                        delta[name] = self._days[slot] if name == "latestTradingDay" else self._columns[name][slot].item()
+                deltas[self._symbols[slot]] = delta
+        return seq, deltas
+
+    def lookup(self, symbols: Sequence[str], max_age: Optional[float] = None
+               ) -> Tuple[np.ndarray, Dict[str, np.ndarray], List[Optional[str]]]:
+        """
+        Numeric fields of several symbols in one gather per column
+
+        Args:
+            symbols: Stock symbols
+            max_age: Treat quotes written longer ago than this as missing
+
+        Returns:
+            (found mask, field -> array aligned with symbols, trading days);
+            missing symbols have NaN prices and a None day
+        """
+        with self._lock:
+            slots = np.array([self._slots.get(symbol, -1) for symbol in symbols], dtype=np.int64)
+            found = slots >= 0
+            if max_age is not None:
+                found &= self._updated_at[slots] >= time.time() - max_age
+            safe = np.where(found, slots, 0)
+            columns = {}
+            for name, column in self._columns.items():
+                values = column[safe].astype(np.float64)
+                values[~found] = np.nan
+                columns[name] = values
+            days = [self._days[slot] if ok else None for slot, ok in zip(safe.tolist(), found.tolist())]
+        return found, columns, days
+
+    def changed_since(self, seq: int) -> Tuple[int, List[str]]:
+        """
+        Symbols whose quote changed after a sequence number
+
+        Args:
+            seq: A value of `seq` seen earlier (0 for everything)
+
+        Returns:
+            (current seq, changed symbols, oldest change first)
+        """
+        with self._lock:
+            versions = self._versions[:len(self._symbols)]
+            slots = np.flatnonzero(versions > seq)
+            slots = slots[np.argsort(versions[slots], kind="stable")]
+            return self._seq, [self._symbols[slot] for slot in slots.tolist()]
@@ -0,0 +1,113 @@
+"""
+Rate Limiting
+Token bucket used to stay inside upstream API quotas
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+from metrics import RATE_LIMIT_WAIT
+from services.errors import RateLimitedError
+from services.shared_cache import SharedStore
+
+
+class RateLimitExceeded(RateLimitedError):
+    """Raised when a token is not available within the allowed wait"""
+
+
+_admission = threading.local()
+
+
+@contextmanager
+def on_admit(callback: Callable[[], None]) -> Iterator[None]:
+    """
+    Call back whenever a bucket grants tokens in this thread
+
+    Lets a caller time a request from when it was let through rather than
+    from when it started waiting (see ProviderRouter's hedging).
+    """
+    previous: Optional[Callable[[], None]] = getattr(_admission, "callback", None)
+    _admission.callback = callback
+    try:
+        yield
+    finally:
+        _admission.callback = previous
+
+
+class TokenBucket:
+    """Thread-safe token bucket (rate tokens per second, up to capacity)"""
+
+    def __init__(self, rate: float, capacity: float, name: str = "default"):
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        """
+        Take tokens if available
+
+        Args:
+            tokens: Tokens to take
+
+        Returns:
+            0.0 if taken, otherwise seconds until enough tokens are available
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens: float = 1.0, max_wait: float = 0.0) -> float:
+        """
+        Take tokens, sleeping up to max_wait seconds for them
+
+        Args:
+            tokens: Tokens to take
+            max_wait: Longest total time to wait
+
+        Returns:
+            Seconds spent waiting
+
+        Raises:
+            RateLimitExceeded: If the tokens are not available in time
+        """
+        started = time.monotonic()
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait == 0.0:
+                waited = time.monotonic() - started
+                RATE_LIMIT_WAIT.observe(waited, self.name)
+                callback = getattr(_admission, "callback", None)
+                if callback is not None:
+                    callback()
+                return waited
+            if time.monotonic() - started + wait > max_wait:
+                raise RateLimitExceeded("API rate limit exceeded", retry_after=wait)
+            time.sleep(wait)
+
+
+class SharedTokenBucket(TokenBucket):
+    """
+    Token bucket whose state lives in a SharedStore
+
+    All workers (and hosts, with Redis) draw from the same bucket, so the
+    upstream quota holds no matter how many workers are running.
+    """
+
+    def __init__(self, store: SharedStore, rate: float, capacity: float, name: str = "default"):
+        super().__init__(rate, capacity, name)
+        self.store = store
+
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        return self.store.take_tokens(self.name, tokens, self.rate, self.capacity)
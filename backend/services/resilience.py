@@ -0,0 +1,228 @@
+"""
+Resilience Policies
+Circuit breaker and retry-with-jitter for upstream provider calls
+"""
+
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional, Tuple, Type, TypeVar
+
+from metrics import CIRCUIT_STATE, CIRCUIT_TRANSITIONS, UPSTREAM_RETRIES
+from services.errors import CircuitOpenError, UpstreamUnavailableError
+
+T = TypeVar("T")
+
+
+class CircuitBreaker:
+    """
+    Per-provider circuit breaker
+
+    Closed: calls go through; the last `window` outcomes are tracked.
+    Opens when, after at least `min_calls`, the failure rate or the share of
+    slow calls crosses its threshold. Open: calls fail immediately with
+    CircuitOpenError for `open_seconds`. Half-open: up to
+    `half_open_calls` trial calls are let through; one good call closes
+    the circuit, a bad one opens it again.
+    """
+
+    CLOSED = "closed"
+    HALF_OPEN = "half_open"
+    OPEN = "open"
+    _STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(
+        self,
+        name: str,
+        window: int = 20,
+        min_calls: int = 5,
+        failure_rate: float = 0.5,
+        slow_call_seconds: float = 4.0,
+        slow_call_rate: float = 0.8,
+        open_seconds: float = 30.0,
+        half_open_calls: int = 1,
+    ):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+
+        self.state = self.CLOSED
+        self._outcomes: deque = deque(maxlen=window)  # (failed, slow)
+        self._opened_at = 0.0
+        self._half_open_inflight = 0
+        self._lock = threading.Lock()
+        CIRCUIT_STATE.set(0, name)
+
+    def _transition(self, state: str) -> None:
+        if state == self.state:
+            return
+        self.state = state
+        CIRCUIT_STATE.set(self._STATE_VALUES[state], self.name)
+        CIRCUIT_TRANSITIONS.inc(self.name, state)
+        if state == self.OPEN:
+            self._opened_at = time.monotonic()
+        if state != self.HALF_OPEN:
+            self._half_open_inflight = 0
+        if state == self.CLOSED:
+            self._outcomes.clear()
+
+    def available(self) -> bool:
+        """True unless the circuit is open and still cooling down (does not reserve a call)"""
+        return self.state != self.OPEN or time.monotonic() - self._opened_at >= self.open_seconds
+
+    def allow(self) -> None:
+        """
+        Reserve permission for one call
+
+        Raises:
+            CircuitOpenError: If the circuit is open (or half-open and busy)
+        """
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+                self._transition(self.HALF_OPEN)
+            if self.state == self.OPEN:
+                raise CircuitOpenError(f"{self.name} is unavailable (circuit open)")
+            if self.state == self.HALF_OPEN:
+                if self._half_open_inflight >= self.half_open_calls:
+                    raise CircuitOpenError(f"{self.name} is unavailable (circuit half-open)")
+                self._half_open_inflight += 1
+
+    def record(self, failed: bool, duration: float) -> None:
+        """
+        Record the outcome of a call permitted by allow()
+
+        Args:
+            failed: True if the provider was unavailable
+            duration: Call duration in seconds
+        """
+        slow = duration >= self.slow_call_seconds
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._half_open_inflight = max(0, self._half_open_inflight - 1)
+                self._transition(self.OPEN if failed or slow else self.CLOSED)
+                return
+
+            self._outcomes.append((failed, slow))
+            calls = len(self._outcomes)
+            if calls < self.min_calls:
+                return
+            failures = sum(1 for f, _ in self._outcomes if f)
+            slow_calls = sum(1 for _, s in self._outcomes if s)
+            if failures / calls >= self.failure_rate or slow_calls / calls >= self.slow_call_rate:
+                self._transition(self.OPEN)
+
+    @contextmanager
+    def guard(
+        self,
+        failure_types: Tuple[Type[BaseException], ...] = (UpstreamUnavailableError,),
+    ) -> Iterator[None]:
+        """
+        Run a block as one call through the breaker
+
+        Only failure_types count as failures; any other exception means the
+        provider answered (e.g. "invalid symbol") and counts as a success.
+        """
+        self.allow()
+        started = time.monotonic()
+        try:
+            yield
+        except failure_types:
+            self.record(True, time.monotonic() - started)
+            raise
+        except BaseException:
+            self.record(False, time.monotonic() - started)
+            raise
+        self.record(False, time.monotonic() - started)
+
+
+class RetryPolicy:
+    """
+    Bounded retries with exponential backoff and full jitter
+
+    Only for idempotent calls. Sleeps uniform(0, min(max_delay,
+    base_delay * 2**attempt)) between attempts and never starts an attempt
+    that would begin after `deadline` seconds from the first one. Each
+    attempt is given the seconds left before the deadline, to cap its
+    timeout, so the whole call ends close to the deadline.
+    """
+
+    def __init__(
+        self,
+        attempts: int = 3,
+        base_delay: float = 0.2,
+        max_delay: float = 2.0,
+        deadline: float = 8.0,
+        retry_on: Tuple[Type[BaseException], ...] = (UpstreamUnavailableError,),
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.retry_on = retry_on
+        self.sleep = sleep
+
+    def call(self, fn: Callable[[float], T], provider: str = "", function: str = "") -> T:
+        """
+        Call fn, retrying retryable failures
+
+        Args:
+            fn: Function making one attempt, given the seconds left
+                before the deadline
+            provider: Provider name (metrics label)
+            function: Upstream function (metrics label)
+
+        Returns:
+            fn's result
+        """
+        started = time.monotonic()
+        for attempt in range(self.attempts):
+            try:
+                return fn(self.deadline - (time.monotonic() - started))
+            except CircuitOpenError:
+                raise
+            except self.retry_on:
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+                out_of_time = time.monotonic() - started + delay >= self.deadline
+                if attempt == self.attempts - 1 or out_of_time:
+                    raise
+                UPSTREAM_RETRIES.inc(provider, function)
+                self.sleep(delay)
+                # The sleep may have overrun (e.g. a busy host): check again before the next attempt
+                if time.monotonic() - started >= self.deadline:
+                    raise
+        raise AssertionError("unreachable")
+
+
+def call_upstream(
+    fn: Callable[[Optional[float]], T],
+    breaker: Optional[CircuitBreaker],
+    retry: Optional[RetryPolicy],
+    provider: str,
+    function: str,
+) -> T:
+    """
+    Call an upstream function through its circuit breaker and retry policy
+
+    Each attempt passes through the breaker, so an open circuit stops the
+    retries immediately. fn is given the seconds left before the retry
+    deadline (None without a retry policy), to cap its request timeout.
+    Rate limiter tokens belong outside fn: one per logical call, not one
+    per attempt.
+    """
+    def attempt(budget: Optional[float]) -> T:
+        if breaker is None:
+            return fn(budget)
+        with breaker.guard():
+            return fn(budget)
+
+    if retry is None:
+        return attempt(None)
+    return retry.call(attempt, provider, function)
@@ -0,0 +1,131 @@
+"""
+Returns Analytics
+Date-aligned daily returns, correlation / covariance, beta and volatility
+of several symbols from the local market store
+"""
+
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from services.market_store import MarketStore
+
+TRADING_DAYS = 252
+DEFAULT_BENCHMARKS = ("^NSEI", "^BSESN")
+
+
+def align_closes(history: Dict[str, Tuple[List[str], List[float]]], symbols: Sequence[str],
+                 window: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Inner-join close series on their common dates
+
+    Args:
+        history: symbol -> (dates, closes), oldest first
+        symbols: Column order (all must be in history)
+        window: Number of returns wanted (window + 1 closes are kept)
+
+    Returns:
+        (dates, closes matrix of shape (dates, symbols))
+    """
+    date_arrays = [np.array(history[s][0], dtype="datetime64[D]") for s in symbols]
+    # Dates every symbol traded on: the ones appearing len(symbols) times
+    dates, counts = np.unique(np.concatenate(date_arrays), return_counts=True)
+    dates = dates[counts == len(symbols)][-(window + 1):]
+
+    closes = np.empty((len(dates), len(symbols)))
+    for j, symbol_dates in enumerate(date_arrays):
+        positions = np.searchsorted(symbol_dates, dates)
+        closes[:, j] = np.asarray(history[symbols[j]][1], dtype=float)[positions]
+    return dates, closes
+
+
+class ReturnsService:
+    """Cross-sectional statistics over stored daily closes"""
+
+    def __init__(self, store: MarketStore):
+        self.store = store
+
+    def compute(self, symbols: Sequence[str], window: int = 90,
+                benchmarks: Sequence[str] = DEFAULT_BENCHMARKS, include_returns: bool = False) -> dict:
+        """
+        Returns matrix statistics over the last `window` common trading days
+
+        Benchmarks without stored data are skipped; symbols without data
+        are listed under "missing". Each benchmark is joined to the
+        symbols only for its beta, so an index with a shorter history or
+        other holidays does not cut dates from the symbols' statistics.
+
+        Args:
+            symbols: Stock symbols
+            window: Number of daily returns
+            benchmarks: Index symbols to compute beta against
+            include_returns: Include the aligned daily returns
+
+        Returns:
+            Dict with dates, volatility, correlation, covariance and beta
+
+        Raises:
+            ValueError: Fewer than two common dates
+        """
+        wanted = list(dict.fromkeys(list(symbols) + [b for b in benchmarks if b not in symbols]))
+        # Extra bars so holidays that differ between exchanges don't shrink the window
+        # Split and dividend adjusted: an ex-date must not show up as a return
+        history = self.store.get_recent_closes(wanted, int(window * 1.2) + 10, adjusted=True)
+        present = [s for s in symbols if s in history]
+        missing = [s for s in symbols if s not in history]
+        if not present:
+            raise ValueError("No stored price history for the requested symbols")
+
+        dates, closes = align_closes(history, present, window)
+        if len(dates) < 3:
+            raise ValueError("Not enough common trading days between the symbols")
+
+        returns = closes[1:] / closes[:-1] - 1
+        n = len(present)
+        covariance = np.cov(returns, rowvar=False, ddof=1).reshape(n, n)
+        std = np.sqrt(np.diag(covariance))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            correlation = covariance / np.outer(std, std)
+
+        beta = {}
+        for benchmark in benchmarks:
+            if benchmark not in history:
+                continue
+            if benchmark in present:
+                k = present.index(benchmark)
+                beta[benchmark] = _beta(present, covariance[:, k], covariance[k, k])
+                continue
+            joined_dates, joined = align_closes(history, present + [benchmark], window)
+            if len(joined_dates) < 3:
+                beta[benchmark] = None
+                continue
+            joined_returns = joined[1:] / joined[:-1] - 1
+            joined_covariance = np.cov(joined_returns, rowvar=False, ddof=1).reshape(n + 1, n + 1)
+            beta[benchmark] = _beta(present, joined_covariance[:n, n], joined_covariance[n, n])
+
+        result = {
+            "symbols": present,
+            "missing": missing,
+            "window": int(len(returns)),
+            "start": str(dates[1]),
+            "end": str(dates[-1]),
+            "meanReturn": dict(zip(present, (returns.mean(axis=0) * TRADING_DAYS).tolist())),
+            "volatility": dict(zip(present, (std * np.sqrt(TRADING_DAYS)).tolist())),
+            "correlation": _matrix(correlation),
+            "covariance": _matrix(covariance),
+            "beta": beta,
+        }
+        if include_returns:
+            result["dates"] = dates[1:].astype(str).tolist()
+            result["returns"] = {s: returns[:, j].tolist() for j, s in enumerate(present)}
+        return result
+
+
+def _beta(symbols: Sequence[str], covariances: np.ndarray, variance: float):
+    # A flat benchmark has no beta
+    return dict(zip(symbols, (covariances / variance).tolist())) if variance else None
+
+
+def _matrix(values: np.ndarray) -> List[List[float]]:
+    # NaN (zero-variance series) is not valid JSON
+    return np.where(np.isnan(values), None, values).tolist()
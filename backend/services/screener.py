@@ -0,0 +1,389 @@
+"""
+Stock Screener
+Column snapshot of the local symbol universe, filtered and sorted with numpy
+"""
+
+import ast
+import math
+import threading
+import time
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from metrics import SCREENER_SECONDS
+from services.market_store import MarketStore
+
+# Snapshot columns, in API (camelCase) naming
+FIELDS = (
+    "price", "changePercent", "volume",
+    "high52w", "low52w", "fromHigh52w", "fromLow52w",
+    "rsi14", "sma50", "sma200", "avgVolume20", "volumeRatio",
+)
+
+HISTORY = 260        # bars loaded per symbol (about a year, plus indicator warm-up)
+YEAR = 252           # trading days in the 52-week range
+RSI_PERIOD = 14
+
+MAX_EXPRESSION_LENGTH = 500
+
+Columns = Dict[str, np.ndarray]
+
+
+# ----------------------------------------------------------------------
+# Filter expressions
+# ----------------------------------------------------------------------
+
+_COMPARISONS = {
+    ast.Lt: np.less, ast.LtE: np.less_equal,
+    ast.Gt: np.greater, ast.GtE: np.greater_equal,
+    ast.Eq: np.equal, ast.NotEq: np.not_equal,
+}
+_ARITHMETIC = {ast.Add: np.add, ast.Sub: np.subtract, ast.Mult: np.multiply, ast.Div: np.divide}
+
+
+def _compile(node: ast.AST) -> Callable[[Columns], np.ndarray]:
+    if isinstance(node, ast.BoolOp):
+        parts = [_compile(value) for value in node.values]
+        combine = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+        def boolean(columns):
+            result = parts[0](columns)
+            for part in parts[1:]:
+                result = combine(result, part(columns))
+            return result
+        return boolean
+
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+        operand = _compile(node.operand)
+        return lambda columns: np.logical_not(operand(columns))
+
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+        operand = _compile(node.operand)
+        return lambda columns: np.negative(operand(columns))
+
+    if isinstance(node, ast.Compare):
+        # Chained comparisons: 30 < rsi14 < 70
+        operands = [_compile(node.left)] + [_compile(c) for c in node.comparators]
+        ops = [_COMPARISONS.get(type(op)) for op in node.ops]
+        if None in ops:
+            raise ValueError("Unsupported comparison operator")
+        def compare(columns):
+            values = [operand(columns) for operand in operands]
+            result = ops[0](values[0], values[1])
+            for i in range(1, len(ops)):
+                result = np.logical_and(result, ops[i](values[i], values[i + 1]))
+            return result
+        return compare
+
+    if isinstance(node, ast.BinOp):
+        op = _ARITHMETIC.get(type(node.op))
+        if op is None:
+            raise ValueError("Unsupported arithmetic operator")
+        left, right = _compile(node.left), _compile(node.right)
+        return lambda columns: op(left(columns), right(columns))
+
+    if isinstance(node, ast.Name):
+        if node.id not in FIELDS:
+            raise ValueError(f"Unknown field: {node.id} (available: {', '.join(FIELDS)})")
+        name = node.id
+        return lambda columns: columns[name]
+
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+        value = float(node.value)
+        return lambda columns: value
+
+    raise ValueError(f"Unsupported expression: {ast.dump(node)[:60]}")
+
+
+@lru_cache(maxsize=256)
+def compile_filter(expression: str) -> Callable[[Columns], np.ndarray]:
+    """
+    Compile a screen such as "rsi14 < 30 and volumeRatio > 2"
+
+    Only field names, numbers, arithmetic, comparisons and and/or/not are
+    allowed. The result evaluates the whole universe at once: each field
+    is a numpy column and the expression becomes element-wise operations.
+    Missing values are NaN, which fail every comparison.
+
+    Args:
+        expression: Filter expression
+
+    Returns:
+        Function of the snapshot columns returning a boolean mask
+
+    Raises:
+        ValueError: Invalid expression
+    """
+    if len(expression) > MAX_EXPRESSION_LENGTH:
+        raise ValueError(f"Filter longer than {MAX_EXPRESSION_LENGTH} characters")
+    try:
+        tree = ast.parse(expression, mode="eval")
+    except SyntaxError as e:
+        raise ValueError(f"Invalid filter: {e.msg}")
+    return _compile(tree.body)
+
+
+# ----------------------------------------------------------------------
+# Indicators
+# ----------------------------------------------------------------------
+
+def _wilder_rsi(closes: np.ndarray, period: int = RSI_PERIOD) -> np.ndarray:
+    """
+    Latest RSI of each row of a (symbols, bars) matrix
+
+    Rows are right-aligned and NaN-padded on the left. Wilder's smoothing
+    is recursive in time, so the loop runs over bars and every step is
+    vectorized across symbols.
+    """
+    changes = np.diff(closes, axis=1)
+    rows = changes.shape[0]
+    count = np.zeros(rows)
+    avg_gain = np.zeros(rows)
+    avg_loss = np.zeros(rows)
+    for t in range(changes.shape[1]):
+        change = changes[:, t]
+        valid = ~np.isnan(change)
+        gain = np.where(valid, np.maximum(change, 0), 0.0)
+        loss = np.where(valid, np.maximum(-change, 0), 0.0)
+        count += valid
+        seeding = valid & (count <= period)
+        smoothing = valid & (count > period)
+        # Simple average over the first `period` changes, then smoothed
+        avg_gain = np.where(seeding, avg_gain + gain / period, avg_gain)
+        avg_loss = np.where(seeding, avg_loss + loss / period, avg_loss)
+        avg_gain = np.where(smoothing, (avg_gain * (period - 1) + gain) / period, avg_gain)
+        avg_loss = np.where(smoothing, (avg_loss * (period - 1) + loss) / period, avg_loss)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsi = np.where(avg_loss == 0, 100.0, 100.0 - 100.0 / (1.0 + avg_gain / avg_loss))
+    return np.where(count >= period, rsi, np.nan)
+
+
+def _tail_mean(matrix: np.ndarray, n: int, skip_last: int = 0) -> np.ndarray:
+    end = matrix.shape[1] - skip_last
+    window = matrix[:, max(0, end - n):end]
+    # NaN (missing history) propagates: fewer than n bars gives no value
+    return window.mean(axis=1) if window.shape[1] == n else np.full(matrix.shape[0], np.nan)
+
+
+def _nan_extreme(matrix: np.ndarray, reduce, fill: float) -> np.ndarray:
+    # nanmax/nanmin without the all-NaN warning; rows without data stay NaN
+    result = reduce(np.where(np.isnan(matrix), fill, matrix), axis=1)
+    return np.where(result == fill, np.nan, result)
+
+
+def bar_indicators(bars: Sequence[Sequence[tuple]], history: int = HISTORY) -> Columns:
+    """
+    Bar-derived columns for a batch of symbols
+
+    Args:
+        bars: Per symbol, [(high, low, close, volume), ...] oldest first
+        history: Matrix width (bars per symbol)
+
+    Returns:
+        Column name -> array aligned with bars
+    """
+    rows = len(bars)
+    high, low, close, volume = (np.full((rows, history), np.nan) for _ in range(4))
+    for i, symbol_bars in enumerate(bars):
+        symbol_bars = symbol_bars[-history:]
+        if not symbol_bars:
+            continue
+        block = np.array(symbol_bars, dtype=float)
+        n = len(symbol_bars)
+        high[i, -n:], low[i, -n:], close[i, -n:], volume[i, -n:] = block.T
+
+    with np.errstate(invalid="ignore"):
+        previous = close[:, -2]
+        return {
+            "lastClose": close[:, -1],
+            "lastVolume": volume[:, -1],
+            "barChangePercent": (close[:, -1] / previous - 1) * 100,
+            "high52w": _nan_extreme(high[:, -YEAR:], np.max, -np.inf),
+            "low52w": _nan_extreme(low[:, -YEAR:], np.min, np.inf),
+            "rsi14": _wilder_rsi(close),
+            "sma50": _tail_mean(close, 50),
+            "sma200": _tail_mean(close, 200),
+            # The 20 sessions before the latest one, so today's volume is compared to them
+            "avgVolume20": _tail_mean(volume, 20, skip_last=1),
+        }
+
+
+# ----------------------------------------------------------------------
+# Snapshot
+# ----------------------------------------------------------------------
+
+class ScreenerService:
+    """
+    In-memory column table of every symbol in the MarketStore
+
+    One row per symbol (slot), one numpy array per field. refresh() only
+    reloads what changed since the previous call: symbols whose bars were
+    written get their indicators recomputed as one batch, and new quotes
+    overwrite price / change / volume. Derived columns (52-week distances,
+    volume ratio) are then recomputed for the whole table, which is cheap.
+    """
+
+    def __init__(self, store: MarketStore, capacity: int = 1024):
+        self.store = store
+        self.symbols: List[str] = []
+        self._slots: Dict[str, int] = {}
+        self._columns: Columns = {}
+        self._quoted = np.zeros(0, dtype=bool)
+        self._capacity = 0
+        self._grow(capacity)
+        self._bars_seen = 0.0
+        self._quotes_seen = 0.0
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self.refreshed_at = 0.0
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def _grow(self, capacity: int) -> None:
+        for name in FIELDS + ("lastClose", "lastVolume", "barChangePercent"):
+            column = np.full(capacity, np.nan)
+            old = self._columns.get(name)
+            if old is not None:
+                column[:len(old)] = old
+            self._columns[name] = column
+        quoted = np.zeros(capacity, dtype=bool)
+        quoted[:len(self._quoted)] = self._quoted
+        self._quoted = quoted
+        self._capacity = capacity
+
+    def _slot(self, symbol: str) -> int:
+        slot = self._slots.get(symbol)
+        if slot is None:
+            slot = len(self.symbols)
+            if slot >= self._capacity:
+                self._grow(self._capacity * 2)
+            self._slots[symbol] = slot
+            self.symbols.append(symbol)
+        return slot
+
+    # ------------------------------------------------------------------
+    # Refresh (blocking; call from the threadpool)
+    # ------------------------------------------------------------------
+
+    def refresh(self) -> int:
+        """
+        Load changes from the store
+
+        Returns:
+            Number of symbols updated
+        """
+        with self._refresh_lock:
+            # Re-read a second back: a writer may commit a row stamped before
+            # the watermark after it was taken (re-applying rows is harmless)
+            bar_symbols, bars_seen = self.store.bars_updated_since(self._bars_seen and self._bars_seen - 1)
+            quotes, quotes_seen = self.store.quotes_updated_since(self._quotes_seen and self._quotes_seen - 1)
+            indicators = None
+            if bar_symbols:
+                # Adjusted, so a split inside the window doesn't look like a crash
+                recent = self.store.get_recent_bars(bar_symbols, HISTORY, adjusted=True)
+                bar_symbols = [s for s in bar_symbols if s in recent]
+                indicators = bar_indicators([recent[s] for s in bar_symbols])
+
+            with self._lock:
+                if bar_symbols:
+                    slots = np.array([self._slot(s) for s in bar_symbols], dtype=np.intp)
+                    for name, values in indicators.items():
+                        self._columns[name][slots] = values
+                for quote in quotes:
+                    slot = self._slot(quote["symbol"])
+                    self._columns["price"][slot] = quote["price"]
+                    self._columns["changePercent"][slot] = quote["changePercent"]
+                    self._columns["volume"][slot] = quote["volume"]
+                    self._quoted[slot] = True
+                self._derive()
+
+            self._bars_seen = max(self._bars_seen, bars_seen)
+            self._quotes_seen = max(self._quotes_seen, quotes_seen)
+            self.refreshed_at = time.monotonic()
+            return len(bar_symbols) + len(quotes)
+
+    def refresh_if_older(self, max_age: float) -> None:
+        if time.monotonic() - self.refreshed_at >= max_age:
+            self.refresh()
+
+    def _derive(self) -> None:
+        n = len(self.symbols)
+        c = {name: column[:n] for name, column in self._columns.items()}
+        quoted = self._quoted[:n]
+        # Symbols without a stored quote use their latest bar
+        c["price"][:] = np.where(quoted, c["price"], c["lastClose"])
+        c["changePercent"][:] = np.where(quoted, c["changePercent"], c["barChangePercent"])
+        c["volume"][:] = np.where(quoted, c["volume"], c["lastVolume"])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            high = np.fmax(c["high52w"], c["price"])
+            low = np.fmin(c["low52w"], c["price"])
+            c["fromHigh52w"][:] = (c["price"] / high - 1) * 100
+            c["fromLow52w"][:] = (c["price"] / low - 1) * 100
+            c["volumeRatio"][:] = c["volume"] / c["avgVolume20"]
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def screen(
+        self,
+        expression: Optional[str] = None,
+        sort: str = "changePercent",
+        descending: bool = True,
+        limit: int = 50,
+        fields: Sequence[str] = FIELDS,
+    ) -> dict:
+        """
+        Filter and sort the universe
+
+        Args:
+            expression: Filter (see compile_filter); None matches everything
+            sort: Field to sort by
+            descending: Sort order (missing values always last)
+            limit: Max rows returned
+            fields: Columns included in each row
+
+        Returns:
+            {"total": matches, "count": returned, "results": [row, ...]}
+
+        Raises:
+            ValueError: Invalid expression, sort or field name
+        """
+        if sort not in FIELDS:
+            raise ValueError(f"Unknown sort field: {sort}")
+        unknown = [name for name in fields if name not in FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown field: {unknown[0]}")
+        predicate = compile_filter(expression) if expression else None
+
+        started = time.perf_counter()
+        with self._lock:
+            n = len(self.symbols)
+            columns = {name: self._columns[name][:n] for name in FIELDS}
+            with np.errstate(divide="ignore", invalid="ignore"):
+                mask = predicate(columns) if predicate else np.ones(n, dtype=bool)
+            if np.ndim(mask) == 0:
+                mask = np.full(n, bool(mask))
+            matched = np.flatnonzero(mask)
+            keys = -columns[sort][matched] if descending else columns[sort][matched]
+            if len(matched) > limit:
+                # NaN sorts last in both partition and sort
+                top = np.argpartition(keys, limit - 1)[:limit]
+                order = top[np.argsort(keys[top], kind="stable")]
+            else:
+                order = np.argsort(keys, kind="stable")
+            rows = matched[order]
+            values = {name: columns[name][rows].tolist() for name in fields}
+            symbols = [self.symbols[i] for i in rows.tolist()]
+        SCREENER_SECONDS.observe(time.perf_counter() - started)
+
+        results = []
+        for i, symbol in enumerate(symbols):
+            row = {"symbol": symbol}
+            for name in fields:
+                value = values[name][i]
+                row[name] = None if math.isnan(value) else value
+            results.append(row)
+        return {"total": int(len(matched)), "count": len(results), "results": results}
@@ -0,0 +1,498 @@
+"""
+Shared Cache Backends
+L2 store shared by all workers: cached bodies, invalidations, token buckets
+and the latest quotes
+
+Selected with SHARED_CACHE_URL:
+    (unset)                      no L2, every worker caches on its own
+    sqlite:///tmp/markstro.db    SQLite file shared by the workers of one host
+    redis://host:6379/0          Redis shared by all instances (needs `redis`)
+    memory://                    in-process stand-in with the same semantics,
+                                 for tests and single-worker development
+"""
+
+import json
+import os
+import struct
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Hashable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from services.database import Database
+
+try:
+    import redis
+except ImportError:  # redis is optional, only needed for redis:// URLs
+    redis = None
+
+# (cache name, encoded key or None for "everything")
+Invalidation = Tuple[str, Optional[str]]
+
+# Invalidations are only needed until every worker has polled them
+INVALIDATION_RETENTION = 600.0
+
+
+def encode_key(key: Hashable) -> str:
+    """
+    Encode a cache key (str, int or tuple of those) as a string
+
+    Args:
+        key: Cache key
+
+    Returns:
+        JSON text, reversible with decode_key()
+    """
+    return json.dumps(key, separators=(",", ":"))
+
+
+def decode_key(text: str) -> Hashable:
+    value = json.loads(text)
+    return tuple(value) if isinstance(value, list) else value
+
+
+class SharedStore(ABC):
+    """
+    Storage shared between workers
+
+    All methods are blocking; async callers run them in the threadpool.
+    Times are wall-clock (time.time()) since monotonic clocks are per process.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Tuple[bytes, float]]:
+        """
+        Returns:
+            (body, expires_at), or None if missing
+        """
+
+    @abstractmethod
+    def set(self, key: str, body: bytes, expires_at: float, keep_until: float) -> None:
+        """Store a body; it may be dropped after keep_until"""
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        ...
+
+    @abstractmethod
+    def delete_prefix(self, prefix: str) -> None:
+        ...
+
+    @abstractmethod
+    def publish_invalidation(self, cache: str, key: Optional[str]) -> None:
+        """Tell other workers to drop a key (or everything) from their L1"""
+
+    @abstractmethod
+    def invalidations_since(self, seq: Optional[int]) -> Tuple[int, List[Invalidation]]:
+        """
+        Invalidations published after seq
+
+        Args:
+            seq: Last seen sequence number, None to only get the current one
+
+        Returns:
+            (new sequence number, invalidations)
+        """
+
+    @abstractmethod
+    def publish_quotes(self, entries: List[Tuple[str, bytes]]) -> int:
+        """
+        Store the latest quote of symbols, each with a new sequence number
+
+        Only the latest entry of a symbol is kept, so the log stays as long
+        as the list of symbols and a new worker can read all of it.
+
+        Args:
+            entries: (symbol, entry) pairs
+
+        Returns:
+            Sequence number of the last entry
+        """
+
+    @abstractmethod
+    def quotes_since(self, seq: int) -> Tuple[int, List[bytes]]:
+        """
+        Latest entries of the symbols published after seq, oldest first
+
+        Args:
+            seq: Last seen sequence number (0 for every symbol)
+
+        Returns:
+            (new sequence number, entries)
+        """
+
+    @abstractmethod
+    def take_tokens(self, bucket: str, tokens: float, rate: float, capacity: float) -> float:
+        """
+        Token bucket shared by all workers
+
+        Returns:
+            0.0 if taken, otherwise seconds until enough tokens are available
+        """
+
+    def purge_expired(self) -> int:
+        """Drop entries past keep_until; returns the number removed"""
+        return 0
+
+    def close(self) -> None:
+        """Release connections"""
+
+
+def _refill(tokens: float, updated: float, now: float, rate: float, capacity: float) -> float:
+    return min(capacity, tokens + max(0.0, now - updated) * rate)
+
+
+class MemorySharedStore(SharedStore):
+    """In-process stand-in for a networked KV store"""
+
+    def __init__(self):
+        self._entries: Dict[str, Tuple[bytes, float, float]] = {}
+        self._invalidations: List[Tuple[int, float, str, Optional[str]]] = []
+        self._seq = 0
+        self._quotes: Dict[str, Tuple[int, bytes]] = {}
+        self._quote_seq = 0
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Tuple[bytes, float]]:
+        with self._lock:
+            item = self._entries.get(key)
+        if item is None or item[2] <= time.time():
+            return None
+        return item[0], item[1]
+
+    def set(self, key: str, body: bytes, expires_at: float, keep_until: float) -> None:
+        with self._lock:
+            self._entries[key] = (body, expires_at, keep_until)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def delete_prefix(self, prefix: str) -> None:
+        with self._lock:
+            for key in [k for k in self._entries if k.startswith(prefix)]:
+                del self._entries[key]
+
+    def publish_invalidation(self, cache: str, key: Optional[str]) -> None:
+        now = time.time()
+        with self._lock:
+            self._seq += 1
+            self._invalidations.append((self._seq, now, cache, key))
+            cutoff = now - INVALIDATION_RETENTION
+            while self._invalidations and self._invalidations[0][1] < cutoff:
+                self._invalidations.pop(0)
+
+    def invalidations_since(self, seq: Optional[int]) -> Tuple[int, List[Invalidation]]:
+        with self._lock:
+            if seq is None:
+                return self._seq, []
+            return self._seq, [(c, k) for s, _, c, k in self._invalidations if s > seq]
+
+    def publish_quotes(self, entries: List[Tuple[str, bytes]]) -> int:
+        with self._lock:
+            for symbol, entry in entries:
+                self._quote_seq += 1
+                self._quotes[symbol] = (self._quote_seq, entry)
+            return self._quote_seq
+
+    def quotes_since(self, seq: int) -> Tuple[int, List[bytes]]:
+        with self._lock:
+            newer = sorted(item for item in self._quotes.values() if item[0] > seq)
+        if not newer:
+            return seq, []
+        return newer[-1][0], [entry for _, entry in newer]
+
+    def take_tokens(self, bucket: str, tokens: float, rate: float, capacity: float) -> float:
+        now = time.time()
+        with self._lock:
+            available, updated = self._buckets.get(bucket, (capacity, now))
+            available = _refill(available, updated, now, rate, capacity)
+            if available >= tokens:
+                self._buckets[bucket] = (available - tokens, now)
+                return 0.0
+            self._buckets[bucket] = (available, now)
+            return (tokens - available) / rate
+
+    def purge_expired(self) -> int:
+        now = time.time()
+        with self._lock:
+            expired = [k for k, (_, _, keep_until) in self._entries.items() if keep_until <= now]
+            for key in expired:
+                del self._entries[key]
+        return len(expired)
+
+
+SHARED_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS cache_entries (
+        key TEXT PRIMARY KEY,
+        body BLOB NOT NULL,
+        expires_at REAL NOT NULL,
+        keep_until REAL NOT NULL
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS cache_invalidations (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        cache TEXT NOT NULL,
+        key TEXT,
+        created_at REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS latest_quotes (
+        symbol TEXT PRIMARY KEY,
+        seq INTEGER NOT NULL,
+        entry BLOB NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_latest_quotes_seq ON latest_quotes(seq);
+    CREATE TABLE IF NOT EXISTS quote_seq (
+        id INTEGER PRIMARY KEY CHECK (id = 0),
+        seq INTEGER NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS token_buckets (
+        name TEXT PRIMARY KEY,
+        tokens REAL NOT NULL,
+        updated_at REAL NOT NULL
+    );
+'''
+
+
+class SQLiteSharedStore(SharedStore):
+    """
+    Shared store in one SQLite file (WAL), for the workers of one host
+
+    Token bucket updates run in BEGIN IMMEDIATE transactions, so concurrent
+    workers see a consistent token count.
+    """
+
+    def __init__(self, path: str):
+        self.db = Database(path, pool_size=8, schema=SHARED_SCHEMA)
+
+    def get(self, key: str) -> Optional[Tuple[bytes, float]]:
+        with self.db.connection() as conn:
+            row = conn.execute(
+                "SELECT body, expires_at FROM cache_entries WHERE key = ? AND keep_until > ?",
+                (key, time.time()),
+            ).fetchone()
+        return (bytes(row[0]), row[1]) if row else None
+
+    def set(self, key: str, body: bytes, expires_at: float, keep_until: float) -> None:
+        with self.db.connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_entries VALUES (?, ?, ?, ?)",
+                (key, body, expires_at, keep_until),
+            )
+
+    def delete(self, key: str) -> None:
+        with self.db.connection() as conn:
+            conn.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+
+    def delete_prefix(self, prefix: str) -> None:
+        escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        with self.db.connection() as conn:
+            conn.execute("DELETE FROM cache_entries WHERE key LIKE ? ESCAPE '\\'", (escaped + "%",))
+
+    def publish_invalidation(self, cache: str, key: Optional[str]) -> None:
+        now = time.time()
+        with self.db.connection() as conn:
+            conn.execute(
+                "INSERT INTO cache_invalidations (cache, key, created_at) VALUES (?, ?, ?)",
+                (cache, key, now),
+            )
+            conn.execute(
+                "DELETE FROM cache_invalidations WHERE created_at < ?", (now - INVALIDATION_RETENTION,)
+            )
+
+    def invalidations_since(self, seq: Optional[int]) -> Tuple[int, List[Invalidation]]:
+        with self.db.connection() as conn:
+            if seq is None:
+                row = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM cache_invalidations").fetchone()
+                return row[0], []
+            rows = conn.execute(
+                "SELECT seq, cache, key FROM cache_invalidations WHERE seq > ? ORDER BY seq", (seq,)
+            ).fetchall()
+        if not rows:
+            return seq, []
+        return rows[-1][0], [(cache, key) for _, cache, key in rows]
+
+    def publish_quotes(self, entries: List[Tuple[str, bytes]]) -> int:
+        with self.db.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT seq FROM quote_seq WHERE id = 0").fetchone()
+            first = (row[0] if row else 0) + 1
+            conn.executemany(
+                "INSERT OR REPLACE INTO latest_quotes VALUES (?, ?, ?)",
+                [(symbol, seq, entry) for seq, (symbol, entry) in enumerate(entries, first)],
+            )
+            last = first + len(entries) - 1
+            conn.execute("INSERT OR REPLACE INTO quote_seq VALUES (0, ?)", (last,))
+        return last
+
+    def quotes_since(self, seq: int) -> Tuple[int, List[bytes]]:
+        with self.db.connection() as conn:
+            rows = conn.execute(
+                "SELECT seq, entry FROM latest_quotes WHERE seq > ? ORDER BY seq", (seq,)
+            ).fetchall()
+        if not rows:
+            return seq, []
+        return rows[-1][0], [bytes(entry) for _, entry in rows]
+
+    def take_tokens(self, bucket: str, tokens: float, rate: float, capacity: float) -> float:
+        now = time.time()
+        with self.db.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT tokens, updated_at FROM token_buckets WHERE name = ?", (bucket,)
+            ).fetchone()
+            available = _refill(row[0], row[1], now, rate, capacity) if row else capacity
+            wait = 0.0
+            if available >= tokens:
+                available -= tokens
+            else:
+                wait = (tokens - available) / rate
+            conn.execute(
+                "INSERT OR REPLACE INTO token_buckets VALUES (?, ?, ?)", (bucket, available, now)
+            )
+        return wait
+
+    def purge_expired(self) -> int:
+        with self.db.connection() as conn:
+            return conn.execute("DELETE FROM cache_entries WHERE keep_until <= ?", (time.time(),)).rowcount
+
+    def close(self) -> None:
+        self.db.close()
+
+
+# KEYS[1] = bucket hash; ARGV = tokens, rate, capacity, now
+_TAKE_TOKENS_SCRIPT = '''
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens, rate, capacity, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+local available = capacity
+if state[1] then
+    available = math.min(capacity, tonumber(state[1]) + math.max(0, now - tonumber(state[2])) * rate)
+end
+local wait = 0
+if available >= tokens then
+    available = available - tokens
+else
+    wait = (tokens - available) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(available), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 60)
+return tostring(wait)
+'''
+
+
+# KEYS = sequence counter, latest quote hash, symbol order set; ARGV = symbol, entry, ...
+# Numbers and writes in one script, so readers never see a later number before an earlier one
+_PUBLISH_QUOTES_SCRIPT = '''
+local seq = tonumber(redis.call('GET', KEYS[1]) or '0')
+for i = 1, #ARGV, 2 do
+    seq = seq + 1
+    redis.call('HSET', KEYS[2], ARGV[i], ARGV[i + 1])
+    redis.call('ZADD', KEYS[3], seq, ARGV[i])
+end
+redis.call('SET', KEYS[1], seq)
+return seq
+'''
+
+
+class RedisSharedStore(SharedStore):
+    """
+    Shared store in Redis, for several hosts
+
+    Bodies are stored with their expiry time prepended and a Redis TTL of
+    keep_until. Invalidations go to a sorted set scored by a sequence
+    counter, the latest quotes to a hash plus a sorted set of symbols
+    scored by the sequence number of their last change; token buckets are
+    updated atomically by a Lua script.
+    """
+
+    def __init__(self, url: str, prefix: str = "markstro:"):
+        if redis is None:
+            raise RuntimeError("SHARED_CACHE_URL uses redis:// but the redis package is not installed")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._take_tokens = self.client.register_script(_TAKE_TOKENS_SCRIPT)
+        self._publish_quotes = self.client.register_script(_PUBLISH_QUOTES_SCRIPT)
+
+    def get(self, key: str) -> Optional[Tuple[bytes, float]]:
+        raw = self.client.get(self.prefix + "c:" + key)
+        if raw is None:
+            return None
+        (expires_at,) = struct.unpack_from("!d", raw)
+        return raw[8:], expires_at
+
+    def set(self, key: str, body: bytes, expires_at: float, keep_until: float) -> None:
+        ttl_ms = max(1, int((keep_until - time.time()) * 1000))
+        self.client.set(self.prefix + "c:" + key, struct.pack("!d", expires_at) + body, px=ttl_ms)
+
+    def delete(self, key: str) -> None:
+        self.client.delete(self.prefix + "c:" + key)
+
+    def delete_prefix(self, prefix: str) -> None:
+        pattern = self.prefix + "c:" + prefix.replace("*", "\\*").replace("?", "\\?") + "*"
+        batch = []
+        for name in self.client.scan_iter(match=pattern, count=500):
+            batch.append(name)
+            if len(batch) >= 500:
+                self.client.delete(*batch)
+                batch = []
+        if batch:
+            self.client.delete(*batch)
+
+    def publish_invalidation(self, cache: str, key: Optional[str]) -> None:
+        seq = self.client.incr(self.prefix + "inv:seq")
+        pipe = self.client.pipeline()
+        pipe.zadd(self.prefix + "inv", {json.dumps([seq, cache, key]): seq})
+        pipe.zremrangebyrank(self.prefix + "inv", 0, -1001)
+        pipe.execute()
+
+    def invalidations_since(self, seq: Optional[int]) -> Tuple[int, List[Invalidation]]:
+        if seq is None:
+            return int(self.client.get(self.prefix + "inv:seq") or 0), []
+        members = self.client.zrangebyscore(self.prefix + "inv", f"({seq}", "+inf")
+        events = [json.loads(member) for member in members]
+        if not events:
+            return seq, []
+        return events[-1][0], [(cache, key) for _, cache, key in events]
+
+    def publish_quotes(self, entries: List[Tuple[str, bytes]]) -> int:
+        keys = [self.prefix + "q:seq", self.prefix + "q:latest", self.prefix + "q:order"]
+        return int(self._publish_quotes(keys=keys, args=[part for entry in entries for part in entry]))
+
+    def quotes_since(self, seq: int) -> Tuple[int, List[bytes]]:
+        changed = self.client.zrangebyscore(self.prefix + "q:order", f"({seq}", "+inf", withscores=True)
+        if not changed:
+            return seq, []
+        entries = self.client.hmget(self.prefix + "q:latest", [symbol for symbol, _ in changed])
+        return int(changed[-1][1]), [entry for entry in entries if entry is not None]
+
+    def take_tokens(self, bucket: str, tokens: float, rate: float, capacity: float) -> float:
+        wait = self._take_tokens(keys=[self.prefix + "tb:" + bucket], args=[tokens, rate, capacity, time.time()])
+        return float(wait)
+
+    def close(self) -> None:
+        self.client.close()
+
+
+def shared_store_from_url(url: Optional[str]) -> Optional[SharedStore]:
+    """
+    Build the shared store configured by SHARED_CACHE_URL
+
+    Args:
+        url: sqlite:///path, redis://..., memory:// or empty
+
+    Returns:
+        SharedStore, or None when no URL is set
+    """
+    if not url:
+        return None
+    parts = urlsplit(url)
+    if parts.scheme == "memory":
+        return MemorySharedStore()
+    if parts.scheme == "sqlite":
+        path = parts.path or os.path.join(tempfile.gettempdir(), "markstro-shared.db")
+        return SQLiteSharedStore(path)
+    if parts.scheme in ("redis", "rediss", "unix"):
+        return RedisSharedStore(url)
+    raise ValueError(f"Unsupported SHARED_CACHE_URL scheme: {parts.scheme}")
@@ -0,0 +1,45 @@
+"""
+Settings
+Loads environment configuration once per process
+"""
+
+import os
+from functools import lru_cache
+
+from dotenv import load_dotenv
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+ENV_FILE = os.path.join(BACKEND_DIR, "config", ".env")
+
+
+@lru_cache(maxsize=None)
+def load_env() -> None:
+    """
+    Load backend/config/.env and any .env found from the working directory
+
+    Safe to call from every module; the files are only read the first time.
+    Variables already set in the environment are never overridden.
+    """
+    if os.path.exists(ENV_FILE):
+        load_dotenv(ENV_FILE)
+    load_dotenv()
+
+
+def lazy_init_enabled() -> bool:
+    """
+    Check whether heavy services should be built on first use
+
+    Enabled with MARKSTRO_LAZY_INIT=1 (the Vercel entry point sets it), so
+    serverless cold starts only pay for what the first request touches.
+    """
+    return os.getenv("MARKSTRO_LAZY_INIT", "0") == "1"
+
+
+def is_production() -> bool:
+    """
+    Check whether this is a production deployment
+
+    Set with MARKSTRO_ENV=production (render.yaml does); endpoints that are
+    open for local development, like /metrics, then need their tokens.
+    """
+    return os.getenv("MARKSTRO_ENV", "development").lower() == "production"
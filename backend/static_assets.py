@@ -0,0 +1,206 @@
+"""
+Static Asset Serving
+Indexes the frontend directory once, fingerprints assets and serves them
+from memory with precompressed variants
+"""
+
+import hashlib
+import mimetypes
+import os
+import posixpath
+import re
+from typing import Dict, Optional
+
+from fastapi.responses import FileResponse, Response
+from starlette.datastructures import Headers
+from starlette.types import Receive, Scope, Send
+
+from http_cache import etag_matches
+from middleware.compression import SUPPORTED_ENCODINGS, compress, is_compressible, negotiate_encoding
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+# Files in the frontend tree that are not part of the site
+SKIPPED_SUFFIXES = (".backup",)
+
+# src="..." / href="..." references to local files inside HTML pages
+_REFERENCE_RE = re.compile(r'(\b(?:src|href)=")([^"#?:]+)(")')
+
+
+class StaticAsset:
+    """One file of the frontend, with optional in-memory body and variants"""
+
+    __slots__ = ("path", "file_path", "media_type", "etag", "body", "variants", "hashed_path")
+
+    def __init__(self, path: str, file_path: str, body: bytes, media_type: str, keep_in_memory: bool):
+        self.path = path
+        self.file_path = file_path
+        self.media_type = media_type
+        digest = hashlib.blake2b(body, digest_size=16).hexdigest()
+        # Weak validator: the identity, gzip and br bodies differ byte for byte
+        # but are the same asset, so one tag revalidates all of them
+        self.etag = f'W/"{digest}"'
+        self.body: Optional[bytes] = body if keep_in_memory else None
+        self.variants: Dict[str, bytes] = {}
+
+        stem, ext = posixpath.splitext(path)
+        self.hashed_path = f"{stem}.{digest[:10]}{ext}"
+
+        if keep_in_memory and is_compressible(media_type):
+            for encoding in SUPPORTED_ENCODINGS:
+                compressed = compress(body, encoding, gzip_level=9, brotli_quality=11)
+                if len(compressed) < len(body):
+                    self.variants[encoding] = compressed
+
+
+class StaticAssetIndex:
+    """
+    In-memory index of the frontend directory
+
+    Every asset is reachable under its original path (revalidated through
+    its ETag) and under a content-hashed path such as
+    ``dashboard.3f2a1b9c04.js`` which is cached as immutable. HTML pages
+    are rewritten to reference the hashed paths, so browsers only go back
+    to the server for the pages themselves.
+    """
+
+    def __init__(self, directory: str, max_memory_size: int = 512 * 1024):
+        self.directory = directory
+        self.max_memory_size = max_memory_size
+        self.assets: Dict[str, StaticAsset] = {}
+        self.hashed: Dict[str, StaticAsset] = {}
+        self.built = False
+
+    def build(self) -> "StaticAssetIndex":
+        """
+        Scan the directory and (re)build the index
+
+        Returns:
+            self, for chaining
+        """
+        pages = []
+        assets = {}
+
+        for root, dirs, files in os.walk(self.directory):
+            dirs[:] = [d for d in dirs if not d.startswith(".")]
+            for name in files:
+                if name.startswith(".") or name.endswith(SKIPPED_SUFFIXES):
+                    continue
+                file_path = os.path.join(root, name)
+                path = os.path.relpath(file_path, self.directory).replace(os.sep, "/")
+                if path.endswith(".html"):
+                    pages.append((path, file_path))
+                else:
+                    assets[path] = self._load(path, file_path)
+
+        # Pages are indexed last so their references can be rewritten
+        for path, file_path in pages:
+            with open(file_path, "rb") as f:
+                html = f.read().decode("utf-8")
+            html = self._rewrite_references(path, html, assets)
+            assets[path] = StaticAsset(path, file_path, html.encode("utf-8"), "text/html; charset=utf-8", True)
+
+        self.assets = assets
+        self.hashed = {asset.hashed_path: asset for asset in assets.values()}
+        self.built = True
+        return self
+
+    def _load(self, path: str, file_path: str) -> StaticAsset:
+        with open(file_path, "rb") as f:
+            body = f.read()
+        media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        if media_type.startswith("text/") or media_type == "application/javascript":
+            media_type += "; charset=utf-8"
+        return StaticAsset(path, file_path, body, media_type, len(body) <= self.max_memory_size)
+
+    @staticmethod
+    def _rewrite_references(page_path: str, html: str, assets: Dict[str, StaticAsset]) -> str:
+        page_dir = posixpath.dirname(page_path)
+
+        def replace(match):
+            ref = match.group(2)
+            target = posixpath.normpath(ref.lstrip("/") if ref.startswith("/") else posixpath.join(page_dir, ref))
+            asset = assets.get(target)
+            if asset is None:
+                return match.group(0)
+            hashed_name = posixpath.basename(asset.hashed_path)
+            return match.group(1) + posixpath.join(posixpath.dirname(ref), hashed_name) + match.group(3)
+
+        return _REFERENCE_RE.sub(replace, html)
+
+    def url_for(self, path: str) -> str:
+        """
+        Get the fingerprinted URL of an asset
+
+        Args:
+            path: Path relative to the frontend directory
+
+        Returns:
+            Absolute URL path of the hashed asset (original path if unknown)
+        """
+        asset = self.assets.get(path)
+        return "/" + (asset.hashed_path if asset else path)
+
+    def response(self, request_headers: Headers, path: str) -> Optional[Response]:
+        """
+        Build the response for an asset path
+
+        Args:
+            request_headers: Request headers (Accept-Encoding, If-None-Match)
+            path: Request path relative to the site root
+
+        Returns:
+            Response, or None if the path is not an asset
+        """
+        if not self.built and os.path.isdir(self.directory):
+            self.build()
+
+        path = path.lstrip("/")
+        if path == "" or path.endswith("/"):
+            path += "index.html"
+
+        asset = self.hashed.get(path)
+        immutable = asset is not None
+        if asset is None:
+            asset = self.assets.get(path)
+        if asset is None:
+            return None
+
+        headers = {
+            "ETag": asset.etag,
+            "Cache-Control": IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL,
+        }
+        if asset.variants:
+            headers["Vary"] = "Accept-Encoding"
+
+        if etag_matches(request_headers.get("if-none-match"), asset.etag):
+            return Response(status_code=304, headers=headers)
+
+        if asset.body is None:
+            return FileResponse(asset.file_path, media_type=asset.media_type, headers=headers)
+
+        body = asset.body
+        encoding = negotiate_encoding(request_headers.get("accept-encoding", ""))
+        if encoding in asset.variants:
+            body = asset.variants[encoding]
+            headers["Content-Encoding"] = encoding
+
+        return Response(content=body, media_type=asset.media_type, headers=headers)
+
+
+class StaticAssetApp:
+    """ASGI app serving a StaticAssetIndex (drop-in for StaticFiles(html=True))"""
+
+    def __init__(self, index: StaticAssetIndex):
+        self.index = index
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["method"] not in ("GET", "HEAD"):
+            response = Response("Method Not Allowed", status_code=405, headers={"Allow": "GET, HEAD"})
+        else:
+            response = self.index.response(Headers(scope=scope), scope["path"])
+            if response is None:
+                response = Response("Not Found", status_code=404, media_type="text/plain")
+        await response(scope, receive, send)
+
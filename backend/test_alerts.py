@@ -0,0 +1,97 @@
+"""
+Tests for price alerts: threshold matching, one-shot claims across workers
+and recovery when a claim fails
+"""
+
+import sqlite3
+from contextlib import contextmanager
+
+import pytest
+
+from services.alerts import ABOVE, BELOW, AlertEngine, ThresholdIndex
+from services.database import Database
+
+
+@pytest.fixture
+def database(tmp_path):
+    db = Database(str(tmp_path / "alerts.db"))
+    yield db
+    db.close()
+
+
+def quote(symbol, price, change=0.0):
+    return {"symbol": symbol, "price": price, "changePercent": change}
+
+
+def test_threshold_index_pops_crossed_prefix_and_suffix():
+    index = ThresholdIndex()
+    for alert_id, threshold in enumerate([110.0, 100.0, 120.0, 100.0]):
+        index.add(threshold, alert_id)
+
+    assert sorted(index.pop_crossed(110.0, ABOVE)) == [0, 1, 3]
+    assert index.thresholds == [120.0]
+    assert index.pop_crossed(125.0, BELOW) == []
+    assert index.pop_crossed(119.0, BELOW) == [2]
+    assert len(index) == 0
+
+
+def test_matched_alert_fires_once_and_is_stored(database):
+    engine = AlertEngine(database)
+    above = engine.create("alice", "AAPL", "price_above", 150.0)
+    below = engine.create("alice", "AAPL", "price_below", 90.0)
+
+    fired = engine.fire(engine.match(quote("AAPL", 151.0)))
+
+    assert [alert.id for alert in fired] == [above.id]
+    assert engine.match(quote("AAPL", 160.0)) == []
+    stored = {row["id"]: row for row in engine.list("alice")}
+    assert stored[above.id]["status"] == "triggered"
+    assert stored[above.id]["triggered_value"] == 151.0
+    assert stored[below.id]["status"] == "active"
+
+
+def test_alert_is_claimed_by_one_worker_only(database):
+    first = AlertEngine(database)
+    alert = first.create("alice", "MSFT", "change_above", 2.0)
+    second = AlertEngine(database)
+    second.ensure_loaded()
+
+    matches_first = first.match(quote("MSFT", 300.0, change=2.5))
+    matches_second = second.match(quote("MSFT", 300.0, change=2.5))
+
+    assert [a.id for a in first.fire(matches_first)] == [alert.id]
+    assert second.fire(matches_second) == []
+
+
+def test_new_alert_fires_against_the_last_quote(database):
+    engine = AlertEngine(database)
+    engine.ensure_loaded()
+    engine.match(quote("AAPL", 95.0))
+
+    alert = engine.create("alice", "AAPL", "price_below", 100.0)
+
+    assert alert.status == "triggered"
+    assert alert.triggered_value == 95.0
+
+
+def test_failed_claim_puts_alerts_back_in_the_index(database, monkeypatch):
+    engine = AlertEngine(database)
+    alert = engine.create("alice", "AAPL", "price_above", 150.0)
+    matches = engine.match(quote("AAPL", 151.0))
+    assert [a.id for a, _ in matches] == [alert.id]
+
+    @contextmanager
+    def locked():
+        raise sqlite3.OperationalError("database is locked")
+        yield
+
+    with monkeypatch.context() as patch:
+        patch.setattr(database, "connection", locked)
+        with pytest.raises(sqlite3.OperationalError):
+            engine.fire(matches)
+
+    assert alert.status == "active"
+    assert engine.symbols() == ["AAPL"]
+    fired = engine.fire(engine.match(quote("AAPL", 152.0)))
+    assert [a.id for a in fired] == [alert.id]
+    assert fired[0].triggered_value == 152.0
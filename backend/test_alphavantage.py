@@ -0,0 +1,149 @@
+"""
+Tests for the Alpha Vantage client: typed parsing of responses and the
+mapping of vendor error bodies and network failures to upstream error
+types, without leaking the API key
+"""
+
+import asyncio
+import json
+import socket
+
+import pytest
+
+import server
+from services.alphavantage import RATE_LIMIT_RETRY_AFTER, AlphaVantageService
+from services.errors import (
+    InvalidSymbolError,
+    NoDataError,
+    RateLimitedError,
+    UpstreamParseError,
+    UpstreamPlanError,
+    UpstreamUnavailableError,
+    redact,
+)
+from services.newsapi import NewsAPIService
+from services.parsers import GLOBAL_QUOTE
+from services.resilience import RetryPolicy
+from tools.fake_upstream import ALPHA_VANTAGE_NOTE, synthetic_daily, synthetic_quote
+
+
+def client(session, retry=None):
+    return AlphaVantageService(session=session, retry=retry)
+
+
+def no_wait_retry():
+    return RetryPolicy(attempts=3, sleep=lambda delay: None)
+
+
+def test_quote_fields_are_typed(fake_session):
+    quote = client(fake_session(synthetic_quote("AAPL"))).get_quote("AAPL")
+
+    assert quote["symbol"] == "AAPL"
+    assert isinstance(quote["price"], float)
+    assert isinstance(quote["volume"], int)
+    assert isinstance(quote["changePercent"], float)
+
+
+def test_quote_without_optional_fields_gets_defaults():
+    assert GLOBAL_QUOTE.parse({"05. price": "12.5"}) == {
+        "price": 12.5, "change": 0.0, "changePercent": 0.0, "open": 0.0, "high": 0.0,
+        "low": 0.0, "volume": 0, "previousClose": 0.0, "latestTradingDay": "",
+    }
+
+
+@pytest.mark.parametrize("record", [{"02. open": "1"}, {"05. price": "n/a"}, ["05. price"]])
+def test_malformed_quote_is_a_parse_error(record):
+    with pytest.raises(UpstreamParseError):
+        GLOBAL_QUOTE.parse(record)
+
+
+def test_time_series_is_streamed_into_the_last_60_bars(fake_session):
+    series = client(fake_session(synthetic_daily("AAPL"))).get_time_series("AAPL")
+
+    dates = [bar["date"] for bar in series["data"]]
+    assert len(dates) == 60
+    assert dates == sorted(dates)
+    assert set(series["data"][0]) == {"date", "open", "high", "low", "close", "volume"}
+
+
+def test_empty_quote_is_no_data(fake_session):
+    with pytest.raises(NoDataError):
+        client(fake_session({"Global Quote": {}})).get_quote("AAPL")
+
+
+def test_error_message_is_an_invalid_symbol(fake_session):
+    body = {"Error Message": "Invalid API call."}
+
+    with pytest.raises(InvalidSymbolError, match="NOPE") as raised:
+        client(fake_session(body)).get_quote("NOPE")
+    assert raised.value.status_code == 404
+
+
+@pytest.mark.parametrize("body", [
+    ALPHA_VANTAGE_NOTE,
+    {"Information": "Thank you for using Alpha Vantage! Our standard API rate limit is 25 requests per day."},
+])
+def test_quota_messages_are_rate_limits(fake_session, body):
+    with pytest.raises(RateLimitedError) as raised:
+        client(fake_session(body)).get_quote("AAPL")
+    assert raised.value.status_code == 429
+    assert raised.value.retry_after == RATE_LIMIT_RETRY_AFTER
+
+
+@pytest.mark.parametrize("message", [
+    "Thank you for using Alpha Vantage! This is a premium endpoint. You may subscribe to any of the premium plans.",
+    "The **demo** API key is for demo purposes only. Please claim your free API key.",
+])
+def test_refusals_are_plan_errors_and_not_retried(fake_session, message):
+    session = fake_session({"Information": message})
+
+    with pytest.raises(UpstreamPlanError) as raised:
+        client(session, no_wait_retry()).get_intraday("AAPL", full=True)
+    assert raised.value.status_code == 502
+    assert "TIME_SERIES_INTRADAY" in str(raised.value)
+    assert len(session.calls) == 1
+
+
+def test_server_errors_are_retried(fake_session):
+    session = fake_session({}, status_code=503)
+
+    with pytest.raises(UpstreamUnavailableError):
+        client(session, no_wait_retry()).get_quote("AAPL")
+    assert len(session.calls) == 3
+
+
+def test_non_json_body_is_a_parse_error(fake_session):
+    with pytest.raises(UpstreamParseError):
+        client(fake_session(b"<html>maintenance</html>")).get_quote("AAPL")
+
+
+def closed_port_url(path):
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    return f"http://127.0.0.1:{port}{path}"
+
+
+def test_unreachable_upstream_never_returns_the_api_key(monkeypatch):
+    monkeypatch.setenv("ALPHA_VANTAGE_KEY", "AV-SECRET-KEY")
+    monkeypatch.setenv("ALPHA_VANTAGE_BASE_URL", closed_port_url("/query"))
+    monkeypatch.setenv("NEWS_API_KEY", "NEWS-SECRET-KEY")
+    monkeypatch.setenv("NEWS_API_BASE_URL", closed_port_url("/v2"))
+
+    calls = [
+        lambda: AlphaVantageService().get_quote("AAPL"),
+        lambda: NewsAPIService().get_market_news(),
+    ]
+    for call in calls:
+        with pytest.raises(UpstreamUnavailableError) as raised:
+            call()
+        response = asyncio.run(server.upstream_exception_handler(None, raised.value))
+        body = json.loads(response.body)
+        assert response.status_code == 503
+        assert body["error"].startswith("Network error: ")
+        assert "SECRET" not in response.body.decode()
+
+
+def test_redact_masks_key_parameters():
+    assert redact("GET /query?function=X&apikey=abc123&symbol=A") == "GET /query?function=X&apikey=***&symbol=A"
+    assert redact("url: /v2/everything?apiKey=abc123") == "url: /v2/everything?apiKey=***"
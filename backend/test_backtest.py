@@ -0,0 +1,122 @@
+"""
+Tests for the backtesting engine: positions from entry/exit events, no
+look-ahead in the simulation, trade pairing, and chunked sorted sweeps
+"""
+
+import asyncio
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from services.backtest import (
+    BacktestService,
+    expand_grid,
+    hold_between,
+    list_trades,
+    run_backtest,
+    run_sweep,
+    simulate,
+)
+from services.market_store import MarketStore
+
+
+def test_hold_between_keeps_the_last_event():
+    entries = np.array([0, 1, 0, 1, 0, 0, 0, 1], dtype=bool)
+    exits = np.array([1, 0, 0, 0, 1, 1, 0, 0], dtype=bool)
+
+    assert hold_between(entries, exits).tolist() == [0, 1, 1, 1, 0, 0, 0, 1]
+    assert hold_between(np.zeros(3, dtype=bool), np.zeros(3, dtype=bool)).tolist() == [0, 0, 0]
+
+
+def test_position_pays_from_the_next_bar():
+    close = np.array([100.0, 110.0, 121.0, 121.0])
+    # Decided on bar 1's close: bar 1's own +10% must not count
+    position = np.array([0.0, 1.0, 1.0, 0.0])
+
+    result = simulate(close, position, cost=0.0)
+
+    assert result["held"].tolist() == [0, 0, 1, 1]
+    assert result["returns"].tolist() == pytest.approx([0, 0, 0.1, 0])
+    assert result["equity"][-1] == pytest.approx(1.1)
+
+
+def test_position_changes_pay_costs_and_show_in_drawdown():
+    close = np.array([100.0, 100.0, 90.0, 90.0])
+    result = simulate(close, np.array([1.0, 1.0, 0.0, 0.0]), cost=0.01)
+
+    assert result["returns"].tolist() == pytest.approx([0, -0.01, -0.1, -0.01])
+    assert result["drawdown"].min() == pytest.approx(result["equity"][-1] - 1)
+
+
+def test_trades_pair_entries_with_exits_and_leave_the_last_open():
+    dates = np.arange("2024-01-01", "2024-01-08", dtype="datetime64[D]")
+    close = np.array([10.0, 11.0, 12.0, 13.0, 14.0, 15.0, 16.0])
+    held = np.array([0, 0, 1, 1, 0, 1, 1], dtype=float)
+
+    trades = list_trades(dates, close, held)
+
+    assert [(t["entryDate"], t["exitDate"]) for t in trades] == [
+        ("2024-01-02", "2024-01-04"), ("2024-01-05", None),
+    ]
+    assert trades[0]["return"] == pytest.approx(13.0 / 11.0 - 1)
+    assert trades[1]["exitPrice"] == 16.0
+
+
+def test_backtest_trades_match_its_equity():
+    rng = np.random.default_rng(11)
+    close = 100 * np.cumprod(1 + rng.normal(0, 0.02, 300))
+    dates = np.arange("2023-01-01", 300, dtype="datetime64[D]")[:300]
+
+    result = run_backtest(dates, close, "ma_crossover", {"fast": 5, "slow": 20}, cost=0.0)
+
+    growth = np.prod([1 + trade["return"] for trade in result["trades"]])
+    assert result["curve"]["equity"][-1] == pytest.approx(10000.0 * growth)
+    assert result["metrics"]["trades"] == len(result["trades"])
+
+
+@pytest.fixture
+def service(tmp_path):
+    store = MarketStore(str(tmp_path / "market.db"))
+    rng = np.random.default_rng(5)
+    closes = 100 * np.cumprod(1 + rng.normal(0.0005, 0.02, 200))
+    start = datetime.date(2023, 1, 2)
+    store.bulk_upsert_bars([
+        ("SWP", (start + datetime.timedelta(days=i)).isoformat(), c, c, c, c, 1000)
+        for i, c in enumerate(closes)
+    ])
+    backtests = BacktestService(store, max_workers=2, min_parallel_work=0)
+    # Threads stand in for the spawned processes: same chunking, no interpreter start-up
+    backtests._pool = ThreadPoolExecutor(max_workers=2)
+    yield backtests
+    backtests.close()
+    store.close()
+
+
+def test_sweep_chunks_cover_every_combination_sorted_best_first(service):
+    grid = {"fast": [5, 10, 20, 40], "slow": [10, 30, 60]}
+
+    result = asyncio.run(service.sweep("SWP", "ma_crossover", grid, sort_by="sharpe", top=100))
+
+    _, close = service.load("SWP")
+    serial = run_sweep(close, "ma_crossover", expand_grid("ma_crossover", grid), 0.0005)
+    key = lambda r: tuple(sorted(r["params"].items()))
+    assert sorted(result["results"], key=key) == sorted(serial, key=key)
+    assert result["combinations"] == 12
+
+    sharpes = [r["metrics"]["sharpe"] for r in result["results"] if r["metrics"]]
+    assert sharpes == sorted(sharpes, reverse=True)
+    # fast >= slow is invalid: those come last, with their error
+    failed = [r for r in result["results"] if r["metrics"] is None]
+    assert len(failed) == 4
+    assert result["results"][-len(failed):] == failed
+    assert all("fast must be shorter" in r["error"] for r in failed)
+
+
+def test_sweep_top_and_grid_limit(service):
+    result = asyncio.run(service.sweep("SWP", "rsi_reversion", {"period": [7, 14], "lower": [20, 30]}, top=3))
+
+    assert len(result["results"]) == 3
+    with pytest.raises(ValueError, match="combinations"):
+        expand_grid("ma_crossover", {"fast": list(range(2, 30)), "slow": list(range(30, 60))})
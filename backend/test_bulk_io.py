@@ -0,0 +1,103 @@
+"""
+Tests for bulk market data I/O: chunked CSV and columnar round-trips
+through the MarketStore
+"""
+
+import io
+import json
+
+import pytest
+
+from services.bulk_io import (
+    COLUMNAR_DTYPES,
+    export_columnar,
+    import_path,
+    iter_csv,
+    read_columnar_chunks,
+    read_csv_chunks,
+)
+from services.market_store import MarketStore
+
+BARS = [
+    (symbol, f"2024-01-{day:02d}", 10.0 + day, 11.5 + day, 9.25 + day, 10.75 + day, 1000 * day)
+    for symbol in ("AAA", "BBB", "CCC")
+    for day in range(1, 11)
+]
+
+
+@pytest.fixture
+def source(tmp_path):
+    store = MarketStore(str(tmp_path / "source.db"))
+    store.bulk_upsert_bars(BARS)
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def target(tmp_path):
+    store = MarketStore(str(tmp_path / "target.db"))
+    yield store
+    store.close()
+
+
+def all_bars(store):
+    return [tuple(row) for chunk in store.iter_bars() for row in chunk]
+
+
+def test_columnar_round_trip_in_small_chunks(source, target, tmp_path):
+    directory = tmp_path / "export"
+
+    exported = export_columnar(source, str(directory), chunk_size=7)
+    imported = import_path(target, str(directory), chunk_size=4)
+
+    assert exported["rows"] == imported["rows"] == len(BARS)
+    assert exported["symbols"] == imported["symbols"] == 3
+    assert exported["bytes"] == len(BARS) * 48
+    assert all_bars(target) == BARS
+
+    meta = json.loads((directory / "meta.json").read_text())
+    assert meta["columns"] == COLUMNAR_DTYPES
+    assert [len(chunk) for chunk in read_columnar_chunks(str(directory), chunk_size=8)] == [8, 8, 8, 6]
+
+
+def test_columnar_export_filters_by_symbol_and_date(source, target, tmp_path):
+    directory = str(tmp_path / "export")
+
+    export_columnar(source, directory, symbols=["BBB"], start="2024-01-03", end="2024-01-05")
+    import_path(target, directory)
+
+    assert all_bars(target) == [bar for bar in BARS if bar[0] == "BBB" and "2024-01-03" <= bar[1] <= "2024-01-05"]
+
+
+def test_empty_columnar_export_imports_nothing(target, tmp_path):
+    directory = str(tmp_path / "export")
+
+    assert export_columnar(target, directory)["rows"] == 0
+    assert import_path(target, directory)["rows"] == 0
+
+
+def test_csv_round_trip_in_small_chunks(source, target, tmp_path):
+    path = tmp_path / "bars.csv"
+    chunks = list(iter_csv(source, chunk_size=9))
+    path.write_text("".join(chunks))
+
+    assert len(chunks) == 4
+    assert import_path(target, str(path), chunk_size=5)["rows"] == len(BARS)
+    assert all_bars(target) == BARS
+
+
+def test_csv_without_symbol_column_takes_the_file_name(target, tmp_path):
+    path = tmp_path / "aapl.csv"
+    path.write_text("Date,Open,High,Low,Close,Volume\n2024-01-02,1,2,0.5,1.5,100\n")
+
+    assert import_path(target, str(path))["symbols"] == 1
+    assert all_bars(target) == [("AAPL", "2024-01-02", 1.0, 2.0, 0.5, 1.5, 100)]
+
+
+def test_malformed_csv_names_the_line():
+    text = "symbol,date,open,high,low,close,volume\nAAA,2024-01-02,1,2,0.5,1.5,100\nAAA,2024-01-03,x,2,1,1,1\n"
+
+    with pytest.raises(ValueError, match="Line 3"):
+        list(read_csv_chunks(io.StringIO(text)))
+    with pytest.raises(ValueError, match="missing columns: volume"):
+        list(read_csv_chunks(io.StringIO("symbol,date,open,high,low,close\n")))
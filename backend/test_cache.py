@@ -0,0 +1,117 @@
+"""
+Tests for the in-process TTL cache: single-flight loads, cancellation and
+stale/fallback entries
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from services.cache import Fallback, TTLCache
+from services.errors import UpstreamError
+
+
+class SlowLoader:
+    """Blocking loader that waits for a release and counts its calls"""
+
+    def __init__(self, value="value"):
+        self.value = value
+        self.calls = 0
+        self.release = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        self.release.wait(5)
+        return self.value
+
+
+async def wait_for_load(loader: SlowLoader, calls: int = 1) -> None:
+    for _ in range(500):
+        if loader.calls >= calls:
+            return
+        await asyncio.sleep(0.01)
+
+
+def test_concurrent_misses_share_one_load():
+    cache = TTLCache("test", ttl=60)
+    loader = SlowLoader()
+
+    async def scenario():
+        waiters = [asyncio.ensure_future(cache.get_or_load("AAPL", loader)) for _ in range(5)]
+        await wait_for_load(loader)
+        loader.release.set()
+        return await asyncio.gather(*waiters)
+
+    entries = asyncio.run(scenario())
+    assert loader.calls == 1
+    assert [entry.value for entry in entries] == ["value"] * 5
+    assert cache.get("AAPL").value == "value"
+
+
+def test_cancelled_owner_leaves_load_running_for_waiters():
+    cache = TTLCache("test", ttl=60)
+    loader = SlowLoader()
+
+    async def scenario():
+        owner = asyncio.ensure_future(cache.get_or_load("AAPL", loader))
+        await wait_for_load(loader)
+        waiter = asyncio.ensure_future(cache.get_or_load("AAPL", loader))
+        await asyncio.sleep(0)
+        owner.cancel()
+        await asyncio.sleep(0)
+        loader.release.set()
+        entry = await waiter
+        with pytest.raises(asyncio.CancelledError):
+            await owner
+        return entry
+
+    entry = asyncio.run(scenario())
+    assert entry.value == "value"
+    assert loader.calls == 1
+    assert not cache._inflight
+
+
+def test_failed_reload_serves_stale_entry():
+    cache = TTLCache("test", ttl=60, stale_ttl=60, stale_on=(UpstreamError,))
+    cache.set("AAPL", "old", ttl=-1)
+
+    def failing():
+        raise UpstreamError("down")
+
+    entry = asyncio.run(cache.get_or_load("AAPL", failing))
+    assert entry.value == "old"
+    assert entry.stale
+
+
+def test_failed_reload_without_stale_entry_raises():
+    cache = TTLCache("test", ttl=60, stale_ttl=60, stale_on=(UpstreamError,))
+
+    def failing():
+        raise UpstreamError("down")
+
+    with pytest.raises(UpstreamError):
+        asyncio.run(cache.get_or_load("AAPL", failing))
+    assert not cache._inflight
+
+
+def test_fallback_value_is_stale_and_short_lived():
+    cache = TTLCache("test", ttl=60, fallback_ttl=5)
+
+    entry = asyncio.run(cache.get_or_load("AAPL", lambda: Fallback("stored")))
+    assert entry.value == "stored"
+    assert entry.fresh
+    assert entry.stale
+    assert entry.expires_at - entry.stored_at == pytest.approx(5)
+
+
+def test_expired_entry_is_a_miss_and_reloads():
+    cache = TTLCache("test", ttl=60)
+    cache.set("AAPL", "old", ttl=-1)
+    assert cache.get("AAPL") is None
+
+    entry = asyncio.run(cache.get_or_load("AAPL", lambda: "new"))
+    assert entry.value == "new"
+    assert not entry.stale
+    assert entry.expires_at > time.time()
@@ -0,0 +1,107 @@
+"""
+Tests for response encoding: fast JSON serialization and negotiated
+compression of complete response bodies
+"""
+
+import asyncio
+import gzip
+
+import numpy as np
+import pytest
+from starlette.datastructures import Headers
+
+from middleware import compression
+from middleware.compression import CompressionMiddleware, negotiate_encoding
+from responses import FastJSONResponse, dumps, loads
+
+PAYLOAD = {"symbol": "AAPL", "data": [{"date": f"2024-01-{day:02d}", "close": 180.5 + day} for day in range(1, 29)]}
+
+
+def test_json_round_trips_compactly():
+    body = FastJSONResponse(PAYLOAD).body
+
+    assert loads(body) == PAYLOAD
+    assert b" " not in body
+    assert loads(dumps({1: np.float64(2.5), "n": np.int64(3)})) == {"1": 2.5, "n": 3}
+
+
+@pytest.mark.parametrize("accept_encoding, expected", [
+    ("", None),
+    ("identity", None),
+    ("gzip", "gzip"),
+    ("deflate, gzip;q=0.5", "gzip"),
+    ("gzip;q=0", None),
+    ("*", compression.SUPPORTED_ENCODINGS[0]),
+    ("br;q=1.0, gzip;q=0.8", compression.SUPPORTED_ENCODINGS[0]),
+])
+def test_encoding_negotiation(accept_encoding, expected):
+    assert negotiate_encoding(accept_encoding) == expected
+
+
+def call(body, accept_encoding="gzip", content_type="application/json", more_body=False, status=200):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(b"content-type", content_type.encode()),
+                                (b"content-length", str(len(body)).encode())]})
+        await send({"type": "http.response.body", "body": body, "more_body": more_body})
+        if more_body:
+            await send({"type": "http.response.body", "body": b""})
+
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    headers = [(b"accept-encoding", accept_encoding.encode())] if accept_encoding else []
+    scope = {"type": "http", "method": "GET", "path": "/", "headers": headers}
+    asyncio.run(CompressionMiddleware(app, minimum_size=500)(scope, None, send))
+    return Headers(raw=messages[0]["headers"]), b"".join(m.get("body", b"") for m in messages[1:])
+
+
+def test_large_json_is_gzipped_and_round_trips():
+    body = dumps(PAYLOAD)
+    headers, sent = call(body)
+
+    assert headers["content-encoding"] == "gzip"
+    assert headers["vary"] == "Accept-Encoding"
+    assert int(headers["content-length"]) == len(sent) < len(body)
+    assert loads(gzip.decompress(sent)) == PAYLOAD
+
+
+@pytest.mark.parametrize("options", [
+    {"accept_encoding": ""},
+    {"body": b"{}"},
+    {"content_type": "image/png"},
+    {"more_body": True},
+    {"status": 206},
+])
+def test_bodies_not_worth_compressing_pass_through(options):
+    body = options.pop("body", dumps(PAYLOAD))
+
+    headers, sent = call(body, **options)
+
+    assert "content-encoding" not in headers
+    assert sent == body
+
+
+def test_identical_bodies_are_compressed_once(monkeypatch):
+    calls = []
+    original = compression.compress
+
+    def counting(body, encoding, **options):
+        calls.append(encoding)
+        return original(body, encoding, **options)
+
+    monkeypatch.setattr(compression, "compress", counting)
+    cache = compression.CompressedBodyCache(max_entries=2)
+    bodies = [dumps({"n": n, **PAYLOAD}) for n in range(3)]
+
+    first = cache.get_or_compress(bodies[0], "gzip")
+    assert cache.get_or_compress(bodies[0], "gzip") is first
+    assert len(calls) == 1
+
+    cache.get_or_compress(bodies[1], "gzip")
+    cache.get_or_compress(bodies[2], "gzip")
+    # Least recently used entry evicted
+    cache.get_or_compress(bodies[0], "gzip")
+    assert len(calls) == 4
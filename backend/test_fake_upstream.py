@@ -0,0 +1,101 @@
+"""
+Tests for the fake upstream server: fixture replay through the real
+clients, deterministic synthetic data, fault injection and recording
+"""
+
+import json
+import random
+
+import pytest
+
+from services.alphavantage import AlphaVantageService
+from services.errors import RateLimitedError, UpstreamUnavailableError
+from tools.fake_upstream import (
+    ALPHA_VANTAGE_NOTE,
+    FakeUpstream,
+    FakeUpstreamServer,
+    FaultConfig,
+    parse_latency,
+    synthetic_daily,
+    synthetic_quote,
+)
+
+QUOTE = {"function": "GLOBAL_QUOTE", "symbol": "AAPL"}
+
+
+@pytest.fixture
+def serve(monkeypatch):
+    servers = []
+
+    def start(upstream):
+        server = FakeUpstreamServer(upstream).start()
+        servers.append(server)
+        monkeypatch.setenv("ALPHA_VANTAGE_BASE_URL", server.alphavantage_url)
+        monkeypatch.setenv("ALPHA_VANTAGE_KEY", "demo")
+        return AlphaVantageService()
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+def test_clients_replay_fixtures_and_synthetic_symbols(serve):
+    upstream = FakeUpstream()
+    client = serve(upstream)
+
+    assert client.get_quote("AAPL")["price"] == 247.45
+    synthetic = client.get_quote("ZZZ.TEST")
+    assert synthetic["price"] == float(synthetic_quote("ZZZ.TEST")["Global Quote"]["05. price"])
+    assert upstream.stats == {"alphavantage:GLOBAL_QUOTE": 2}
+
+
+def test_clients_see_injected_faults(serve):
+    with pytest.raises(UpstreamUnavailableError):
+        serve(FakeUpstream(faults=FaultConfig(error_rate=1.0))).get_quote("AAPL")
+    with pytest.raises(RateLimitedError):
+        serve(FakeUpstream(faults=FaultConfig(note_rate=1.0))).get_quote("AAPL")
+
+
+def test_synthetic_data_is_deterministic_and_consistent():
+    assert synthetic_daily("XYZ") == synthetic_daily("XYZ")
+    assert synthetic_daily("XYZ") != synthetic_daily("XYY")
+
+    quote = synthetic_quote("XYZ")["Global Quote"]
+    latest_day, latest = next(iter(synthetic_daily("XYZ")["Time Series (Daily)"].items()))
+    assert (quote["07. latest trading day"], quote["05. price"]) == (latest_day, latest["4. close"])
+
+
+def test_per_minute_quota_answers_like_the_free_tier():
+    upstream = FakeUpstream(faults=FaultConfig(rate_limit_per_min=2))
+
+    answers = [upstream.handle("/query", QUOTE) for _ in range(3)]
+    news = upstream.handle("/v2/top-headlines", {"category": "business"})
+
+    assert [status for status, _ in answers] == [200, 200, 200]
+    assert answers[2][1] == ALPHA_VANTAGE_NOTE
+    # Each provider has its own quota
+    assert news[0] == 200 and news[1]["status"] == "ok"
+
+
+def test_latency_specs():
+    assert parse_latency("fixed:80")(None) == 0.08
+    assert 0.01 <= parse_latency("uniform:10,20")(random.Random(1)) <= 0.02
+    with pytest.raises(ValueError):
+        parse_latency("gaussian:1,2")
+
+
+def test_recorded_responses_replay_offline(tmp_path, monkeypatch):
+    body = {"Global Quote": {"01. symbol": "NEW", "05. price": "12.3400"}}
+    recorder = FakeUpstream(str(tmp_path), record=True)
+    answers = iter([(200, body), (200, ALPHA_VANTAGE_NOTE)])
+    monkeypatch.setattr(recorder, "_fetch_real", lambda provider, path, params: next(answers))
+
+    assert recorder.handle("/query", {"function": "GLOBAL_QUOTE", "symbol": "NEW"}) == (200, body)
+    # Quota answers are passed on but never saved
+    assert recorder.handle("/query", {"function": "GLOBAL_QUOTE", "symbol": "NEW"}) == (200, ALPHA_VANTAGE_NOTE)
+
+    path = tmp_path / "alphavantage" / "GLOBAL_QUOTE" / "new.json"
+    assert json.loads(path.read_text()) == body
+    replay = FakeUpstream(str(tmp_path), synthesize=False)
+    assert replay.handle("/query", {"function": "GLOBAL_QUOTE", "symbol": "new"}) == (200, body)
+    assert replay.handle("/query", {"function": "GLOBAL_QUOTE", "symbol": "OTHER"})[0] == 404
@@ -0,0 +1,124 @@
+"""
+Tests for FX rates: the full FX_DAILY download, rate lookups by date and
+conversion of quotes and bars
+"""
+
+import datetime
+
+import numpy as np
+import pytest
+
+from services.alphavantage import AlphaVantageService
+from services.errors import NoDataError, UpstreamUnavailableError
+from services.fx import FXService
+from services.market_calendar import MarketCalendar
+from services.providers.base import MarketDataProvider
+from tools.fake_upstream import synthetic_fx_daily
+
+
+class FakeFXProvider(MarketDataProvider):
+    """Serves fixed daily rates per pair and counts the fetches"""
+
+    def __init__(self, pairs):
+        self.pairs = pairs
+        self.calls = 0
+        self.error = None
+
+    def get_fx_daily(self, from_currency, to_currency):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        rows = self.pairs.get((from_currency, to_currency))
+        if rows is None:
+            raise NoDataError(f"No FX data for {from_currency}/{to_currency}")
+        return {"from": from_currency, "to": to_currency,
+                "data": [{"date": date, "rate": rate} for date, rate in rows]}
+
+    def get_quote(self, symbol):
+        raise NoDataError("no quotes")
+
+    def get_time_series(self, symbol):
+        raise NoDataError("no series")
+
+    def search_symbols(self, keywords):
+        return []
+
+
+# Friday, then Monday
+USD_INR = [("2024-05-03", 83.0), ("2024-05-06", 84.0)]
+
+
+@pytest.fixture
+def provider():
+    return FakeFXProvider({("USD", "INR"): USD_INR, ("GBP", "USD"): [("2024-05-06", 1.25)]})
+
+
+@pytest.fixture
+def fx(provider):
+    return FXService(provider, MarketCalendar.default())
+
+
+def test_fx_daily_downloads_the_full_history(fake_session):
+    session = fake_session(synthetic_fx_daily("EUR", "USD", full=True))
+    service = AlphaVantageService(session=session)
+
+    result = service.get_fx_daily("EUR", "USD")
+
+    assert session.calls[0]["function"] == "FX_DAILY"
+    assert session.calls[0]["outputsize"] == "full"
+    dates = [row["date"] for row in result["data"]]
+    assert len(dates) == 5000
+    assert dates == sorted(dates)
+
+
+def test_rates_use_the_last_rate_on_or_before_each_date(fx):
+    dates = np.array(["2024-05-03", "2024-05-05", "2024-05-06", "2024-05-10"], dtype="datetime64[D]")
+
+    assert fx.rates("USD", "INR", dates).tolist() == [83.0, 83.0, 84.0, 84.0]
+    assert fx.rate("USD", "INR") == 84.0
+
+
+def test_date_before_the_first_rate_is_an_error(fx):
+    dates = np.array(["2024-05-02", "2024-05-06"], dtype="datetime64[D]")
+
+    with pytest.raises(NoDataError, match="rates start on 2024-05-03"):
+        fx.rates("USD", "INR", dates)
+
+
+def test_inverse_and_minor_unit_pairs_share_one_fetch(fx, provider):
+    fx.rate("USD", "INR")
+
+    assert fx.rate("INR", "USD") == pytest.approx(1 / 84.0)
+    assert fx.rate("GBX", "USD") == pytest.approx(0.0125)
+    assert fx.rate("USD", "USD") == 1.0
+    assert provider.calls == 2
+
+
+def test_failed_refresh_keeps_yesterdays_rates(fx, provider, monkeypatch):
+    monkeypatch.setattr(FXService, "today", staticmethod(lambda: datetime.date(2024, 5, 6)))
+    fx.rate("USD", "INR")
+    monkeypatch.setattr(FXService, "today", staticmethod(lambda: datetime.date(2024, 5, 7)))
+    provider.error = UpstreamUnavailableError("down")
+
+    assert fx.rate("USD", "INR") == 84.0
+    assert provider.calls == 2
+
+
+def test_missing_pair_is_not_fetched_again_the_same_day(fx, provider):
+    for _ in range(2):
+        with pytest.raises(NoDataError):
+            fx.rate("USD", "JPY")
+    assert provider.calls == 1
+
+
+def test_conversions_of_quotes_and_bars(fx):
+    quote = fx.convert_quote({"symbol": "AAPL", "price": 10.0, "changePercent": 1.5, "volume": 7}, "INR")
+    assert quote == {"symbol": "AAPL", "price": 840.0, "changePercent": 1.5, "volume": 7, "currency": "INR"}
+
+    series = fx.convert_bars({"symbol": "AAPL", "data": [
+        {"date": "2024-05-03", "open": 1.0, "high": 2.0, "low": 1.0, "close": 2.0, "volume": 5},
+        {"date": "2024-05-06", "open": 1.0, "high": 2.0, "low": 1.0, "close": 2.0, "volume": 5},
+    ]}, "INR")
+    assert [bar["close"] for bar in series["data"]] == [166.0, 168.0]
+    assert series["data"][0]["volume"] == 5
+    assert series["currency"] == "INR"
@@ -0,0 +1,137 @@
+"""
+Tests for daily history: full and compact syncs into the market store,
+and split/dividend adjustment of stored bars, series and returns
+"""
+
+import datetime
+import time
+
+import numpy as np
+import pytest
+
+from services.adjustments import adjustment_factors
+from services.alphavantage import AlphaVantageService
+from services.errors import NoDataError, UpstreamUnavailableError
+from services.history import FAILURE_BACKOFF, HistoryService
+from services.market_calendar import MarketCalendar
+from services.market_store import MarketStore
+from services.returns import ReturnsService
+from tools.fake_upstream import synthetic_daily, synthetic_daily_adjusted
+
+
+@pytest.fixture
+def store(tmp_path):
+    market = MarketStore(str(tmp_path / "market.db"))
+    yield market
+    market.close()
+
+
+def history_service(session, store):
+    return HistoryService(AlphaVantageService(session=session), store, MarketCalendar.default())
+
+
+def dates(count, start=datetime.date(2024, 1, 1)):
+    return [(start + datetime.timedelta(days=i)).isoformat() for i in range(count)]
+
+
+def test_adjustment_factors_for_a_split_and_a_dividend():
+    days = np.array(dates(5))
+    closes = np.array([100.0, 100.0, 50.0, 50.0, 50.0])
+    # 2:1 split on day 2, a 1.0 dividend on day 4 (close before it: 50)
+    actions = [(days[4], 1.0, 1.0), (days[2], 0.0, 2.0), (days[0], 5.0, 1.0)]
+
+    factors = adjustment_factors(days, closes, actions)
+
+    assert factors.tolist() == pytest.approx([0.49, 0.49, 0.98, 0.98, 1.0])
+
+
+def test_first_sync_downloads_the_full_history(fake_session, store):
+    body = synthetic_daily_adjusted("HIST", full=True)
+    session = fake_session(body, synthetic_daily_adjusted("HIST"))
+    history = history_service(session, store)
+
+    assert history.sync("HIST") == "full"
+    assert history.sync("HIST") == "fresh"
+    assert history.sync("HIST", force=True) == "compact"
+
+    assert [call["outputsize"] for call in session.calls] == ["full", "compact"]
+    assert len(store.get_bars("HIST")) == len(body["Time Series (Daily)"])
+    vendor_actions = {
+        day for day, row in body["Time Series (Daily)"].items()
+        if float(row["7. dividend amount"]) or float(row["8. split coefficient"]) != 1.0
+    }
+    assert {date for date, _, _ in store.get_actions("HIST")} == vendor_actions
+
+
+def test_adjusted_series_matches_the_vendors_adjusted_close(fake_session, store):
+    body = synthetic_daily_adjusted("HIST", full=True)
+    history = history_service(fake_session(body), store)
+
+    series = history.series("HIST")
+    raw = history.series("HIST", start=series["data"][-10]["date"], adjusted=False)
+
+    vendor = body["Time Series (Daily)"]
+    assert any(float(row["8. split coefficient"]) != 1.0 for row in vendor.values())
+    closes = np.array([bar["close"] for bar in series["data"]])
+    expected = np.array([float(vendor[bar["date"]]["5. adjusted close"]) for bar in series["data"]])
+    assert closes == pytest.approx(expected, rel=1e-3)
+    assert len(raw["data"]) == 10
+    assert raw["data"][-1]["close"] == float(vendor[raw["data"][-1]["date"]]["4. close"])
+
+
+def test_failed_sync_falls_back_to_stored_bars_and_backs_off(fake_session, store):
+    session = fake_session({}, status_code=503)
+    history = history_service(session, store)
+    store.bulk_upsert_bars([("HIST", "2024-01-02", 1.0, 1.0, 1.0, 1.0, 10)])
+
+    history.ensure("HIST")
+    assert history.series("HIST")["data"][0]["close"] == 1.0
+    assert len(session.calls) == 1
+    assert store.history_state("HIST")["expiresAt"] > time.time() + FAILURE_BACKOFF - 5
+
+
+def test_failed_first_sync_raises_without_retrying_every_read(fake_session, store):
+    session = fake_session({}, status_code=503)
+    history = history_service(session, store)
+
+    with pytest.raises(UpstreamUnavailableError):
+        history.ensure("HIST")
+    with pytest.raises(NoDataError, match="retrying later"):
+        history.ensure("HIST")
+    assert len(session.calls) == 1
+
+
+def test_refused_adjusted_series_falls_back_to_raw_compact_bars(fake_session, store):
+    refusal = {"Information": "Thank you for using Alpha Vantage! This is a premium endpoint."}
+    raw = synthetic_daily("HIST")
+    session = fake_session(refusal, raw)
+    history = history_service(session, store)
+
+    assert history.sync("HIST") == "compact"
+    assert history.sync("HIST", force=True) == "compact"
+
+    assert [call["function"] for call in session.calls] == [
+        "TIME_SERIES_DAILY_ADJUSTED", "TIME_SERIES_DAILY", "TIME_SERIES_DAILY",
+    ]
+    assert "outputsize" not in session.calls[1]
+    assert len(store.get_bars("HIST")) == len(raw["Time Series (Daily)"])
+    assert store.get_actions("HIST") == []
+    assert store.history_state("HIST")["fullAt"] == 0
+    series = history.series("HIST")["data"]
+    assert series[-1]["close"] == float(raw["Time Series (Daily)"][series[-1]["date"]]["4. close"])
+
+
+def test_split_inside_the_window_is_not_a_return(store):
+    closes = [100.0, 101.0, 102.0, 51.5, 52.0, 52.5]
+    store.bulk_upsert_bars([("SPLT", date, c, c, c, c, 1000) for date, c in zip(dates(6), closes)])
+    store.bulk_upsert_bars([("FLAT", date, 10.0, 10.0, 10.0, 10.0, 1000) for date in dates(6)])
+    store.upsert_actions([("SPLT", dates(6)[3], 0.0, 2.0)])
+
+    recent = store.get_recent_closes(["SPLT"], 6, adjusted=True)["SPLT"][1]
+    assert recent == pytest.approx([50.0, 50.5, 51.0, 51.5, 52.0, 52.5])
+    bars = store.get_recent_bars(["SPLT"], 6, adjusted=True)["SPLT"]
+    assert bars[0] == pytest.approx((50.0, 50.0, 50.0, 2000))
+
+    result = ReturnsService(store).compute(["SPLT", "FLAT"], window=5, benchmarks=(), include_returns=True)
+    assert min(result["returns"]["SPLT"]) > 0
+    assert result["volatility"]["SPLT"] < 0.1
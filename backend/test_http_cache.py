@@ -0,0 +1,77 @@
+"""
+Tests for HTTP caching: content-hash ETags, Cache-Control policies and
+304 answers to conditional requests
+"""
+
+import pytest
+from starlette.requests import Request
+
+from http_cache import (
+    QUOTE_POLICY,
+    CachePolicy,
+    PreparedBody,
+    cached_json_response,
+    etag_matches,
+)
+from responses import loads
+
+QUOTE = {"symbol": "AAPL", "price": 189.5}
+
+
+def request(if_none_match=None):
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match else []
+    return Request({"type": "http", "method": "GET", "path": "/api/stock/quote/AAPL", "headers": headers})
+
+
+def test_etag_follows_the_content():
+    assert PreparedBody.from_content(QUOTE).etag == PreparedBody.from_content(dict(QUOTE)).etag
+    assert PreparedBody.from_content(QUOTE).etag != PreparedBody.from_content({**QUOTE, "price": 190}).etag
+    assert PreparedBody.from_content(QUOTE).etag.startswith('W/"')
+
+
+@pytest.mark.parametrize("if_none_match, matches", [
+    (None, False),
+    ('"abc"', True),
+    ('W/"abc"', True),
+    ('"other", W/"abc"', True),
+    ("*", True),
+    ('"abcd"', False),
+])
+def test_etag_comparison_is_weak(if_none_match, matches):
+    assert etag_matches(if_none_match, 'W/"abc"') is matches
+
+
+def test_private_response_then_304_for_the_same_content():
+    response = cached_json_response(request(), QUOTE, QUOTE_POLICY)
+
+    assert response.status_code == 200
+    assert loads(response.body) == QUOTE
+    assert response.headers["cache-control"] == "private, max-age=15, stale-while-revalidate=45"
+    assert response.headers["vary"] == "Authorization"
+
+    etag = response.headers["etag"]
+    unchanged = cached_json_response(request(etag), PreparedBody.from_content(QUOTE), QUOTE_POLICY)
+    assert unchanged.status_code == 304
+    assert unchanged.body == b""
+    assert unchanged.headers["etag"] == etag
+
+    changed = cached_json_response(request(etag), {**QUOTE, "price": 190.0}, QUOTE_POLICY)
+    assert changed.status_code == 200
+
+
+def test_public_policies_and_max_age_overrides():
+    policy = CachePolicy(max_age=60, public=True)
+
+    response = cached_json_response(request(), QUOTE, policy, max_age=1234.7)
+
+    assert response.headers["cache-control"] == "public, max-age=1234"
+    assert "vary" not in response.headers
+
+
+def test_stale_fallbacks_are_short_lived_and_flagged():
+    response = cached_json_response(request(), QUOTE, CachePolicy(max_age=3600, public=True), stale=True, max_age=999)
+
+    assert response.headers["cache-control"] == "private, max-age=5"
+    assert response.headers["x-data-stale"] == "true"
+    assert response.headers["warning"].startswith("110")
+    assert response.headers["vary"] == "Authorization"
@@ -0,0 +1,99 @@
+"""
+Tests for intraday bars: incremental rollups match resampling everything
+at once, and aged-out bars compact into daily bars
+"""
+
+import numpy as np
+
+from services.intraday import BAR_DTYPE, DAY, INTERVALS, IntradaySeries, IntradayService, resample
+
+SESSION_OPEN = 9 * 3600 + 15 * 60
+SESSION_MINUTES = 375
+
+
+def minute_bars(days, seed=1):
+    """1-minute bars for whole sessions starting 2024-01-01"""
+    rng = np.random.default_rng(seed)
+    first = int(np.datetime64("2024-01-01", "s").astype("<i8"))
+    ts = np.concatenate([
+        first + day * DAY + SESSION_OPEN + 60 * np.arange(SESSION_MINUTES) for day in range(days)
+    ])
+    rows = np.empty(len(ts), dtype=BAR_DTYPE)
+    close = 100 * np.cumprod(1 + rng.normal(0, 0.001, len(ts)))
+    rows["ts"] = ts
+    rows["open"] = np.r_[100.0, close[:-1]]
+    rows["high"] = np.maximum(rows["open"], close) + rng.uniform(0, 0.1, len(ts))
+    rows["low"] = np.minimum(rows["open"], close) - rng.uniform(0, 0.1, len(ts))
+    rows["close"] = close
+    rows["volume"] = rng.integers(1, 1000, len(ts))
+    return rows
+
+
+def as_tuples(rows):
+    return [tuple(row) for row in rows.tolist()]
+
+
+def test_incremental_rollups_match_resampling_everything():
+    rows = minute_bars(2)
+    series = IntradaySeries({interval: 2000 for interval in INTERVALS})
+
+    # Overlapping fetches: each repeats (and revises) the previous newest bar
+    start = 0
+    for size in (100, 1, 37, 260, 3, 349):
+        batch = rows[max(start - 1, 0):start + size].copy()
+        if start:
+            batch["volume"][0] += 1
+            rows["volume"][start - 1] += 1
+        series.add(batch)
+        start += size
+
+    assert start == len(rows)
+    for interval, size in INTERVALS.items():
+        assert as_tuples(series.view(interval)) == as_tuples(resample(rows, size))
+
+
+class Vendor:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def get_intraday(self, symbol, interval, full):
+        data = [
+            {"timestamp": str(np.datetime64(int(row["ts"]), "s")), "open": row["open"], "high": row["high"],
+             "low": row["low"], "close": row["close"], "volume": int(row["volume"])}
+            for row in self.rows
+        ]
+        return {"timeZone": "Asia/Kolkata", "data": data}
+
+
+def daily(symbol, rows):
+    days = resample(rows, DAY)
+    dates = np.datetime_as_string((days["ts"] // DAY).astype("datetime64[D]")).tolist()
+    return [(symbol, date, *values[1:]) for date, values in zip(dates, as_tuples(days))]
+
+
+def test_compaction_keeps_the_retention_window_and_returns_daily_bars():
+    rows = minute_bars(3)
+    service = IntradayService(Vendor(rows))
+    service.refresh("AAA")
+
+    compacted = service.compact(retention_days=1)
+
+    assert compacted == daily("AAA", rows[:2 * SESSION_MINUTES])
+    remaining = service.series("AAA", "1min")["data"]
+    assert len(remaining) == SESSION_MINUTES
+    assert remaining[0]["timestamp"] == "2024-01-03T09:15:00"
+    # Compacted days are not taken back in on the next fetch
+    assert service.refresh("AAA") == 1
+    assert service.compact(retention_days=1) == []
+
+
+def test_idle_symbols_are_compacted_completely_and_dropped():
+    rows = minute_bars(2)
+    service = IntradayService(Vendor(rows))
+    service.refresh("AAA")
+
+    compacted = service.compact(retention_days=5, idle_seconds=-1)
+
+    assert compacted == daily("AAA", rows)
+    assert "AAA" not in service
+    assert len(service) == 0
@@ -0,0 +1,115 @@
+"""
+Tests for lazy routers: route modules are imported by the first request
+under their prefix, ahead of catch-all mounts, and all of them for the docs
+"""
+
+import asyncio
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from starlette.routing import Mount
+
+from lazy_routers import LazyRouterMiddleware, LazyRouters
+
+ROUTE_MODULE = """
+from fastapi import APIRouter
+
+router = APIRouter(prefix="/api/{name}")
+
+
+@router.get("/ping")
+def ping():
+    return {{"router": "{name}"}}
+"""
+
+LAZY_SERVER = """
+import json
+import sys
+
+from fastapi.testclient import TestClient
+
+import server
+
+before = {name: name in sys.modules for name in ("services.container", "numpy", "routes.stock", "routes.news")}
+status = TestClient(server.app).get("/api/stock/quote/AAPL").status_code
+after = {name: name in sys.modules for name in ("routes.stock", "routes.news")}
+print(json.dumps({"before": before, "status": status, "after": after,
+                  "services": hasattr(server.app.state, "services")}))
+"""
+
+
+def get(app, path):
+    """(status, body) of a GET through the ASGI app"""
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": path, "query_string": b"", "headers": []}
+    asyncio.run(app(scope, receive, send))
+    body = b"".join(message.get("body", b"") for message in messages[1:])
+    return messages[0]["status"], body
+
+
+@pytest.fixture
+def lazy_app(tmp_path, monkeypatch):
+    package = tmp_path / "lazy_demo"
+    package.mkdir()
+    (package / "__init__.py").write_text("")
+    for name in ("alpha", "beta"):
+        (package / f"{name}.py").write_text(ROUTE_MODULE.format(name=name))
+    monkeypatch.syspath_prepend(str(tmp_path))
+    for name in ("lazy_demo", "lazy_demo.alpha", "lazy_demo.beta"):
+        monkeypatch.delitem(sys.modules, name, raising=False)
+
+    app = FastAPI()
+    # A catch-all like the static frontend at "/"
+    app.router.routes.append(Mount("/", app=PlainTextResponse("frontend")))
+    routers = LazyRouters(app, [("lazy_demo.alpha", "/api/alpha", None), ("lazy_demo.beta", "/api/beta", None)])
+    app.add_middleware(LazyRouterMiddleware, routers=routers)
+    return app, routers
+
+
+def test_first_request_includes_only_its_router_ahead_of_mounts(lazy_app):
+    app, routers = lazy_app
+
+    assert get(app, "/api/alpha/ping") == (200, b'{"router":"alpha"}')
+    assert "lazy_demo.alpha" in sys.modules
+    assert "lazy_demo.beta" not in sys.modules
+    assert [spec[0] for spec in routers.pending] == ["lazy_demo.beta"]
+    assert get(app, "/elsewhere") == (200, b"frontend")
+
+
+def test_docs_include_every_router(lazy_app):
+    app, routers = lazy_app
+    get(app, "/api/alpha/ping")
+
+    paths = json.loads(get(app, "/openapi.json")[1])["paths"]
+
+    assert set(paths) == {"/api/alpha/ping", "/api/beta/ping"}
+    assert routers.pending == []
+    assert get(app, "/api/beta/ping") == (200, b'{"router":"beta"}')
+
+
+def test_lazy_server_import_defers_services_and_routes():
+    env = {**os.environ, "MARKSTRO_LAZY_INIT": "1"}
+    output = subprocess.run(
+        [sys.executable, "-c", LAZY_SERVER], env=env, capture_output=True, text=True, check=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    ).stdout
+    result = json.loads(output.splitlines()[-1])
+
+    assert result["before"] == {"services.container": False, "numpy": False,
+                                "routes.stock": False, "routes.news": False}
+    # Routed (and refused without a token) without starting the services
+    assert result["status"] == 401
+    assert result["after"] == {"routes.stock": True, "routes.news": False}
+    assert result["services"] is False
@@ -0,0 +1,121 @@
+"""
+Tests for the multi-worker launch: leader election between workers,
+singleton jobs following the leader, and the gunicorn configuration
+"""
+
+import asyncio
+import gc
+import os
+import runpy
+import subprocess
+import sys
+
+import pytest
+
+from services.container import ServiceContainer
+from services.leader import LeaderLock
+
+HOLD_LOCK = """
+import sys
+from services.leader import LeaderLock
+lock = LeaderLock(sys.argv[1])
+print(lock.try_acquire(), flush=True)
+sys.stdin.read()
+"""
+
+
+@pytest.fixture
+def lock_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "leader.lock")
+    monkeypatch.setenv("LEADER_LOCK_PATH", path)
+    return path
+
+
+def test_one_leader_until_it_releases(lock_path):
+    first, second = LeaderLock(lock_path), LeaderLock(lock_path)
+
+    assert first.try_acquire()
+    assert not second.try_acquire()
+    assert first.try_acquire()
+
+    first.release()
+    assert second.try_acquire()
+    assert second.is_leader and not first.is_leader
+    second.release()
+
+
+def test_leadership_passes_on_when_the_leader_process_exits(lock_path):
+    worker = subprocess.Popen(
+        [sys.executable, "-c", HOLD_LOCK, lock_path],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    try:
+        assert worker.stdout.readline().strip() == "True"
+        lock = LeaderLock(lock_path)
+        assert not lock.try_acquire()
+    finally:
+        # Exiting without release(), as a crashed or recycled worker would
+        worker.communicate("")
+    assert lock.try_acquire()
+    lock.release()
+
+
+def test_singleton_jobs_run_only_in_the_leader_and_move_with_it(lock_path):
+    started = []
+
+    def job(name):
+        async def run():
+            started.append(name)
+            await asyncio.Event().wait()
+        return run
+
+    async def scenario():
+        workers = [ServiceContainer(), ServiceContainer()]
+        for name, worker in zip("ab", workers):
+            worker.spawn_singleton(job(name))
+            worker.spawn(worker._leader_loop(interval=0.01))
+        await asyncio.sleep(0.05)
+        assert started == ["a"]
+
+        await workers[0].close()
+        await asyncio.sleep(0.05)
+        assert started == ["a", "b"]
+
+        # Registered after leadership: runs at once, in the leader only
+        workers[1].spawn_singleton(job("b2"))
+        await asyncio.sleep(0)
+        assert started == ["a", "b", "b2"]
+        await workers[1].close()
+
+    asyncio.run(scenario())
+
+
+def load_config(monkeypatch, **env):
+    for name in ("WEB_CONCURRENCY", "MAX_REQUESTS", "MAX_REQUESTS_JITTER"):
+        monkeypatch.delenv(name, raising=False)
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    return runpy.run_path(os.path.join(os.path.dirname(os.path.abspath(__file__)), "gunicorn.conf.py"))
+
+
+def test_gunicorn_preloads_and_sizes_workers_to_the_cores(monkeypatch):
+    config = load_config(monkeypatch)
+
+    assert config["preload_app"] is True
+    assert config["workers"] == len(os.sched_getaffinity(0))
+    assert config["worker_class"] == "uvicorn_worker.UvicornWorker"
+    assert (config["max_requests"], config["max_requests_jitter"]) == (5000, 500)
+
+    config = load_config(monkeypatch, WEB_CONCURRENCY="3", MAX_REQUESTS="200")
+    assert config["workers"] == 3
+    assert (config["max_requests"], config["max_requests_jitter"]) == (200, 20)
+
+
+def test_gunicorn_freezes_the_preloaded_heap_before_forking(monkeypatch):
+    config = load_config(monkeypatch)
+    try:
+        config["pre_fork"](None, None)
+        assert gc.get_freeze_count() > 0
+    finally:
+        gc.unfreeze()
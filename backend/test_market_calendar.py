@@ -0,0 +1,85 @@
+"""
+Tests for the market calendar: trading days over several years, half
+days, cache lifetimes of daily bars and warnings for missing holidays
+"""
+
+import json
+import logging
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from services.market_calendar import MarketCalendar
+
+NEW_YORK = ZoneInfo("America/New_York")
+KOLKATA = ZoneInfo("Asia/Kolkata")
+
+
+@pytest.fixture(scope="module")
+def calendar():
+    return MarketCalendar.default(today=date(2026, 5, 4))
+
+
+@pytest.mark.parametrize("exchange, day, trading", [
+    ("NYSE", date(2024, 3, 29), False),   # Good Friday
+    ("NYSE", date(2025, 1, 9), False),    # National day of mourning
+    ("NYSE", date(2027, 6, 18), False),   # Juneteenth, observed on the Friday
+    ("NYSE", date(2026, 11, 27), True),   # Half day
+    ("NYSE", date(2026, 5, 2), False),    # Saturday
+    ("NSE", date(2025, 10, 21), False),   # Diwali
+    ("BSE", date(2025, 10, 21), False),
+    ("NSE", date(2026, 5, 4), True),
+])
+def test_trading_days_across_years(calendar, exchange, day, trading):
+    assert calendar.exchanges[exchange].is_trading_day(day) is trading
+
+
+def test_half_day_closes_early(calendar):
+    nyse = calendar.exchanges["NYSE"]
+    # The day after Thanksgiving 2026 closes at 13:00 (plus 15 minutes of settling)
+    assert nyse.is_open(datetime(2026, 11, 27, 13, 10, tzinfo=NEW_YORK))
+    assert not nyse.is_open(datetime(2026, 11, 27, 13, 30, tzinfo=NEW_YORK))
+    assert nyse.next_close(datetime(2026, 11, 27, 10, 0, tzinfo=NEW_YORK)) == \
+        datetime(2026, 11, 27, 13, 15, tzinfo=NEW_YORK)
+    assert nyse.next_open(datetime(2026, 11, 27, 14, 0, tzinfo=NEW_YORK)) == \
+        datetime(2026, 11, 30, 9, 30, tzinfo=NEW_YORK)
+
+
+def test_bars_live_until_the_next_close_across_holidays(calendar):
+    # Friday evening before Memorial Day: the next close is Tuesday's
+    friday = datetime(2026, 5, 22, 18, 0, tzinfo=NEW_YORK)
+    tuesday_close = datetime(2026, 5, 26, 16, 15, tzinfo=NEW_YORK)
+    assert calendar.bars_ttl("AAPL", friday) == (tuesday_close - friday).total_seconds()
+
+    # During an NSE session bars live until that day's close
+    morning = datetime(2026, 5, 4, 10, 0, tzinfo=KOLKATA)
+    assert calendar.bars_ttl("RELIANCE.BSE", morning) == timedelta(hours=5, minutes=45).total_seconds()
+    assert calendar.bars_ttl("ACME.XYZ", morning) is None
+
+
+def test_missing_year_is_logged_loudly(caplog):
+    with caplog.at_level(logging.WARNING, logger="services.market_calendar"):
+        calendar = MarketCalendar.default(today=date(2030, 1, 2))
+        calendar.exchanges["NSE"].is_trading_day(date(2030, 1, 2))
+        calendar.exchanges["NSE"].is_trading_day(date(2030, 1, 3))
+
+    errors = [r for r in caplog.records if r.levelno == logging.ERROR]
+    assert sorted(r.args[0] for r in errors) == ["BSE", "NSE", "NYSE"]
+    warnings = [r for r in caplog.records if r.levelno == logging.WARNING]
+    assert len(warnings) == 1
+    assert calendar.missing_holidays(2026) == []
+
+
+def test_extra_holidays_file_adds_years(tmp_path):
+    extra = tmp_path / "holidays.json"
+    extra.write_text(json.dumps({
+        "nse": ["2030-01-01"],
+        "NYSE": {"holidays": ["2030-01-01"], "earlyCloses": {"2030-12-24": "13:00"}},
+    }))
+
+    calendar = MarketCalendar.default(str(extra), today=date(2030, 1, 2))
+
+    assert not calendar.exchanges["BSE"].is_trading_day(date(2030, 1, 1))
+    assert calendar.exchanges["NYSE"].close_on(date(2030, 12, 24)).hour == 13
+    assert calendar.missing_holidays(2030) == []
@@ -0,0 +1,66 @@
+"""
+Tests for metrics: rendering of the metric types and access to /metrics
+"""
+
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+import server
+from metrics import Counter, Histogram, _Metric
+
+
+def test_metric_types_must_render():
+    with pytest.raises(TypeError):
+        _Metric("abstract_total", "Cannot be rendered")
+
+
+def test_counter_and_histogram_render_in_exposition_format():
+    counter = Counter("test_requests_total", "Requests", ["route"])
+    counter.inc("/a")
+    counter.inc("/a", amount=2)
+    histogram = Histogram("test_seconds", "Durations", buckets=(0.1, 1.0))
+    histogram.observe(0.5)
+
+    assert counter.render() == [
+        "# HELP test_requests_total Requests",
+        "# TYPE test_requests_total counter",
+        'test_requests_total{route="/a"} 3.0',
+    ]
+    assert histogram.render()[2:] == [
+        'test_seconds_bucket{le="0.1"} 0.0',
+        'test_seconds_bucket{le="1.0"} 1.0',
+        'test_seconds_bucket{le="+Inf"} 1.0',
+        "test_seconds_sum 0.5",
+        "test_seconds_count 1.0",
+    ]
+
+
+def scrape(authorization=None):
+    headers = [(b"authorization", authorization.encode())] if authorization else []
+    request = Request({"type": "http", "method": "GET", "path": "/metrics", "headers": headers})
+    return asyncio.run(server.metrics(request))
+
+
+@pytest.mark.parametrize("env, token, authorization, status", [
+    ("development", None, None, 200),
+    ("production", None, None, 403),
+    ("production", "t0ken", None, 401),
+    ("production", "t0ken", "Bearer wrong", 401),
+    ("production", "t0ken", "Bearer t0ken", 200),
+])
+def test_metrics_need_a_token_in_production(monkeypatch, env, token, authorization, status):
+    monkeypatch.setenv("MARKSTRO_ENV", env)
+    if token is None:
+        monkeypatch.delenv("METRICS_TOKEN", raising=False)
+    else:
+        monkeypatch.setenv("METRICS_TOKEN", token)
+
+    if status == 200:
+        assert scrape(authorization).status_code == 200
+    else:
+        with pytest.raises(HTTPException) as raised:
+            scrape(authorization)
+        assert raised.value.status_code == status
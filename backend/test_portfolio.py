@@ -0,0 +1,108 @@
+"""
+Tests for portfolios: ledger math, valuations from stored prices and
+equity curves replayed over stored closes
+"""
+
+import datetime
+
+import pytest
+
+from services.database import Database
+from services.market_store import MarketStore
+from services.portfolio import PortfolioService
+
+
+@pytest.fixture
+def service(tmp_path):
+    database = Database(str(tmp_path / "users.db"))
+    store = MarketStore(str(tmp_path / "market.db"))
+    yield PortfolioService(database, store)
+    database.close()
+    store.close()
+
+
+def days_ago(days):
+    return (datetime.date.today() - datetime.timedelta(days=days)).isoformat()
+
+
+def test_holdings_use_average_cost_and_realize_sells(service):
+    portfolio = service.create("alice", "Main")
+    pid = portfolio["id"]
+    service.add_transaction("alice", pid, "cash", days_ago(10), amount=10000.0)
+    service.add_transaction("alice", pid, "trade", days_ago(9), "AAPL", quantity=10, price=100.0, fees=10.0)
+    service.add_transaction("alice", pid, "trade", days_ago(8), "AAPL", quantity=10, price=120.0, fees=10.0)
+    service.add_transaction("alice", pid, "trade", days_ago(7), "AAPL", quantity=-5, price=130.0)
+
+    result = service.get("alice", pid)
+
+    position = result["positions"][0]
+    assert position["quantity"] == 15
+    assert position["averageCost"] == pytest.approx(111.0)
+    assert position["costBasis"] == pytest.approx(1665.0)
+    assert position["realizedPnl"] == pytest.approx(5 * (130.0 - 111.0))
+    assert result["cash"] == pytest.approx(10000.0 - 1010.0 - 1210.0 + 650.0)
+
+
+def test_portfolio_of_another_user_is_hidden(service):
+    pid = service.create("alice", "Main")["id"]
+
+    assert service.get("bob", pid) is None
+    assert service.add_transaction("bob", pid, "cash", days_ago(1), amount=1.0) is None
+    assert service.get("alice", pid)["transactions"] == []
+
+
+def test_valuation_prices_positions_and_follows_new_trades(service):
+    pid = service.create("alice", "Main")["id"]
+    service.add_transaction("alice", pid, "cash", days_ago(5), amount=5000.0)
+    service.add_transaction("alice", pid, "trade", days_ago(4), "AAPL", quantity=10, price=100.0)
+    service.add_transaction("alice", pid, "trade", days_ago(4), "MSFT", quantity=5, price=200.0)
+    service.store.upsert_quote({"symbol": "AAPL", "price": 110.0, "change": 2.0})
+    service.store.bulk_upsert_bars([
+        ("MSFT", days_ago(2), 0, 0, 0, 190.0, 0),
+        ("MSFT", days_ago(1), 0, 0, 0, 210.0, 0),
+    ])
+
+    result = service.valuation("alice", pid)
+
+    positions = {row["symbol"]: row for row in result["positions"]}
+    assert positions["AAPL"]["marketValue"] == pytest.approx(1100.0)
+    assert positions["MSFT"]["marketValue"] == pytest.approx(1050.0)
+    assert positions["MSFT"]["dayPnl"] == pytest.approx(100.0)
+    assert result["unrealizedPnl"] == pytest.approx(150.0)
+    assert result["dayPnl"] == pytest.approx(120.0)
+    assert result["totalValue"] == pytest.approx(3000.0 + 2150.0)
+    assert result["unpriced"] == []
+
+    service.add_transaction("alice", pid, "trade", days_ago(1), "AAPL", quantity=-10, price=110.0)
+    updated = service.valuation("alice", pid)
+    assert [row["symbol"] for row in updated["positions"]] == ["MSFT"]
+    assert updated["realizedPnl"] == pytest.approx(100.0)
+
+
+def test_unpriced_positions_are_reported(service):
+    pid = service.create("alice", "Main")["id"]
+    service.add_transaction("alice", pid, "trade", days_ago(1), "NOPE", quantity=1, price=10.0)
+
+    result = service.valuation("alice", pid)
+
+    assert result["unpriced"] == ["NOPE"]
+    assert result["positions"][0]["marketValue"] is None
+    assert result["marketValue"] == 0.0
+
+
+def test_equity_curve_replays_trades_over_stored_closes(service):
+    pid = service.create("alice", "Main")["id"]
+    service.add_transaction("alice", pid, "cash", days_ago(5), amount=1000.0)
+    service.add_transaction("alice", pid, "trade", days_ago(3), "AAPL", quantity=5, price=100.0)
+    service.store.bulk_upsert_bars([
+        ("AAPL", days_ago(4), 0, 0, 0, 100.0, 0),
+        ("AAPL", days_ago(3), 0, 0, 0, 100.0, 0),
+        ("AAPL", days_ago(1), 0, 0, 0, 120.0, 0),
+    ])
+
+    curve = service.equity_curve("alice", pid, days=30)
+
+    assert curve["dates"] == [days_ago(4), days_ago(3), days_ago(1)]
+    assert curve["cash"] == [1000.0, 500.0, 500.0]
+    assert curve["equity"] == [1000.0, 1000.0, 1100.0]
+    assert curve["netDeposits"] == [1000.0, 1000.0, 1000.0]
@@ -0,0 +1,81 @@
+"""
+Tests for the profiling middleware: admin-token requests, skipping event
+streams and the cap on sampling time
+"""
+
+import asyncio
+import os
+import time
+
+import pytest
+
+from middleware.profiling import ProfilingMiddleware, SamplingProfiler
+
+
+def scope(path="/api/stock/quote/AAPL", **headers):
+    raw = [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()]
+    return {"type": "http", "method": "GET", "path": path, "headers": raw}
+
+
+def busy_app(content_type="application/json", seconds=0.05):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", content_type.encode())]})
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            sum(range(1000))
+        await send({"type": "http.response.body", "body": b"{}"})
+    return app
+
+
+async def discard(message):
+    pass
+
+
+def profiles(directory):
+    return [name for _, _, names in os.walk(directory) for name in names]
+
+
+@pytest.fixture
+def middleware(tmp_path):
+    def build(app, **options):
+        return ProfilingMiddleware(app, admin_token="s3cret", directory=str(tmp_path), interval=0.001, **options)
+    return build
+
+
+def test_only_the_right_admin_token_profiles_a_request(middleware, tmp_path):
+    profiled = middleware(busy_app())
+
+    asyncio.run(profiled(scope(x_profile_token="wrong"), None, discard))
+    assert profiles(tmp_path) == []
+
+    asyncio.run(profiled(scope(x_profile_token="s3cret"), None, discard))
+    assert len(profiles(tmp_path)) == 1
+    assert not profiled._busy.locked()
+
+
+def test_event_streams_are_not_profiled_and_free_the_slot(middleware, tmp_path):
+    seen = []
+
+    async def stream(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"text/event-stream")]})
+        # The stream is still open: another request may be profiled meanwhile
+        seen.append(profiled._busy.locked())
+        await send({"type": "http.response.body", "body": b"data: {}\n\n"})
+
+    profiled = middleware(stream)
+    asyncio.run(profiled(scope("/api/quotes/stream", x_profile_token="s3cret"), None, discard))
+
+    assert seen == [False]
+    assert profiles(tmp_path) == []
+    assert not profiled._wants_profile(scope(x_profile_token="s3cret", accept="text/event-stream"))
+
+
+def test_sampling_stops_at_max_seconds():
+    profiler = SamplingProfiler(interval=0.001, max_seconds=0.05)
+    profiler.start()
+    time.sleep(0.2)
+    assert not profiler._thread.is_alive()
+    profiler.stop()
+    assert profiler.duration >= 0.2
@@ -0,0 +1,217 @@
+"""
+Tests for the quote snapshot store: batched writes, versions, shared
+bodies, column lookups, the delta feed and cursors shared by workers
+"""
+
+import json
+import time
+
+import numpy as np
+import pytest
+
+from services.quote_feed import QuoteFeed
+from services.quote_snapshot import QuoteSnapshotStore
+from services.shared_cache import SQLiteSharedStore
+
+
+def quote(symbol, price, **fields):
+    return {"symbol": symbol, "price": price, "change": 0.0, "volume": 100, **fields}
+
+
+def test_unchanged_quote_keeps_version_and_body():
+    store = QuoteSnapshotStore()
+    assert store.put_many([quote("AAPL", 100.0), quote("MSFT", 200.0)]) == ["AAPL", "MSFT"]
+    body = store.get("AAPL")
+    version = store.version("AAPL")
+
+    assert store.put_many([quote("AAPL", 100.0)]) == []
+    assert store.get("AAPL") is body
+    assert store.version("AAPL") == version
+
+    assert store.put_many([quote("AAPL", 101.0)]) == ["AAPL"]
+    assert store.version("AAPL") > version
+    assert store.get("AAPL").etag != body.etag
+
+
+def test_older_quote_does_not_roll_back():
+    store = QuoteSnapshotStore()
+    now = time.time()
+    store.put_many([quote("AAPL", 101.0)], as_of=[now])
+
+    assert store.put_many([quote("AAPL", 99.0)], as_of=[now - 5]) == []
+    assert json.loads(store.get("AAPL").body)["price"] == 101.0
+
+
+def test_malformed_batch_stores_nothing():
+    store = QuoteSnapshotStore()
+
+    with pytest.raises(ValueError):
+        store.put_many([quote("AAPL", 100.0), quote("MSFT", "n/a")])
+    assert len(store) == 0
+    assert store.seq == 0
+
+
+def test_lookup_gathers_columns_and_skips_old_quotes():
+    store = QuoteSnapshotStore(capacity=2)
+    now = time.time()
+    store.put_many(
+        [quote("AAPL", 100.0, latestTradingDay="2024-05-01"), quote("MSFT", 200.0), quote("OLD", 5.0)],
+        as_of=[now, now, now - 120],
+    )
+
+    found, columns, days = store.lookup(["MSFT", "NOPE", "AAPL", "OLD"], max_age=60)
+
+    assert found.tolist() == [True, False, True, False]
+    assert columns["price"][[0, 2]].tolist() == [200.0, 100.0]
+    assert np.isnan(columns["price"][1])
+    assert days == ["", None, "2024-05-01", None]
+
+
+def test_encode_stitches_stored_bodies():
+    store = QuoteSnapshotStore()
+    store.put_many([quote("AAPL", 100.0), quote("MSFT", 200.0)])
+
+    encoded = json.loads(store.encode(["MSFT", "NOPE", "AAPL"]))
+
+    assert list(encoded) == ["MSFT", "AAPL"]
+    assert encoded["AAPL"]["price"] == 100.0
+    assert encoded["AAPL"]["open"] == 0.0
+
+
+def test_changed_since_lists_symbols_oldest_change_first():
+    store = QuoteSnapshotStore()
+    store.put_many([quote("AAPL", 100.0), quote("MSFT", 200.0)])
+    seq = store.seq
+    store.put_many([quote("MSFT", 201.0)])
+    store.put_many([quote("AAPL", 101.0)])
+
+    assert store.changed_since(seq) == (seq + 2, ["MSFT", "AAPL"])
+    assert store.changed_since(store.seq) == (store.seq, [])
+
+
+def test_changes_fold_field_deltas_since_a_cursor():
+    store = QuoteSnapshotStore()
+    store.put_many([quote("AAPL", 100.0), quote("MSFT", 200.0)])
+    cursor = store.cursor()
+    store.put_many([quote("AAPL", 101.0)])
+    store.put_many([quote("AAPL", 102.0, volume=150), quote("MSFT", 200.0)])
+
+    seq, deltas = store.changes(store.parse_cursor(cursor))
+
+    assert seq == store.seq
+    assert deltas == {"AAPL": {"price": 102.0, "volume": 150}}
+    assert store.changes(seq) == (seq, {})
+
+
+def test_changes_of_new_symbols_carry_every_field():
+    store = QuoteSnapshotStore()
+    store.put_many([quote("AAPL", 100.0)])
+    since = store.seq
+    store.put_many([quote("MSFT", 200.0, latestTradingDay="2024-05-01"), quote("AAPL", 101.0)])
+
+    _, deltas = store.changes(since, symbols=["MSFT"])
+
+    assert list(deltas) == ["MSFT"]
+    assert deltas["MSFT"]["price"] == 200.0
+    assert deltas["MSFT"]["open"] == 0.0
+    assert deltas["MSFT"]["latestTradingDay"] == "2024-05-01"
+
+
+def test_foreign_or_overrun_cursor_needs_a_resync():
+    store = QuoteSnapshotStore(log_capacity=4)
+    store.put_many([quote("AAPL", 100.0)])
+    since = store.seq
+
+    assert store.parse_cursor(QuoteSnapshotStore().cursor(since)) is None
+    assert store.parse_cursor("garbage") is None
+    assert store.parse_cursor(store.cursor(since)) == since
+
+    for price in range(101, 106):
+        store.put_many([quote("AAPL", float(price))])
+    assert store.changes(since) is None
+    assert store.changes(store.seq + 1) is None
+
+
+def test_feed_sends_each_subscriber_its_own_symbols():
+    store = QuoteSnapshotStore()
+    store.put_many([quote("AAPL", 100.0), quote("MSFT", 200.0)])
+    feed = QuoteFeed(store)
+    apple = feed.subscribe(["AAPL"])
+    both = feed.subscribe(["AAPL", "MSFT"])
+
+    store.put_many([quote("MSFT", 201.0)])
+    assert feed.publish() == 1
+    assert apple.queue.empty()
+    cursor, payload = both.queue.get_nowait()
+    assert json.loads(payload) == {"cursor": cursor, "reset": False, "quotes": {"MSFT": {"price": 201.0}}}
+    assert store.parse_cursor(cursor) == store.seq
+
+
+def test_feed_resets_subscribers_that_fall_behind():
+    store = QuoteSnapshotStore()
+    store.put_many([quote("AAPL", 100.0)])
+    feed = QuoteFeed(store, max_pending=2)
+    subscription = feed.subscribe(["AAPL"])
+
+    for price in (101.0, 102.0, 103.0):
+        store.put_many([quote("AAPL", price)])
+        feed.publish()
+
+    assert subscription.queue.qsize() == 1
+    assert subscription.queue.get_nowait() is None
+
+
+@pytest.fixture
+def workers(tmp_path):
+    """Two workers' snapshot stores sharing one SQLite file"""
+    shared = [SQLiteSharedStore(str(tmp_path / "shared.db")) for _ in range(2)]
+    yield [QuoteSnapshotStore(shared=store) for store in shared]
+    for store in shared:
+        store.close()
+
+
+def test_cursor_from_one_worker_resumes_on_another(workers):
+    first, second = workers
+    first.put_many([quote("AAPL", 100.0), quote("MSFT", 200.0)])
+    first.sync()
+    second.sync()
+    assert json.loads(second.get("AAPL").body)["price"] == 100.0
+
+    cursor = first.cursor()
+    first.put_many([quote("AAPL", 101.0)])
+    second.put_many([quote("MSFT", 201.0)])
+    for store in (first, second, first):
+        store.sync()
+
+    for store in workers:
+        since = store.parse_cursor(cursor)
+        assert since is not None
+        _, deltas = store.changes(since)
+        assert deltas["AAPL"]["price"] == 101.0
+        assert deltas["MSFT"]["price"] == 201.0
+
+    latest = second.cursor()
+    assert first.changes(first.parse_cursor(latest)) == (first.seq, {})
+
+
+def test_late_worker_loads_every_symbol_before_serving_cursors(workers, tmp_path):
+    first, _ = workers
+    first.put_many([quote("AAPL", 100.0)])
+    first.sync()
+    old_cursor = first.cursor()
+    first.put_many([quote("MSFT", 200.0)])
+    first.sync()
+    cursor = first.cursor()
+
+    late = QuoteSnapshotStore(shared=SQLiteSharedStore(str(tmp_path / "shared.db")))
+    # Its cursors from before the first sync are resumed nowhere else
+    assert first.parse_cursor(late.cursor()) is None
+    late.sync()
+
+    assert len(late) == 2
+    assert late.parse_cursor(old_cursor) is None
+    # It cannot know what the client already has: everything is resent
+    _, deltas = late.changes(late.parse_cursor(cursor))
+    assert set(deltas) == {"AAPL", "MSFT"}
+    assert first.changes(first.parse_cursor(late.cursor()))[1] == {}
+    late.shared.close()
@@ -0,0 +1,114 @@
+"""
+Tests for the resilience policies: circuit breaker transitions, the retry
+deadline and one rate limiter token per logical upstream call
+"""
+
+import time
+
+import pytest
+
+from services.alphavantage import AlphaVantageService
+from services.errors import CircuitOpenError, InvalidSymbolError, UpstreamUnavailableError
+from services.rate_limit import TokenBucket
+from services.resilience import CircuitBreaker, RetryPolicy, call_upstream
+
+
+def failing(budget):
+    raise UpstreamUnavailableError("down")
+
+
+def invalid(budget):
+    raise InvalidSymbolError("nope")
+
+
+def through(breaker, fn):
+    return call_upstream(fn, breaker, None, "test", "f")
+
+
+def test_breaker_opens_on_failure_rate_and_fails_fast():
+    breaker = CircuitBreaker("test", window=4, min_calls=4, failure_rate=0.5, open_seconds=60)
+
+    for _ in range(2):
+        with pytest.raises(UpstreamUnavailableError):
+            through(breaker, failing)
+    # Answers other than "unavailable" count as successes
+    with pytest.raises(InvalidSymbolError):
+        through(breaker, invalid)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert through(breaker, lambda budget: "ok") == "ok"
+    assert breaker.state == CircuitBreaker.OPEN
+
+    calls = []
+    with pytest.raises(CircuitOpenError):
+        through(breaker, lambda budget: calls.append(budget))
+    assert calls == []
+    assert not breaker.available()
+
+
+def open_breaker(**kwargs):
+    breaker = CircuitBreaker("test", window=2, min_calls=2, open_seconds=0.05, **kwargs)
+    for _ in range(2):
+        with pytest.raises(UpstreamUnavailableError):
+            through(breaker, failing)
+    assert breaker.state == CircuitBreaker.OPEN
+    time.sleep(0.06)
+    assert breaker.available()
+    return breaker
+
+
+def test_half_open_trial_success_closes_the_circuit():
+    breaker = open_breaker()
+
+    breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # Only one trial call at a time
+    with pytest.raises(CircuitOpenError, match="half-open"):
+        breaker.allow()
+    breaker.record(False, 0.01)
+
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert through(breaker, lambda budget: "ok") == "ok"
+
+
+@pytest.mark.parametrize("failed, duration", [(True, 0.01), (False, 5.0)])
+def test_half_open_trial_failure_or_slow_call_reopens(failed, duration):
+    breaker = open_breaker(slow_call_seconds=4.0)
+
+    breaker.allow()
+    breaker.record(failed, duration)
+
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.available()
+
+
+def test_retries_stop_at_the_deadline_and_cap_each_attempt():
+    budgets = []
+
+    def slow_failure(budget):
+        budgets.append(budget)
+        time.sleep(0.12)
+        raise UpstreamUnavailableError("down")
+
+    retry = RetryPolicy(attempts=10, base_delay=0.0, deadline=0.3, sleep=lambda delay: None)
+    started = time.monotonic()
+    with pytest.raises(UpstreamUnavailableError):
+        retry.call(slow_failure)
+
+    assert len(budgets) == 3
+    assert budgets[0] == pytest.approx(0.3, abs=0.01)
+    assert budgets == sorted(budgets, reverse=True)
+    assert 0 < budgets[-1] < 0.1
+    assert time.monotonic() - started < 0.5
+
+
+def test_retries_do_not_take_new_rate_limiter_tokens(fake_session):
+    limiter = TokenBucket(rate=0.001, capacity=3.0, name="test")
+    session = fake_session({}, status_code=503)
+    service = AlphaVantageService(session=session, limiter=limiter, retry=RetryPolicy(attempts=3, sleep=lambda delay: None))
+
+    with pytest.raises(UpstreamUnavailableError):
+        service.get_quote("AAPL")
+
+    assert len(session.calls) == 3
+    assert limiter.try_acquire(2.0) == 0.0
+    assert limiter.try_acquire() > 0
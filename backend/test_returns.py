@@ -0,0 +1,69 @@
+"""
+Tests for returns analytics: the symbols' own date alignment, and betas
+against benchmarks with shorter histories or other holidays
+"""
+
+import datetime
+
+import numpy as np
+import pytest
+
+from services.market_store import MarketStore
+from services.returns import ReturnsService
+
+
+@pytest.fixture
+def store(tmp_path):
+    market = MarketStore(str(tmp_path / "market.db"))
+    yield market
+    market.close()
+
+
+def dates(count, start=datetime.date(2024, 1, 1)):
+    return [(start + datetime.timedelta(days=i)).isoformat() for i in range(count)]
+
+
+def put_closes(store, symbol, days, closes):
+    store.bulk_upsert_bars([(symbol, day, c, c, c, c, 1000) for day, c in zip(days, closes)])
+
+
+def test_short_benchmark_does_not_shrink_the_symbols_window(store):
+    rng = np.random.default_rng(7)
+    days = dates(41)
+    index = 100 * np.cumprod(1 + rng.normal(0, 0.01, len(days)))
+    put_closes(store, "AAA", days, index * 2)
+    put_closes(store, "BBB", days, 50 * np.cumprod(1 + rng.normal(0, 0.01, len(days))))
+    # Only the last 11 days of index data, with one missing day
+    put_closes(store, "^NSEI", days[-11:-3] + days[-2:], list(index[-11:-3]) + list(index[-2:]))
+
+    result = ReturnsService(store).compute(["AAA", "BBB"], window=40, benchmarks=("^NSEI", "^BSESN"))
+
+    assert result["window"] == 40
+    assert result["start"] == days[1]
+    assert set(result["beta"]) == {"^NSEI"}
+    # AAA is the index times two: its returns are the index's
+    assert result["beta"]["^NSEI"]["AAA"] == pytest.approx(1.0)
+
+
+def test_benchmark_without_enough_overlap_has_no_beta(store):
+    days = dates(20)
+    put_closes(store, "AAA", days, np.linspace(10, 20, 20))
+    put_closes(store, "^NSEI", days[:2], [100.0, 101.0])
+
+    result = ReturnsService(store).compute(["AAA"], window=10, benchmarks=("^NSEI",))
+
+    assert result["window"] == 10
+    assert result["beta"] == {"^NSEI": None}
+
+
+def test_benchmark_among_the_symbols_uses_their_matrix(store):
+    rng = np.random.default_rng(3)
+    days = dates(31)
+    index = 100 * np.cumprod(1 + rng.normal(0, 0.01, len(days)))
+    put_closes(store, "^NSEI", days, index)
+    put_closes(store, "AAA", days, index * 3)
+
+    result = ReturnsService(store).compute(["AAA", "^NSEI"], window=30, benchmarks=("^NSEI",))
+
+    assert result["symbols"] == ["AAA", "^NSEI"]
+    assert result["beta"]["^NSEI"] == pytest.approx({"AAA": 1.0, "^NSEI": 1.0})
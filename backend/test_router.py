@@ -0,0 +1,154 @@
+"""
+Tests for the provider router: failover, quote hedging between live
+vendors, timing hedges from rate limiter admission and caching of local
+fallback answers
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from services.cache import Fallback, TTLCache
+from services.errors import NoDataError, UpstreamUnavailableError
+from services.market_store import MarketStore
+from services.providers.base import MarketDataProvider
+from services.providers.local import LocalMarketDataProvider
+from services.providers.router import ProviderRouter
+from services.rate_limit import TokenBucket
+
+
+class FakeProvider(MarketDataProvider):
+    """Answers quotes after a delay, optionally through a rate limiter"""
+
+    def __init__(self, name, tier=0, delay=0.0, error=None, limiter=None):
+        self.name = name
+        self.tier = tier
+        self.delay = delay
+        self.error = error
+        self.limiter = limiter
+        self.calls = 0
+
+    def get_quote(self, symbol):
+        if self.limiter is not None:
+            self.limiter.acquire(max_wait=5.0)
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return {'symbol': symbol, 'price': 100.0, 'source': self.name}
+
+    def get_time_series(self, symbol):
+        raise NoDataError('no series')
+
+    def search_symbols(self, keywords):
+        return []
+
+
+def make_router(*providers, **kwargs):
+    kwargs.setdefault('hedge_default_delay', 0.1)
+    return ProviderRouter(providers, **kwargs)
+
+
+def test_failover_moves_to_next_provider():
+    primary = FakeProvider('primary', error=UpstreamUnavailableError('down'))
+    local = FakeProvider('local', tier=1)
+    router = make_router(primary, local, hedge_quotes=False)
+
+    quote, provider = router.get_quote_with_source('AAPL')
+
+    assert quote['source'] == 'local'
+    assert provider is local
+    assert router.stats['primary'].consecutive_failures == 1
+
+
+def test_all_failures_raise_the_live_vendors_error():
+    vendor_error = UpstreamUnavailableError('circuit open')
+    router = make_router(
+        FakeProvider('primary', error=vendor_error),
+        FakeProvider('local', tier=1, error=NoDataError('no stored quote')),
+        hedge_quotes=False,
+    )
+
+    with pytest.raises(UpstreamUnavailableError) as raised:
+        router.get_quote('AAPL')
+    assert raised.value is vendor_error
+
+
+def test_slow_vendor_is_hedged_to_another_live_vendor():
+    slow = FakeProvider('slow', delay=0.6)
+    fast = FakeProvider('fast', delay=0.0)
+    router = make_router(slow, fast)
+
+    started = time.perf_counter()
+    quote, provider = router.get_quote_with_source('AAPL')
+    elapsed = time.perf_counter() - started
+
+    assert provider is fast
+    assert quote['source'] == 'fast'
+    assert elapsed < 0.5
+    router.close()
+
+
+def test_slow_vendor_is_not_hedged_to_local_fallback():
+    slow = FakeProvider('slow', delay=0.3)
+    local = FakeProvider('local', tier=1)
+    router = make_router(slow, local)
+
+    quote, provider = router.get_quote_with_source('AAPL')
+
+    assert provider is slow
+    assert quote['source'] == 'slow'
+    assert local.calls == 0
+    router.close()
+
+
+def test_hedge_delay_starts_when_the_limiter_admits_the_call():
+    limiter = TokenBucket(rate=5.0, capacity=1.0, name='test')
+    limiter.acquire()
+    # Waits about 0.2s for a token, then answers well inside the hedge delay
+    limited = FakeProvider('limited', delay=0.02, limiter=limiter)
+    other = FakeProvider('other')
+    router = make_router(limited, other, hedge_default_delay=0.15)
+
+    quote, provider = router.get_quote_with_source('AAPL')
+
+    assert provider is limited
+    assert other.calls == 0
+    router.close()
+
+
+@pytest.mark.parametrize('method', ['get_quote', 'search_symbols'])
+def test_local_fallback_answers_are_cached_as_stale(tmp_path, method):
+    store = MarketStore(str(tmp_path / 'market.db'))
+    store.upsert_symbols([{'symbol': 'AAPL', 'name': 'Apple Inc'}])
+    store.upsert_quote({'symbol': 'AAPL', 'price': 100.0})
+    down = FakeProvider('down', error=UpstreamUnavailableError('down'))
+    down.search_symbols = lambda keywords: down.get_quote(keywords)
+    router = make_router(down, LocalMarketDataProvider(store), hedge_quotes=False)
+    cache = TTLCache('test', ttl=86400, fallback_ttl=5)
+
+    result = router.for_cache(method, 'AAPL')
+    entry = asyncio.run(cache.get_or_load('AAPL', lambda: router.for_cache(method, 'AAPL')))
+
+    assert isinstance(result, Fallback)
+    assert entry.stale
+    assert entry.expires_at - entry.stored_at == pytest.approx(5)
+    router.close()
+    store.close()
+
+
+def test_live_answers_are_not_wrapped():
+    router = make_router(FakeProvider('primary'), FakeProvider('local', tier=1))
+
+    assert router.for_cache('search_symbols', 'AAPL') == []
+    assert router.for_cache('get_quote', 'AAPL')['source'] == 'primary'
+    router.close()
+
+
+def test_empty_local_search_is_no_data(tmp_path):
+    store = MarketStore(str(tmp_path / 'market.db'))
+
+    with pytest.raises(NoDataError):
+        LocalMarketDataProvider(store).search_symbols('apple')
+    store.close()
@@ -0,0 +1,115 @@
+"""
+Tests for the stock screener: filter compilation, indicators over the
+stored bars and incremental refreshes
+"""
+
+import datetime
+
+import numpy as np
+import pytest
+
+from services.market_store import MarketStore
+from services.screener import ScreenerService, bar_indicators, compile_filter
+
+
+@pytest.fixture
+def store(tmp_path):
+    market = MarketStore(str(tmp_path / "market.db"))
+    yield market
+    market.close()
+
+
+def dates(count, start=datetime.date(2024, 1, 1)):
+    return [(start + datetime.timedelta(days=i)).isoformat() for i in range(count)]
+
+
+def bar_rows(symbol, closes, volume=1000):
+    return [
+        (symbol, date, close, close, close, close, volume)
+        for date, close in zip(dates(len(closes)), closes)
+    ]
+
+
+def test_filter_evaluates_columns_element_wise():
+    columns = {
+        "rsi14": np.array([25.0, 50.0, np.nan]),
+        "volumeRatio": np.array([3.0, 3.0, 3.0]),
+    }
+
+    mask = compile_filter("rsi14 < 30 and volumeRatio > 2")
+
+    assert mask(columns).tolist() == [True, False, False]
+    assert compile_filter("20 < rsi14 < 60")(columns).tolist() == [True, True, False]
+
+
+@pytest.mark.parametrize("expression", [
+    "__import__('os')",
+    "price.real > 1",
+    "unknown > 1",
+    "price > 'a'",
+    "price >",
+    "price > 1 " * 100,
+])
+def test_filter_rejects_anything_but_fields_numbers_and_operators(expression):
+    with pytest.raises(ValueError):
+        compile_filter(expression)
+
+
+def test_indicators_of_rising_and_short_series():
+    rising = [(c, c, c, 100.0) for c in np.arange(1.0, 261.0)]
+    short = [(1.0, 1.0, 1.0, 100.0)] * 10
+
+    columns = bar_indicators([rising, short])
+
+    assert columns["rsi14"][0] == 100.0
+    assert columns["sma50"][0] == pytest.approx(np.mean(np.arange(211.0, 261.0)))
+    assert columns["high52w"][0] == 260.0
+    assert np.isnan(columns["rsi14"][1])
+    assert np.isnan(columns["sma200"][1])
+
+
+def test_screen_filters_and_sorts_the_store(store):
+    store.bulk_upsert_bars(
+        bar_rows("UP", np.linspace(100, 130, 60))
+        + bar_rows("DOWN", np.linspace(130, 100, 60))
+        + bar_rows("FLAT", [100.0] * 60)
+    )
+    screener = ScreenerService(store)
+    assert screener.refresh() == 3
+
+    result = screener.screen("rsi14 > 70 and changePercent > 0", fields=["price", "rsi14"])
+    assert [row["symbol"] for row in result["results"]] == ["UP"]
+
+    ordered = screener.screen(sort="changePercent", descending=False)
+    assert [row["symbol"] for row in ordered["results"]] == ["DOWN", "FLAT", "UP"]
+
+
+def test_refresh_applies_new_quotes_over_bars(store):
+    store.bulk_upsert_bars(bar_rows("AAPL", [100.0] * 30, volume=1000))
+    screener = ScreenerService(store)
+    screener.refresh()
+    assert screener.screen(fields=["price"])["results"][0]["price"] == 100.0
+
+    store.upsert_quote({"symbol": "AAPL", "price": 110.0, "changePercent": 10.0, "volume": 3000})
+    screener.refresh()
+
+    row = screener.screen(fields=["price", "changePercent", "volumeRatio", "fromLow52w"])["results"][0]
+    assert row["price"] == 110.0
+    assert row["changePercent"] == 10.0
+    assert row["volumeRatio"] == pytest.approx(3.0)
+    assert row["fromLow52w"] == pytest.approx(10.0)
+
+
+def test_split_inside_the_window_is_adjusted(store):
+    # 2-for-1 split on bar 100: raw closes halve without any loss
+    closes = [200.0] * 100 + [100.0] * 50
+    store.bulk_upsert_bars(bar_rows("SPLT", closes))
+    store.upsert_actions([("SPLT", dates(150)[100], 0.0, 2.0)])
+    screener = ScreenerService(store)
+    screener.refresh()
+
+    row = screener.screen(fields=["high52w", "fromHigh52w", "rsi14"])["results"][0]
+
+    assert row["high52w"] == pytest.approx(100.0)
+    assert row["fromHigh52w"] == pytest.approx(0.0)
+    assert row["rsi14"] == 100.0
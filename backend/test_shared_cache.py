@@ -0,0 +1,87 @@
+"""
+Tests for the shared L2 store between workers: one upstream quota, cached
+bodies filled by any worker and invalidations seen by all
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from services.cache import TTLCache
+from services.rate_limit import RateLimitExceeded, SharedTokenBucket
+from services.shared_cache import SQLiteSharedStore
+
+
+@pytest.fixture
+def workers(tmp_path):
+    """Two workers' stores on one SQLite file, as with SHARED_CACHE_URL=sqlite://"""
+    path = str(tmp_path / "shared.db")
+    stores = [SQLiteSharedStore(path), SQLiteSharedStore(path)]
+    yield stores
+    for store in stores:
+        store.close()
+
+
+def test_workers_draw_from_one_token_bucket(workers):
+    # Refills one token an hour: only the initial capacity is available
+    buckets = [SharedTokenBucket(store, rate=1 / 3600, capacity=3, name="alphavantage") for store in workers]
+
+    granted = [buckets[i % 2].try_acquire() for i in range(5)]
+
+    assert granted[:3] == [0.0, 0.0, 0.0]
+    assert all(wait > 3000 for wait in granted[3:])
+    with pytest.raises(RateLimitExceeded):
+        buckets[0].acquire(max_wait=1.0)
+    # Other buckets have their own quota
+    assert SharedTokenBucket(workers[1], rate=1 / 3600, capacity=3, name="newsapi").try_acquire() == 0.0
+
+
+def test_concurrent_takes_never_exceed_the_quota(workers):
+    buckets = [SharedTokenBucket(store, rate=1 / 3600, capacity=10, name="alphavantage") for store in workers]
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        waits = list(pool.map(lambda i: buckets[i % 2].try_acquire(), range(40)))
+
+    assert waits.count(0.0) == 10
+
+
+def caches(workers):
+    return [TTLCache("quote", 60, 16, shared=store) for store in workers]
+
+
+def test_bodies_loaded_by_one_worker_are_shared(workers):
+    first, second = caches(workers)
+
+    def unavailable():
+        raise AssertionError("the other worker already loaded it")
+
+    async def scenario():
+        await first.get_or_load("AAPL", lambda: {"price": 100.0})
+        return await second.get_or_load("AAPL", unavailable)
+
+    assert asyncio.run(scenario()).value == {"price": 100.0}
+
+
+def test_invalidations_reach_the_other_worker(workers):
+    first, second = caches(workers)
+    first.set("AAPL", {"price": 100.0})
+    second.set("AAPL", {"price": 100.0})
+    second.set(("MSFT", "daily"), {"price": 200.0})
+    seq, _ = workers[1].invalidations_since(None)
+
+    first.invalidate("AAPL")
+    seq, invalidations = workers[1].invalidations_since(seq)
+    for name, key in invalidations:
+        assert name == "quote"
+        second.apply_invalidation(key)
+
+    assert second.get("AAPL") is None
+    assert second.get(("MSFT", "daily")) is not None
+
+    first.clear()
+    seq, invalidations = workers[1].invalidations_since(seq)
+    assert invalidations == [("quote", None)]
+    second.apply_invalidation(None)
+    assert len(second) == 0
+    assert workers[1].invalidations_since(seq) == (seq, [])
@@ -0,0 +1,87 @@
+"""
+Tests for static asset serving: fingerprinted paths, encoding negotiation
+and revalidation of every encoded variant through one ETag
+"""
+
+import asyncio
+import gzip
+
+import pytest
+from starlette.datastructures import Headers
+
+from http_cache import etag_matches
+from middleware.compression import CompressionMiddleware
+from static_assets import IMMUTABLE_CACHE_CONTROL, REVALIDATE_CACHE_CONTROL, StaticAssetIndex
+
+SCRIPT = b"console.log('markstro');\n" * 200
+
+
+@pytest.fixture
+def index(tmp_path):
+    (tmp_path / "app.js").write_bytes(SCRIPT)
+    (tmp_path / "index.html").write_text('<script src="app.js"></script>')
+    return StaticAssetIndex(str(tmp_path)).build()
+
+
+def get(index, path, **headers):
+    return index.response(Headers({name.replace("_", "-"): value for name, value in headers.items()}), path)
+
+
+def test_pages_reference_immutable_hashed_assets(index):
+    hashed = index.url_for("app.js")
+
+    assert hashed != "/app.js"
+    assert f'src="{hashed[1:]}"'.encode() in get(index, "/").body
+    assert get(index, hashed).headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+    assert get(index, "/app.js").headers["cache-control"] == REVALIDATE_CACHE_CONTROL
+
+
+def test_encoding_is_negotiated_under_one_weak_etag(index):
+    plain = get(index, "/app.js")
+    zipped = get(index, "/app.js", accept_encoding="gzip, deflate")
+
+    assert "content-encoding" not in plain.headers
+    assert zipped.headers["content-encoding"] == "gzip"
+    assert gzip.decompress(zipped.body) == plain.body == SCRIPT
+    assert plain.headers["vary"] == zipped.headers["vary"] == "Accept-Encoding"
+    assert plain.headers["etag"].startswith('W/"')
+    assert plain.headers["etag"] == zipped.headers["etag"]
+
+
+@pytest.mark.parametrize("accept_encoding", ["", "gzip", "br, gzip"])
+def test_any_variants_etag_revalidates(index, accept_encoding):
+    etag = get(index, "/app.js", accept_encoding="gzip").headers["etag"]
+
+    for if_none_match in (etag, etag[2:], f'"other", {etag}'):
+        response = get(index, "/app.js", accept_encoding=accept_encoding, if_none_match=if_none_match)
+        assert response.status_code == 304
+        assert response.body == b""
+        assert response.headers["etag"] == etag
+        assert response.headers["vary"] == "Accept-Encoding"
+
+    assert get(index, "/app.js", if_none_match='"other"').status_code == 200
+
+
+def call_compressed(etag):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"application/json"), (b"etag", etag.encode())]})
+        await send({"type": "http.response.body", "body": b'{"price": 1}' * 200})
+
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": "/", "headers": [(b"accept-encoding", b"gzip")]}
+    asyncio.run(CompressionMiddleware(app)(scope, None, send))
+    return Headers(raw=messages[0]["headers"])
+
+
+def test_compressed_responses_never_keep_a_strong_etag():
+    headers = call_compressed('"abc"')
+
+    assert headers["content-encoding"] == "gzip"
+    assert headers["etag"] == 'W/"abc"'
+    assert etag_matches('"abc"', headers["etag"])
+    assert call_compressed('W/"abc"')["etag"] == 'W/"abc"'
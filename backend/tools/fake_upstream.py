@@ -0,0 +1,596 @@
+"""
+Fake Upstream Server
+Serves recorded Alpha Vantage and NewsAPI responses for offline benchmarks
+
+Run with: python -m tools.fake_upstream [--port 8765] [--latency lognormal:80,0.5]
+          [--error-rate 0.02] [--note-rate 0.01] [--rate-limit-per-min 5]
+and point the backend at it:
+    ALPHA_VANTAGE_BASE_URL=http://127.0.0.1:8765/query
+    NEWS_API_BASE_URL=http://127.0.0.1:8765/v2
+
+Replay: responses come from fixtures/upstream/<provider>/<function>/<key>.json
+(key = symbol, keywords, currency pair, category or query). Symbols without a fixture get
+deterministic synthetic data seeded by the symbol, so any ticker works.
+
+Record: with --record, requests are proxied to the real APIs (the client's
+own apikey is forwarded) and successful responses are saved as fixtures.
+
+Faults: --latency draws a delay per request (fixed:MS, uniform:LO,HI or
+lognormal:MEDIAN_MS,SIGMA); --error-rate answers 503; --note-rate and
+--rate-limit-per-min answer with Alpha Vantage's "Note" or NewsAPI's
+rateLimited error, like the real free tiers. GET /__stats returns request
+counts per function, e.g. to check how many calls reached "upstream".
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+from zoneinfo import ZoneInfo
+
+import requests
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_FIXTURES = os.path.join(BACKEND_DIR, "fixtures", "upstream")
+
+REAL_UPSTREAMS = {
+    "alphavantage": "https://www.alphavantage.co/query",
+    "newsapi": "https://newsapi.org/v2",
+}
+
+ALPHA_VANTAGE_NOTE = {
+    "Note": "Thank you for using Alpha Vantage! Our standard API call frequency is "
+            "5 calls per minute and 500 calls per day."
+}
+NEWS_API_RATE_LIMITED = {
+    "status": "error",
+    "code": "rateLimited",
+    "message": "You have made too many requests recently.",
+}
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """
+    Parse a latency distribution spec
+
+    Args:
+        spec: "fixed:MS", "uniform:LO,HI" or "lognormal:MEDIAN_MS,SIGMA"
+
+    Returns:
+        Function drawing a delay in seconds
+    """
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",") if v]
+    if kind == "fixed" and len(values) == 1:
+        return lambda rng: values[0] / 1000.0
+    if kind == "uniform" and len(values) == 2:
+        return lambda rng: rng.uniform(values[0], values[1]) / 1000.0
+    if kind == "lognormal" and len(values) == 2:
+        mu = math.log(values[0])
+        return lambda rng: rng.lognormvariate(mu, values[1]) / 1000.0
+    raise ValueError(f"Invalid latency spec: {spec}")
+
+
+def fixture_key(value: str) -> str:
+    """File-name-safe, case-insensitive fixture key"""
+    return re.sub(r"[^a-z0-9_.-]+", "_", value.lower()).strip("_") or "_"
+
+
+# ----------------------------------------------------------------------
+# Synthetic data for requests without a fixture
+# ----------------------------------------------------------------------
+
+def _rng_for(*parts: str) -> random.Random:
+    seed = hashlib.blake2b("|".join(parts).encode(), digest_size=8).digest()
+    return random.Random(int.from_bytes(seed, "big"))
+
+
+def _trading_days(count: int, end: Optional[date] = None):
+    day = end or date.today()
+    days = []
+    while len(days) < count:
+        if day.weekday() < 5:
+            days.append(day)
+        day -= timedelta(days=1)
+    return days
+
+
+def synthetic_daily(symbol: str, count: int = 100) -> dict:
+    """TIME_SERIES_DAILY response with a seeded random walk"""
+    rng = _rng_for("daily", symbol)
+    price = rng.uniform(20, 2000)
+    series = {}
+    for day in reversed(_trading_days(count)):
+        open_ = price
+        price = max(1.0, price * (1 + rng.gauss(0, 0.015)))
+        high = max(open_, price) * (1 + abs(rng.gauss(0, 0.005)))
+        low = min(open_, price) * (1 - abs(rng.gauss(0, 0.005)))
+        series[day.isoformat()] = {
+            "1. open": f"{open_:.4f}",
+            "2. high": f"{high:.4f}",
+            "3. low": f"{low:.4f}",
+            "4. close": f"{price:.4f}",
+            "5. volume": str(rng.randint(100_000, 20_000_000)),
+        }
+    return {
+        "Meta Data": {
+            "1. Information": "Daily Prices (open, high, low, close) and Volumes",
+            "2. Symbol": symbol,
+            "3. Last Refreshed": max(series),
+            "4. Output Size": "Compact",
+            "5. Time Zone": "US/Eastern",
+        },
+        "Time Series (Daily)": dict(sorted(series.items(), reverse=True)),
+    }
+
+
+def synthetic_daily_adjusted(symbol: str, full: bool = False, count: int = 5000) -> dict:
+    """
+    TIME_SERIES_DAILY_ADJUSTED response: a seeded walk with quarterly
+    dividends and occasional 2:1 splits
+
+    The whole history is always generated, so compact responses (the last
+    100 days) agree with full ones; "5. adjusted close" uses the vendor's
+    backward adjustment.
+    """
+    rng = _rng_for("daily_adjusted", symbol)
+    price = rng.uniform(20, 400)
+    rows = []
+    for index, day in enumerate(reversed(_trading_days(count))):
+        dividend, split = 0.0, 1.0
+        if index and rng.random() < 0.001:
+            split = 2.0
+        if index and index % 63 == 0:
+            dividend = round(price * 0.005, 4)
+        open_ = price / split
+        price = max(1.0, open_ * (1 + rng.gauss(0, 0.015)))
+        high = max(open_, price) * (1 + abs(rng.gauss(0, 0.005)))
+        low = min(open_, price) * (1 - abs(rng.gauss(0, 0.005)))
+        rows.append([day.isoformat(), open_, high, low, round(price, 4), rng.randint(100_000, 20_000_000), dividend, split])
+    factor, series = 1.0, {}
+    for index in range(len(rows) - 1, -1, -1):
+        day, open_, high, low, close, volume, dividend, split = rows[index]
+        series[day] = {
+            "1. open": f"{open_:.4f}",
+            "2. high": f"{high:.4f}",
+            "3. low": f"{low:.4f}",
+            "4. close": f"{close:.4f}",
+            "5. adjusted close": f"{close * factor:.4f}",
+            "6. volume": str(volume),
+            "7. dividend amount": f"{dividend:.4f}",
+            "8. split coefficient": f"{split:.1f}",
+        }
+        if index and (dividend or split != 1.0):
+            factor *= (1 - dividend / rows[index - 1][4]) / split
+    if not full:
+        series = dict(list(series.items())[:100])
+    return {
+        "Meta Data": {
+            "1. Information": "Daily Time Series with Splits and Dividend Events",
+            "2. Symbol": symbol,
+            "3. Last Refreshed": rows[-1][0],
+            "4. Output Size": "Full size" if full else "Compact",
+            "5. Time Zone": "US/Eastern",
+        },
+        "Time Series (Daily)": series,
+    }
+
+
+def synthetic_quote(symbol: str) -> dict:
+    """GLOBAL_QUOTE response consistent with synthetic_daily()"""
+    series = synthetic_daily(symbol)["Time Series (Daily)"]
+    (today, bar), (_, previous) = list(series.items())[:2]
+    close, prev_close = float(bar["4. close"]), float(previous["4. close"])
+    change = close - prev_close
+    return {
+        "Global Quote": {
+            "01. symbol": symbol,
+            "02. open": bar["1. open"],
+            "03. high": bar["2. high"],
+            "04. low": bar["3. low"],
+            "05. price": bar["4. close"],
+            "06. volume": bar["5. volume"],
+            "07. latest trading day": today,
+            "08. previous close": f"{prev_close:.4f}",
+            "09. change": f"{change:.4f}",
+            "10. change percent": f"{change / prev_close * 100:.4f}%",
+        }
+    }
+
+
+def synthetic_intraday(symbol: str, interval: str = "1min", full: bool = False) -> dict:
+    """
+    TIME_SERIES_INTRADAY response: a seeded walk per regular US session
+
+    Bars run 09:30-16:00 US/Eastern up to the current minute; compact
+    output is the latest 100 bars, full output the last 10 sessions.
+    """
+    minutes = int(interval.rstrip("min") or 1)
+    now = datetime.now(ZoneInfo("US/Eastern")).replace(tzinfo=None)
+    series = {}
+    for day in reversed(_trading_days(10 if full else 2, now.date())):
+        rng = _rng_for("intraday", symbol, day.isoformat())
+        price = rng.uniform(20, 2000)
+        start = datetime.combine(day, datetime.min.time()) + timedelta(hours=9, minutes=30)
+        for step in range(0, 390, minutes):
+            ts = start + timedelta(minutes=step)
+            if ts > now:
+                break
+            open_ = price
+            price = max(1.0, price * (1 + rng.gauss(0, 0.001 * minutes ** 0.5)))
+            series[ts.strftime("%Y-%m-%d %H:%M:%S")] = {
+                "1. open": f"{open_:.4f}",
+                "2. high": f"{max(open_, price) * (1 + abs(rng.gauss(0, 0.0005))):.4f}",
+                "3. low": f"{min(open_, price) * (1 - abs(rng.gauss(0, 0.0005))):.4f}",
+                "4. close": f"{price:.4f}",
+                "5. volume": str(rng.randint(1_000, 200_000) * minutes),
+            }
+    latest = sorted(series, reverse=True)[:None if full else 100]
+    return {
+        "Meta Data": {
+            "1. Information": f"Intraday ({interval}) open, high, low, close prices and volume",
+            "2. Symbol": symbol,
+            "3. Last Refreshed": latest[0] if latest else "",
+            "4. Interval": interval,
+            "5. Output Size": "Full size" if full else "Compact",
+            "6. Time Zone": "US/Eastern",
+        },
+        f"Time Series ({interval})": {ts: series[ts] for ts in latest},
+    }
+
+
+# Rough units per US dollar, the level synthetic_fx_daily() wanders around
+FX_LEVELS = {"USD": 1.0, "INR": 83.0, "EUR": 0.92, "GBP": 0.79, "JPY": 150.0, "CAD": 1.36, "CNY": 7.2}
+
+
+def synthetic_fx_daily(from_currency: str, to_currency: str, full: bool = False, count: int = 5000) -> dict:
+    """
+    FX_DAILY response with a seeded random walk around FX_LEVELS
+
+    The whole history is always generated, so compact responses (the last
+    100 days) agree with full ones.
+    """
+    if from_currency not in FX_LEVELS or to_currency not in FX_LEVELS:
+        return {"Error Message": "Invalid API call. Please retry or visit the documentation for FX_DAILY."}
+    rng = _rng_for("fx", from_currency, to_currency)
+    rate = FX_LEVELS[to_currency] / FX_LEVELS[from_currency]
+    series = {}
+    for day in reversed(_trading_days(count)):
+        open_ = rate
+        rate *= 1 + rng.gauss(0, 0.003)
+        series[day.isoformat()] = {
+            "1. open": f"{open_:.5f}",
+            "2. high": f"{max(open_, rate):.5f}",
+            "3. low": f"{min(open_, rate):.5f}",
+            "4. close": f"{rate:.5f}",
+        }
+    series = dict(sorted(series.items(), reverse=True)[:None if full else 100])
+    return {
+        "Meta Data": {
+            "1. Information": "Forex Daily Prices (open, high, low, close)",
+            "2. From Symbol": from_currency,
+            "3. To Symbol": to_currency,
+            "4. Output Size": "Full size" if full else "Compact",
+            "5. Last Refreshed": max(series),
+            "6. Time Zone": "UTC",
+        },
+        "Time Series FX (Daily)": series,
+    }
+
+
+def synthetic_articles(topic: str, page_size: int) -> dict:
+    """NewsAPI response with placeholder articles about a topic"""
+    rng = _rng_for("news", topic)
+    today = date.today()
+    articles = []
+    for i in range(page_size):
+        published = today - timedelta(hours=rng.randint(1, 96))
+        articles.append({
+            "source": {"id": None, "name": f"Fake Wire {i % 4 + 1}"},
+            "author": "Fake Upstream",
+            "title": f"{topic.title()} update #{i + 1}",
+            "description": f"Synthetic article about {topic} for offline testing.",
+            "url": f"https://example.com/{fixture_key(topic)}/{i + 1}",
+            "urlToImage": None,
+            "publishedAt": f"{published.isoformat()}T00:00:00Z",
+            "content": None,
+        })
+    return {"status": "ok", "totalResults": page_size * 5, "articles": articles}
+
+
+# ----------------------------------------------------------------------
+# Server
+# ----------------------------------------------------------------------
+
+class FaultConfig:
+    """Latency and failure injection settings"""
+
+    def __init__(
+        self,
+        latency: Optional[str] = None,
+        error_rate: float = 0.0,
+        note_rate: float = 0.0,
+        rate_limit_per_min: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        self.latency = parse_latency(latency) if latency else None
+        self.error_rate = error_rate
+        self.note_rate = note_rate
+        self.rate_limit_per_min = rate_limit_per_min
+        self.rng = random.Random(seed)
+        self._minute = 0
+        self._window: Counter = Counter()  # provider -> calls in the current minute
+        self._lock = threading.Lock()
+
+    def delay(self) -> float:
+        with self._lock:
+            return self.latency(self.rng) if self.latency else 0.0
+
+    def outcome(self, provider: str) -> str:
+        """
+        Decide how to answer one request
+
+        Returns:
+            "error", "rate_limited" or "ok"
+        """
+        with self._lock:
+            if self.rng.random() < self.error_rate:
+                return "error"
+            if self.rng.random() < self.note_rate:
+                return "rate_limited"
+            if self.rate_limit_per_min:
+                minute = int(time.time() // 60)
+                if minute != self._minute:
+                    self._minute = minute
+                    self._window.clear()
+                self._window[provider] += 1
+                if self._window[provider] > self.rate_limit_per_min:
+                    return "rate_limited"
+        return "ok"
+
+
+class FakeUpstream:
+    """
+    Fixture store plus the replay/record logic, independent of HTTP
+
+    Args:
+        fixtures_dir: Root directory of the fixtures
+        faults: Fault injection settings
+        record: Proxy to the real APIs and save responses as fixtures
+        synthesize: Generate data for requests without a fixture
+    """
+
+    def __init__(
+        self,
+        fixtures_dir: str = DEFAULT_FIXTURES,
+        faults: Optional[FaultConfig] = None,
+        record: bool = False,
+        synthesize: bool = True,
+    ):
+        self.fixtures_dir = fixtures_dir
+        self.faults = faults or FaultConfig()
+        self.record = record
+        self.synthesize = synthesize
+        self.stats: Counter = Counter()
+        self._lock = threading.Lock()
+        self._session = requests.Session() if record else None
+
+    def fixture_path(self, provider: str, function: str, key: str) -> str:
+        return os.path.join(self.fixtures_dir, provider, function, fixture_key(key) + ".json")
+
+    def _load(self, path: str) -> Optional[dict]:
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _save(self, path: str, data: dict) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(data, f, indent=2)
+            f.write("\n")
+
+    @staticmethod
+    def describe(path: str, params: dict) -> Tuple[str, str, str]:
+        """
+        Identify a request
+
+        Returns:
+            (provider, function, fixture key)
+        """
+        if path.rstrip("/").endswith("/query"):
+            function = params.get("function", "")
+            key = params.get("symbol") or params.get("keywords") or params.get("from_symbol", "") + params.get("to_symbol", "")
+            return "alphavantage", function, key
+        endpoint = path.rstrip("/").rsplit("/", 1)[-1]
+        key = params.get("q") or params.get("category") or "general"
+        return "newsapi", endpoint, key
+
+    def _synthesize(self, provider: str, function: str, key: str, params: dict) -> Optional[dict]:
+        if provider == "alphavantage":
+            if function == "GLOBAL_QUOTE":
+                return synthetic_quote(key.upper())
+            if function == "TIME_SERIES_DAILY":
+                return synthetic_daily(key.upper())
+            if function == "TIME_SERIES_DAILY_ADJUSTED":
+                return synthetic_daily_adjusted(key.upper(), params.get("outputsize") == "full")
+            if function == "TIME_SERIES_INTRADAY":
+                return synthetic_intraday(
+                    key.upper(), params.get("interval", "1min"), params.get("outputsize") == "full"
+                )
+            if function == "FX_DAILY":
+                return synthetic_fx_daily(
+                    params.get("from_symbol", "").upper(), params.get("to_symbol", "").upper(),
+                    params.get("outputsize") == "full",
+                )
+            if function == "SYMBOL_SEARCH":
+                return {"bestMatches": []}
+            return {"Error Message": f"Invalid API call. Unknown function {function}."}
+        if function in ("top-headlines", "everything"):
+            return synthetic_articles(key, int(params.get("pageSize", 20)))
+        return None
+
+    def _fetch_real(self, provider: str, path: str, params: dict) -> Tuple[int, dict]:
+        base = REAL_UPSTREAMS[provider]
+        url = base if provider == "alphavantage" else f"{base}/{path.rstrip('/').rsplit('/', 1)[-1]}"
+        response = self._session.get(url, params=params, timeout=15)
+        return response.status_code, response.json()
+
+    def handle(self, path: str, params: dict) -> Tuple[int, dict]:
+        """
+        Answer one upstream request
+
+        Args:
+            path: Request path (/query or /v2/<endpoint>)
+            params: Query parameters
+
+        Returns:
+            (HTTP status, JSON body)
+        """
+        provider, function, key = self.describe(path, params)
+        with self._lock:
+            self.stats[f"{provider}:{function}"] += 1
+
+        delay = self.faults.delay()
+        if delay:
+            time.sleep(delay)
+
+        outcome = self.faults.outcome(provider)
+        if outcome == "error":
+            return 503, {"error": "injected upstream failure"}
+        if outcome == "rate_limited":
+            if provider == "alphavantage":
+                return 200, ALPHA_VANTAGE_NOTE
+            return 429, NEWS_API_RATE_LIMITED
+
+        fixture = self.fixture_path(provider, function, key)
+        if self.record:
+            status, data = self._fetch_real(provider, path, params)
+            recordable = status == 200 and "Note" not in data and "Error Message" not in data \
+                and data.get("status") != "error"
+            if recordable:
+                self._save(fixture, data)
+            return status, data
+
+        data = self._load(fixture)
+        if data is None and self.synthesize:
+            data = self._synthesize(provider, function, key, params)
+        if data is None:
+            return 404, {"error": f"No fixture for {provider} {function} {key!r}"}
+        return 200, data
+
+
+class _Handler(BaseHTTPRequestHandler):
+    upstream: FakeUpstream
+
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        if url.path == "/__stats":
+            self._reply(200, dict(self.upstream.stats))
+            return
+        params = dict(parse_qsl(url.query))
+        try:
+            status, body = self.upstream.handle(url.path, params)
+        except Exception as e:
+            status, body = 502, {"error": f"fake upstream failed: {e}"}
+        self._reply(status, body)
+
+    def _reply(self, status: int, body: dict) -> None:
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format: str, *args) -> None:
+        if os.getenv("FAKE_UPSTREAM_VERBOSE") == "1":
+            super().log_message(format, *args)
+
+
+class FakeUpstreamServer:
+    """
+    Threaded HTTP server around FakeUpstream, usable in-process
+
+    Usage:
+        server = FakeUpstreamServer(FakeUpstream(faults=FaultConfig("fixed:50")))
+        server.start()
+        os.environ["ALPHA_VANTAGE_BASE_URL"] = server.alphavantage_url
+        ...
+        server.stop()
+    """
+
+    def __init__(self, upstream: FakeUpstream, host: str = "127.0.0.1", port: int = 0):
+        handler = type("FakeUpstreamHandler", (_Handler,), {"upstream": upstream})
+        self.upstream = upstream
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def alphavantage_url(self) -> str:
+        return f"{self.base_url}/query"
+
+    @property
+    def newsapi_url(self) -> str:
+        return f"{self.base_url}/v2"
+
+    def start(self) -> "FakeUpstreamServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="fake-upstream", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Fake Alpha Vantage / NewsAPI server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--fixtures", default=DEFAULT_FIXTURES, help="fixture directory")
+    parser.add_argument("--latency", help="fixed:MS | uniform:LO,HI | lognormal:MEDIAN_MS,SIGMA")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction answered with 503")
+    parser.add_argument("--note-rate", type=float, default=0.0, help="fraction answered as rate limited")
+    parser.add_argument("--rate-limit-per-min", type=float, default=0.0,
+                        help="per-provider calls per minute before answering as rate limited")
+    parser.add_argument("--seed", type=int, help="seed for latency and fault injection")
+    parser.add_argument("--record", action="store_true", help="proxy to the real APIs and save fixtures")
+    parser.add_argument("--strict", action="store_true", help="404 instead of synthetic data without a fixture")
+    args = parser.parse_args()
+
+    faults = FaultConfig(args.latency, args.error_rate, args.note_rate, args.rate_limit_per_min, args.seed)
+    upstream = FakeUpstream(args.fixtures, faults, record=args.record, synthesize=not args.strict)
+    server = FakeUpstreamServer(upstream, args.host, args.port)
+    print(f"Fake upstream on {server.base_url} ({'recording' if args.record else 'replaying'} {args.fixtures})")
+    print(f"  ALPHA_VANTAGE_BASE_URL={server.alphavantage_url}")
+    print(f"  NEWS_API_BASE_URL={server.newsapi_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""
+Market Data Import / Export
+Bulk-loads daily OHLCV into the local market store and exports it back out
+
+Run with:
+    python -m tools.market_data import data/*.csv [--symbol AAPL] [--chunk-size 50000]
+    python -m tools.market_data import exports/nse-2024          (columnar directory)
+    python -m tools.market_data export exports/nse-2024 [--symbols A,B] [--start 2024-01-01]
+    python -m tools.market_data export bars.csv --format csv
+
+The store is MARKET_DB_PATH (default database/market.db). See
+services/bulk_io.py for the file formats.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from services.bulk_io import DEFAULT_CHUNK_SIZE, export_columnar, import_path, iter_csv
+from services.market_store import DEFAULT_MARKET_DB_PATH, MarketStore
+from settings import load_env
+
+
+def run_import(store: MarketStore, args: argparse.Namespace) -> int:
+    total_rows = 0
+    started = time.perf_counter()
+    for path in args.paths:
+        try:
+            stats = import_path(store, path, args.format, args.symbol, args.chunk_size)
+        except (OSError, ValueError) as e:
+            print(f"{path}: {e}", file=sys.stderr)
+            return 1
+        total_rows += stats["rows"]
+        print(f"{path}: {stats['rows']} bars, {stats['symbols']} symbols in {stats['seconds']:.1f} s")
+    elapsed = time.perf_counter() - started
+    print(f"Imported {total_rows} bars in {elapsed:.1f} s ({total_rows / max(elapsed, 1e-9):,.0f} bars/s)")
+    return 0
+
+
+def run_export(store: MarketStore, args: argparse.Namespace) -> int:
+    symbols = [s.strip().upper() for s in args.symbols.split(",") if s.strip()] if args.symbols else None
+    fmt = args.format or ("csv" if args.path.lower().endswith(".csv") else "columnar")
+    started = time.perf_counter()
+    if fmt == "csv":
+        with open(args.path, "w", newline="") as f:
+            for text in iter_csv(store, symbols, args.start, args.end, args.chunk_size):
+                f.write(text)
+        print(f"Wrote {args.path} in {time.perf_counter() - started:.1f} s")
+    else:
+        stats = export_columnar(store, args.path, symbols, args.start, args.end, args.chunk_size)
+        print(f"Wrote {stats['rows']} bars, {stats['symbols']} symbols, "
+              f"{stats['bytes'] / 1e6:.1f} MB to {args.path} in {stats['seconds']:.1f} s")
+    return 0
+
+
+def main() -> int:
+    load_env()
+    parser = argparse.ArgumentParser(description="Bulk import / export of daily bars")
+    parser.add_argument("--db", default=os.getenv("MARKET_DB_PATH", DEFAULT_MARKET_DB_PATH),
+                        help="market store path")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="rows per transaction")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    importer = commands.add_parser("import", help="load CSV / Parquet files or columnar directories")
+    importer.add_argument("paths", nargs="+")
+    importer.add_argument("--format", choices=["csv", "parquet", "columnar"], help="default: from the path")
+    importer.add_argument("--symbol", help="symbol for files without a symbol column (default: file name)")
+
+    exporter = commands.add_parser("export", help="write bars to a columnar directory or a CSV file")
+    exporter.add_argument("path")
+    exporter.add_argument("--format", choices=["csv", "columnar"], help="default: csv for *.csv paths")
+    exporter.add_argument("--symbols", help="comma-separated (default: all)")
+    exporter.add_argument("--start", help="first date, YYYY-MM-DD")
+    exporter.add_argument("--end", help="last date, YYYY-MM-DD")
+
+    args = parser.parse_args()
+    store = MarketStore(args.db)
+    try:
+        return run_import(store, args) if args.command == "import" else run_export(store, args)
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
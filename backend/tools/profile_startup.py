@@ -0,0 +1,148 @@
+"""
+Startup Profiler
+Reports where app import time goes and checks the cold-start budget
+
+Run with: python -m tools.profile_startup [--budget-ms 900] [--path /health]
+
+Every measurement runs in a fresh interpreter, the same way a serverless
+cold start does. Cold start = interpreter start + `import server` +
+lifespan startup + the first request.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import List, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Executed in a child process: imports the app and serves one request
+_COLD_START_SNIPPET = r'''
+import asyncio, json, sys, time
+t0 = time.perf_counter()
+import server
+t1 = time.perf_counter()
+
+async def main(path):
+    app = server.app
+    lifespan_events = asyncio.Queue()
+    await lifespan_events.put({"type": "lifespan.startup"})
+    started = asyncio.Event()
+
+    async def lifespan_send(message):
+        if message["type"].startswith("lifespan.startup"):
+            started.set()
+
+    lifespan = asyncio.ensure_future(app({"type": "lifespan", "asgi": {"version": "3.0"}}, lifespan_events.get, lifespan_send))
+    await started.wait()
+    t2 = time.perf_counter()
+
+    status = {}
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status["code"] = message["status"]
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": path, "raw_path": path.encode(),
+        "root_path": "", "query_string": b"", "headers": [(b"host", b"localhost")],
+        "client": ("127.0.0.1", 0), "server": ("localhost", 80),
+    }
+    await app(scope, receive, send)
+    t3 = time.perf_counter()
+
+    await lifespan_events.put({"type": "lifespan.shutdown"})
+    await lifespan
+    return t2, t3, status.get("code")
+
+t2, t3, code = asyncio.run(main(sys.argv[1]))
+print(json.dumps({"import_ms": (t1 - t0) * 1000, "startup_ms": (t2 - t1) * 1000,
+                  "first_request_ms": (t3 - t2) * 1000, "status": code}))
+'''
+
+
+def run_importtime(module: str, env: dict) -> List[Tuple[int, int, int, str]]:
+    """
+    Run `python -X importtime -c "import <module>"` and parse the report
+
+    Args:
+        module: Module to import
+        env: Environment for the child process
+
+    Returns:
+        List of (self_us, cumulative_us, depth, module_name)
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        rows.append((int(self_us), int(cumulative_us), depth, name.strip()))
+    return rows
+
+
+def measure_cold_start(path: str, env: dict) -> dict:
+    """
+    Measure one cold start in a fresh interpreter
+
+    Args:
+        path: Request path for the first request
+        env: Environment for the child process
+
+    Returns:
+        Timings in milliseconds, including total process wall time
+    """
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", _COLD_START_SNIPPET, path],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    timings["total_ms"] = (time.perf_counter() - started) * 1000
+    return timings
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Profile Markstro API startup")
+    parser.add_argument("--module", default="server", help="module to import (default: server)")
+    parser.add_argument("--path", default="/health", help="path of the first request")
+    parser.add_argument("--runs", type=int, default=5, help="cold starts to measure")
+    parser.add_argument("--top", type=int, default=20, help="rows in the import report")
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("COLD_START_BUDGET_MS", "900")),
+                        help="fail if the median cold start exceeds this")
+    parser.add_argument("--eager", action="store_true", help="profile without MARKSTRO_LAZY_INIT")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env["MARKSTRO_LAZY_INIT"] = "0" if args.eager else "1"
+
+    rows = run_importtime(args.module, env)
+    print(f"\nImport time report for '{args.module}' (MARKSTRO_LAZY_INIT={env['MARKSTRO_LAZY_INIT']})")
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for self_us, cumulative_us, depth, name in sorted(rows, key=lambda r: r[1], reverse=True)[:args.top]:
+        print(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>9.1f}  {'  ' * depth}{name}")
+
+    runs = [measure_cold_start(args.path, env) for _ in range(args.runs)]
+    print(f"\nCold start over {args.runs} runs (GET {args.path} -> {runs[-1]['status']})")
+    for key in ("import_ms", "startup_ms", "first_request_ms", "total_ms"):
+        values = [run[key] for run in runs]
+        print(f"  {key:<18} median {statistics.median(values):8.1f}   max {max(values):8.1f}")
+
+    median_total = statistics.median(run["total_ms"] for run in runs)
+    within_budget = median_total <= args.budget_ms
+    print(f"\nBudget {args.budget_ms:.0f} ms: {'OK' if within_budget else 'EXCEEDED'} ({median_total:.1f} ms)\n")
+    return 0 if within_budget else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
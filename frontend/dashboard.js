@@ -6,8 +6,10 @@
 // ========== CONFIGURATION ==========
 const CONFIG = {
     BACKEND_URL: '/api',
-    CACHE_DURATION: 300000,  // 5 minutes
-    AUTO_REFRESH: 120000     // 2 minutes
+    // Prices are converted into this currency by the backend
+    BASE_CURRENCY: localStorage.getItem('markstro_currency') || 'INR',
+    AUTO_REFRESH: 120000,    // 2 minutes while the market trades
+    MAX_REFRESH_DELAY: 21600000  // 6 hours, while it is closed
 };
 
 // ========== GLOBAL STATE ==========
@@ -15,7 +17,7 @@ let currentChart = null;
 let currentStockData = null;
 let currentSymbol = '';
 let currentChartType = 'candlestick';
-let priceUpdateInterval = null;
+let priceUpdateTimer = null;
 let searchTimeout = null;
 let favorites = [];
 
@@ -32,6 +34,16 @@ function getAuthHeaders() {
     };
 }
 
+// ========== FORMATTING ==========
+
+function formatMoney(value, currency) {
+    // Indices (no currency) are points
+    if (!currency) {
+        return value.toLocaleString(undefined, { minimumFractionDigits: 2, maximumFractionDigits: 2 });
+    }
+    return new Intl.NumberFormat(undefined, { style: 'currency', currency }).format(value);
+}
+
 // ========== FAVORITES MANAGEMENT ==========
 
 function loadFavorites() {
@@ -51,13 +63,14 @@ function isFavorite(symbol) {
     return favorites.some(fav => fav.symbol === symbol);
 }
 
-function addToFavorites(symbol, name, price, change) {
+function addToFavorites(symbol, name, price, change, currency) {
     if (!isFavorite(symbol)) {
         favorites.push({
             symbol: symbol,
             name: name,
             price: price,
             change: change,
+            currency: currency,
             addedAt: new Date().toISOString()
         });
         saveFavorites();
@@ -73,43 +86,21 @@ function removeFromFavorites(symbol) {
     showNotification(`❌ ${symbol} removed from favorites`);
 }
 
-function toggleFavorite(symbol, name, price, change) {
+function toggleFavorite(symbol, name, price, change, currency) {
     if (isFavorite(symbol)) {
         removeFromFavorites(symbol);
     } else {
-        addToFavorites(symbol, name, price, change);
-    }
-}
-
-// ========== CACHE SYSTEM ==========
-const cache = new Map();
-
-function getCached(key) {
-    const item = cache.get(key);
-    if (!item) return null;
-    if (Date.now() - item.time > CONFIG.CACHE_DURATION) {
-        cache.delete(key);
-        return null;
+        addToFavorites(symbol, name, price, change, currency);
     }
-    return item.data;
-}
-
-function setCache(key, data) {
-    cache.set(key, { data, time: Date.now() });
 }
 
 // ========== API CALLS ==========
 
 async function fetchStockQuote(symbol) {
     try {
-        const cached = getCached(`quote_${symbol}`);
-        if (cached) {
-            console.log(`📦 Cache: ${symbol} quote`);
-            return cached;
-        }
-
+        // Repeat requests are served by the browser HTTP cache (ETag + Cache-Control)
         console.log(`📡 Fetching quote: ${symbol}`);
-        const response = await fetch(`${CONFIG.BACKEND_URL}/stock/quote/${symbol}`, {
+        const response = await fetch(`${CONFIG.BACKEND_URL}/stock/quote/${symbol}?currency=${CONFIG.BASE_CURRENCY}`, {
             headers: getAuthHeaders()
         });
         
@@ -118,22 +109,7 @@ async function fetchStockQuote(symbol) {
             throw new Error(error.detail || 'Failed to fetch stock quote');
         }
         
-        const data = await response.json();
-        
-        // Mock data for demo (backend ready nahi hai abhi)
-        const mockData = {
-            symbol: symbol,
-            price: 150.25 + Math.random() * 50,
-            open: 148.50,
-            high: 152.80,
-            low: 147.20,
-            volume: 12500000,
-            change: 2.5,
-            changePercent: 1.7
-        };
-        
-        setCache(`quote_${symbol}`, mockData);
-        return mockData;
+        return await response.json();
         
     } catch (error) {
         console.error('❌ Quote error:', error);
@@ -151,6 +127,58 @@ async function fetchStockQuote(symbol) {
     }
 }
 
+async function fetchChartSeries(symbol) {
+    // Intraday bars (held in backend memory), falling back to daily bars
+    const urls = [
+        `${CONFIG.BACKEND_URL}/stock/intraday/${symbol}?interval=5min&limit=390&currency=${CONFIG.BASE_CURRENCY}`,
+        `${CONFIG.BACKEND_URL}/stock/timeseries/${symbol}?currency=${CONFIG.BASE_CURRENCY}`
+    ];
+    for (const url of urls) {
+        try {
+            const response = await fetch(url, { headers: getAuthHeaders() });
+            if (!response.ok) continue;
+            const series = await response.json();
+            if (!series.data || series.data.length === 0) continue;
+            return {
+                data: series.data.map(bar => ({
+                    ...bar,
+                    date: bar.date || bar.timestamp.replace('T', ' ').slice(5, 16)
+                }))
+            };
+        } catch (error) {
+            console.error('❌ Series error:', error);
+        }
+    }
+    return { data: [] };
+}
+
+// Latest quotes of the polled symbols; each poll sends the cursor and gets only changed fields
+const quoteState = { cursor: null, symbols: '', quotes: {} };
+
+async function fetchQuotes(symbols) {
+    const key = symbols.join(',');
+    if (quoteState.symbols !== key) {
+        Object.assign(quoteState, { cursor: null, symbols: key, quotes: {} });
+    }
+    const since = quoteState.cursor ? `&since=${encodeURIComponent(quoteState.cursor)}` : '';
+    const response = await fetch(`${CONFIG.BACKEND_URL}/stock/quotes?symbols=${encodeURIComponent(key)}${since}`, {
+        headers: getAuthHeaders()
+    });
+    if (!response.ok) {
+        const error = await response.json();
+        throw new Error(error.detail || 'Failed to fetch quotes');
+    }
+    const update = await response.json();
+    if (update.reset) {
+        quoteState.quotes = {};
+    }
+    for (const [symbol, fields] of Object.entries(update.quotes)) {
+        quoteState.quotes[symbol] = { ...quoteState.quotes[symbol], ...fields };
+    }
+    quoteState.cursor = update.cursor;
+    return { quotes: quoteState.quotes, errors: update.errors || {} };
+}
+
 async function searchStocks(query) {
     try {
         console.log(`🔍 Searching: ${query}`);
@@ -200,7 +228,7 @@ function initializeDashboard() {
     }
     
     loadMarketIndices();
-    priceUpdateInterval = setInterval(loadMarketIndices, CONFIG.AUTO_REFRESH);
+    scheduleIndexRefresh();
     setupSearch();
     
     console.log('✅ Dashboard ready!');
@@ -208,53 +236,88 @@ function initializeDashboard() {
 
 // ========== MARKET INDICES ==========
 
+const MARKET_INDICES = [
+    { displayName: 'SENSEX', prefix: 'sensex', symbol: '^BSESN', exchange: 'BSE' },
+    { displayName: 'NIFTY 50', prefix: 'nifty', symbol: '^NSEI', exchange: 'NSE' }
+];
+
+async function nextRefreshDelay() {
+    // Faster around the open and close, not at all while the exchanges are closed
+    try {
+        const response = await fetch(`${CONFIG.BACKEND_URL}/stock/market-status?interval=${CONFIG.AUTO_REFRESH / 1000}`, {
+            headers: getAuthHeaders()
+        });
+        if (response.ok) {
+            const { exchanges } = await response.json();
+            const seconds = Math.min(...MARKET_INDICES.map(index => exchanges[index.exchange].refreshSeconds));
+            // A second past the open, so the first refresh sees the new session
+            return Math.min(seconds * 1000 + 1000, CONFIG.MAX_REFRESH_DELAY);
+        }
+    } catch (error) {
+        console.error('❌ Market status:', error.message);
+    }
+    return CONFIG.AUTO_REFRESH;
+}
+
+async function scheduleIndexRefresh() {
+    const delay = await nextRefreshDelay();
+    console.log(`⏱️ Next index refresh in ${Math.round(delay / 1000)}s`);
+    priceUpdateTimer = setTimeout(async () => {
+        await loadMarketIndices();
+        scheduleIndexRefresh();
+    }, delay);
+}
+
 async function loadMarketIndices() {
     console.log('📈 Loading market indices...');
-    loadIndexData('SENSEX', 'sensex', '^BSESN');
-    setTimeout(() => loadIndexData('NIFTY 50', 'nifty', '^NSEI'), 1000);
+    let result = { quotes: {}, errors: {} };
+    try {
+        result = await fetchQuotes(MARKET_INDICES.map(index => index.symbol));
+    } catch (error) {
+        console.error('❌ Indices:', error.message);
+    }
+    MARKET_INDICES.forEach(index => renderIndexData(index, result.quotes[index.symbol]));
 }
 
-async function loadIndexData(displayName, prefix, symbol) {
+function renderIndexData({ displayName, prefix, symbol }, data) {
     const priceEl = document.getElementById(`${prefix}-price`);
     const changeEl = document.getElementById(`${prefix}-change`);
     const cardEl = document.getElementById(`${prefix}-card`);
     
     if (!priceEl) return;
     
-    try {
-        const data = await fetchStockQuote(symbol);
-        
-        priceEl.textContent = `₹${data.price.toFixed(2)}`;
-        priceEl.classList.remove('loading-pulse');
-        
-        const changeText = `${data.change >= 0 ? '+' : ''}${data.change.toFixed(2)} (${data.changePercent.toFixed(2)}%)`;
-        changeEl.textContent = changeText;
-        
-        if (data.change >= 0) {
-            cardEl.className = 'sentiment-card bullish';
-            cardEl.querySelector('.icon-wrapper span').textContent = 'trending_up';
-            changeEl.className = 'success-text';
-        } else {
-            cardEl.className = 'sentiment-card bearish';
-            cardEl.querySelector('.icon-wrapper span').textContent = 'trending_down';
-            changeEl.className = 'danger-text';
-        }
-        
-        cardEl.style.cursor = 'pointer';
-        cardEl.onclick = () => openStockDetail(symbol, displayName);
-        console.log(`✅ ${displayName}: ₹${data.price.toFixed(2)}`);
-        
-    } catch (error) {
-        console.error(`❌ ${displayName}:`, error.message);
+    if (!data) {
+        console.error(`❌ ${displayName}: no quote`);
         priceEl.textContent = 'Click to Retry';
         priceEl.classList.remove('loading-pulse');
         changeEl.textContent = 'Unable to load';
         cardEl.onclick = () => {
             priceEl.textContent = 'Loading...';
             priceEl.classList.add('loading-pulse');
-            setTimeout(() => loadIndexData(displayName, prefix, symbol), 1000);
+            setTimeout(loadMarketIndices, 1000);
         };
+        return;
+    }
+    
+    priceEl.textContent = formatMoney(data.price, data.currency);
+    priceEl.classList.remove('loading-pulse');
+    
+    const changeText = `${data.change >= 0 ? '+' : ''}${data.change.toFixed(2)} (${data.changePercent.toFixed(2)}%)`;
+    changeEl.textContent = changeText;
+    
+    if (data.change >= 0) {
+        cardEl.className = 'sentiment-card bullish';
+        cardEl.querySelector('.icon-wrapper span').textContent = 'trending_up';
+        changeEl.className = 'success-text';
+    } else {
+        cardEl.className = 'sentiment-card bearish';
+        cardEl.querySelector('.icon-wrapper span').textContent = 'trending_down';
+        changeEl.className = 'danger-text';
     }
+    
+    cardEl.style.cursor = 'pointer';
+    cardEl.onclick = () => openStockDetail(symbol, displayName);
+    console.log(`✅ ${displayName}: ${formatMoney(data.price, data.currency)}`);
 }
 
 // ========== SEARCH ==========
@@ -363,14 +426,13 @@ async function openStockDetail(symbol, displayName) {
         const quoteData = await fetchStockQuote(symbol);
         updateModalInfo(quoteData, displayName);
         
-        // Generate mock time series data
-        const timeSeriesData = generateMockTimeSeries(quoteData.price);
+        const timeSeriesData = await fetchChartSeries(symbol);
         currentStockData = timeSeriesData;
         
         createModalChart(timeSeriesData, currentChartType);
         document.getElementById('modal-stock-name').textContent = displayName;
         
-        updateFavoriteButton(symbol, displayName, quoteData.price, quoteData.changePercent);
+        updateFavoriteButton(symbol, displayName, quoteData.price, quoteData.changePercent, quoteData.currency);
         
         console.log('✅ Stock detail loaded');
     } catch (error) {
@@ -380,43 +442,11 @@ async function openStockDetail(symbol, displayName) {
     }
 }
 
-function generateMockTimeSeries(basePrice) {
-    const data = [];
-    const days = 30;
-    let price = basePrice;
-    
-    for (let i = days; i >= 0; i--) {
-        const date = new Date();
-        date.setDate(date.getDate() - i);
-        
-        const change = (Math.random() - 0.5) * 5;
-        price = Math.max(price + change, basePrice * 0.8);
-        
-        const open = price;
-        const high = price + Math.random() * 3;
-        const low = price - Math.random() * 3;
-        const close = low + Math.random() * (high - low);
-        
-        data.push({
-            date: date.toISOString().split('T')[0],
-            open: parseFloat(open.toFixed(2)),
-            high: parseFloat(high.toFixed(2)),
-            low: parseFloat(low.toFixed(2)),
-            close: parseFloat(close.toFixed(2)),
-            volume: Math.floor(Math.random() * 10000000) + 5000000
-        });
-        
-        price = close;
-    }
-    
-    return { data: data };
-}
-
 function updateModalInfo(data, displayName) {
-    document.getElementById('modal-current-price').textContent = `$${data.price.toFixed(2)}`;
-    document.getElementById('modal-open').textContent = `$${data.open.toFixed(2)}`;
-    document.getElementById('modal-high').textContent = `$${data.high.toFixed(2)}`;
-    document.getElementById('modal-low').textContent = `$${data.low.toFixed(2)}`;
+    document.getElementById('modal-current-price').textContent = formatMoney(data.price, data.currency);
+    document.getElementById('modal-open').textContent = formatMoney(data.open, data.currency);
+    document.getElementById('modal-high').textContent = formatMoney(data.high, data.currency);
+    document.getElementById('modal-low').textContent = formatMoney(data.low, data.currency);
     
     const vol = data.volume;
     const volText = vol > 1000000 ? `${(vol/1000000).toFixed(2)}M` : `${(vol/1000).toFixed(2)}K`;
@@ -427,7 +457,7 @@ function updateModalInfo(data, displayName) {
     changeEl.className = data.change >= 0 ? 'success-text' : 'danger-text';
 }
 
-function updateFavoriteButton(symbol, name, price, change) {
+function updateFavoriteButton(symbol, name, price, change, currency) {
     let favBtn = document.getElementById('favorite-btn');
     
     if (!favBtn) {
@@ -444,8 +474,8 @@ function updateFavoriteButton(symbol, name, price, change) {
         '<span class="material-icons-sharp">favorite_border</span> Add to Favorites';
     
     favBtn.onclick = () => {
-        toggleFavorite(symbol, name, price, change);
-        updateFavoriteButton(symbol, name, price, change);
+        toggleFavorite(symbol, name, price, change, currency);
+        updateFavoriteButton(symbol, name, price, change, currency);
     };
 }
 
@@ -483,7 +513,7 @@ function updateFavoritesUI() {
         card.innerHTML = `
             <span class="material-icons-sharp favorite-icon" onclick="event.stopPropagation(); removeFromFavorites('${fav.symbol}')">star</span>
             <h3>${fav.symbol}</h3>
-            <h2>$${fav.price.toFixed(2)}</h2>
+            <h2>${formatMoney(fav.price, fav.currency)}</h2>
             <span class="${fav.change >= 0 ? 'success-text' : 'danger-text'}">
                 ${fav.change >= 0 ? '+' : ''}${fav.change.toFixed(2)}%
             </span>
@@ -682,7 +712,7 @@ window.onclick = function(event) {
 }
 
 window.addEventListener('beforeunload', () => {
-    if (priceUpdateInterval) clearInterval(priceUpdateInterval);
+    if (priceUpdateTimer) clearTimeout(priceUpdateTimer);
 });
 
 console.log('✅ Dashboard JS fully loaded and ready!');